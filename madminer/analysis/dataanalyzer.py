@@ -4,6 +4,9 @@ import numpy as np
 
 from madminer.utils.interfaces.hdf5 import load_events
 from madminer.utils.interfaces.hdf5 import load_madminer_settings
+from madminer.utils.interfaces.hdf5 import load_morphing_error_surface
+from madminer.utils.morphing import MorphingErrorSurface
+from madminer.utils.morphing import MorphingKernel
 from madminer.utils.morphing import PhysicsMorpher
 from madminer.utils.morphing import NuisanceMorpher
 from madminer.utils.various import mdot
@@ -65,6 +68,10 @@ class DataAnalyzer:
             self.morpher.set_components(self.morphing_components)
             self.morpher.set_basis(self.benchmarks, morphing_matrix=self.morphing_matrix)
 
+            error_axes, error_values = load_morphing_error_surface(filename)
+            if error_values is not None:
+                self.morpher.morphing_error_surface = MorphingErrorSurface(error_axes, error_values)
+
         # Nuisance morphing
         self.nuisance_morpher = None
         if self.n_nuisance_parameters > 0:
@@ -74,6 +81,21 @@ class DataAnalyzer:
                 self.reference_benchmark,
             )
 
+        # Morphing kernel, translating parameter points into benchmark weights
+        self.morphing_kernel = MorphingKernel(
+            benchmark_names=self.benchmarks.keys(),
+            benchmark_values=self._benchmark_array(),
+            components=None if self.morpher is None else self.morpher.components,
+            morphing_matrix=None if self.morpher is None else self.morpher.morphing_matrix,
+            finite_difference_matrices=(
+                self._finite_differences_theta_gradient_matrices()
+                if self.morpher is None
+                and self.finite_difference_benchmarks is not None
+                and self.finite_difference_epsilon is not None
+                else None
+            ),
+        )
+
         # Check event numbers
         self._check_n_events()
         self._report_setup()
@@ -86,6 +108,7 @@ class DataAnalyzer:
         include_nuisance_parameters=None,
         generated_close_to=None,
         return_sampling_ids=False,
+        return_nuisance_coefficients=False,
     ):
         """
         Yields batches of events in the MadMiner file.
@@ -111,6 +134,10 @@ class DataAnalyzer:
         return_sampling_ids : bool, optional
             If True, the iterator returns the sampling IDs in addition to observables and weights.
 
+        return_nuisance_coefficients : bool, optional
+            If True, the iterator also returns the nuisance coefficients (a, b) stored in the file, or None if the
+            file stores the nuisance benchmark weights instead.
+
         Yields
         ------
         observations : ndarray
@@ -122,6 +149,10 @@ class DataAnalyzer:
         sampling_ids : int
             Sampling IDs (benchmark used for sampling for signal events, -1 for background events). Only returned if
             return_sampling_ids = True was set.
+
+        nuisance_coefficients : tuple of ndarray or None
+            Nuisance coefficients (a, b), each with shape `(n_nuisance_parameters, n_batch)`, that can be passed to
+            the NuisanceMorpher methods. Only returned if return_nuisance_coefficients = True was set.
         """
 
         if include_nuisance_parameters is None:
@@ -145,8 +176,21 @@ class DataAnalyzer:
             sampling_factors=sampling_factors,
             include_nuisance_params=include_nuisance_parameters,
             include_sampling_ids=return_sampling_ids,
+            include_nuisance_coefficients=True,
         ):
-            yield data
+            *data, nuisance_coefficients = data
+
+            if nuisance_coefficients is not None:
+                nuisance_coefficients = tuple(c.T.astype(np.float64) for c in nuisance_coefficients)
+
+                # Nuisance benchmark weights are reconstructed from the stored coefficients
+                if include_nuisance_parameters and self.nuisance_morpher is not None:
+                    data[1] = self.nuisance_morpher.expand_benchmark_weights(data[1], nuisance_coefficients)
+
+            if return_nuisance_coefficients:
+                data.append(nuisance_coefficients)
+
+            yield tuple(data)
 
     def weighted_events(
         self,
@@ -318,21 +362,21 @@ class DataAnalyzer:
         if thetas is None:
             theta_matrices = np.identity(self.n_benchmarks)
         else:
-            theta_matrices = [self._get_theta_benchmark_matrix(theta) for theta in thetas]
-            theta_matrices = np.asarray(theta_matrices)  # Shape (n_thetas, n_benchmarks)
+            theta_matrices = self.morphing_kernel.weights(thetas)  # Shape (n_thetas, n_benchmarks)
 
         # Loop over events
         xsecs = 0.0
         xsec_uncertainties = 0.0
         n_events = 0
 
-        for i_batch, (_, benchmark_weights) in enumerate(
+        for i_batch, (_, benchmark_weights, nuisance_coefficients) in enumerate(
             self.event_loader(
                 start=start_event,
                 end=end_event,
                 include_nuisance_parameters=include_nuisance_benchmarks,
                 batch_size=batch_size,
                 generated_close_to=generated_close_to,
+                return_nuisance_coefficients=True,
             )
         ):
             n_batch, _ = benchmark_weights.shape
@@ -350,7 +394,7 @@ class DataAnalyzer:
                 weights_sq_nom = mdot(theta_matrices, benchmark_weights * benchmark_weights)  # same
 
                 # Effect of nuisance parameters
-                nuisance_factors = self._calculate_nuisance_factors(nus, benchmark_weights)
+                nuisance_factors = self._calculate_nuisance_factors(nus, benchmark_weights, nuisance_coefficients)
                 weights = nuisance_factors * weights_nom
                 weights_sq = nuisance_factors * weights_sq_nom
 
@@ -448,34 +492,37 @@ class DataAnalyzer:
             raise ValueError(f"Invalid partition type: {partition}")
 
         # Theta matrices (translation of benchmarks to theta, at nominal nuisance params)
-        theta_matrices = np.asarray(
-            [self._get_theta_benchmark_matrix(theta) for theta in thetas]
-        )  # shape (n_thetas, n_benchmarks)
-
-        theta_gradient_matrices = np.asarray(
-            [self._get_dtheta_benchmark_matrix(theta) for theta in thetas]
-        )  # shape (n_thetas, n_gradients, n_benchmarks)
+        theta_matrices = self.morphing_kernel.weights(thetas)  # shape (n_thetas, n_benchmarks)
+        theta_gradient_matrices = self.morphing_kernel.gradients(thetas)  # shape (n_thetas, n_gradients, n_benchmarks)
 
         # Loop over events
         xsec_gradients = 0.0
 
-        for i_batch, (_, benchmark_weights) in enumerate(
+        for i_batch, (_, benchmark_weights, nuisance_coefficients) in enumerate(
             self.event_loader(
                 start=start_event,
                 end=end_event,
                 include_nuisance_parameters=include_nuisance_benchmarks,
                 batch_size=batch_size,
                 generated_close_to=generated_close_to,
+                return_nuisance_coefficients=True,
             )
         ):
             n_batch, _ = benchmark_weights.shape
             logger.debug(f"Batch {i_batch+1} with {n_batch} events")
 
+            # Nuisance coefficients, calculated once for all thetas and nus (unless stored in the file)
+            coefficients = self._calculate_nuisance_coefficients(
+                benchmark_weights, nus, gradients, nuisance_coefficients
+            )
+
             if gradients in ["all", "theta"]:
                 nom_gradients = mdot(
                     theta_gradient_matrices, benchmark_weights
                 )  # Shape (n_thetas, n_phys_gradients, n_batch)
-                nuisance_factors = self._calculate_nuisance_factors(nus, benchmark_weights)  # Shape (n_thetas, n_batch)
+                nuisance_factors = self._calculate_nuisance_factors(
+                    nus, benchmark_weights, coefficients
+                )  # Shape (n_thetas, n_batch)
                 try:
                     dweight_dtheta = nuisance_factors[:, np.newaxis, :] * nom_gradients
                 except TypeError:
@@ -483,8 +530,8 @@ class DataAnalyzer:
 
             if gradients in ["all", "nu"]:
                 weights_nom = mdot(theta_matrices, benchmark_weights)  # Shape (n_thetas, n_batch)
-                nuisance_factor_gradients = np.asarray(
-                    [self.nuisance_morpher.calculate_nuisance_factor_gradients(nu, benchmark_weights) for nu in nus]
+                nuisance_factor_gradients = self.nuisance_morpher.calculate_nuisance_factor_gradients_batch(
+                    nus, coefficients=coefficients
                 )  # Shape (n_thetas, n_nuisance_gradients, n_batch)
                 dweight_dnu = nuisance_factor_gradients * weights_nom[:, np.newaxis, :]
 
@@ -552,14 +599,25 @@ class DataAnalyzer:
         else:
             logger.info("Did not find nuisance morphing setup")
 
-    def _calculate_nuisance_factors(self, nus, benchmark_weights):
+    def _calculate_nuisance_factors(self, nus, benchmark_weights, coefficients=None):
         if self._any_nontrivial_nus(nus):
-            return np.asarray(
-                [self.nuisance_morpher.calculate_nuisance_factors(nu, benchmark_weights) for nu in nus]
+            return self.nuisance_morpher.calculate_nuisance_factors_batch(
+                nus, benchmark_weights, coefficients
             )  # Shape (n_thetas, n_batch)
         else:
             return 1.0
 
+    def _calculate_nuisance_coefficients(self, benchmark_weights, nus, gradients="theta", stored_coefficients=None):
+        """Calculates the nuisance coefficients (a, b) for a batch of events, if they are needed at all"""
+
+        if self.nuisance_morpher is None:
+            return None
+        if gradients not in ["all", "nu"] and not self._any_nontrivial_nus(nus):
+            return None
+        if stored_coefficients is not None:
+            return stored_coefficients
+        return self.nuisance_morpher.calculate_coefficients(benchmark_weights)
+
     def _finite_differences_theta_gradient_matrices(self):
         """Constructs the matrix that translates benchmark weights to the gradient of the weight evaluated at the benchmarks"""
         assert self.finite_difference_benchmarks is not None
@@ -609,18 +667,7 @@ class DataAnalyzer:
                 return True
         return False
 
-    def _derivative_mode(self):
-        if self.morpher is not None:
-            mode = "morphing"
-        elif self.finite_difference_benchmarks is not None:
-            mode = "fd"
-        else:
-            raise RuntimeError(
-                "Cannot compute xsec gradients when neither morphing nor finite differences are correctly set up!"
-            )
-        return mode
-
-    def _weights(self, thetas, nus, benchmark_weights, theta_matrices=None):
+    def _weights(self, thetas, nus, benchmark_weights, theta_matrices=None, nuisance_coefficients=None):
         """
         Turns benchmark weights into weights for given parameter points (theta, nu).
 
@@ -636,6 +683,16 @@ class DataAnalyzer:
              account. Otherwise, the list has to have the same number of elements as thetas, and each entry can specify
              nuisance parameters at nominal value (None) or a value of the nuisance parameters (ndarray).
 
+        benchmark_weights : ndarray
+            Benchmark weights with shape `(n_batch, n_benchmarks)`.
+
+        theta_matrices : ndarray or None, optional
+            Morphing weights of the thetas. If None, they are calculated. Default value: None.
+
+        nuisance_coefficients : tuple of ndarray or None, optional
+            Nuisance coefficients (a, b) of the events as returned by `event_loader()`. If None, they are calculated
+            from the benchmark weights. Default value: None.
+
         Returns
         -------
         weights : ndarray
@@ -651,20 +708,30 @@ class DataAnalyzer:
 
         # Theta matrices (translation of benchmarks to theta, at nominal nuisance params)
         if theta_matrices is None:
-            theta_matrices = [self._get_theta_benchmark_matrix(theta) for theta in thetas]
+            theta_matrices = self.morphing_kernel.weights(thetas)
         theta_matrices = np.asarray(theta_matrices)  # Shape (n_thetas, n_benchmarks)
 
         # Weights at nominal nuisance params (nu=0)
         weights_nom = mdot(theta_matrices, benchmark_weights)  # Shape (n_thetas, n_batch)
 
         # Effect of nuisance parameters
-        nuisance_factors = self._calculate_nuisance_factors(nus, benchmark_weights)
+        coefficients = self._calculate_nuisance_coefficients(
+            benchmark_weights, nus, stored_coefficients=nuisance_coefficients
+        )
+        nuisance_factors = self._calculate_nuisance_factors(nus, benchmark_weights, coefficients)
         weights = nuisance_factors * weights_nom
 
         return weights
 
     def _weight_gradients(
-        self, thetas, nus, benchmark_weights, gradients="all", theta_matrices=None, theta_gradient_matrices=None
+        self,
+        thetas,
+        nus,
+        benchmark_weights,
+        gradients="all",
+        theta_matrices=None,
+        theta_gradient_matrices=None,
+        nuisance_coefficients=None,
     ):
         """
         Turns benchmark weights into weights for given parameter points (theta, nu).
@@ -681,9 +748,19 @@ class DataAnalyzer:
              account. Otherwise, the list has to have the same number of elements as thetas, and each entry can specify
              nuisance parameters at nominal value (None) or a value of the nuisance parameters (ndarray).
 
+        benchmark_weights : ndarray
+            Benchmark weights with shape `(n_batch, n_benchmarks)`.
+
         gradients : {"all", "theta", "nu"}, optional
             Which gradients to calculate. Default value: "all".
 
+        theta_matrices, theta_gradient_matrices : ndarray or None, optional
+            Morphing weights and their gradients of the thetas. If None, they are calculated. Default value: None.
+
+        nuisance_coefficients : tuple of ndarray or None, optional
+            Nuisance coefficients (a, b) of the events as returned by `event_loader()`. If None, they are calculated
+            from the benchmark weights. Default value: None.
+
         Returns
         -------
         gradients : ndarray
@@ -701,16 +778,21 @@ class DataAnalyzer:
 
         # Theta matrices (translation of benchmarks to theta, at nominal nuisance params)
         if theta_matrices is None:
-            theta_matrices = [self._get_theta_benchmark_matrix(theta) for theta in thetas]
+            theta_matrices = self.morphing_kernel.weights(thetas)
         if theta_gradient_matrices is None:
-            theta_gradient_matrices = [self._get_dtheta_benchmark_matrix(theta) for theta in thetas]
+            theta_gradient_matrices = self.morphing_kernel.gradients(thetas)
         theta_matrices = np.asarray(theta_matrices)  # Shape (n_thetas, n_benchmarks)
         theta_gradient_matrices = np.asarray(theta_gradient_matrices)  # Shape (n_thetas, n_gradients, n_benchmarks)
 
+        # Nuisance coefficients, calculated once for all thetas and nus
+        coefficients = self._calculate_nuisance_coefficients(
+            benchmark_weights, nus, gradients, stored_coefficients=nuisance_coefficients
+        )
+
         # Calculate theta gradient
         if gradients in ["all", "theta"]:
             nom_gradients = mdot(theta_gradient_matrices, benchmark_weights)  # (n_thetas, n_phys_gradients, n_batch)
-            nuisance_factors = self._calculate_nuisance_factors(nus, benchmark_weights)
+            nuisance_factors = self._calculate_nuisance_factors(nus, benchmark_weights, coefficients)
             try:
                 dweight_dtheta = nuisance_factors[:, np.newaxis, :] * nom_gradients
             except TypeError:
@@ -721,8 +803,8 @@ class DataAnalyzer:
         # Calculate nu gradient
         if gradients in ["all", "nu"]:
             weights_nom = mdot(theta_matrices, benchmark_weights)  # Shape (n_thetas, n_batch)
-            nuisance_factor_gradients = np.asarray(
-                [self.nuisance_morpher.calculate_nuisance_factor_gradients(nu, benchmark_weights) for nu in nus]
+            nuisance_factor_gradients = self.nuisance_morpher.calculate_nuisance_factor_gradients_batch(
+                nus, coefficients=coefficients
             )  # Shape (n_thetas, n_nuisance_gradients, n_batch)
             dweight_dnu = nuisance_factor_gradients * weights_nom[:, np.newaxis, :]
         else:
@@ -812,59 +894,20 @@ class DataAnalyzer:
     def _get_theta_benchmark_matrix(self, theta, zero_pad=True):
         """Calculates vector A such that dsigma(theta) = A * dsigma_benchmarks"""
 
-        if zero_pad:
-            unpadded_theta_matrix = self._get_theta_benchmark_matrix(theta, zero_pad=False)
-            theta_matrix = np.zeros(self.n_benchmarks)
-            theta_matrix[: unpadded_theta_matrix.shape[0]] = unpadded_theta_matrix
-
-        elif isinstance(theta, str):
-            i_benchmark = list(self.benchmarks).index(theta)
-            theta_matrix = self._get_theta_benchmark_matrix(i_benchmark)
-
-        elif isinstance(theta, int):
-            n_benchmarks = len(self.benchmarks)
-            theta_matrix = np.zeros(n_benchmarks)
-            theta_matrix[theta] = 1.0
+        theta_matrix = self.morphing_kernel.weights([theta])[0]
 
-        else:
-            theta_matrix = self.morpher.calculate_morphing_weights(theta)
+        if not zero_pad and not isinstance(theta, (str, int, np.integer)):
+            theta_matrix = theta_matrix[: self.morphing_kernel.n_morphing_benchmarks]
 
         return theta_matrix
 
     def _get_dtheta_benchmark_matrix(self, theta, zero_pad=True):
         """Calculates matrix A_ij such that d dsigma(theta) / d theta_i = A_ij * dsigma (benchmark j)"""
 
-        mode = self._derivative_mode()
-
-        if zero_pad:
-            unpadded_theta_matrix = self._get_dtheta_benchmark_matrix(theta, zero_pad=False)
-            dtheta_matrix = np.zeros((unpadded_theta_matrix.shape[0], self.n_benchmarks))
-            dtheta_matrix[:, : unpadded_theta_matrix.shape[1]] = unpadded_theta_matrix
-
-        elif isinstance(theta, str) and mode == "morphing":
-            benchmark = self.benchmarks[theta]
-            benchmark = np.array([val for val in benchmark.values.values()])
-            dtheta_matrix = self._get_dtheta_benchmark_matrix(benchmark)
-
-        elif isinstance(theta, int) and mode == "morphing":
-            benchmark = self.benchmarks[list(self.benchmarks.keys())[theta]]
-            benchmark = np.array([val for val in benchmark.values.values()])
-            dtheta_matrix = self._get_dtheta_benchmark_matrix(benchmark)
-
-        elif isinstance(theta, str):
-            benchmark_id = list(self.benchmarks.keys()).index(theta)
-            dtheta_matrix = self._get_dtheta_benchmark_matrix(benchmark_id)
-
-        elif isinstance(theta, int):  # finite differences
-            # TODO: avoid constructing the full matrix every time
-            dtheta_matrix = self._finite_differences_theta_gradient_matrices()[theta]
-
-        else:
-            if mode == "fd":
-                raise RuntimeError("Cannot calculate score for arbitrary parameter points without morphing setup")
+        dtheta_matrix = self.morphing_kernel.gradients([theta])[0]
 
-            # Shape (n_parameters, n_benchmarks_phys)
-            dtheta_matrix = self.morpher.calculate_morphing_weight_gradient(theta)
+        if not zero_pad and not isinstance(theta, (str, int, np.integer)):
+            dtheta_matrix = dtheta_matrix[:, : self.morphing_kernel.n_morphing_benchmarks]
 
         return dtheta_matrix
 
@@ -1,8 +1,10 @@
 import os
 import logging
+import shutil
 import tempfile
 
 from collections import OrderedDict
+from functools import partial
 from pathlib import Path
 from typing import Dict
 from typing import List
@@ -13,18 +15,30 @@ from madminer.models import Benchmark
 from madminer.models import Systematic
 from madminer.models import SystematicScale
 from madminer.models import SystematicType
+from madminer.utils.morphing import MorphingErrorSurface
 from madminer.utils.morphing import PhysicsMorpher
 from madminer.utils.interfaces.hdf5 import load_madminer_settings
+from madminer.utils.interfaces.hdf5 import load_morphing_error_surface
 from madminer.utils.interfaces.hdf5 import save_madminer_settings
+from madminer.utils.interfaces.hdf5 import save_morphing_error_surface
 from madminer.utils.interfaces.mg_cards import export_param_card
 from madminer.utils.interfaces.mg_cards import export_reweight_card
 from madminer.utils.interfaces.mg_cards import export_run_card
 from madminer.utils.interfaces.mg import generate_mg_process
 from madminer.utils.interfaces.mg import setup_mg_with_scripts
 from madminer.utils.interfaces.mg import run_mg
+from madminer.utils.interfaces.mg import run_mg_in_clone
+from madminer.utils.interfaces.mg import run_in_mg_process_clones
 from madminer.utils.interfaces.mg import create_master_script
+from madminer.utils.interfaces.mg import create_job_array
 from madminer.utils.interfaces.mg import setup_mg_reweighting_with_scripts
 from madminer.utils.interfaces.mg import run_mg_reweighting
+from madminer.utils.interfaces.mg import run_mg_reweighting_in_clone
+from madminer.utils.interfaces.mg import find_lhe_events
+from madminer.utils.interfaces.lhe import can_write_lhe_file
+from madminer.utils.interfaces.lhe import merge_lhe_files
+from madminer.utils.interfaces.lhe import split_lhe_file
+from madminer.utils.interfaces.lhe import write_lhe_file_range
 from madminer.utils.various import copy_file
 
 logger = logging.getLogger(__name__)
@@ -534,6 +548,11 @@ class MadMiner:
             self.morpher.set_basis(self.benchmarks, morphing_matrix=morphing_matrix)
             self.export_morphing = True
 
+            error_axes, error_values = load_morphing_error_surface(filename)
+            if error_values is not None:
+                self.morpher.morphing_error_surface = MorphingErrorSurface(error_axes, error_values)
+                logger.info("Found morphing error surface")
+
             logger.info("Found morphing setup with %s components", len(morphing_components))
         else:
             logger.info("Did not find morphing setup.")
@@ -554,8 +573,9 @@ class MadMiner:
 
         * the parameter definitions,
         * the benchmark points,
-        * the systematics setup (if defined), and
-        * the morphing setup (if defined).
+        * the systematics setup (if defined),
+        * the morphing setup (if defined), and
+        * the morphing error surface (if calculated with `PhysicsMorpher.calculate_morphing_error_surface()`).
 
         This file is an important input to later stages in the analysis chain, including the processing of generated
         events, extraction of training samples, and calculation of Fisher information matrices. In these downstream
@@ -589,6 +609,10 @@ class MadMiner:
                 finite_differences=self.finite_difference_benchmarks,
                 finite_differences_epsilon=self.finite_difference_epsilon,
             )
+
+            surface = self.morpher.morphing_error_surface
+            if surface is not None:
+                save_morphing_error_surface(filename, surface.axes, surface.values)
         else:
             logger.info("Saving setup (without morphing) to %s", filename)
 
@@ -832,6 +856,10 @@ class MadMiner:
         systematics=None,
         order="LO",
         python_executable=None,
+        n_workers=1,
+        n_retries=0,
+        job_array=False,
+        job_resources=None,
     ):
         """
         High-level function that creates the the MadGraph process, all required cards, and prepares or runs the event
@@ -907,6 +935,30 @@ class MadMiner:
         python_executable : None or str, optional
             Provides a path to the Python executable that should be used to call MadMiner. Default: None.
 
+        n_workers : int, optional
+            Maximal number of MadGraph runs at the same time. With more than one worker, the runs are queued and
+            executed in n_workers copies of the process directory, which are created in temp_directory and deleted
+            afterwards. The events of each run are moved to the Events folder of the process directory as soon as it
+            has finished, as the next free "run_<n>" folder in the order of the runs. Ignored if only_prepare_script is
+            True. Default value: 1.
+
+        n_retries : int, optional
+            With more than one worker, the number of times a failed run is started again (with its output in a new
+            log file). The other runs continue when a run fails for good, and an error is raised at the end. Default
+            value: 0.
+
+        job_array : bool, optional
+            If True and only_prepare_script is True, a job array manifest (`<process_folder>/madminer/job_array.json`)
+            and a launcher script (`<process_folder>/madminer/run_array.sh`) that takes the array index are created in
+            addition, so that the runs can be submitted as one job array to a batch system. Each job runs in a copy of
+            the process directory, and its events end up in `<process_folder>/Events/job_<index>`.
+            `madminer.utils.interfaces.mg.collect_job_array_events()` finds them once the jobs have finished. Default
+            value: False.
+
+        job_resources : dict or None, optional
+            Resource hints for the batch system (for instance `{"cores": 4, "memory": "8GB", "time": "12:00:00"}`),
+            which are stored for each job in the job array manifest. Default value: None.
+
         Returns
         -------
             None
@@ -914,6 +966,8 @@ class MadMiner:
         """
 
         # Defaults
+        if n_workers < 1:
+            raise ValueError(f"Invalid number of workers: {n_workers}")
         if mg_process_directory is None:
             mg_process_directory = "./MG_process"
 
@@ -966,6 +1020,8 @@ class MadMiner:
         # Loop over settings
         i = 0
         mg_scripts = []
+        mg_jobs = []
+        array_jobs = []
 
         for run_card_file in run_card_files:
             for sample_benchmark in sample_benchmarks:
@@ -1051,22 +1107,42 @@ class MadMiner:
                         order=order,
                     )
                     mg_scripts.append(mg_script)
+                    array_jobs.append(
+                        dict(
+                            script=script_file,
+                            log_file=log_file_run,
+                            sample_benchmark=sample_benchmark,
+                            run_card=run_card_file,
+                            is_background=is_background,
+                        )
+                    )
                 else:
-                    run_mg(
-                        mg_directory,
-                        mg_process_directory,
-                        f"{mg_process_directory}/{mg_commands_filename}",
-                        f"{mg_process_directory}/{new_run_card_file}",
-                        f"{mg_process_directory}/{param_card_file}",
-                        f"{mg_process_directory}/{reweight_card_file}",
-                        None if new_pythia8_card_file is None else f"{mg_process_directory}/{new_pythia8_card_file}",
-                        None if new_configuration_file is None else f"{mg_process_directory}/{new_configuration_file}",
+                    mg_kwargs = dict(
+                        mg_directory=mg_directory,
+                        proc_card_filename=f"{mg_process_directory}/{mg_commands_filename}",
+                        run_card_file=(
+                            None if new_run_card_file is None else f"{mg_process_directory}/{new_run_card_file}"
+                        ),
+                        param_card_file=f"{mg_process_directory}/{param_card_file}",
+                        reweight_card_file=f"{mg_process_directory}/{reweight_card_file}",
+                        pythia8_card_file=(
+                            None if new_pythia8_card_file is None else f"{mg_process_directory}/{new_pythia8_card_file}"
+                        ),
+                        configuration_card_file=(
+                            None
+                            if new_configuration_file is None
+                            else f"{mg_process_directory}/{new_configuration_file}"
+                        ),
                         is_background=is_background,
                         initial_command=initial_command,
                         log_file=f"{log_directory}/{log_file_run}",
                         python_executable=python_executable,
                         order=order,
                     )
+                    if n_workers == 1:
+                        run_mg(mg_process_directory=mg_process_directory, **mg_kwargs)
+                    else:
+                        mg_jobs.append(partial(run_mg_in_clone, **mg_kwargs))
 
                 i += 1
 
@@ -1087,7 +1163,23 @@ class MadMiner:
                 master_script_filename,
             )
 
-        else:
+            if job_array:
+                launcher_filename = create_job_array(
+                    log_directory,
+                    mg_directory,
+                    mg_process_directory,
+                    array_jobs,
+                    resources=job_resources,
+                )
+                logger.info(
+                    "Or submit the job array with indices 0 to %s (for instance with sbatch --array=0-%s) of:\n\n"
+                    " %s [index] [MG_directory] [MG_process_directory] [log_dir]\n\n",
+                    n_runs_total - 1,
+                    n_runs_total - 1,
+                    launcher_filename,
+                )
+
+        elif n_workers == 1:
             expected_event_files = [f"{mg_process_directory}/Events/run_{(i+1):02d}" for i in range(n_runs_total)]
             expected_event_files = "\n".join(expected_event_files)
             logger.info(
@@ -1096,6 +1188,45 @@ class MadMiner:
                 expected_event_files,
             )
 
+        else:
+            run_directories = self._free_run_directories(mg_process_directory, n_runs_total)
+
+            def collect(i, new_runs):
+                if len(new_runs) == 0:
+                    logger.warning("MadGraph run %s did not create a new folder in Events", i)
+                    return
+                shutil.move(str(new_runs[-1]), run_directories[i])
+                logger.info("Finished MadGraph run %s, events in %s", i, run_directories[i])
+
+            run_in_mg_process_clones(
+                mg_process_directory,
+                mg_jobs,
+                n_workers=n_workers,
+                n_retries=n_retries,
+                collect=collect,
+                temp_directory=temp_directory,
+            )
+
+            logger.info(
+                "Finished running MadGraph! Please check that events were successfully generated in the following "
+                "folders:\n\n%s\n\n",
+                "\n".join(run_directories),
+            )
+
+    @staticmethod
+    def _free_run_directories(mg_process_directory, n_runs):
+        """Paths of the first n_runs run folders that do not exist yet in the Events folder"""
+
+        run_directories = []
+        n = 1
+        while len(run_directories) < n_runs:
+            run_directory = f"{mg_process_directory}/Events/run_{n:02d}"
+            if not Path(run_directory).exists():
+                run_directories.append(run_directory)
+            n += 1
+
+        return run_directories
+
     def reweight_existing_sample(
         self,
         mg_process_directory,
@@ -1106,6 +1237,10 @@ class MadMiner:
         only_prepare_script=False,
         log_directory=None,
         initial_command=None,
+        n_workers=1,
+        n_chunks=1,
+        n_retries=0,
+        temp_directory=None,
     ):
         """
         High-level function that adds the weights required for MadMiner to an existing sample.
@@ -1121,14 +1256,16 @@ class MadMiner:
         mg_process_directory : str
             Path to the MG process directory. If None, MadMiner uses ./MG_process.
 
-        run_name : str
-            Run name.
+        run_name : str or list of str
+            Run name, or list of run names. Instead of a run name, the path to an existing LHE event file can be
+            given (unless only_prepare_script is True). The events of each run (or each file) are replaced by the
+            reweighted events.
 
         param_card_template_file : str
             Path to a param card that will be used as template to create the appropriate param cards for these runs.
 
-        sample_benchmark : str
-            The name of the benchmark used to generate this sample.
+        sample_benchmark : str or list of str
+            The name of the benchmark used to generate this sample, or a list with one name for each run.
 
         reweight_benchmarks : list of str or None
             Lists the names of benchmarks to which the sample should be reweighted. If None, all benchmarks (except
@@ -1145,6 +1282,25 @@ class MadMiner:
             Initial shell commands that have to be executed before MG is run (e.g. to load a virtual environment).
             Default value: None.
 
+        n_workers : int, optional
+            Maximal number of reweighting jobs at the same time. With more than one worker, with LHE files instead of
+            run names, or with n_chunks larger than one, each job reweights a copy of the events in a copy of the
+            process directory, which are created in temp_directory and deleted afterwards. Ignored if
+            only_prepare_script is True. Default value: 1.
+
+        n_chunks : int, optional
+            If larger than one, the events of each run are split at event boundaries into up to n_chunks files, which
+            are reweighted as separate jobs and merged back in their original order. Files compressed with zstd or
+            LZ4 cannot be written and are reweighted in a single job. Default value: 1.
+
+        n_retries : int, optional
+            With jobs in copies of the process directory, the number of times a failed job is started again (with its
+            output in a new log file). The other jobs continue when a job fails for good, and an error is raised at
+            the end. Default value: 0.
+
+        temp_directory : str or None, optional
+            Path to a temporary directory. If None, a system default is used. Default value: None.
+
         Returns
         -------
             None
@@ -1158,62 +1314,230 @@ class MadMiner:
         if log_directory is None:
             log_directory = "./logs"
 
+        if temp_directory is None:
+            temp_directory = tempfile.gettempdir()
+
+        if n_workers < 1:
+            raise ValueError(f"Invalid number of workers: {n_workers}")
+        if n_chunks < 1:
+            raise ValueError(f"Invalid number of chunks: {n_chunks}")
+
+        run_names = [run_name] if isinstance(run_name, str) else list(run_name)
+        if isinstance(sample_benchmark, str):
+            sample_benchmarks = [sample_benchmark for _ in run_names]
+        else:
+            sample_benchmarks = list(sample_benchmark)
+        if len(sample_benchmarks) != len(run_names):
+            raise ValueError(
+                f"Number of sample benchmarks does not match number of runs: {len(sample_benchmarks)} vs "
+                f"{len(run_names)}"
+            )
+
+        is_event_file = [Path(name).is_file() for name in run_names]
+        if only_prepare_script and any(is_event_file):
+            raise ValueError("Scripts can only be prepared to reweight runs, not LHE files")
+
         # Make MadMiner folders
         Path(mg_process_directory, "madminer", "cards").mkdir(parents=True, exist_ok=True)
         Path(mg_process_directory, "madminer", "scripts").mkdir(parents=True, exist_ok=True)
 
-        # Files
-        script_file = "madminer/scripts/run_reweight.sh"
-        log_file_run = "reweight.log"
-        reweight_card_file = "/madminer/cards/reweight_card_reweight.dat"
-
-        # Missing benchmarks
-        missing_benchmarks = OrderedDict()
-        for benchmark_name in reweight_benchmarks:
-            missing_benchmarks[benchmark_name] = self.benchmarks[benchmark_name]
-
-        # Inform user
-        logger.info("Reweighting setup")
-        logger.info("  Originally sampled from benchmark: %s", sample_benchmark)
-        logger.info("  Now reweighting to benchmarks:     %s", reweight_benchmarks)
-        logger.info("  Reweight card:                     %s", reweight_card_file)
-        logger.info("  Log file:                          %s", log_file_run)
-
-        # Create param and reweight cards
-        self._export_cards(
-            param_card_template_file,
-            mg_process_directory,
-            sample_benchmark=sample_benchmark,
-            reweight_card_filename=f"{mg_process_directory}/{reweight_card_file}",
-            include_param_card=False,
-            benchmarks=missing_benchmarks,
-        )
-
-        # Run reweighting
-        if only_prepare_script:
-            call_instruction = setup_mg_reweighting_with_scripts(
+        lhe_files = []
+        reweight_card_files = []
+        log_files = []
+
+        for i, (name, this_sample_benchmark) in enumerate(zip(run_names, sample_benchmarks)):
+            # Files
+            if len(run_names) == 1:
+                script_file = "madminer/scripts/run_reweight.sh"
+                log_file_run = "reweight.log"
+                reweight_card_file = "/madminer/cards/reweight_card_reweight.dat"
+            else:
+                script_file = f"madminer/scripts/run_reweight_{i}.sh"
+                log_file_run = f"reweight_{i}.log"
+                reweight_card_file = f"/madminer/cards/reweight_card_reweight_{i}.dat"
+
+            # Missing benchmarks
+            if reweight_benchmarks is None:
+                this_reweight_benchmarks = [key for key in self.benchmarks if key != this_sample_benchmark]
+            else:
+                this_reweight_benchmarks = reweight_benchmarks
+
+            missing_benchmarks = OrderedDict()
+            for benchmark_name in this_reweight_benchmarks:
+                missing_benchmarks[benchmark_name] = self.benchmarks[benchmark_name]
+
+            # Inform user
+            logger.info("Reweighting setup for %s", name)
+            logger.info("  Originally sampled from benchmark: %s", this_sample_benchmark)
+            logger.info("  Now reweighting to benchmarks:     %s", this_reweight_benchmarks)
+            logger.info("  Reweight card:                     %s", reweight_card_file)
+            logger.info("  Log file:                          %s", log_file_run)
+
+            # Create param and reweight cards
+            self._export_cards(
+                param_card_template_file,
                 mg_process_directory,
-                run_name=run_name,
-                reweight_card_file_from_mgprocdir=reweight_card_file,
-                script_file_from_mgprocdir=script_file,
-                initial_command=initial_command,
-                log_dir=log_directory,
-                log_file_from_logdir=log_file_run,
+                sample_benchmark=this_sample_benchmark,
+                reweight_card_filename=f"{mg_process_directory}/{reweight_card_file}",
+                include_param_card=False,
+                benchmarks=missing_benchmarks,
             )
 
-            logger.info("To generate events, please run:\n\n %s \n\n", call_instruction)
+            # Run reweighting
+            if only_prepare_script:
+                call_instruction = setup_mg_reweighting_with_scripts(
+                    mg_process_directory,
+                    run_name=name,
+                    reweight_card_file_from_mgprocdir=reweight_card_file,
+                    script_file_from_mgprocdir=script_file,
+                    initial_command=initial_command,
+                    log_dir=log_directory,
+                    log_file_from_logdir=log_file_run,
+                )
 
-        else:
-            run_mg_reweighting(
+                logger.info("To generate events, please run:\n\n %s \n\n", call_instruction)
+
+            elif n_workers == 1 and n_chunks == 1 and not any(is_event_file):
+                run_mg_reweighting(
+                    mg_process_directory,
+                    run_name=name,
+                    reweight_card_file=f"{mg_process_directory}/{reweight_card_file}",
+                    initial_command=initial_command,
+                    log_file=f"{log_directory}/{log_file_run}",
+                )
+                logger.info(
+                    "Finished running reweighting! Please check that events were successfully reweighted in the "
+                    "following folder:\n\n %s/Events/%s \n\n",
+                    mg_process_directory,
+                    name,
+                )
+
+            else:
+                lhe_file = name if is_event_file[i] else find_lhe_events(f"{mg_process_directory}/Events/{name}")
+                if lhe_file is None:
+                    raise RuntimeError(f"Could not find LHE events of run {name} in {mg_process_directory}/Events")
+                lhe_files.append(lhe_file)
+                reweight_card_files.append(f"{mg_process_directory}/{reweight_card_file}")
+                log_files.append(f"{log_directory}/{log_file_run}")
+
+        # Reweighting jobs in copies of the process directory
+        if len(lhe_files) > 0:
+            self._reweight_in_parallel(
                 mg_process_directory,
-                run_name=run_name,
-                reweight_card_file=f"{mg_process_directory}/{reweight_card_file}",
+                lhe_files,
+                reweight_card_files,
+                log_files,
                 initial_command=initial_command,
-                log_file=f"{log_directory}/{log_file_run}",
+                n_workers=n_workers,
+                n_chunks=n_chunks,
+                n_retries=n_retries,
+                temp_directory=temp_directory,
             )
             logger.info(
                 "Finished running reweighting! Please check that events were successfully reweighted in the following "
-                "folder:\n\n %s/Events/%s \n\n",
+                "files:\n\n%s\n\n",
+                "\n".join(lhe_files),
+            )
+
+    @staticmethod
+    def _reweight_in_parallel(
+        mg_process_directory,
+        lhe_files,
+        reweight_card_files,
+        log_files,
+        initial_command,
+        n_workers,
+        n_chunks,
+        n_retries,
+        temp_directory,
+    ):
+        """Reweights LHE files (or ranges of them) in copies of the process directory and replaces them in place"""
+
+        Path(temp_directory).mkdir(parents=True, exist_ok=True)
+        chunk_directory = tempfile.mkdtemp(prefix="madminer_chunks_", dir=temp_directory)
+
+        try:
+            # One job per file or range of a file. The reweighted events replace the file or range.
+            jobs = []
+            targets = []
+            merged_files = []
+            for i, (lhe_file, reweight_card_file, log_file) in enumerate(
+                zip(lhe_files, reweight_card_files, log_files)
+            ):
+                # The reweighted ranges could not be merged back into the file after all jobs have finished
+                if n_chunks > 1 and not can_write_lhe_file(lhe_file):
+                    logger.warning("Cannot write %s, reweighting it in a single job", lhe_file)
+                    byte_ranges = [None]
+                else:
+                    byte_ranges = split_lhe_file(lhe_file, n_chunks)
+
+                if len(byte_ranges) == 1:
+                    jobs.append(
+                        partial(
+                            run_mg_reweighting_in_clone,
+                            lhe_file=lhe_file,
+                            reweight_card_file=reweight_card_file,
+                            initial_command=initial_command,
+                            log_file=log_file,
+                        )
+                    )
+                    targets.append(lhe_file)
+                    continue
+
+                logger.info("Splitting %s into %s files", lhe_file, len(byte_ranges))
+                log_path = Path(log_file)
+                chunk_files = []
+                for k, byte_range in enumerate(byte_ranges):
+                    chunk_file = str(Path(chunk_directory, f"events_{i}_{k}.lhe.gz"))
+                    write_lhe_file_range(lhe_file, byte_range, chunk_file)
+                    jobs.append(
+                        partial(
+                            run_mg_reweighting_in_clone,
+                            lhe_file=chunk_file,
+                            reweight_card_file=reweight_card_file,
+                            initial_command=initial_command,
+                            log_file=str(log_path.with_name(f"{log_path.stem}_{k}{log_path.suffix}")),
+                        )
+                    )
+                    targets.append(chunk_file)
+                    chunk_files.append(chunk_file)
+                merged_files.append((lhe_file, chunk_files))
+
+            def collect(j, reweighted_file):
+                shutil.move(reweighted_file, targets[j])
+
+            run_in_mg_process_clones(
                 mg_process_directory,
-                run_name,
+                jobs,
+                n_workers=n_workers,
+                n_retries=n_retries,
+                collect=collect,
+                temp_directory=temp_directory,
+            )
+
+        except BaseException:
+            shutil.rmtree(chunk_directory, ignore_errors=True)
+            raise
+
+        # Merge into a temporary file next to the original one, so that neither the original events nor the
+        # reweighted ranges are lost if the merge fails
+        for lhe_file, chunk_files in merged_files:
+            lhe_path = Path(lhe_file)
+            handle, merged_file = tempfile.mkstemp(
+                prefix=f".{lhe_path.name}.", suffix=lhe_path.suffix, dir=lhe_path.parent
             )
+            os.close(handle)
+
+            try:
+                merge_lhe_files(chunk_files, merged_file)
+            except BaseException:
+                Path(merged_file).unlink(missing_ok=True)
+                logger.error(
+                    "Could not merge the reweighted events into %s, they are kept in %s", lhe_file, chunk_directory
+                )
+                raise
+
+            shutil.copymode(lhe_file, merged_file)
+            os.replace(merged_file, lhe_file)
+
+        shutil.rmtree(chunk_directory, ignore_errors=True)
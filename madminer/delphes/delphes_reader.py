@@ -1,6 +1,8 @@
 import logging
 
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import numpy as np
@@ -8,15 +10,20 @@ import numpy as np
 from madminer.models import Cut
 from madminer.models import Observable
 from madminer.models import NuisanceParameter
+from madminer.utils.interfaces.cache import AnalysisCache
+from madminer.utils.interfaces.cache import definition_hash
+from madminer.utils.interfaces.cache import file_signature
 from madminer.utils.interfaces.delphes import run_delphes
+from madminer.utils.interfaces.delphes_root import FUNCTION_OBJECTS
 from madminer.utils.interfaces.delphes_root import parse_delphes_root_file
 from madminer.utils.interfaces.hdf5 import load_madminer_settings
 from madminer.utils.interfaces.hdf5 import save_events
 from madminer.utils.interfaces.hdf5 import save_nuisance_setup
 from madminer.utils.interfaces.hepmc import extract_weight_order
-from madminer.utils.interfaces.lhe import parse_lhe_file
+from madminer.utils.interfaces.hepmc import parse_hepmc_file
+from madminer.utils.interfaces.lhe import parse_lhe_weights
 from madminer.utils.interfaces.lhe import extract_nuisance_parameters_from_lhe_file
-from madminer.sampling import combine_and_shuffle
+from madminer.utils.morphing import NuisanceMorpher
 
 logger = logging.getLogger(__name__)
 
@@ -40,7 +47,8 @@ class DelphesReader:
       `DelphesProcessor.add_observable_from_function()`. A simple set of default observables is provided in
       `DelphesProcessor.add_default_observables()`
     * Optionally, cuts can be set with `DelphesProcessor.add_cut()`
-    * Calculating the observables from the Delphes ROOT files with `DelphesProcessor.analyse_delphes_samples()`
+    * Calculating the observables from the Delphes ROOT files with `DelphesProcessor.analyse_delphes_samples()`, or
+      at generator level directly from the HepMC files with `DelphesProcessor.analyse_hepmc_samples()`
     * Saving the results with `DelphesProcessor.save()`
 
     Please see the tutorial for a detailed walk-through.
@@ -160,7 +168,9 @@ class DelphesReader:
         Parameters
         ----------
         hepmc_filename : str
-            Path to the HepMC event file (with extension '.hepmc' or '.hepmc.gz').
+            Path to the HepMC event file (with extension '.hepmc' or '.hepmc.gz'). Compressed files are decompressed
+            while reading and streamed into Delphes; '.hepmc.zst' and '.hepmc.lz4' files are supported if the
+            zstandard or lz4 package is installed.
 
         sampled_from_benchmark : str
             Name of the benchmark that was used for sampling in this event file (the keyword `sample_benchmark`
@@ -180,13 +190,13 @@ class DelphesReader:
             Multiplies the cross sections found in the sample. Default value: 1.
 
         weights : {"delphes", "lhe"}, optional
-            If "delphes", the weights are read out from the Delphes ROOT file, and their names are taken from the
-            HepMC file. If "lhe" (and lhe_filename is not None), the weights are taken from the LHE file (and matched
-            with the observables from the Delphes ROOT file). The "delphes" behaviour is generally better as it
-            minimizes the risk of mismatching observables and weights, but for some MadGraph and Delphes versions
-            there are issues with weights not being saved in the HepMC and Delphes ROOT files. In this case, setting
-            weights to "lhe" and providing the unweighted LHE file from MadGraph may be an easy fix. Default value:
-            "lhe".
+            If "delphes", the weights are read out from the Delphes ROOT file (or from the HepMC file in
+            `analyse_hepmc_samples()`), and their names are taken from the HepMC file. If "lhe" (and lhe_filename is
+            not None), the weights are taken from the LHE file (and matched with the observables from the Delphes ROOT
+            file). The "delphes" behaviour is generally better as it minimizes the risk of mismatching observables and
+            weights, but for some MadGraph and Delphes versions there are issues with weights not being saved in the
+            HepMC and Delphes ROOT files. In this case, setting weights to "lhe" and providing the unweighted LHE file
+            from MadGraph may be an easy fix. Default value: "lhe".
 
         systematics : None or list of str, optional
             List of systematics associated with this sample. Default value: None.
@@ -230,7 +240,7 @@ class DelphesReader:
             self.hepmc_sample_weight_labels.append(extract_weight_order(hepmc_filename, sampled_from_benchmark))
             self.lhe_sample_filenames_for_weights.append(None)
 
-    def run_delphes(self, delphes_directory, delphes_card, initial_command=None, log_file=None):
+    def run_delphes(self, delphes_directory, delphes_card, initial_command=None, log_file=None, n_workers=1):
         """
         Runs the fast detector simulation Delphes on all HepMC samples added so far for which it hasn't been run yet.
 
@@ -249,15 +259,23 @@ class DelphesReader:
         log_file : str or None, optional
             Path to log file in which the Delphes output is saved. Default value: None.
 
+        n_workers : int, optional
+            Maximal number of Delphes processes that run at the same time. With more than one worker, the output of
+            the i-th sample is saved in a separate log file, with "_i" appended to the stem of log_file. Default
+            value: 1.
+
         Returns
         -------
             None
 
         """
 
+        if n_workers < 1:
+            raise ValueError(f"Invalid number of workers: {n_workers}")
         if log_file is None:
             log_file = "./logs/delphes.log"
 
+        jobs = []
         for i, (delphes_filename, hepmc_filename) in enumerate(
             zip(self.delphes_sample_filenames, self.hepmc_sample_filenames)
         ):
@@ -273,15 +291,35 @@ class DelphesReader:
             else:
                 logger.info("Running Delphes on HepMC sample at %s", hepmc_filename)
 
-            delphes_sample_filename = run_delphes(
-                delphes_directory=delphes_directory,
-                delphes_card_filename=delphes_card,
-                hepmc_sample_filename=hepmc_filename,
-                initial_command=initial_command,
-                log_file=log_file,
+            jobs.append(
+                (
+                    i,
+                    dict(
+                        delphes_directory=delphes_directory,
+                        delphes_card_filename=delphes_card,
+                        hepmc_sample_filename=hepmc_filename,
+                        initial_command=initial_command,
+                        log_file=log_file,
+                    ),
+                )
             )
 
-            self.delphes_sample_filenames[i] = delphes_sample_filename
+        if n_workers == 1 or len(jobs) <= 1:
+            for i, job in jobs:
+                self.delphes_sample_filenames[i] = run_delphes(**job)
+            return
+
+        # Separate log files, the Delphes processes are waited for in threads
+        log_path = Path(log_file)
+        for i, job in jobs:
+            job["log_file"] = str(log_path.with_name(f"{log_path.stem}_{i}{log_path.suffix}"))
+
+        n_threads = min(n_workers, len(jobs))
+        logger.info("Running Delphes on %s HepMC samples with %s workers", len(jobs), n_threads)
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            futures = [executor.submit(run_delphes, **job) for _, job in jobs]
+            for (i, _), future in zip(jobs, futures):
+                self.delphes_sample_filenames[i] = future.result()
 
     def set_acceptance(
         self,
@@ -386,7 +424,7 @@ class DelphesReader:
             is_required=required,
         )
 
-    def add_observable_from_function(self, name, fn, required=False, default=None):
+    def add_observable_from_function(self, name, fn, required=False, default=None, objects=None):
         """
         Adds an observable defined through a function.
 
@@ -410,11 +448,19 @@ class DelphesReader:
             If `required=False`, this is the placeholder value for observables that cannot be parsed. None is replaced
             with `np.nan`. Default value: None.
 
+        objects : list of str or None, optional
+            The arguments of fn that it actually uses, among "l", "a", "j", and "met". Only the Delphes branches needed
+            for these objects are read (unless other observables or cuts use them), the other arguments may be empty
+            lists or None. If None, all objects are read. Default value: None.
+
         Returns
         -------
             None
         """
 
+        if objects is not None and not set(objects) <= set(FUNCTION_OBJECTS):
+            raise ValueError(f"Invalid objects {objects}, has to be a subset of {FUNCTION_OBJECTS}")
+
         if required:
             logger.debug("Adding required observable %s defined through external function", name)
         else:
@@ -427,6 +473,7 @@ class DelphesReader:
             val_expression=fn,
             val_default=default,
             is_required=required,
+            objects=objects,
         )
 
     def add_default_observables(
@@ -557,6 +604,10 @@ class DelphesReader:
         delete_delphes_files=False,
         reference_benchmark=None,
         parse_lhe_events_as_xml=True,
+        cache=False,
+        engine="columnar",
+        chunk_size=100000,
+        n_workers=1,
     ):
         """
         Main function that parses the Delphes samples (ROOT files), checks acceptance and cuts, and extracts
@@ -579,8 +630,32 @@ class DelphesReader:
             If None, the first one will be used. Default value: None.
 
         parse_lhe_events_as_xml : bool, optional
-            Decides whether the LHE events are parsed with an XML parser (more robust, but slower) or a text parser
-            (less robust, faster). Default value: True.
+            Deprecated and without effect: the weights are scanned directly from the LHE events without parsing them.
+            Setting it to False logs a warning. Default value: True.
+
+        cache : bool, optional
+            If True, the results for each Delphes file are stored in a sidecar file next to it (with the suffix
+            ".madminer-cache.h5") and reused when the Delphes file, the LHE file with the weights, and the analysis
+            setup (observables, cuts, acceptance, systematics, and the arguments of this function) are unchanged.
+            Functions are compared as described in `LHEReader.analyse_samples()`. Ignored if delete_delphes_files is
+            True. Default value: False.
+
+        engine : {"columnar", "events"}, optional
+            Decides how observables and cuts are evaluated. In both cases, the objects are read from the ROOT files as
+            flat arrays and the acceptance cuts are applied to whole arrays. With "columnar", all definitions are then
+            evaluated on all events at once; definitions that cannot be vectorized (for instance functions, or
+            expressions with `if` or `and`) are evaluated event by event. With "events", one event at a time is
+            analysed. Default value: "columnar".
+
+        chunk_size : int, optional
+            Number of events that are read from a Delphes file and analysed at once. Only the observations and weights
+            of the events that pass all cuts are kept, so this bounds the memory needed for large files. Default
+            value: 100000.
+
+        n_workers : int, optional
+            Number of processes that analyse different Delphes files in parallel. With more than one worker,
+            observables defined through functions have to be picklable (for instance module-level functions rather
+            than lambdas). The results are merged in the order in which the samples were added. Default value: 1.
 
         Returns
         -------
@@ -588,72 +663,121 @@ class DelphesReader:
 
         """
 
-        # Input
-        if reference_benchmark is None:
-            reference_benchmark = self.benchmark_names_phys[0]
-        self.reference_benchmark = reference_benchmark
+        if not parse_lhe_events_as_xml:
+            logger.warning(
+                "parse_lhe_events_as_xml is deprecated and has no effect, the LHE weights are always scanned directly "
+                "from the events"
+            )
 
-        # Reset observations
-        self.observations = None
-        self.weights = None
-        self.nuisance_parameters = OrderedDict()
-        self.events_sampling_benchmark_ids = []
-        self.signal_events_per_benchmark = [0 for _ in range(self.n_benchmarks_phys)]
-        self.background_events = 0
+        jobs = self._prepare_jobs(
+            "delphes",
+            reference_benchmark,
+            n_workers,
+            use_generator_truth=generator_truth,
+            delete_delphes_sample_file=delete_delphes_files,
+            engine=engine,
+            chunk_size=chunk_size,
+        )
+        self._analyse_samples(jobs, cache and not delete_delphes_files, n_workers)
 
-        for (
-            delphes_file,
-            weight_labels,
-            is_background,
-            sampling_benchmark,
-            lhe_file,
-            lhe_file_for_weights,
-            k_factor,
-            sample_syst_names,
-        ) in zip(
-            self.delphes_sample_filenames,
-            self.hepmc_sample_weight_labels,
-            self.hepmc_is_backgrounds,
-            self.hepmc_sampled_from_benchmark,
-            self.lhe_sample_filenames,
-            self.lhe_sample_filenames_for_weights,
-            self.sample_k_factors,
-            self.sample_systematics,
-        ):
-            logger.info(
-                "Analysing Delphes sample %s: Calculating %s observables, requiring %s selection cuts, associated with "
-                "%s",
-                delphes_file,
-                len(self.observables),
-                len(self.cuts),
-                "no systematics" if sample_syst_names is None else "systematics" + ", ".join(list(sample_syst_names)),
-            )
+    def analyse_hepmc_samples(
+        self,
+        reference_benchmark=None,
+        cache=False,
+        engine="columnar",
+        chunk_size=10000,
+        n_workers=1,
+        jet_clustering=None,
+    ):
+        """
+        Calculates the observables at generator level directly from the final-state particles in the HepMC files,
+        without running Delphes, checks acceptance and cuts, and extracts the weights. Observables and cuts are
+        defined as for `DelphesReader.analyse_delphes_samples()`.
 
-            this_observations, this_weights, this_n_events = self._analyse_delphes_sample(
-                delete_delphes_files,
-                delphes_file,
-                generator_truth,
-                is_background,
-                k_factor,
-                lhe_file,
-                lhe_file_for_weights,
-                parse_lhe_events_as_xml,
-                reference_benchmark,
-                sampling_benchmark,
-                weight_labels,
-                sample_syst_names,
-            )
+        Parameters
+        ----------
+        reference_benchmark : str or None, optional
+            The weights at the nuisance benchmarks will be rescaled to this reference benchmark, see
+            `DelphesReader.analyse_delphes_samples()`. If None, the first one will be used. Default value: None.
+
+        cache : bool, optional
+            If True, the results for each HepMC file are stored in a sidecar file next to it and reused when nothing
+            changed, see `DelphesReader.analyse_delphes_samples()`. Default value: False.
 
+        engine : {"columnar", "events"}, optional
+            Decides how observables and cuts are evaluated, see `DelphesReader.analyse_delphes_samples()`. Default
+            value: "columnar".
+
+        chunk_size : int, optional
+            Number of events that are read from a HepMC file and analysed at once. Default value: 10000.
+
+        n_workers : int, optional
+            Number of processes that analyse different HepMC files in parallel. Default value: 1.
+
+        jet_clustering : callable or None, optional
+            Function `jet_clustering(event_index, momenta)` that clusters the final-state particles except neutrinos
+            of a chunk of events into jets, for instance `madminer.utils.jets.JetClustering(radius=0.4)`, see
+            `madminer.utils.interfaces.hepmc.parse_hepmc_file()`. With more than one worker, it has to be picklable.
+            If None, there are no jets. Default value: None.
+
+        Returns
+        -------
+            None
+
+        """
+
+        jobs = self._prepare_jobs(
+            "hepmc",
+            reference_benchmark,
+            n_workers,
+            engine=engine,
+            chunk_size=chunk_size,
+            jet_clustering=jet_clustering,
+        )
+        self._analyse_samples(jobs, cache, n_workers)
+
+    def _analyse_samples(self, jobs, cache, n_workers):
+        """Analyses the event files of the jobs, possibly in parallel, and merges the results"""
+
+        reference_benchmark = self.reference_benchmark
+
+        # Cached results
+        results = [None for _ in jobs]
+        if cache:
+            caches = [AnalysisCache(job["event_file"]) for job in jobs]
+            keys = [_cache_key(job) for job in jobs]
+            results = [file_cache.load_results(key) for file_cache, key in zip(caches, keys)]
+
+        # Analyse events
+        missing = [i for i, result in enumerate(results) if result is None]
+        if n_workers == 1 or len(missing) <= 1:
+            for i in missing:
+                results[i] = _parse_sample(**jobs[i])
+        else:
+            n_processes = min(n_workers, len(missing))
+            logger.info("Analysing %s event files with %s workers", len(missing), n_processes)
+            with ProcessPoolExecutor(max_workers=n_processes) as executor:
+                futures = [executor.submit(_parse_sample, **jobs[i]) for i in missing]
+                for i, future in zip(missing, futures):
+                    results[i] = future.result()
+
+        if cache:
+            for i in missing:
+                this_observations, this_weights, this_n_events = results[i]
+                caches[i].save_results(keys[i], this_observations, this_weights, this_n_events or 0)
+
+        # Merge results in the order of the samples
+        for job, (this_observations, this_weights, this_n_events) in zip(jobs, results):
             # No events?
             if this_observations is None:
                 continue
 
             # Store sampling id for each event
-            if is_background:
+            if job["is_background"]:
                 idx = -1
                 self.background_events += this_n_events
             else:
-                idx = self.benchmark_names_phys.index(sampling_benchmark)
+                idx = self.benchmark_names_phys.index(job["sampling_benchmark"])
                 self.signal_events_per_benchmark[idx] += this_n_events
             this_events_sampling_benchmark_ids = np.array([idx] * this_n_events, dtype=int)
 
@@ -667,7 +791,7 @@ class DelphesReader:
             # Following results: check consistency with previous results
             if len(self.observations) != len(this_observations):
                 raise ValueError(
-                    f"Number of observations in different Delphes files incompatible: "
+                    f"Number of observations in different event files incompatible: "
                     f"{len(self.observations)} vs {len(this_observations)}"
                 )
 
@@ -692,7 +816,7 @@ class DelphesReader:
 
             # Merge observations with previous (should always be the same observables)
             for key in self.observations:
-                assert key in this_observations, f"Observable {key} not found in Delphes sample!"
+                assert key in this_observations, f"Observable {key} not found in event sample!"
                 self.observations[key] = np.hstack([self.observations[key], this_observations[key]])
 
             self.events_sampling_benchmark_ids = np.hstack(
@@ -707,21 +831,97 @@ class DelphesReader:
         if self.background_events > 0:
             logger.info("  %s from backgrounds", self.background_events)
 
-    def _analyse_delphes_sample(
-        self,
-        delete_delphes_files,
-        delphes_file,
-        generator_truth,
-        is_background,
-        k_factor,
-        lhe_file,
-        lhe_file_for_weights,
-        parse_lhe_events_as_xml,
-        reference_benchmark,
-        sampling_benchmark,
-        weight_labels,
-        sample_syst_names,
-    ):
+    def _prepare_jobs(self, file_format, reference_benchmark, n_workers, **kwargs):
+        """
+        Resets the results, extracts the nuisance setup, and returns one job per Delphes or HepMC file (depending on
+        file_format), with the keyword arguments kwargs for the parser
+        """
+
+        # Input
+        if n_workers < 1:
+            raise ValueError(f"Invalid number of workers: {n_workers}")
+        if reference_benchmark is None:
+            reference_benchmark = self.benchmark_names_phys[0]
+        self.reference_benchmark = reference_benchmark
+
+        # Reset observations
+        self.observations = None
+        self.weights = None
+        self.nuisance_parameters = OrderedDict()
+        self.events_sampling_benchmark_ids = []
+        self.signal_events_per_benchmark = [0 for _ in range(self.n_benchmarks_phys)]
+        self.background_events = 0
+
+        if file_format == "delphes":
+            event_files, file_format_name = self.delphes_sample_filenames, "Delphes"
+        else:
+            event_files, file_format_name = self.hepmc_sample_filenames, "HepMC"
+
+        jobs = []
+
+        for (
+            event_file,
+            weight_labels,
+            is_background,
+            sampling_benchmark,
+            lhe_file,
+            lhe_file_for_weights,
+            k_factor,
+            sample_syst_names,
+        ) in zip(
+            event_files,
+            self.hepmc_sample_weight_labels,
+            self.hepmc_is_backgrounds,
+            self.hepmc_sampled_from_benchmark,
+            self.lhe_sample_filenames,
+            self.lhe_sample_filenames_for_weights,
+            self.sample_k_factors,
+            self.sample_systematics,
+        ):
+            if event_file is None:
+                raise ValueError(f"No {file_format_name} file for the sample sampled from {sampling_benchmark}")
+
+            logger.info(
+                "Analysing %s sample %s: Calculating %s observables, requiring %s selection cuts, associated with "
+                "%s",
+                file_format_name,
+                event_file,
+                len(self.observables),
+                len(self.cuts),
+                "no systematics" if sample_syst_names is None else "systematics" + ", ".join(list(sample_syst_names)),
+            )
+
+            systematics_dict = self._extract_sample_systematics(lhe_file, lhe_file_for_weights, sample_syst_names)
+
+            jobs.append(
+                dict(
+                    event_file=event_file,
+                    file_format=file_format,
+                    observables=self.observables,
+                    cuts=self.cuts,
+                    weight_labels=weight_labels,
+                    acceptance_eta_max_a=self.acceptance_eta_max_a,
+                    acceptance_eta_max_e=self.acceptance_eta_max_e,
+                    acceptance_eta_max_mu=self.acceptance_eta_max_mu,
+                    acceptance_eta_max_j=self.acceptance_eta_max_j,
+                    acceptance_pt_min_a=self.acceptance_pt_min_a,
+                    acceptance_pt_min_e=self.acceptance_pt_min_e,
+                    acceptance_pt_min_mu=self.acceptance_pt_min_mu,
+                    acceptance_pt_min_j=self.acceptance_pt_min_j,
+                    lhe_file_for_weights=lhe_file_for_weights,
+                    sampling_benchmark=sampling_benchmark,
+                    reference_benchmark=reference_benchmark,
+                    benchmark_names=self.benchmark_names_phys,
+                    is_background=is_background,
+                    k_factor=k_factor,
+                    systematics_dict=systematics_dict,
+                    **kwargs,
+                )
+            )
+
+        return jobs
+
+    def _extract_sample_systematics(self, lhe_file, lhe_file_for_weights, sample_syst_names):
         # Relevant systematics
         systematics_used = OrderedDict()
         if sample_syst_names is None:
@@ -735,6 +935,9 @@ class DelphesReader:
                 " are extracted from the LHE file (instead of the HepMC / Delphes ROOT"
                 " file). Please use the keyword lhe_filename when calling add_sample()."
             )
+        if len(systematics_used) == 0:
+            # Samples with weights from the Delphes file may come without LHE file
+            return OrderedDict()
 
         # Read systematics setup from LHE file
         logger.debug("Extracting nuisance parameter definitions from LHE file")
@@ -769,85 +972,9 @@ class DelphesReader:
                     benchmark_neg=benchmark1,
                 )
 
-        # Calculate observables and weights in Delphes ROOT file
-        this_observations, this_weights, cut_filter = parse_delphes_root_file(
-            delphes_file,
-            self.observables,
-            self.cuts,
-            weight_labels,
-            use_generator_truth=generator_truth,
-            delete_delphes_sample_file=delete_delphes_files,
-            acceptance_eta_max_a=self.acceptance_eta_max_a,
-            acceptance_eta_max_e=self.acceptance_eta_max_e,
-            acceptance_eta_max_mu=self.acceptance_eta_max_mu,
-            acceptance_eta_max_j=self.acceptance_eta_max_j,
-            acceptance_pt_min_a=self.acceptance_pt_min_a,
-            acceptance_pt_min_e=self.acceptance_pt_min_e,
-            acceptance_pt_min_mu=self.acceptance_pt_min_mu,
-            acceptance_pt_min_j=self.acceptance_pt_min_j,
-        )
-        # No events found?
-        if this_observations is None:
-            logger.warning("No remaining events in this Delphes file, skipping it")
-            return None, None, None
-
-        if this_weights is not None:
-            logger.debug("Found weights %s in Delphes file", list(this_weights.keys()))
-        else:
-            logger.debug("Did not extract weights from Delphes file")
-
-        # Sanity checks
-        n_events = self._check_sample_elements(this_observations, None)
-
-        # Find weights in LHE file
-        if lhe_file_for_weights is not None:
-            logger.debug("Extracting weights from LHE file")
-            _, this_weights = parse_lhe_file(
-                filename=lhe_file_for_weights,
-                sampling_benchmark=sampling_benchmark,
-                observables=OrderedDict(),
-                benchmark_names=self.benchmark_names_phys,
-                is_background=is_background,
-                parse_events_as_xml=parse_lhe_events_as_xml,
-                systematics_dict=systematics_dict,
-            )
-
-            logger.debug("Found weights %s in LHE file", list(this_weights.keys()))
-
-            # Apply cuts
-            logger.debug("Applying Delphes-based cuts to LHE weights")
-            for key, weights in this_weights.items():
-                this_weights[key] = weights[cut_filter]
-
-        if this_weights is None:
-            raise RuntimeError("Could not extract weights from Delphes ROOT file or LHE file.")
-
-        # Sanity checks
-        n_events = self._check_sample_elements(this_weights, n_events)
+        return systematics_dict
 
-        # k factors
-        if k_factor is not None:
-            for key in this_weights:
-                this_weights[key] = k_factor * this_weights[key]
-
-        # Background scenario: we only have one set of weights, but these should be true for all benchmarks
-        if is_background:
-            logger.debug("Sample is background")
-            benchmarks_weight = list(this_weights.values())[0]
-
-            for benchmark_name in self.benchmark_names_phys:
-                this_weights[benchmark_name] = benchmarks_weight
-
-        # Rescale nuisance parameters to reference benchmark
-        reference_weights = this_weights[reference_benchmark]
-        sampling_weights = this_weights[sampling_benchmark]
-        for key in this_weights:
-            if key not in self.benchmark_names_phys:  # Only rescale nuisance benchmarks
-                this_weights[key] = reference_weights / sampling_weights * this_weights[key]
-
-        return this_observations, this_weights, n_events
-
-    def save(self, filename_out, shuffle=True):
+    def save(self, filename_out, shuffle=True, nuisance_storage="weights"):
         """
         Saves the observable definitions, observable values, and event weights in a MadMiner file. The parameter,
         benchmark, and morphing setup is copied from the file provided during initialization. Nuisance benchmarks found
@@ -862,6 +989,13 @@ class DelphesReader:
             If True, events are shuffled before being saved. That's important when there are multiple distinct
             samples (e.g. signal and background). Default value: True.
 
+        nuisance_storage : {"weights", "coefficients"}, optional
+            If "weights", the event weights for all nuisance benchmarks are saved. If "coefficients", the per-event
+            coefficients a_i(x) and b_i(x) of the nuisance morphing are saved as float32 arrays instead, which
+            requires one column per nuisance parameter rather than one or two, and spares the analysis from
+            recomputing them. Nuisance benchmarks that are not used by any nuisance parameter are then not saved.
+            Default value: "weights".
+
         Returns
         -------
             None
@@ -874,8 +1008,29 @@ class DelphesReader:
 
         logger.debug("Loading HDF5 data from %s and saving file to %s", self.filename, filename_out)
 
+        if nuisance_storage not in ["weights", "coefficients"]:
+            raise ValueError(f"Invalid nuisance storage mode: {nuisance_storage}")
+
+        # Nuisance coefficients instead of nuisance benchmark weights
+        weights = self.weights
+        nuisance_coefficients = None
+
+        if nuisance_storage == "coefficients" and len(self.nuisance_parameters) > 0:
+            nuisance_morpher = NuisanceMorpher(self.nuisance_parameters, self.weights.keys(), self.reference_benchmark)
+            nuisance_coefficients = nuisance_morpher.calculate_coefficients(np.array(list(self.weights.values())).T)
+            nuisance_benchmarks = [
+                name
+                for param in self.nuisance_parameters.values()
+                for name in (param.benchmark_pos, param.benchmark_neg)
+            ]
+            weights = OrderedDict(
+                (key, value)
+                for key, value in self.weights.items()
+                if key in self.benchmark_names_phys or key in nuisance_benchmarks
+            )
+
         # Save nuisance parameters and benchmarks
-        weight_names = list(self.weights.keys())
+        weight_names = list(weights.keys())
         logger.debug("Weight names: %s", weight_names)
 
         save_nuisance_setup(
@@ -887,17 +1042,116 @@ class DelphesReader:
             copy_from_path=self.filename,
         )
 
+        # Number of events per sampling benchmark
+        sampling_ids = np.asarray(self.events_sampling_benchmark_ids, dtype=int)
+        num_signal_events = np.bincount(sampling_ids[sampling_ids >= 0], minlength=self.n_benchmarks_phys)
+        num_background_events = int(np.sum(sampling_ids < 0))
+
         # Save events
         save_events(
             file_name=filename_out,
             file_override=True,
             observables=self.observables,
             observations=self.observations,
-            weights=self.weights,
-            sampling_benchmarks=self.events_sampling_benchmark_ids,
-            num_signal_events=self.signal_events_per_benchmark,
-            num_background_events=self.background_events,
+            weights=weights,
+            sampling_benchmarks=sampling_ids,
+            num_signal_events=num_signal_events,
+            num_background_events=num_background_events,
+            nuisance_coefficients=nuisance_coefficients,
+            shuffle=shuffle,
         )
 
-        if shuffle:
-            combine_and_shuffle([filename_out], filename_out)
+
+def _cache_key(job):
+    """Key of the cached results of a job, which depends on everything except the event file name and chunk size"""
+
+    settings = OrderedDict(
+        (key, job[key]) for key in sorted(job) if key not in ["event_file", "chunk_size", "delete_delphes_sample_file"]
+    )
+    if settings["lhe_file_for_weights"] is not None:
+        settings["lhe_file_for_weights"] = file_signature(settings["lhe_file_for_weights"])
+
+    return definition_hash(settings)
+
+
+def _parse_sample(
+    event_file,
+    file_format,
+    observables,
+    cuts,
+    weight_labels,
+    lhe_file_for_weights,
+    sampling_benchmark,
+    reference_benchmark,
+    benchmark_names,
+    is_background,
+    k_factor,
+    systematics_dict,
+    **kwargs,
+):
+    """Analyses one Delphes or HepMC file, returns the observations, weights, and number of events"""
+
+    # Calculate observables and weights in Delphes ROOT file or HepMC file
+    parse_file = parse_delphes_root_file if file_format == "delphes" else parse_hepmc_file
+    this_observations, this_weights, cut_filter = parse_file(event_file, observables, cuts, weight_labels, **kwargs)
+
+    # No events found?
+    if this_observations is None:
+        logger.warning("No remaining events in %s, skipping it", event_file)
+        return None, None, None
+
+    if this_weights is not None:
+        logger.debug("Found weights %s in event file", list(this_weights.keys()))
+    else:
+        logger.debug("Did not extract weights from event file")
+
+    # Sanity checks
+    n_events = DelphesReader._check_sample_elements(this_observations, None)
+
+    # Find weights in LHE file
+    if lhe_file_for_weights is not None:
+        logger.debug("Extracting weights from LHE file")
+        this_weights = parse_lhe_weights(
+            filename=lhe_file_for_weights,
+            sampling_benchmark=sampling_benchmark,
+            benchmark_names=benchmark_names,
+            is_background=is_background,
+            systematics_dict=systematics_dict,
+        )
+        if this_weights is None:
+            raise RuntimeError(f"Could not find events in LHE file {lhe_file_for_weights}")
+
+        logger.debug("Found weights %s in LHE file", list(this_weights.keys()))
+
+        # Apply cuts
+        logger.debug("Applying cuts to LHE weights")
+        for key, weights in this_weights.items():
+            this_weights[key] = weights[cut_filter]
+
+    if this_weights is None:
+        raise RuntimeError("Could not extract weights from Delphes ROOT file, HepMC file, or LHE file.")
+
+    # Sanity checks
+    n_events = DelphesReader._check_sample_elements(this_weights, n_events)
+
+    # k factors
+    if k_factor is not None:
+        for key in this_weights:
+            this_weights[key] = k_factor * this_weights[key]
+
+    # Background scenario: we only have one set of weights, but these should be true for all benchmarks
+    if is_background:
+        logger.debug("Sample is background")
+        benchmarks_weight = list(this_weights.values())[0]
+
+        for benchmark_name in benchmark_names:
+            this_weights[benchmark_name] = benchmarks_weight
+
+    # Rescale nuisance parameters to reference benchmark
+    reference_weights = this_weights[reference_benchmark]
+    sampling_weights = this_weights[sampling_benchmark]
+    for key in this_weights:
+        if key not in benchmark_names:  # Only rescale nuisance benchmarks
+            this_weights[key] = reference_weights / sampling_weights * this_weights[key]
+
+    return this_observations, this_weights, n_events
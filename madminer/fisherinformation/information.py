@@ -5,6 +5,10 @@ from pathlib import Path
 import numpy as np
 
 from madminer.analysis import DataAnalyzer
+from madminer.utils.columnar import UnsupportedExpression
+from madminer.utils.columnar import evaluate_expression
+from madminer.utils.columnar import vectorized_math_commands
+from madminer.utils.expressions import compile_expression
 from madminer.utils.various import math_commands
 from madminer.utils.various import weighted_quantile
 from madminer.utils.various import sanitize_array
@@ -118,14 +122,12 @@ class FisherInformation(DataAnalyzer):
 
         for observations, weights in self.event_loader():
             # Cuts
-            cut_filter = [self._pass_cuts(obs_event, cuts) for obs_event in observations]
+            cut_filter = self._pass_cuts_batch(observations, cuts)
             observations = observations[cut_filter]
             weights = weights[cut_filter]
 
             # Efficiencies
-            efficiencies = np.array(
-                [self._eval_efficiency(obs_event, efficiency_functions) for obs_event in observations]
-            )
+            efficiencies = self._eval_efficiency_batch(observations, efficiency_functions)
             weights *= efficiencies[:, np.newaxis]
 
             # Fisher information
@@ -532,18 +534,16 @@ class FisherInformation(DataAnalyzer):
 
         for observations, weights in self.event_loader():
             # Cuts
-            cut_filter = [self._pass_cuts(obs_event, cuts) for obs_event in observations]
+            cut_filter = self._pass_cuts_batch(observations, cuts)
             observations = observations[cut_filter]
             weights = weights[cut_filter]
 
             # Efficiencies
-            efficiencies = np.array(
-                [self._eval_efficiency(obs_event, efficiency_functions) for obs_event in observations]
-            )
+            efficiencies = self._eval_efficiency_batch(observations, efficiency_functions)
             weights *= efficiencies[:, np.newaxis]
 
             # Evaluate histogrammed observable
-            histo_observables = np.asarray([self._eval_observable(obs_event, observable) for obs_event in observations])
+            histo_observables = self._eval_observable_batch(observations, observable)
 
             # Find bins
             i_bins = np.searchsorted(bin_boundaries, histo_observables)
@@ -681,23 +681,17 @@ class FisherInformation(DataAnalyzer):
 
         for observations, weights in self.event_loader():
             # Cuts
-            cut_filter = [self._pass_cuts(obs_event, cuts) for obs_event in observations]
+            cut_filter = self._pass_cuts_batch(observations, cuts)
             observations = observations[cut_filter]
             weights = weights[cut_filter]
 
             # Efficiencies
-            efficiencies = np.array(
-                [self._eval_efficiency(obs_event, efficiency_functions) for obs_event in observations]
-            )
+            efficiencies = self._eval_efficiency_batch(observations, efficiency_functions)
             weights *= efficiencies[:, np.newaxis]
 
             # Evaluate histogrammed observable
-            histo1_observables = np.asarray(
-                [self._eval_observable(obs_event, observable1) for obs_event in observations]
-            )
-            histo2_observables = np.asarray(
-                [self._eval_observable(obs_event, observable2) for obs_event in observations]
-            )
+            histo1_observables = self._eval_observable_batch(observations, observable1)
+            histo2_observables = self._eval_observable_batch(observations, observable2)
 
             # Find bins
             i_bins1 = np.searchsorted(bin1_boundaries, histo1_observables)
@@ -832,23 +826,19 @@ class FisherInformation(DataAnalyzer):
         if model_file is None:
             for observations, weights in self.event_loader():
                 # Cuts
-                cut_filter = [self._pass_cuts(obs_event, cuts) for obs_event in observations]
+                cut_filter = self._pass_cuts_batch(observations, cuts)
                 observations = observations[cut_filter]
                 weights = weights[cut_filter]
 
                 # Efficiencies
-                efficiencies = np.array(
-                    [self._eval_efficiency(obs_event, efficiency_functions) for obs_event in observations]
-                )
+                efficiencies = self._eval_efficiency_batch(observations, efficiency_functions)
                 weights *= efficiencies[:, np.newaxis]
 
                 # Fisher info per event
                 fisher_info_events = self._calculate_fisher_information(theta, weights, luminosity, sum_events=False)
 
                 # Evaluate histogrammed observable
-                histo_observables = np.asarray(
-                    [self._eval_observable(obs_event, observable) for obs_event in observations]
-                )
+                histo_observables = self._eval_observable_batch(observations, observable)
 
                 # Get rid of nuisance parameters
                 fisher_info_events = fisher_info_events[:, : self.n_parameters, : self.n_parameters]
@@ -928,14 +918,12 @@ class FisherInformation(DataAnalyzer):
                     logger.debug("Evaluating kinematic Fisher information on batch %s / %s", i_batch, n_batches)
 
                 # Cuts
-                cut_filter = [self._pass_cuts(obs_event, cuts) for obs_event in observations]
+                cut_filter = self._pass_cuts_batch(observations, cuts)
                 observations = observations[cut_filter]
                 weights_benchmarks = weights_benchmarks[cut_filter]
 
                 # Efficiencies
-                efficiencies = np.array(
-                    [self._eval_efficiency(obs_event, efficiency_functions) for obs_event in observations]
-                )
+                efficiencies = self._eval_efficiency_batch(observations, efficiency_functions)
                 weights_benchmarks *= efficiencies[:, np.newaxis]
 
                 # Rescale for test_split
@@ -968,9 +956,7 @@ class FisherInformation(DataAnalyzer):
                     fisher_info_events = fisher_info_events[:, : self.n_parameters, : self.n_parameters]
 
                 # Evaluate histogrammed observable
-                histo_observables = np.asarray(
-                    [self._eval_observable(obs_event, observable) for obs_event in observations]
-                )
+                histo_observables = self._eval_observable_batch(observations, observable)
 
                 # Find bins
                 bins = np.searchsorted(bin_boundaries, histo_observables)
@@ -1063,18 +1049,16 @@ class FisherInformation(DataAnalyzer):
         # Main loop: truth-level case
         for observations, weights in self.event_loader():
             # Cuts
-            cut_filter = [self._pass_cuts(obs_event, cuts) for obs_event in observations]
+            cut_filter = self._pass_cuts_batch(observations, cuts)
             observations = observations[cut_filter]
             weights = weights[cut_filter]
 
             # Efficiencies
-            efficiencies = np.array(
-                [self._eval_efficiency(obs_event, efficiency_functions) for obs_event in observations]
-            )
+            efficiencies = self._eval_efficiency_batch(observations, efficiency_functions)
             weights *= efficiencies[:, np.newaxis]
 
             # Evaluate histogrammed observable
-            histo_observables = np.asarray([self._eval_observable(obs_event, observable) for obs_event in observations])
+            histo_observables = self._eval_observable_batch(observations, observable)
 
             # Find bins
             bins = np.searchsorted(bin_boundaries, histo_observables)
@@ -1336,7 +1320,7 @@ class FisherInformation(DataAnalyzer):
 
         # Check cuts
         for cut in cuts:
-            if not bool(eval(cut, variables)):
+            if not bool(compile_expression(cut)(variables)):
                 return False
 
         return True
@@ -1377,7 +1361,7 @@ class FisherInformation(DataAnalyzer):
         # Check cuts
         efficiency = 1.0
         for efficency_function in efficiency_functions:
-            efficiency *= float(eval(efficency_function, variables))
+            efficiency *= float(compile_expression(efficency_function)(variables))
 
         return efficiency
 
@@ -1409,7 +1393,120 @@ class FisherInformation(DataAnalyzer):
             variables[observable_name] = observable_value
 
         # Check cuts
-        return float(eval(observable_definition, variables))
+        return float(compile_expression(observable_definition)(variables))
+
+    def _pass_cuts_batch(self, observations, cuts=None):
+        """
+        Checks which events in a batch pass a set of cuts. The cuts are evaluated on whole columns of observations
+        where possible, and event by event with `_pass_cuts()` otherwise.
+
+        Parameters
+        ----------
+        observations : ndarray
+            Values of the observables with shape `(n_events, n_observables)`.
+
+        cuts : list of str or None, optional
+            Each entry is a parseable Python expression that returns a bool (True if the event should pass a cut,
+            False otherwise). Default value: None.
+
+        Returns
+        -------
+        passes : ndarray
+            Boolean array with shape `(n_events,)`, True for events that pass all cuts.
+
+        """
+
+        if cuts is None:
+            cuts = []
+
+        passes = np.ones(len(observations), dtype=bool)
+
+        for cut in cuts:
+            values = self._evaluate_on_columns(cut, observations)
+            if values is None:
+                return np.array([self._pass_cuts(obs_event, cuts) for obs_event in observations], dtype=bool)
+            passes &= values.astype(bool)
+
+        return passes
+
+    def _eval_efficiency_batch(self, observations, efficiency_functions=None):
+        """
+        Calculates the efficiencies for a batch of events, on whole columns of observations where possible, and
+        event by event with `_eval_efficiency()` otherwise.
+
+        Parameters
+        ----------
+        observations : ndarray
+            Values of the observables with shape `(n_events, n_observables)`.
+
+        efficiency_functions : list of str or None
+            Each entry is a parseable Python expression that returns a float for the efficiency of one component.
+            Default value: None.
+
+        Returns
+        -------
+        efficiencies : ndarray
+            Efficiencies with shape `(n_events,)`.
+
+        """
+
+        if efficiency_functions is None:
+            efficiency_functions = []
+
+        efficiencies = np.ones(len(observations))
+
+        for efficiency_function in efficiency_functions:
+            values = self._evaluate_on_columns(efficiency_function, observations)
+            if values is None:
+                return np.array([self._eval_efficiency(obs_event, efficiency_functions) for obs_event in observations])
+            efficiencies *= values.astype(np.float64)
+
+        return efficiencies
+
+    def _eval_observable_batch(self, observations, observable_definition):
+        """
+        Calculates an observable expression for a batch of events, on whole columns of observations where possible,
+        and event by event with `_eval_observable()` otherwise.
+
+        Parameters
+        ----------
+        observations : ndarray
+            Values of the observables with shape `(n_events, n_observables)`.
+
+        observable_definition : str
+            A parseable Python expression that returns the value of the observable to be calculated.
+
+        Returns
+        -------
+        observable_values : ndarray
+            Values of the observable defined in observable_definition with shape `(n_events,)`.
+
+        """
+
+        values = self._evaluate_on_columns(observable_definition, observations)
+        if values is None:
+            return np.array([self._eval_observable(obs_event, observable_definition) for obs_event in observations])
+
+        return values.astype(np.float64)
+
+    def _evaluate_on_columns(self, definition, observations):
+        """Evaluates an expression on all events at once, returns None if it has to be evaluated event by event"""
+
+        observations = np.asarray(observations)
+        assert observations.ndim == 2 and observations.shape[1] == len(
+            self.observables
+        ), "Mismatch between observables and observations"
+
+        variables = vectorized_math_commands()
+        for i_observable, observable_name in enumerate(self.observables):
+            variables[observable_name] = observations[:, i_observable]
+
+        try:
+            values, _ = evaluate_expression(definition, variables, [], len(observations), strict=True)
+        except UnsupportedExpression:
+            return None
+
+        return values
 
     def _calculate_xsec(
         self,
@@ -1480,14 +1577,12 @@ class FisherInformation(DataAnalyzer):
             start=start_event, include_nuisance_parameters=include_nuisance_parameters
         ):
             # Cuts
-            cut_filter = [self._pass_cuts(obs_event, cuts) for obs_event in observations]
+            cut_filter = self._pass_cuts_batch(observations, cuts)
             observations = observations[cut_filter]
             weights = weights[cut_filter]
 
             # Efficiencies
-            efficiencies = np.array(
-                [self._eval_efficiency(obs_event, efficiency_functions) for obs_event in observations]
-            )
+            efficiencies = self._eval_efficiency_batch(observations, efficiency_functions)
             weights *= efficiencies[:, np.newaxis]
 
             # xsecs
@@ -1542,16 +1637,16 @@ class FisherInformation(DataAnalyzer):
         x_pilot, weights_pilot = next(self.event_loader(batch_size=n_events))
 
         # Cuts
-        cut_filter = [self._pass_cuts(x, cuts) for x in x_pilot]
+        cut_filter = self._pass_cuts_batch(x_pilot, cuts)
         x_pilot = x_pilot[cut_filter]
         weights_pilot = weights_pilot[cut_filter]
 
         # Efficiencies
-        efficiencies = np.array([self._eval_efficiency(x, efficiency_functions) for x in x_pilot])
+        efficiencies = self._eval_efficiency_batch(x_pilot, efficiency_functions)
         weights_pilot *= efficiencies[:, np.newaxis]
 
         # Evaluate histogrammed observable
-        histo_observables_pilot = np.asarray([self._eval_observable(x, observable) for x in x_pilot])
+        histo_observables_pilot = self._eval_observable_batch(x_pilot, observable)
 
         # Weights at theta
         theta_matrix = self._get_theta_benchmark_matrix(theta)
@@ -1,6 +1,12 @@
 import logging
+import os
+import pickle
+import tempfile
 
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
 
 import numpy as np
 
@@ -8,13 +14,20 @@ from madminer.models import Cut
 from madminer.models import Efficiency
 from madminer.models import Observable
 from madminer.models import NuisanceParameter
+from madminer.utils.interfaces.cache import AnalysisCache
+from madminer.utils.interfaces.cache import definition_hash
+from madminer.utils.interfaces.hdf5 import append_events
 from madminer.utils.interfaces.hdf5 import load_madminer_settings
 from madminer.utils.interfaces.hdf5 import save_events
 from madminer.utils.interfaces.hdf5 import save_nuisance_setup
+from madminer.utils.interfaces.hdf5 import shuffle_events
+from madminer.utils.interfaces.hdf5 import _save_samples_summary
 from madminer.utils.interfaces.lhe import parse_lhe_file
 from madminer.utils.interfaces.lhe import extract_nuisance_parameters_from_lhe_file
 from madminer.utils.interfaces.lhe import get_elementary_pdg_ids
-from madminer.sampling import combine_and_shuffle
+from madminer.utils.interfaces.lhe import split_lhe_file
+from madminer.utils.jets import JetClustering
+from madminer.utils.morphing import NuisanceMorpher
 
 logger = logging.getLogger(__name__)
 
@@ -42,7 +55,8 @@ class LHEReader:
     * Optionally, cuts can be set with `LHEProcessor.add_cut()`
     * Optionally, efficiencies can be set with `LHEProcessor.add_efficiency()`
     * Calculating the observables from the Delphes ROOT files with `LHEProcessor.analyse_delphes_samples()`
-    * Saving the results with `LHEProcessor.save()`
+    * Saving the results with `LHEProcessor.save()`, or analysing and saving large samples chunk by chunk with
+      `LHEReader.analyse_samples_to_file()`
 
     Please see the tutorial for a detailed walk-through.
 
@@ -83,6 +97,9 @@ class LHEReader:
             self.phi_resolution[pdgid] = (0.0, 0.0)
         self.pt_resolution["met"] = (0.0, 0.0)
 
+        # Jet clustering
+        self.jet_clustering = None
+
         # Initialize samples
         self.reference_benchmark = None
         self.observations = None
@@ -153,7 +170,8 @@ class LHEReader:
         Parameters
         ----------
         lhe_filename : str
-            Path to the LHE event file (with extension '.lhe' or '.lhe.gz').
+            Path to the LHE event file (with extension '.lhe' or '.lhe.gz'). Compressed files are decompressed
+            while reading; '.lhe.zst' and '.lhe.lz4' files are supported if the zstandard or lz4 package is installed.
 
         sampled_from_benchmark : str
             Name of the benchmark that was used for sampling in this event file (the keyword `sample_benchmark`
@@ -294,6 +312,40 @@ class LHEReader:
 
         self.pt_resolution["met"] = (abs_, rel)
 
+    def set_jet_clustering(self, algorithm="antikt", radius=0.4, pt_min=0.0, backend="auto"):
+        """
+        Sets up the clustering of the quarks and gluons of each event into jets.
+
+        By default, every quark and gluon is a jet. After calling this function, the quarks and gluons (after
+        smearing) are instead clustered with a sequential recombination algorithm, see
+        `madminer.utils.jets.cluster_jets()`. A jet is tagged as tau, b, or top jet if any of its constituents is.
+
+        Parameters
+        ----------
+        algorithm : {"antikt", "kt", "cambridge"} or None, optional
+            Clustering algorithm. If None, the clustering is switched off again. Default value: "antikt".
+
+        radius : float, optional
+            Jet radius. Default value: 0.4.
+
+        pt_min : float, optional
+            Minimal transverse momentum of the jets in GeV. Default value: 0.
+
+        backend : {"auto", "fastjet", "numpy"}, optional
+            Implementation of the clustering. "auto" uses the fastjet package if it is installed and a vectorized NumPy
+            implementation otherwise. Default value: "auto".
+
+        Returns
+        -------
+            None
+
+        """
+
+        if algorithm is None:
+            self.jet_clustering = None
+        else:
+            self.jet_clustering = JetClustering(algorithm=algorithm, radius=radius, pt_min=pt_min, backend=backend)
+
     def add_observable(self, name, definition, required=False, default=None):
         """
         Adds an observable as a string that can be parsed by Python's `eval()` function.
@@ -546,7 +598,16 @@ class LHEReader:
         logger.debug("Resetting efficiencies")
         self.efficiencies = []
 
-    def analyse_samples(self, reference_benchmark=None, parse_events_as_xml=True):
+    def analyse_samples(
+        self,
+        reference_benchmark=None,
+        parse_events_as_xml=True,
+        engine="columnar",
+        n_workers=1,
+        split_files=False,
+        random_state=None,
+        cache=False,
+    ):
         """
         Main function that parses the LHE samples, applies detector effects, checks cuts,
         evaluate efficiencies, and extracts the observables and weights.
@@ -563,13 +624,268 @@ class LHEReader:
             Decides whether the LHE events are parsed with an XML parser (more robust, but slower) or a text parser
             (less robust, faster). Default value: True.
 
+        engine : {"columnar", "events"}, optional
+            Decides how observables, cuts, and efficiencies are evaluated. With "columnar", events are parsed into
+            flat arrays and all definitions are evaluated on whole chunks of events at once; definitions that cannot
+            be vectorized (for instance functions, or expressions with `if` or `and`) are evaluated event by event.
+            Smearing and MET noise are applied to whole chunks of events as well. With "events", one event at a time
+            is analysed. Both engines draw the noise from the same distributions, but not the same random numbers.
+            Default value: "columnar".
+
+        n_workers : int, optional
+            Number of processes that analyse different LHE files in parallel. With more than one worker, observables
+            defined through functions have to be picklable (for instance module-level functions rather than lambdas),
+            and each file is smeared with its own random seed, drawn from NumPy's global random state. The results
+            are merged in the order in which the samples were added. Default value: 1.
+
+        split_files : bool, optional
+            If True and n_workers is larger than one, each LHE file is split at event boundaries into n_workers
+            ranges, which are analysed in parallel (each with its own random seed for the smearing) and concatenated
+            in order. This speeds up the analysis of single large files. Compressed files have to be decompressed
+            once more to find the event boundaries. Default value: False.
+
+        random_state : int or None, optional
+            Seed for the smearing and MET noise. Every LHE file (or file range) gets its own seed derived from it, so
+            the results do not depend on n_workers (but on split_files). If None, the seeds are drawn from NumPy's
+            global random state. Default value: None.
+
+        cache : bool, optional
+            If True, the results for each LHE file are stored in a sidecar file next to it (with the suffix
+            ".madminer-cache.h5") and reused when the file and the analysis setup (observables, cuts, efficiencies,
+            smearing, systematics, and the arguments of this function) are unchanged. When only the analysis setup
+            changes, the parsed events are read from the sidecar file (for the "columnar" engine and unsplit files),
+            which is much faster than parsing the LHE file again. Without random_state, cached results are reused
+            independently of NumPy's global random state. Functions (for instance in observables) are compared by
+            their code, captured values, and the module-level functions, numbers, and arrays they refer to, but not by
+            other objects they use, see `madminer.utils.interfaces.cache.definition_hash()`. Default value: False.
+
         Returns
         -------
             None
 
         """
 
+        jobs, seeds = self._prepare_jobs(
+            reference_benchmark, parse_events_as_xml, engine, n_workers, split_files, random_state
+        )
+
+        # Cached results
+        results = [None for _ in jobs]
+        if cache:
+            caches = [AnalysisCache(job["lhe_file"]) for job in jobs]
+            keys = [
+                definition_hash(
+                    {key: value for key, value in job.items() if key != "lhe_file"},
+                    seed if random_state is not None else None,
+                )
+                for job, seed in zip(jobs, seeds)
+            ]
+            results = [file_cache.load_results(key) for file_cache, key in zip(caches, keys)]
+
+            # Parsed events are cached for whole files, by one job per file
+            cached_files = set()
+            for job, result in zip(jobs, results):
+                if result is None and job["byte_range"] is None and job["lhe_file"] not in cached_files:
+                    job["cache"] = True
+                    cached_files.add(job["lhe_file"])
+
+        # Analyse events
+        missing = [i for i, result in enumerate(results) if result is None]
+        if n_workers == 1 or len(missing) <= 1:
+            for i in missing:
+                results[i] = _parse_sample_with_seed(jobs[i], seeds[i])
+        else:
+            n_processes = min(n_workers, len(missing))
+            logger.info("Analysing %s LHE files or file ranges with %s workers", len(missing), n_processes)
+            with ProcessPoolExecutor(max_workers=n_processes) as executor:
+                missing_results = executor.map(
+                    _parse_sample_with_seed,
+                    [jobs[i] for i in missing],
+                    [seeds[i] for i in missing],
+                )
+                for i, result in zip(missing, missing_results):
+                    results[i] = result
+
+        if cache:
+            for i in missing:
+                caches[i].save_results(keys[i], *results[i])
+
+        self._merge_samples(jobs, results, self.reference_benchmark)
+        self._report_samples()
+
+    def analyse_samples_to_file(
+        self,
+        filename_out,
+        reference_benchmark=None,
+        parse_events_as_xml=True,
+        engine="columnar",
+        n_workers=1,
+        split_files=False,
+        random_state=None,
+        cache=False,
+        chunk_size=100000,
+        shuffle=True,
+        nuisance_storage="weights",
+    ):
+        """
+        Analyses the LHE samples like `LHEReader.analyse_samples()` and saves the results like `LHEReader.save()`,
+        but writes the observations and weights to resizable datasets in the MadMiner file in chunks while the LHE
+        files are analysed. The memory usage thus does not grow with the number of events, and `LHEReader.save()` is
+        not needed (the events are not kept in `LHEReader.observations` and `LHEReader.weights`).
+
+        Files without weights for some nuisance benchmarks contribute their weights at the reference benchmark
+        instead, as in `LHEReader.analyse_samples()`.
+
+        Parameters
+        ----------
+        filename_out : str
+            Path to where the results should be saved.
+
+        reference_benchmark : str or None, optional
+            See `LHEReader.analyse_samples()`. Default value: None.
+
+        parse_events_as_xml : bool, optional
+            See `LHEReader.analyse_samples()`. Default value: True.
+
+        engine : {"columnar", "events"}, optional
+            See `LHEReader.analyse_samples()`. Default value: "columnar".
+
+        n_workers : int, optional
+            Number of processes that analyse different LHE files (or file ranges) in parallel. Each worker stores its
+            chunks in a temporary file next to filename_out, from which they are copied to filename_out in the order
+            in which the samples were added. See `LHEReader.analyse_samples()`. Default value: 1.
+
+        split_files : bool, optional
+            See `LHEReader.analyse_samples()`. Default value: False.
+
+        random_state : int or None, optional
+            See `LHEReader.analyse_samples()`. Default value: None.
+
+        cache : bool, optional
+            If True, the parsed events are cached as in `LHEReader.analyse_samples()`, but not the analysis results,
+            which would have to be kept in memory. Default value: False.
+
+        chunk_size : int, optional
+            Maximal number of events that are written at once (with the "columnar" engine, also the number of
+            events that are analysed at once). Default value: 100000.
+
+        shuffle : bool, optional
+            If True, events are shuffled in place after all of them are written. Unlike the analysis, this loads
+            the observations, weights, etc. of all events into memory, one dataset at a time. Default value: True.
+
+        nuisance_storage : {"weights", "coefficients"}, optional
+            See `LHEReader.save()`. Default value: "weights".
+
+        Returns
+        -------
+            None
+
+        """
+
+        if nuisance_storage not in ["weights", "coefficients"]:
+            raise ValueError(f"Invalid nuisance storage mode: {nuisance_storage}")
+
+        jobs, seeds = self._prepare_jobs(
+            reference_benchmark, parse_events_as_xml, engine, n_workers, split_files, random_state
+        )
+
+        cached_files = set()
+        for job in jobs:
+            job["chunk_size"] = chunk_size
+            if cache and job["byte_range"] is None and job["lhe_file"] not in cached_files:
+                job["cache"] = True
+                cached_files.add(job["lhe_file"])
+
+        # Benchmarks, known from the nuisance setup before the events are analysed
+        benchmarks = list(self.benchmark_names_phys)
+        for param in self.nuisance_parameters.values():
+            for name in (param.benchmark_pos, param.benchmark_neg):
+                if name is not None and name not in benchmarks:
+                    benchmarks.append(name)
+
+        weight_names = self._get_saved_benchmarks(benchmarks, nuisance_storage)
+        logger.debug("Weight names: %s", weight_names)
+
+        save_nuisance_setup(
+            file_name=filename_out,
+            file_override=True,
+            nuisance_benchmarks=weight_names,
+            nuisance_parameters=self.nuisance_parameters,
+            reference_benchmark=self.reference_benchmark,
+            copy_from_path=self.filename,
+        )
+        save_events(
+            file_name=filename_out,
+            file_override=True,
+            observables=self.observables,
+            observations=OrderedDict(),
+            weights=None,
+            sampling_benchmarks=None,
+            num_signal_events=None,
+            num_background_events=None,
+        )
+
+        # Analyse events and write them in chunks
+        if n_workers == 1 or len(jobs) <= 1:
+            for job, seed in zip(jobs, seeds):
+                event_sink = partial(self._append_chunk, filename_out, job, benchmarks, nuisance_storage)
+                _stream_sample_with_seed(job, seed, event_sink)
+        else:
+            n_processes = min(n_workers, len(jobs))
+            logger.info("Analysing %s LHE files or file ranges with %s workers", len(jobs), n_processes)
+            output_dir = os.path.dirname(os.path.abspath(filename_out))
+            with tempfile.TemporaryDirectory(dir=output_dir) as tmp_dir:
+                chunk_filenames = [os.path.join(tmp_dir, f"chunks_{i}.pickle") for i in range(len(jobs))]
+                with ProcessPoolExecutor(max_workers=n_processes) as executor:
+                    done = executor.map(_stream_sample_to_file, jobs, seeds, chunk_filenames)
+                    for job, chunk_filename, _ in zip(jobs, chunk_filenames, done):
+                        for observations, weights in _load_chunks(chunk_filename):
+                            self._append_chunk(filename_out, job, benchmarks, nuisance_storage, observations, weights)
+                        os.remove(chunk_filename)
+
+        self._report_samples()
+
+        if sum(self.signal_events_per_benchmark) + self.background_events == 0:
+            logger.warning("No events to save!")
+            return
+
+        _save_samples_summary(filename_out, True, self.signal_events_per_benchmark, self.background_events)
+
+        if shuffle:
+            shuffle_events(filename_out)
+
+    def _append_chunk(self, filename_out, job, benchmarks, nuisance_storage, observations, weights):
+        """Appends a chunk of events from one job to the MadMiner file"""
+
+        n_events = self._check_sample_elements(observations, None)
+        n_events = self._check_sample_elements(weights, n_events)
+
+        # Files without weights for some benchmark contribute their weights at the reference benchmark instead
+        weights = OrderedDict((key, weights.get(key, weights[self.reference_benchmark])) for key in benchmarks)
+
+        if job["is_background"]:
+            sampling_id = -1
+            self.background_events += n_events
+        else:
+            sampling_id = self.benchmark_names_phys.index(job["sampling_benchmark"])
+            self.signal_events_per_benchmark[sampling_id] += n_events
+
+        append_events(
+            file_name=filename_out,
+            observations=observations,
+            weights=weights,
+            sampling_benchmarks=np.full(n_events, sampling_id, dtype=int),
+            nuisance_coefficients=self._calculate_nuisance_coefficients(weights, nuisance_storage),
+        )
+
+    def _prepare_jobs(self, reference_benchmark, parse_events_as_xml, engine, n_workers, split_files, random_state):
+        """Resets the results, extracts the nuisance setup, and returns one job and random seed per file or range"""
+
         # Input
+        if engine not in ["columnar", "events"]:
+            raise ValueError(f"Invalid analysis engine: {engine}")
+        if n_workers < 1:
+            raise ValueError(f"Invalid number of workers: {n_workers}")
         if reference_benchmark is None:
             reference_benchmark = self.benchmark_names_phys[0]
         self.reference_benchmark = reference_benchmark
@@ -582,6 +898,8 @@ class LHEReader:
         self.signal_events_per_benchmark = [0 for _ in range(self.n_benchmarks_phys)]
         self.background_events = 0
 
+        # Nuisance setup from the LHE headers
+        jobs = []
         for lhe_file, is_background, sampling_benchmark, k_factor, sample_syst_names in zip(
             self.lhe_sample_filenames,
             self.sample_is_backgrounds,
@@ -599,71 +917,43 @@ class LHEReader:
                 "no systematics" if sample_syst_names is None else "systematics" + ", ".join(list(sample_syst_names)),
             )
 
-            this_observations, this_weights, this_n_events = self._parse_sample(
-                is_background,
-                k_factor,
-                lhe_file,
-                parse_events_as_xml,
-                reference_benchmark,
-                sampling_benchmark,
-                sample_syst_names,
-            )
-
-            # No results?
-            if this_observations is None:
-                continue
-
-            # Store sampling id for each event
-            if is_background:
-                idx = -1
-                self.background_events += this_n_events
-            else:
-                idx = self.benchmark_names_phys.index(sampling_benchmark)
-                self.signal_events_per_benchmark[idx] += this_n_events
-            this_events_sampling_benchmark_ids = np.array([idx] * this_n_events, dtype=int)
-
-            # First results
-            if self.observations is None and self.weights is None:
-                self.observations = this_observations
-                self.weights = this_weights
-                self.events_sampling_benchmark_ids = this_events_sampling_benchmark_ids
-                continue
-
-            # Following results: check consistency with previous results
-            if len(self.observations) != len(this_observations):
-                raise ValueError(
-                    f"Number of observations in different Delphes files incompatible: "
-                    f"{len(self.observations)} vs {len(this_observations)}"
+            systematics_dict = self._extract_sample_systematics(lhe_file, sample_syst_names)
+            byte_ranges = split_lhe_file(lhe_file, n_workers) if split_files else [None]
+
+            for byte_range in byte_ranges:
+                jobs.append(
+                    dict(
+                        lhe_file=lhe_file,
+                        byte_range=byte_range,
+                        sampling_benchmark=sampling_benchmark,
+                        reference_benchmark=reference_benchmark,
+                        benchmark_names=self.benchmark_names_phys,
+                        systematics_dict=systematics_dict,
+                        is_background=is_background,
+                        observables=self.observables,
+                        cuts=self.cuts,
+                        efficiencies=self.efficiencies,
+                        energy_resolutions=self.energy_resolution,
+                        pt_resolutions=self.pt_resolution,
+                        eta_resolutions=self.eta_resolution,
+                        phi_resolutions=self.phi_resolution,
+                        k_factor=k_factor,
+                        parse_events_as_xml=parse_events_as_xml,
+                        engine=engine,
+                        jet_clustering=self.jet_clustering,
+                    )
                 )
 
-            # Merge weights with previous
-            logging.debug("Merging data extracted from this file with data from previous files")
-            previous_reference_weights = np.copy(self.weights[reference_benchmark])
-            for key in self.weights:
-                if key in this_weights:
-                    # Benchmark exists in both samples
-                    self.weights[key] = np.hstack([self.weights[key], this_weights[key]])
-                    logging.debug("  Weights for benchmark %s exist in both", key)
-                else:
-                    # Benchmark only in previous samples
-                    self.weights[key] = np.hstack([self.weights[key], this_weights[reference_benchmark]])
-                    logging.debug("  Weights for benchmark %s exist only in previous files", key)
-            for key in this_weights:
-                if key in self.weights:
-                    continue
-                # Benchmark only in new samples
-                self.weights[key] = np.hstack([previous_reference_weights, this_weights[key]])
-                logging.debug("  Weights for benchmark %s exist only in new file", key)
-
-            # Merge observations with previous (should always be the same observables)
-            for key in self.observations:
-                assert key in this_observations, f"Observable {key} not found in Delphes sample!"
-                self.observations[key] = np.hstack([self.observations[key], this_observations[key]])
-
-            self.events_sampling_benchmark_ids = np.hstack(
-                [self.events_sampling_benchmark_ids, this_events_sampling_benchmark_ids]
-            )
+        # Random seeds for the smearing, one per job
+        seeds = [None for _ in jobs]
+        if random_state is not None:
+            seeds = np.random.SeedSequence(random_state).generate_state(len(jobs)).tolist()
+        elif n_workers > 1 and len(jobs) > 1:
+            seeds = np.random.randint(0, 2**31 - 1, size=len(jobs)).tolist()
+
+        return jobs, seeds
 
+    def _report_samples(self):
         logger.info("Analysed number of events per sampling benchmark:")
         for name, n_events in zip(self.benchmark_names_phys, self.signal_events_per_benchmark):
             if n_events > 0:
@@ -671,16 +961,7 @@ class LHEReader:
         if self.background_events > 0:
             logger.info("  %s from backgrounds", self.background_events)
 
-    def _parse_sample(
-        self,
-        is_background,
-        k_factor,
-        lhe_file,
-        parse_events_as_xml,
-        reference_benchmark,
-        sampling_benchmark,
-        sample_syst_names,
-    ):
+    def _extract_sample_systematics(self, lhe_file, sample_syst_names):
         # Relevant systematics
         systematics_used = OrderedDict()
         if sample_syst_names is None:
@@ -721,43 +1002,70 @@ class LHEReader:
                     benchmark_neg=benchmark1,
                 )
 
-        # Calculate observables and weights in LHE file
-        this_observations, this_weights = parse_lhe_file(
-            filename=lhe_file,
-            sampling_benchmark=sampling_benchmark,
-            benchmark_names=self.benchmark_names_phys,
-            is_background=is_background,
-            observables=self.observables,
-            cuts=self.cuts,
-            efficiencies=self.efficiencies,
-            energy_resolutions=self.energy_resolution,
-            pt_resolutions=self.pt_resolution,
-            eta_resolutions=self.eta_resolution,
-            phi_resolutions=self.phi_resolution,
-            k_factor=k_factor,
-            parse_events_as_xml=parse_events_as_xml,
-            systematics_dict=systematics_dict,
-        )
-
-        # No events found?
-        if this_observations is None:
-            logger.warning("No remaining events in this LHE file, skipping it")
-            return None, None
-        logger.debug("Found weights %s in LHE file", list(this_weights.keys()))
-
-        n_events = self._check_sample_elements(this_observations, None)
-        n_events = self._check_sample_elements(this_weights, None)
-
-        # Rescale nuisance parameters to reference benchmark
-        reference_weights = this_weights[reference_benchmark]
-        sampling_weights = this_weights[sampling_benchmark]
-        for key in this_weights:
-            if key not in self.benchmark_names_phys:  # Only rescale nuisance benchmarks
-                this_weights[key] = reference_weights / sampling_weights * this_weights[key]
+        return systematics_dict
 
-        return this_observations, this_weights, n_events
+    def _merge_samples(self, jobs, results, reference_benchmark):
+        """Merges the observations and weights of all LHE files (or file ranges), in the order of the files"""
 
-    def save(self, filename_out, shuffle=True):
+        # Skip files without events
+        samples = [(job, result) for job, result in zip(jobs, results) if result[0] is not None]
+        if len(samples) == 0:
+            return
+        jobs, results = zip(*samples)
+
+        # Sampling id for each event
+        n_events_per_file = [n_events for _, _, n_events in results]
+        sampling_ids = []
+        for job, n_events in zip(jobs, n_events_per_file):
+            if job["is_background"]:
+                sampling_ids.append(-1)
+                self.background_events += n_events
+            else:
+                idx = self.benchmark_names_phys.index(job["sampling_benchmark"])
+                sampling_ids.append(idx)
+                self.signal_events_per_benchmark[idx] += n_events
+
+        # Check consistency (should always be the same observables)
+        observables = list(results[0][0].keys())
+        for this_observations, _, _ in results[1:]:
+            if len(observables) != len(this_observations):
+                raise ValueError(
+                    f"Number of observations in different LHE files incompatible: "
+                    f"{len(observables)} vs {len(this_observations)}"
+                )
+            for key in observables:
+                assert key in this_observations, f"Observable {key} not found in LHE sample!"
+
+        # Benchmarks, in the order in which they first appear. Files without weights for some benchmark contribute
+        # their weights at the reference benchmark instead.
+        benchmarks = []
+        for _, this_weights, _ in results:
+            benchmarks += [key for key in this_weights if key not in benchmarks]
+        for key in benchmarks:
+            if not all(key in this_weights for _, this_weights, _ in results):
+                logger.debug("  Weights for benchmark %s do not exist in all files", key)
+
+        # Fill preallocated arrays
+        n_total = sum(n_events_per_file)
+        offsets = np.cumsum([0] + n_events_per_file)
+
+        self.observations = OrderedDict()
+        for key in observables:
+            dtype = np.result_type(*[this_observations[key] for this_observations, _, _ in results])
+            self.observations[key] = np.empty(n_total, dtype=dtype)
+            for (this_observations, _, _), start, end in zip(results, offsets[:-1], offsets[1:]):
+                self.observations[key][start:end] = this_observations[key]
+
+        self.weights = OrderedDict()
+        for key in benchmarks:
+            columns = [this_weights.get(key, this_weights[reference_benchmark]) for _, this_weights, _ in results]
+            self.weights[key] = np.empty(n_total, dtype=np.result_type(*columns))
+            for column, start, end in zip(columns, offsets[:-1], offsets[1:]):
+                self.weights[key][start:end] = column
+
+        self.events_sampling_benchmark_ids = np.repeat(np.array(sampling_ids, dtype=int), n_events_per_file)
+
+    def save(self, filename_out, shuffle=True, nuisance_storage="weights"):
         """
         Saves the observable definitions, observable values, and event weights in a MadMiner file. The parameter,
         benchmark, and morphing setup is copied from the file provided during initialization. Nuisance benchmarks found
@@ -772,6 +1080,13 @@ class LHEReader:
             If True, events are shuffled before being saved. That's important when there are multiple distinct
             samples (e.g. signal and background). Default value: True.
 
+        nuisance_storage : {"weights", "coefficients"}, optional
+            If "weights", the event weights for all nuisance benchmarks are saved. If "coefficients", the per-event
+            coefficients a_i(x) and b_i(x) of the nuisance morphing are saved as float32 arrays instead, which
+            requires one column per nuisance parameter rather than one or two, and spares the analysis from
+            recomputing them. Nuisance benchmarks that are not used by any nuisance parameter are then not saved.
+            Default value: "weights".
+
         Returns
         -------
             None
@@ -784,8 +1099,15 @@ class LHEReader:
 
         logger.debug("Loading HDF5 data from %s and saving file to %s", self.filename, filename_out)
 
+        if nuisance_storage not in ["weights", "coefficients"]:
+            raise ValueError(f"Invalid nuisance storage mode: {nuisance_storage}")
+
+        # Nuisance coefficients instead of nuisance benchmark weights
+        nuisance_coefficients = self._calculate_nuisance_coefficients(self.weights, nuisance_storage)
+        weight_names = self._get_saved_benchmarks(self.weights.keys(), nuisance_storage)
+        weights = OrderedDict((key, self.weights[key]) for key in weight_names)
+
         # Save nuisance parameters and benchmarks
-        weight_names = list(self.weights.keys())
         logger.debug("Weight names: %s", weight_names)
 
         save_nuisance_setup(
@@ -797,17 +1119,165 @@ class LHEReader:
             copy_from_path=self.filename,
         )
 
+        # Number of events per sampling benchmark
+        sampling_ids = np.asarray(self.events_sampling_benchmark_ids, dtype=int)
+        num_signal_events = np.bincount(sampling_ids[sampling_ids >= 0], minlength=self.n_benchmarks_phys)
+        num_background_events = int(np.sum(sampling_ids < 0))
+
         # Save events
         save_events(
             file_name=filename_out,
             file_override=True,
             observables=self.observables,
             observations=self.observations,
-            weights=self.weights,
-            sampling_benchmarks=self.events_sampling_benchmark_ids,
-            num_signal_events=self.signal_events_per_benchmark,
-            num_background_events=self.background_events,
+            weights=weights,
+            sampling_benchmarks=sampling_ids,
+            num_signal_events=num_signal_events,
+            num_background_events=num_background_events,
+            nuisance_coefficients=nuisance_coefficients,
+            shuffle=shuffle,
         )
 
-        if shuffle:
-            combine_and_shuffle([filename_out], filename_out)
+    def _get_saved_benchmarks(self, benchmarks, nuisance_storage):
+        """Benchmarks whose weights are saved, without the unused nuisance benchmarks when saving coefficients"""
+
+        if nuisance_storage != "coefficients" or len(self.nuisance_parameters) == 0:
+            return list(benchmarks)
+
+        nuisance_benchmarks = [
+            name for param in self.nuisance_parameters.values() for name in (param.benchmark_pos, param.benchmark_neg)
+        ]
+        return [key for key in benchmarks if key in self.benchmark_names_phys or key in nuisance_benchmarks]
+
+    def _calculate_nuisance_coefficients(self, weights, nuisance_storage):
+        """Nuisance coefficients (a, b) to save instead of the nuisance benchmark weights, or None"""
+
+        if nuisance_storage != "coefficients" or len(self.nuisance_parameters) == 0:
+            return None
+
+        nuisance_morpher = NuisanceMorpher(self.nuisance_parameters, weights.keys(), self.reference_benchmark)
+        return nuisance_morpher.calculate_coefficients(np.array(list(weights.values())).T)
+
+
+def _parse_sample(
+    lhe_file,
+    sampling_benchmark,
+    reference_benchmark,
+    benchmark_names,
+    systematics_dict,
+    **kwargs,
+):
+    """Analyses one LHE file, returns the observations, weights, and number of events"""
+
+    # Calculate observables and weights in LHE file
+    this_observations, this_weights = parse_lhe_file(
+        filename=lhe_file,
+        sampling_benchmark=sampling_benchmark,
+        benchmark_names=benchmark_names,
+        systematics_dict=systematics_dict,
+        **kwargs,
+    )
+
+    # No events found?
+    if this_observations is None:
+        logger.warning("No remaining events in this LHE file, skipping it")
+        return None, None, 0
+    logger.debug("Found weights %s in LHE file", list(this_weights.keys()))
+
+    n_events = LHEReader._check_sample_elements(this_observations, None)
+    n_events = LHEReader._check_sample_elements(this_weights, None)
+
+    _rescale_nuisance_weights(this_weights, sampling_benchmark, reference_benchmark, benchmark_names)
+
+    return this_observations, this_weights, n_events
+
+
+def _rescale_nuisance_weights(weights, sampling_benchmark, reference_benchmark, benchmark_names):
+    """Rescales the weights at the nuisance benchmarks to the reference benchmark, in place"""
+
+    reference_weights = weights[reference_benchmark]
+    sampling_weights = weights[sampling_benchmark]
+    for key in weights:
+        if key not in benchmark_names:  # Only rescale nuisance benchmarks
+            weights[key] = reference_weights / sampling_weights * weights[key]
+
+
+@contextmanager
+def _global_random_state(seed):
+    """
+    Seeds NumPy's global random state, which the events engine uses for the smearing, and restores the previous state
+    afterwards, so that analysing samples in the calling process does not reseed the random state of the caller.
+    """
+
+    if seed is None:
+        yield
+        return
+
+    state = np.random.get_state()
+    np.random.seed(seed)
+    try:
+        yield
+    finally:
+        np.random.set_state(state)
+
+
+def _parse_sample_with_seed(job, seed):
+    # Worker processes would otherwise share the random state used for smearing
+    with _global_random_state(seed):
+        return _parse_sample(random_state=seed, **job)
+
+
+def _stream_sample(
+    lhe_file,
+    sampling_benchmark,
+    reference_benchmark,
+    benchmark_names,
+    event_sink,
+    **kwargs,
+):
+    """Analyses one LHE file, passes the observations and weights to event_sink in chunks"""
+
+    def rescale_and_sink(observations, weights):
+        _rescale_nuisance_weights(weights, sampling_benchmark, reference_benchmark, benchmark_names)
+        event_sink(observations, weights)
+
+    n_events = parse_lhe_file(
+        filename=lhe_file,
+        sampling_benchmark=sampling_benchmark,
+        benchmark_names=benchmark_names,
+        event_sink=rescale_and_sink,
+        **kwargs,
+    )
+
+    if n_events == 0:
+        logger.warning("No remaining events in this LHE file, skipping it")
+
+    return n_events
+
+
+def _stream_sample_with_seed(job, seed, event_sink):
+    # Worker processes would otherwise share the random state used for smearing
+    with _global_random_state(seed):
+        return _stream_sample(random_state=seed, event_sink=event_sink, **job)
+
+
+def _stream_sample_to_file(job, seed, filename):
+    """Analyses one LHE file in a worker process, stores the chunks of observations and weights in a pickle file"""
+
+    with open(filename, "wb") as file:
+
+        def dump(observations, weights):
+            pickle.dump((observations, weights), file, protocol=pickle.HIGHEST_PROTOCOL)
+
+        return _stream_sample_with_seed(job, seed, dump)
+
+
+def _load_chunks(filename):
+    """Reads back the chunks stored by `_stream_sample_to_file()` one at a time"""
+
+    with open(filename, "rb") as file:
+        while True:
+            try:
+                yield pickle.load(file)
+            except EOFError:
+                return
@@ -9,6 +9,7 @@ from .. import sampling
 from ..ml import ScoreEstimator
 from ..ml import Ensemble
 from ..ml import load_estimator
+from ..utils.expressions import compile_expression
 from ..utils.histo import Histo
 from ..utils.various import mdot
 from ..utils.various import less_logging
@@ -451,7 +452,7 @@ class HistoLikelihood(BaseLikelihood):
 
                 for observable, x_index in zip(observables, x_indices):
                     if x_index == "function":
-                        data_event.append(float(eval(observable, variables)))
+                        data_event.append(float(compile_expression(observable)(variables)))
                     elif x_index == "score":
                         data_event.append(score[observable])
                     else:
@@ -877,10 +877,8 @@ class AsymptoticLimits(DataAnalyzer):
             xsecs_benchmarks += np.sum(weights, axis=0)
 
         # xsecs at thetas
-        xsecs = []
-        for theta in thetas:
-            theta_matrix = self._get_theta_benchmark_matrix(theta)
-            xsecs.append(mdot(theta_matrix, xsecs_benchmarks) * correction_factor)
+        theta_matrices = self.morphing_kernel.weights(thetas)
+        xsecs = mdot(theta_matrices, xsecs_benchmarks) * correction_factor
         return np.asarray(xsecs)
 
     def _asimov_data(self, theta, test_split=0.2, sample_only_from_closest_benchmark=True, n_asimov=None):
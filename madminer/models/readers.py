@@ -1,8 +1,11 @@
 from dataclasses import dataclass
 from contextlib import suppress
 from typing import Callable
+from typing import List
 from typing import Union
 
+from madminer.utils.expressions import compile_expression
+
 
 @dataclass
 class Cut:
@@ -14,7 +17,12 @@ class Cut:
         """Perform certain attribute quality assertions"""
 
         with suppress(NameError):
-            eval(self.val_expression)
+            eval(compile_expression(self.val_expression).code)
+
+    @property
+    def expression(self):
+        """Compiled expression, shared by all cuts, efficiencies, and observables with the same definition"""
+        return compile_expression(self.val_expression)
 
 
 @dataclass
@@ -27,7 +35,12 @@ class Efficiency:
         """Perform certain attribute quality assertions"""
 
         with suppress(NameError):
-            eval(self.val_expression)
+            eval(compile_expression(self.val_expression).code)
+
+    @property
+    def expression(self):
+        """Compiled expression, shared by all cuts, efficiencies, and observables with the same definition"""
+        return compile_expression(self.val_expression)
 
 
 @dataclass
@@ -36,6 +49,7 @@ class Observable:
     val_expression: Union[str, Callable]
     val_default: float = None
     is_required: bool = False
+    objects: List[str] = None
 
     def __post_init__(self):
         """Perform certain attribute quality assertions"""
@@ -44,4 +58,11 @@ class Observable:
             return
 
         with suppress(NameError):
-            eval(self.val_expression)
+            eval(compile_expression(self.val_expression).code)
+
+    @property
+    def expression(self):
+        """Compiled expression, shared by all cuts, efficiencies, and observables with the same definition"""
+        if not isinstance(self.val_expression, str):
+            return None
+        return compile_expression(self.val_expression)
@@ -1,6 +1,7 @@
 from .distributions import plot_distributions
 from .distributions import plot_histograms
 
+from .morphing import compute_morphing_quality_grid
 from .morphing import plot_1d_morphing_basis
 from .morphing import plot_2d_morphing_basis
 from .morphing import plot_nd_morphing_basis_scatter
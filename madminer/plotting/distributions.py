@@ -190,7 +190,7 @@ def plot_distributions(
 
     # Parse thetas
     theta_values = [sa._get_theta_value(theta) for theta in parameter_points]
-    theta_matrices = [sa._get_theta_benchmark_matrix(theta) for theta in parameter_points]
+    theta_matrices = sa.morphing_kernel.weights(parameter_points)
     logger.debug("Calculated %s theta matrices", len(theta_matrices))
 
     # Get event data (observations and weights)
@@ -266,12 +266,7 @@ def plot_distributions(
 
         logger.debug("Drew %s toy values for nuisance parameters", n_toys * n_nuisance_params)
 
-        nuisance_toy_factors = np.array(
-            [
-                nuisance_morpher.calculate_nuisance_factors(nuisance_toy, all_weights_benchmarks)
-                for nuisance_toy in nuisance_toys
-            ]
-        )  # Shape (n_toys, n_events)
+        nuisance_toy_factors = nuisance_morpher.calculate_nuisance_factors_batch(nuisance_toys, all_weights_benchmarks)
 
         nuisance_toy_factors = sanitize_array(nuisance_toy_factors, min_value=1.0e-2, max_value=100.0)
         # Shape (n_toys, n_events)
@@ -6,6 +6,69 @@ from matplotlib import pyplot as plt
 logger = logging.getLogger(__name__)
 
 
+def compute_morphing_quality_grid(morpher, parameters=(0, 1), ranges=None, resolution=100, theta_ref=None):
+    """
+    Evaluates the morphing error measure `sqrt(sum_i w_i^2)` on a regular grid in one or two parameters.
+
+    All grid points are evaluated in a single batched call, so the result can be computed without any plotting backend
+    and cached or reused for several figures.
+
+    Parameters
+    ----------
+    morpher : PhysicsMorpher
+        PhysicsMorpher instance with defined basis.
+
+    parameters : int or tuple of int, optional
+        Index or indices of the parameters spanned by the grid. Default value: (0, 1).
+
+    ranges : tuple of tuple of float or None, optional
+        Range `(min, max)` for each grid parameter. If None, `morpher.parameter_range` is used. Default value: None.
+
+    resolution : int, optional
+        Number of points per grid axis. Default value: 100.
+
+    theta_ref : ndarray or None, optional
+        Parameter point with shape `(n_parameters,)` that fixes the parameters not spanned by the grid. If None, these
+        parameters are set to zero. Default value: None.
+
+    Returns
+    -------
+    axes : list of ndarray
+        Grid coordinates along each of the grid parameters, each with shape `(resolution,)`.
+
+    squared_weights : ndarray
+        Square root of the sum of squared morphing weights. For a one-dimensional grid the shape is `(resolution,)`,
+        for a two-dimensional grid it is `(resolution, resolution)`, with the first index running over the second
+        grid parameter (as expected by `pcolormesh`).
+
+    """
+
+    if isinstance(parameters, int):
+        parameters = (parameters,)
+    parameters = list(parameters)
+
+    assert len(parameters) in [1, 2], "Only one- or two-dimensional grids are supported"
+
+    n_parameters = morpher.n_parameters
+    if ranges is None:
+        ranges = [morpher.parameter_range[i] for i in parameters]
+
+    axes = [np.linspace(range_[0], range_[1], resolution) for range_ in ranges]
+    grid = np.meshgrid(*axes)
+
+    if theta_ref is None:
+        theta_ref = np.zeros(n_parameters)
+    thetas = np.tile(np.asarray(theta_ref, dtype=np.float64).reshape((1, -1)), (resolution ** len(parameters), 1))
+    for i, coordinates in zip(parameters, grid):
+        thetas[:, i] = coordinates.flatten()
+
+    weights = morpher.calculate_morphing_weights_batch(thetas)
+    squared_weights = np.sum(weights * weights, axis=1) ** 0.5
+    squared_weights = squared_weights.reshape(grid[0].shape)
+
+    return axes, squared_weights
+
+
 def plot_1d_morphing_basis(morpher, xlabel=r"$\theta$", xrange=(-1.0, 1.0), resolution=100):
     """
     Visualizes a morphing basis and morphing errors for problems with a two-dimensional parameter space.
@@ -36,17 +99,12 @@ def plot_1d_morphing_basis(morpher, xlabel=r"$\theta$", xrange=(-1.0, 1.0), reso
     assert basis is not None, "No basis defined"
     assert basis.shape[1] == 1, "Only 1d problems can be plotted with this function"
 
-    theta_test = np.linspace(xrange[0], xrange[1], resolution).reshape((-1, 1))
-
-    squared_weights = []
-    for theta in theta_test:
-        wi = morpher.calculate_morphing_weights(theta, None)
-        squared_weights.append(np.sum(wi * wi) ** 0.5)
+    (xi,), squared_weights = compute_morphing_quality_grid(morpher, 0, ranges=[xrange], resolution=resolution)
 
     fig = plt.figure(figsize=(5, 5))
     ax = plt.gca()
 
-    ax.plot(theta_test.flatten(), squared_weights)
+    ax.plot(xi, squared_weights)
 
     plt.scatter(basis[:, 0], [0.0 for _ in basis[:, 0]], s=50.0, c="black")
 
@@ -107,16 +165,9 @@ def plot_2d_morphing_basis(
     assert basis is not None, "No basis defined"
     assert basis.shape[1] == 2, "Only 2d problems can be plotted with this function"
 
-    xi, yi = (np.linspace(xrange[0], xrange[1], resolution), np.linspace(yrange[0], yrange[1], resolution))
-    xx, yy = np.meshgrid(xi, yi)
-    xx, yy = xx.reshape((-1, 1)), yy.reshape((-1, 1))
-    theta_test = np.hstack([xx, yy])
-
-    squared_weights = []
-    for theta in theta_test:
-        wi = morpher.calculate_morphing_weights(theta, None)
-        squared_weights.append(np.sum(wi * wi) ** 0.5)
-    squared_weights = np.array(squared_weights).reshape((resolution, resolution))
+    (xi, yi), squared_weights = compute_morphing_quality_grid(
+        morpher, (0, 1), ranges=[xrange, yrange], resolution=resolution
+    )
 
     fig = plt.figure(figsize=(6.5, 5))
     ax = plt.gca()
@@ -233,24 +284,8 @@ def plot_nd_morphing_basis_slices(morpher, crange=(1.0, 100.0), resolution=50):
             i_panel = 1 + (iy - 1) * (n_parameters - 1) + ix
             ax = plt.subplot(n_parameters - 1, n_parameters - 1, i_panel)
 
-            # Grid
-            xrange = morpher.parameter_range[ix]
-            yrange = morpher.parameter_range[iy]
-            xi = np.linspace(xrange[0], xrange[1], resolution)
-            yi = np.linspace(yrange[0], yrange[1], resolution)
-            xx, yy = np.meshgrid(xi, yi)
-            xx, yy = xx.flatten(), yy.flatten()
-
-            theta_test = np.zeros((resolution**2, n_parameters))
-            theta_test[:, ix] = xx
-            theta_test[:, iy] = yy
-
-            # Get squared weights
-            squared_weights = []
-            for theta in theta_test:
-                wi = morpher.calculate_morphing_weights(theta, None)
-                squared_weights.append(np.sum(wi * wi) ** 0.5)
-            squared_weights = np.array(squared_weights).reshape((resolution, resolution))
+            # Squared weights on grid
+            (xi, yi), squared_weights = compute_morphing_quality_grid(morpher, (ix, iy), resolution=resolution)
 
             pcm = ax.pcolormesh(
                 xi,
@@ -130,12 +130,7 @@ def plot_uncertainty(
             if i not in nuisance_parameters:
                 nuisance_toys[:, i] = 0.0
 
-    nuisance_toy_factors = np.array(
-        [
-            nuisance_morpher.calculate_nuisance_factors(nuisance_toy, weights_benchmarks)
-            for nuisance_toy in nuisance_toys
-        ]
-    )  # Shape (n_toys, n_events)
+    nuisance_toy_factors = nuisance_morpher.calculate_nuisance_factors_batch(nuisance_toys, weights_benchmarks)
 
     nuisance_toy_factors = sanitize_array(nuisance_toy_factors, min_value=1.0e-2, max_value=100.0)
     # Shape (n_toys, n_events)
@@ -369,12 +364,7 @@ def plot_systematics(
 
     nuisance_toys = nuisance_toys.reshape(n_systematics * n_toys, n_nuisance_params)
 
-    nuisance_toy_factors = np.array(
-        [
-            nuisance_morpher.calculate_nuisance_factors(nuisance_toy, weights_benchmarks)
-            for nuisance_toy in nuisance_toys
-        ]
-    )  # Shape (n_systematics*n_toys, n_events)
+    nuisance_toy_factors = nuisance_morpher.calculate_nuisance_factors_batch(nuisance_toys, weights_benchmarks)
 
     nuisance_toy_factors = sanitize_array(nuisance_toy_factors, min_value=1.0e-2, max_value=100.0)
     # Shape (n_systematics*n_toys, n_events)
@@ -96,6 +96,9 @@ def combine_and_shuffle(
     all_observations = None
     all_weights = None
     all_sampling_ids = None
+    all_nuisance_a = None
+    all_nuisance_b = None
+    stores_coefficients = None
 
     all_n_events_background = 0
     all_n_events_signal_per_benchmark = 0
@@ -132,8 +135,17 @@ def combine_and_shuffle(
             all_n_events_signal_per_benchmark += n_signal_events_generated_per_benchmark
             all_n_events_background += n_background_events
 
-        for observations, weights, sampling_ids in load_events(filename, include_sampling_ids=True):
+        for observations, weights, sampling_ids, nuisance_coefficients in load_events(
+            filename,
+            include_sampling_ids=True,
+            include_nuisance_coefficients=True,
+        ):
             logger.debug("Sampling benchmarks: %s", sampling_ids)
+            if stores_coefficients is None:
+                stores_coefficients = nuisance_coefficients is not None
+            elif stores_coefficients != (nuisance_coefficients is not None):
+                raise RuntimeError("Cannot combine files with nuisance coefficients and files with nuisance weights")
+
             if all_observations is None:
                 all_observations = observations
                 all_weights = k_factor * weights
@@ -141,6 +153,15 @@ def combine_and_shuffle(
                 all_observations = np.vstack((all_observations, observations))
                 all_weights = np.vstack((all_weights, k_factor * weights))
 
+            # Nuisance coefficients are ratios of weights and thus not affected by k factors
+            if nuisance_coefficients is not None:
+                nuisance_a, nuisance_b = nuisance_coefficients
+                if all_nuisance_a is None:
+                    all_nuisance_a, all_nuisance_b = nuisance_a, nuisance_b
+                else:
+                    all_nuisance_a = np.vstack((all_nuisance_a, nuisance_a))
+                    all_nuisance_b = np.vstack((all_nuisance_b, nuisance_b))
+
             if all_sampling_ids is None:
                 all_sampling_ids = sampling_ids
             elif sampling_ids is not None:
@@ -149,7 +170,13 @@ def combine_and_shuffle(
         logger.debug("Combined sampling benchmarks: %s", all_sampling_ids)
 
     # Shuffle
-    all_observations, all_weights, all_sampling_ids = shuffle(all_observations, all_weights, all_sampling_ids)
+    all_observations, all_weights, all_sampling_ids, all_nuisance_a, all_nuisance_b = shuffle(
+        all_observations,
+        all_weights,
+        all_sampling_ids,
+        all_nuisance_a,
+        all_nuisance_b,
+    )
 
     # Recalculate header info: number of events
     if recalculate_header:
@@ -173,6 +200,7 @@ def combine_and_shuffle(
         sample_observations=all_observations,
         sample_weights=all_weights,
         sampling_ids=all_sampling_ids,
+        nuisance_coefficients=None if all_nuisance_a is None else (all_nuisance_a, all_nuisance_b),
     )
 
     if all_n_events_background + np.sum(all_n_events_signal_per_benchmark) > 0:
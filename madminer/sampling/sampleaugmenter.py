@@ -68,11 +68,34 @@ class SampleAugmenter(DataAnalyzer):
     include_nuisance_parameters : bool, optional
         If True, nuisance parameters are taken into account. Default value: True.
 
+    max_morphing_error : float or None, optional
+        If not None, parameter points at which the morphing error `sqrt(sum_b w_b(theta)^2)` exceeds this value are
+        reported before any events are sampled. The error is looked up in the morphing error surface stored in the
+        MadMiner file (see `PhysicsMorpher.calculate_morphing_error_surface()`) and only calculated directly for points
+        it does not cover. Default value: None.
+
+    morphing_error_action : {"warn", "raise"}, optional
+        Whether parameter points exceeding `max_morphing_error` lead to a warning or to a RuntimeError. Default value:
+        "warn".
+
     """
 
-    def __init__(self, filename, disable_morphing=False, include_nuisance_parameters=True):
+    def __init__(
+        self,
+        filename,
+        disable_morphing=False,
+        include_nuisance_parameters=True,
+        max_morphing_error=None,
+        morphing_error_action="warn",
+    ):
         super().__init__(filename, disable_morphing, include_nuisance_parameters)
 
+        if morphing_error_action not in ["warn", "raise"]:
+            raise ValueError(f"Invalid morphing error action: {morphing_error_action}")
+
+        self.max_morphing_error = max_morphing_error
+        self.morphing_error_action = morphing_error_action
+
     def sample_train_plain(
         self,
         theta,
@@ -1302,6 +1325,7 @@ class SampleAugmenter(DataAnalyzer):
             augmented_data_definitions = []
 
         n_sets, n_params = self._check_sets(sets)
+        self._check_morphing_errors(sets)
 
         # What needs to be calculated?
         needs_gradients = self._check_gradient_need(augmented_data_definitions)
@@ -1462,6 +1486,47 @@ class SampleAugmenter(DataAnalyzer):
 
         return n_sets, n_params
 
+    def _check_morphing_errors(self, sets):
+        if self.max_morphing_error is None or self.morpher is None:
+            return
+
+        thetas = [theta for set_ in sets for theta, _ in set_ if not isinstance(theta, (str, int, np.integer))]
+        if len(thetas) == 0:
+            return
+
+        thetas = np.asarray(thetas, dtype=np.float64).reshape((-1, self.n_parameters))
+        morphing_errors = self._calculate_morphing_errors(thetas)
+        too_large = morphing_errors > self.max_morphing_error
+        n_too_large = np.sum(too_large)
+
+        if n_too_large == 0:
+            return
+
+        i_max = np.argmax(morphing_errors)
+        message = (
+            f"{n_too_large} of {len(thetas)} parameter points have a morphing error sqrt(sum w_i^2) above "
+            f"{self.max_morphing_error} (largest: {morphing_errors[i_max]} at theta = {thetas[i_max]})"
+        )
+        if self.morphing_error_action == "raise":
+            raise RuntimeError(message)
+        logger.warning(message)
+
+    def _calculate_morphing_errors(self, thetas):
+        morphing_errors = np.full(len(thetas), np.nan)
+
+        # Cheap lookup in the stored surface
+        surface = self.morpher.morphing_error_surface
+        if surface is not None:
+            morphing_errors = surface(thetas)
+
+        # Direct calculation for points not covered by the surface
+        missing = ~np.isfinite(morphing_errors)
+        if np.any(missing):
+            weights = self.morphing_kernel.weights(thetas[missing])
+            morphing_errors[missing] = np.sum(weights * weights, axis=1) ** 0.5
+
+        return morphing_errors
+
     @staticmethod
     def _check_gradient_need(augmented_data_definitions):
         for definition in augmented_data_definitions:
@@ -1493,7 +1558,6 @@ class SampleAugmenter(DataAnalyzer):
         # Parse thetas and nus
         thetas, nus = [], []
         theta_values, nu_values = [], []
-        theta_matrices, theta_gradient_matrices = [], []
 
         logger.debug("Drawing %s events for the following parameter points:", n_samples)
 
@@ -1512,10 +1576,6 @@ class SampleAugmenter(DataAnalyzer):
                 nu_value = self._get_nu_value(nu)
                 nu_values.append(np.broadcast_to(nu_value, (n_samples, nu_value.size)).astype(dtype))
 
-            theta_matrices.append(self._get_theta_benchmark_matrix(theta))
-            if needs_gradients:
-                theta_gradient_matrices.append(self._get_dtheta_benchmark_matrix(theta))
-
             if i_param == sampling_index:
                 logger.debug("  %s: theta = %s, nu = %s (sampling)", i_param, theta_value[0, :], nu_value)
             else:
@@ -1523,6 +1583,10 @@ class SampleAugmenter(DataAnalyzer):
 
         theta_value_sampling = theta_values[sampling_index][0, :]
 
+        # Benchmark weights for all parameter points at once
+        theta_matrices = self.morphing_kernel.weights(thetas)
+        theta_gradient_matrices = self.morphing_kernel.gradients(thetas) if needs_gradients else []
+
         # Cross sections
         xsecs, xsec_uncertainties = self.xsecs(
             thetas,
@@ -1591,15 +1655,18 @@ class SampleAugmenter(DataAnalyzer):
             cumulative_p = np.array([0.0])
 
             # Loop over weighted events
-            for x_batch, weights_benchmarks_batch in self.event_loader(
+            for x_batch, weights_benchmarks_batch, nuisance_coefficients in self.event_loader(
                 start=start_event,
                 end=end_event,
                 generated_close_to=None if not sample_only_from_closest_benchmark else theta_value_sampling,
+                return_nuisance_coefficients=True,
             ):
                 weights_benchmarks_batch *= correction_factor
 
-                # Weights
-                weights = self._weights(thetas, nus, weights_benchmarks_batch, theta_matrices)
+                # Weights, with the nuisance coefficients stored in the file (if any)
+                weights = self._weights(
+                    thetas, nus, weights_benchmarks_batch, theta_matrices, nuisance_coefficients=nuisance_coefficients
+                )
                 if needs_gradients:
                     weight_gradients = self._weight_gradients(
                         thetas,
@@ -1608,6 +1675,7 @@ class SampleAugmenter(DataAnalyzer):
                         gradients="all" if nuisance_score else "theta",
                         theta_matrices=theta_matrices,
                         theta_gradient_matrices=theta_gradient_matrices,
+                        nuisance_coefficients=nuisance_coefficients,
                     )
                 else:
                     weight_gradients = None
@@ -0,0 +1,437 @@
+import logging
+import time
+
+from typing import Callable
+
+import numpy as np
+import vector
+
+from madminer.utils.expressions import Expression
+from madminer.utils.expressions import compile_expression
+
+logger = logging.getLogger(__name__)
+
+
+class UnsupportedExpression(Exception):
+    """Raised when an expression cannot be evaluated on whole arrays of events at once"""
+
+
+class ParticleArray:
+    """
+    One particle per event, for a whole chunk of events. This is the columnar counterpart of `MadMinerParticle`:
+    the four-momentum is a `vector` NumPy array, so properties and methods like `pt`, `eta`, `m`, or `deltaR()` act on
+    all events at once, while `charge`, `pdgid`, `spin`, and the tags are stored as NumPy arrays.
+
+    Parameters
+    ----------
+    momentum : vector.MomentumNumpy4D
+        Four-momenta with shape `(n_events,)`.
+
+    charge, pdgid, spin, tau_tag, b_tag, t_tag : ndarray or None, optional
+        Particle properties with shape `(n_events,)`. Default value: None.
+    """
+
+    def __init__(self, momentum, charge=None, pdgid=None, spin=None, tau_tag=None, b_tag=None, t_tag=None):
+        self.momentum = momentum
+        self.charge = charge
+        self.pdgid = pdgid
+        self.spin = spin
+        self.tau_tag = tau_tag
+        self.b_tag = b_tag
+        self.t_tag = t_tag
+
+    @classmethod
+    def from_xyzt(cls, x, y, z, t, **properties):
+        momentum = vector.array({"px": x, "py": y, "pz": z, "E": t})
+        return cls(momentum, **properties)
+
+    @classmethod
+    def from_rhophietat(cls, rho, phi, eta, t, **properties):
+        momentum = vector.array({"pt": rho, "phi": phi, "eta": eta, "E": t})
+        return cls(momentum, **properties)
+
+    @classmethod
+    def from_rhophietatau(cls, rho, phi, eta, tau, **properties):
+        momentum = vector.array({"pt": rho, "phi": phi, "eta": eta, "mass": tau})
+        return cls(momentum, **properties)
+
+    def __getattr__(self, name):
+        if name.startswith("_") or name == "momentum":
+            raise AttributeError(name)
+
+        attribute = getattr(self.momentum, name)
+
+        if callable(attribute):
+
+            def method(*args, **kwargs):
+                args = [arg.momentum if isinstance(arg, ParticleArray) else arg for arg in args]
+                return _wrap(attribute(*args, **kwargs))
+
+            return method
+
+        return _wrap(attribute)
+
+    def __add__(self, other):
+        return self._combine(other, self.momentum + self._momentum_of(other), np.add)
+
+    def __sub__(self, other):
+        return self._combine(other, self.momentum - self._momentum_of(other), np.subtract)
+
+    def __bool__(self):
+        raise UnsupportedExpression("Truth value of a particle array")
+
+    @staticmethod
+    def _momentum_of(other):
+        if not isinstance(other, ParticleArray):
+            raise UnsupportedExpression(f"Cannot combine particle array with {type(other)}")
+        return other.momentum
+
+    def _combine(self, other, momentum, charge_operation):
+        return ParticleArray(
+            momentum,
+            charge=None if self.charge is None or other.charge is None else charge_operation(self.charge, other.charge),
+            tau_tag=_either(self.tau_tag, other.tau_tag),
+            b_tag=_either(self.b_tag, other.b_tag),
+            t_tag=_either(self.t_tag, other.t_tag),
+        )
+
+
+class ObjectCollection:
+    """
+    A list of objects (for instance all jets) in each event of a chunk, sorted as the event-by-event lists.
+
+    Indexing with an integer `i` returns a `ParticleArray` with the i-th object of every event. Events in which this
+    object does not exist are recorded in `ObjectCollection.missing`, so that the expression evaluating them can be
+    treated as failed for exactly these events (like the IndexError raised in the event-by-event analysis).
+
+    Parameters
+    ----------
+    counts : ndarray
+        Number of objects per event with shape `(n_events,)`.
+
+    columns : dict
+        Padded object properties: the four-momentum as "px", "py", "pz", "e", as "pt", "phi", "eta", "e", or as
+        "pt", "phi", "eta", "mass" (float, padded with NaN) and, optionally, "charge", "pdgid", "spin", "tau_tag",
+        "b_tag", "t_tag", each with shape `(n_events, max(counts))`.
+    """
+
+    def __init__(self, counts, columns):
+        self.counts = counts
+        self.columns = columns
+        self.n_events = len(counts)
+        self.missing = np.zeros(self.n_events, dtype=bool)
+
+    @classmethod
+    def from_flat(cls, event_index, n_events, columns, sort_key=None):
+        """
+        Builds a collection from flat per-object arrays.
+
+        Parameters
+        ----------
+        event_index : ndarray
+            Event index for each object, with shape `(n_objects,)` and in ascending order.
+
+        n_events : int
+            Number of events in the chunk.
+
+        columns : dict
+            Flat object properties, each with shape `(n_objects,)`.
+
+        sort_key : ndarray or None, optional
+            If not None, objects are sorted by descending values of this key within each event. Ties keep the
+            original order. Default value: None.
+
+        Returns
+        -------
+        collection : ObjectCollection
+            The collection.
+        """
+
+        if sort_key is not None:
+            order = np.lexsort((-sort_key, event_index))
+            event_index = event_index[order]
+            columns = {key: values[order] for key, values in columns.items()}
+
+        counts = np.bincount(event_index, minlength=n_events)
+        starts = np.cumsum(counts) - counts
+        position = np.arange(len(event_index)) - starts[event_index]
+        n_max = int(np.max(counts)) if n_events > 0 else 0
+
+        padded_columns = {}
+        for key, values in columns.items():
+            padded = np.full((n_events, n_max), _padding(values.dtype), dtype=values.dtype)
+            padded[event_index, position] = values
+            padded_columns[key] = padded
+
+        return cls(counts, padded_columns)
+
+    def reset_missing(self):
+        self.missing = np.zeros(self.n_events, dtype=bool)
+
+    def __getitem__(self, index):
+        if isinstance(index, (bool, np.bool_)) or not isinstance(index, (int, np.integer)):
+            raise UnsupportedExpression(f"Unsupported index {index}")
+
+        positions = np.full(self.n_events, index) if index >= 0 else self.counts + index
+        missing = (positions < 0) | (positions >= self.counts)
+        self.missing |= missing
+
+        n_max = next(iter(self.columns.values())).shape[1]
+        positions = np.clip(positions, 0, max(n_max - 1, 0))
+        rows = np.arange(self.n_events)
+
+        values = {}
+        for key, padded in self.columns.items():
+            if n_max == 0:
+                column = np.full(self.n_events, _padding(padded.dtype), dtype=padded.dtype)
+            else:
+                column = padded[rows, positions]
+                column = np.where(missing, _padding(padded.dtype), column)
+            values[key] = column
+
+        if "mass" in values:
+            return ParticleArray.from_rhophietatau(
+                values.pop("pt"),
+                values.pop("phi"),
+                values.pop("eta"),
+                values.pop("mass"),
+                **values,
+            )
+
+        if "phi" in values:
+            return ParticleArray.from_rhophietat(
+                values.pop("pt"),
+                values.pop("phi"),
+                values.pop("eta"),
+                values.pop("e"),
+                **values,
+            )
+
+        return ParticleArray.from_xyzt(
+            values.pop("px"),
+            values.pop("py"),
+            values.pop("pz"),
+            values.pop("e"),
+            **values,
+        )
+
+    def __len__(self):
+        raise UnsupportedExpression("Python len() of an object collection")
+
+    def __iter__(self):
+        raise UnsupportedExpression("Iteration over an object collection")
+
+
+def vectorized_math_commands():
+    """Provides the NumPy counterparts of `madminer.utils.various.math_commands()`"""
+    return {
+        "acos": np.arccos,
+        "asin": np.arcsin,
+        "atan": np.arctan,
+        "atan2": np.arctan2,
+        "ceil": np.ceil,
+        "cos": np.cos,
+        "cosh": np.cosh,
+        "exp": np.exp,
+        "floor": np.floor,
+        "log": _log,
+        "pi": np.pi,
+        "pow": np.power,
+        "sin": np.sin,
+        "sinh": np.sinh,
+        "sqrt": np.sqrt,
+        "tan": np.tan,
+        "tanh": np.tanh,
+        "len": _len,
+    }
+
+
+def evaluate_expression(definition, variables, collections, n_events, strict=False, unsupported=None):
+    """
+    Evaluates a string expression on a whole chunk of events.
+
+    Parameters
+    ----------
+    definition : str or Expression
+        Expression, with the same conventions as for the event-by-event evaluation.
+
+    variables : dict
+        Namespace with `ObjectCollection`, `ParticleArray`, and array entries, plus `vectorized_math_commands()`.
+
+    collections : list of ObjectCollection
+        All collections in the namespace, used to find the events in which the expression is not defined.
+
+    n_events : int
+        Number of events in the chunk.
+
+    strict : bool, optional
+        If True, invalid operations and overflows (for instance `sqrt(-1.)`) are not silently turned into NaN or
+        inf, but make the expression unsupported, so that the event-by-event evaluation can raise the same errors
+        as before. Default value: False.
+
+    unsupported : set or None, optional
+        Definitions that turned out not to be vectorizable before, for instance in earlier chunks of the same
+        analysis. Definitions that fail for structural reasons are added to it, and are not tried on arrays again.
+        Default value: None.
+
+    Returns
+    -------
+    values : ndarray
+        Values with shape `(n_events,)`, or None if the expression failed for all events.
+
+    failed : ndarray
+        Boolean array with shape `(n_events,)` that is True for events in which the expression is not defined.
+
+    Raises
+    ------
+    UnsupportedExpression
+        If the expression cannot be evaluated on arrays and has to be evaluated event by event.
+    """
+
+    # Syntax errors affect every event equally
+    try:
+        expression = definition if isinstance(definition, Expression) else compile_expression(definition)
+    except SyntaxError:
+        return None, np.ones(n_events, dtype=bool)
+
+    if unsupported is None:
+        unsupported = set()
+    if expression.definition in unsupported:
+        raise UnsupportedExpression("Expression was not vectorizable before")
+
+    for collection in collections:
+        collection.reset_missing()
+
+    start = time.perf_counter()
+    try:
+        errors = "raise" if strict else "ignore"
+        with np.errstate(divide="raise", over=errors, invalid=errors, under="ignore"):
+            values = eval(expression.code, variables)
+
+    # Undefined names affect every event equally
+    except NameError:
+        return None, np.ones(n_events, dtype=bool)
+    except UnsupportedExpression:
+        unsupported.add(expression.definition)
+        raise
+    # Floating-point errors depend on the events in this chunk, so other chunks may still work on arrays
+    except FloatingPointError as e:
+        raise UnsupportedExpression(f"{type(e).__name__}: {e}") from e
+    except Exception as e:
+        unsupported.add(expression.definition)
+        raise UnsupportedExpression(f"{type(e).__name__}: {e}") from e
+
+    try:
+        values = _check_values(values, n_events)
+    except UnsupportedExpression:
+        unsupported.add(expression.definition)
+        raise
+
+    expression.record(n_events, time.perf_counter() - start, vectorized=True)
+
+    failed = np.zeros(n_events, dtype=bool)
+    for collection in collections:
+        failed |= collection.missing
+
+    return values, failed
+
+
+def evaluate_definition(
+    definition,
+    variables,
+    collections,
+    n_events,
+    event_variables,
+    exceptions,
+    evaluated=None,
+    function_arguments=None,
+    unsupported=None,
+):
+    """
+    Evaluates a definition on a chunk of events, falling back to the event-by-event evaluation for the events in
+    `evaluated` if it cannot be vectorized. Returns values and a mask of events in which the definition failed.
+
+    Functions are only allowed if function_arguments is given, they are then called event by event with the
+    event-by-event variables of these names. Definitions that cannot be vectorized are remembered in the set
+    unsupported, see `evaluate_expression()`.
+    """
+
+    if isinstance(definition, str):
+        try:
+            values, failed = evaluate_expression(definition, variables, collections, n_events, unsupported=unsupported)
+            if values is None:
+                values = np.full(n_events, np.nan)
+            return values, failed
+        except UnsupportedExpression as e:
+            logger.debug("Evaluating %s event by event: %s", definition, e)
+
+    values = np.full(n_events, np.nan)
+    failed = np.zeros(n_events, dtype=bool)
+    events = range(n_events) if evaluated is None else np.flatnonzero(evaluated)
+    expression = compile_expression(definition) if isinstance(definition, str) else None
+
+    start = time.perf_counter()
+    for i_event in events:
+        this_variables = event_variables(i_event)
+        try:
+            if expression is not None:
+                values[i_event] = expression(this_variables)
+            elif function_arguments is not None and isinstance(definition, Callable):
+                values[i_event] = definition(*[this_variables[name] for name in function_arguments])
+            else:
+                raise TypeError("Not a valid definition")
+        except exceptions:
+            failed[i_event] = True
+
+    # The event-by-event fallback is timed as a whole, including building the objects of the events
+    if expression is not None:
+        expression.record(len(events), time.perf_counter() - start)
+
+    return values, failed
+
+
+def _check_values(values, n_events):
+    if values is None or isinstance(values, (ParticleArray, ObjectCollection)):
+        raise UnsupportedExpression(f"Expression returns {type(values)}")
+
+    values = np.asarray(values)
+    if values.dtype == object:
+        raise UnsupportedExpression("Expression returns Python objects")
+    if values.ndim == 0:
+        values = np.full(n_events, values)
+    if values.shape != (n_events,):
+        raise UnsupportedExpression(f"Expression returns shape {values.shape}")
+
+    return values
+
+
+def _wrap(value):
+    if isinstance(value, vector.MomentumNumpy4D):
+        return ParticleArray(value)
+    return value
+
+
+def _either(tags, other_tags):
+    if tags is None or other_tags is None:
+        return None
+    return np.logical_or(tags, other_tags)
+
+
+def _padding(dtype):
+    if np.issubdtype(dtype, np.floating):
+        return np.nan
+    if np.issubdtype(dtype, np.bool_):
+        return False
+    return 0
+
+
+def _log(x, base=None):
+    if base is None:
+        return np.log(x)
+    return np.log(x) / np.log(base)
+
+
+def _len(obj):
+    if isinstance(obj, ObjectCollection):
+        return obj.counts
+    return len(obj)
@@ -0,0 +1,117 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Compiled expressions (or the SyntaxError raised while compiling them), keyed by their definition string
+_EXPRESSIONS = {}
+
+
+class Expression:
+    """
+    Observable, cut, or efficiency definition that is compiled once and then evaluated many times, either event by
+    event (`expression(variables)`) or on whole columns of events (see `madminer.utils.columnar`).
+
+    The columnar evaluations and their event-by-event fallbacks are timed per chunk of events, so that slow
+    definitions can be spotted with `expression_timings()`.
+
+    Parameters
+    ----------
+    definition : str
+        Expression that can be parsed by Python's `eval()` function.
+    """
+
+    def __init__(self, definition):
+        self.definition = definition
+        self.code = compile(definition, "<expression>", "eval")
+
+        self.n_events = 0
+        self.n_vectorized_events = 0
+        self.time = 0.0
+
+    def __call__(self, variables):
+        """Evaluates the expression for a single event with the given variables"""
+
+        return eval(self.code, variables)
+
+    def record(self, n_events, duration, vectorized=False):
+        """Adds the time spent evaluating the expression for a number of events"""
+
+        self.n_events += n_events
+        self.time += duration
+        if vectorized:
+            self.n_vectorized_events += n_events
+
+
+def compile_expression(definition):
+    """
+    Returns the compiled `Expression` for a definition, compiling each definition only once.
+
+    Parameters
+    ----------
+    definition : str
+        Expression that can be parsed by Python's `eval()` function.
+
+    Returns
+    -------
+    expression : Expression
+        Compiled expression.
+
+    Raises
+    ------
+    SyntaxError
+        If the definition is not a valid Python expression (like `eval()` would).
+    """
+
+    try:
+        expression = _EXPRESSIONS[definition]
+    except KeyError:
+        try:
+            expression = Expression(definition)
+        except SyntaxError as e:
+            expression = e
+        _EXPRESSIONS[definition] = expression
+
+    if isinstance(expression, SyntaxError):
+        raise expression
+
+    return expression
+
+
+def expression_timings():
+    """
+    Returns the accumulated evaluation time of all compiled expressions.
+
+    Returns
+    -------
+    timings : list of tuple
+        Tuples `(definition, n_events, n_vectorized_events, time)`, sorted by descending time (in seconds).
+    """
+
+    timings = [
+        (expression.definition, expression.n_events, expression.n_vectorized_events, expression.time)
+        for expression in _EXPRESSIONS.values()
+        if isinstance(expression, Expression) and expression.n_events > 0
+    ]
+    return sorted(timings, key=lambda timing: -timing[3])
+
+
+def reset_expression_timings():
+    """Resets the accumulated evaluation times of all compiled expressions."""
+
+    for expression in _EXPRESSIONS.values():
+        if isinstance(expression, Expression):
+            expression.n_events = 0
+            expression.n_vectorized_events = 0
+            expression.time = 0.0
+
+
+def log_expression_timings(n_max=10):
+    """Logs the slowest expressions on debug level."""
+
+    timings = expression_timings()
+    if len(timings) == 0:
+        return
+
+    logger.debug("Slowest expressions (accumulated time, events, vectorized events):")
+    for definition, n_events, n_vectorized_events, duration in timings[:n_max]:
+        logger.debug("  %8.3f s, %9d, %9d: %s", duration, n_events, n_vectorized_events, definition)
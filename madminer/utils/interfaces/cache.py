@@ -0,0 +1,384 @@
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import time
+
+from collections import OrderedDict
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Suffix of the sidecar files, which are stored next to the input files
+CACHE_SUFFIX = ".madminer-cache.h5"
+
+# Increase when the analysis changes in a way that invalidates cached results
+_CACHE_FORMAT_VERSION = 1
+
+# Number of analysis results kept per input file, older ones are removed first
+_MAX_CACHED_RESULTS = 10
+
+
+def cache_filename(filename):
+    """Returns the path of the sidecar cache file of an input file"""
+    return str(filename) + CACHE_SUFFIX
+
+
+def file_signature(filename):
+    """Returns a string that changes when a file is modified, based on its size and modification time"""
+    stat = os.stat(filename)
+    return json.dumps([stat.st_size, stat.st_mtime_ns])
+
+
+def definition_hash(*settings):
+    """
+    Hashes an analysis definition, for instance observables, cuts, efficiencies, smearing and systematics settings.
+
+    Parameters
+    ----------
+    settings
+        Any combination of strings, numbers, None, lists, tuples, dicts, NumPy arrays, dataclasses (like
+        `Observable`), and functions. Functions are identified by their module, name, byte code, default arguments,
+        the values captured in their closures, and the module-level functions, numbers, strings, and arrays they refer
+        to by name. Other globals (like modules or class instances) and attributes of them are not part of the hash,
+        so changing them does not invalidate cached results.
+
+    Returns
+    -------
+    key : str
+        Hex digest that changes whenever any of the settings (or their order) changes.
+    """
+
+    text = repr(_canonical((_CACHE_FORMAT_VERSION,) + settings))
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _canonical(obj, functions=()):
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    if isinstance(obj, (np.integer, np.floating, np.bool_)):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return ("array", obj.dtype.str, obj.shape, obj.tolist())
+    if isinstance(obj, Path):
+        return str(obj)
+    if isinstance(obj, dict):
+        return ("dict", [(_canonical(key, functions), _canonical(value, functions)) for key, value in obj.items()])
+    if isinstance(obj, (list, tuple)):
+        return [_canonical(value, functions) for value in obj]
+    if dataclasses.is_dataclass(obj):
+        return (
+            type(obj).__name__,
+            [_canonical(getattr(obj, field.name), functions) for field in dataclasses.fields(obj)],
+        )
+    if callable(obj) and hasattr(obj, "__code__"):
+        # Recursive functions capture themselves
+        if id(obj) in functions:
+            return ("function", obj.__qualname__)
+        functions = functions + (id(obj),)
+        code = obj.__code__
+        return (
+            "function",
+            obj.__module__,
+            obj.__qualname__,
+            code.co_code.hex(),
+            repr(code.co_consts),
+            _canonical(getattr(obj, "__defaults__", None), functions),
+            _canonical(getattr(obj, "__kwdefaults__", None), functions),
+            [_canonical(_cell_contents(cell), functions) for cell in getattr(obj, "__closure__", None) or ()],
+            [
+                (name, _canonical(value, functions))
+                for name, value in _referenced_globals(obj)
+                if _is_hashable_global(value)
+            ],
+        )
+    # Objects without a stable description are never found in the cache
+    return repr(obj)
+
+
+def _referenced_globals(function):
+    """Returns the module-level names and values that a function (or code nested in it) refers to, sorted by name"""
+
+    namespace = getattr(function, "__globals__", None) or {}
+    names = set()
+    codes = [function.__code__]
+    while codes:
+        code = codes.pop()
+        names.update(code.co_names)
+        codes.extend(const for const in code.co_consts if hasattr(const, "co_names"))
+
+    return [(name, namespace[name]) for name in sorted(names) if name in namespace]
+
+
+def _is_hashable_global(value):
+    if value is None or isinstance(value, (bool, int, float, str, np.generic, np.ndarray)):
+        return True
+    if isinstance(value, (list, tuple)):
+        return all(_is_hashable_global(item) for item in value)
+    if isinstance(value, dict):
+        return all(_is_hashable_global(key) and _is_hashable_global(item) for key, item in value.items())
+    return callable(value) and hasattr(value, "__code__")
+
+
+def _cell_contents(cell):
+    try:
+        return cell.cell_contents
+    except ValueError:  # Empty cell
+        return ("empty cell",)
+
+
+class AnalysisCache:
+    """
+    Sidecar HDF5 file that caches the analysis of one input file (an LHE or Delphes ROOT file).
+
+    It stores two kinds of entries: the analysis results (observations and weights), keyed by a hash of the analysis
+    definition (see `definition_hash()`), and, for LHE files, the parsed particle-level columns, keyed by a hash of
+    the parsing settings. The latter can be analysed again without parsing the LHE file when only the observables,
+    cuts, efficiencies, or smearing change. All entries are discarded when the input file changes, which is detected
+    from its size and modification time.
+
+    Errors while reading or writing the cache file (for instance in read-only directories) are logged and otherwise
+    ignored, the analysis then proceeds without cache.
+
+    Parameters
+    ----------
+    filename : str or Path
+        Path to the input file.
+    """
+
+    def __init__(self, filename):
+        self.filename = str(filename)
+        self.cache_filename = cache_filename(filename)
+
+    def _open(self, mode):
+        """Opens the cache file, discarding its entries if the input file changed. Returns None on errors."""
+
+        if mode == "r" and not os.path.exists(self.cache_filename):
+            return None
+
+        try:
+            signature = file_signature(self.filename)
+            file = h5py.File(self.cache_filename, mode)
+        except OSError as e:
+            logger.warning("Cannot open analysis cache %s: %s", self.cache_filename, e)
+            return None
+
+        if file.attrs.get("signature") != signature:
+            if mode == "r":
+                file.close()
+                return None
+            logger.debug("Input file %s changed, clearing its analysis cache", self.filename)
+            for name in list(file.keys()):
+                del file[name]
+            file.attrs["signature"] = signature
+
+        return file
+
+    def load_results(self, key):
+        """
+        Loads cached analysis results.
+
+        Parameters
+        ----------
+        key : str
+            Hash of the analysis definition.
+
+        Returns
+        -------
+        results : tuple or None
+            None if there are no results for this key. Otherwise a tuple `(observations, weights, n_events)` with
+            OrderedDicts of observations and weights (both None if no events passed the analysis) and the number of
+            events.
+        """
+
+        file = self._open("r")
+        if file is None:
+            return None
+
+        with file:
+            group = file.get(f"results/{key}")
+            if group is None:
+                return None
+
+            n_events = int(group.attrs["n_events"])
+            if n_events == 0:
+                return None, None, 0
+
+            observations = _load_columns(group["observations"])
+            weights = _load_columns(group["weights"])
+
+        logger.info("  Using cached analysis results from %s", self.cache_filename)
+        return observations, weights, n_events
+
+    def save_results(self, key, observations, weights, n_events):
+        """
+        Saves analysis results.
+
+        Parameters
+        ----------
+        key : str
+            Hash of the analysis definition.
+
+        observations : OrderedDict or None
+            Observations with shape `(n_events,)` each.
+
+        weights : OrderedDict or None
+            Weights with shape `(n_events,)` each.
+
+        n_events : int
+            Number of events.
+
+        Returns
+        -------
+            None
+        """
+
+        file = self._open("a")
+        if file is None:
+            return
+
+        with file:
+            results = file.require_group("results")
+            if key in results:
+                del results[key]
+
+            group = results.create_group(key)
+            group.attrs["n_events"] = n_events
+            group.attrs["created"] = time.time()
+            if n_events > 0:
+                _save_columns(group.create_group("observations"), observations)
+                _save_columns(group.create_group("weights"), weights)
+
+            # Remove the oldest results
+            keys = sorted(results.keys(), key=lambda name: results[name].attrs["created"])
+            for old_key in keys[:-_MAX_CACHED_RESULTS]:
+                del results[old_key]
+
+    def load_events(self, key, chunk_size):
+        """
+        Loads cached particle-level columns of an LHE file in chunks of events.
+
+        Parameters
+        ----------
+        key : str
+            Hash of the parsing settings.
+
+        chunk_size : int
+            Number of events per chunk.
+
+        Returns
+        -------
+        chunks : generator or None
+            None if there are no complete columns for this key. Otherwise a generator of tuples
+            `(particle_rows, multiplicities, weights, weight_names, global_event_data)`, where particle_rows has
+            shape `(n_particles, 6)` with columns (pdgid, px, py, pz, e, spin), multiplicities and weights have
+            shapes `(n_events,)` and `(n_events, n_weights)`, and global_event_data is None or a dict of arrays
+            with shape `(n_events,)`. Only one chunk at a time is read from the cache file.
+        """
+
+        file = self._open("r")
+        if file is None:
+            return None
+
+        with file:
+            group = file.get(f"events/{key}")
+            if group is None or not group.attrs["complete"]:
+                return None
+
+        logger.info("  Using cached events from %s", self.cache_filename)
+        return self._iterate_events(key, chunk_size)
+
+    def _iterate_events(self, key, chunk_size):
+        with h5py.File(self.cache_filename, "r") as file:
+            group = file[f"events/{key}"]
+            weight_names = json.loads(group.attrs["weight_names"])
+            multiplicities = group["multiplicities"][()]
+            particle_ends = np.cumsum(multiplicities)
+
+            for start in range(0, len(multiplicities), chunk_size):
+                end = min(start + chunk_size, len(multiplicities))
+                particle_start = particle_ends[start - 1] if start > 0 else 0
+
+                global_event_data = None
+                if "global_event_data" in group:
+                    global_event_data = {name: values[start:end] for name, values in group["global_event_data"].items()}
+
+                yield (
+                    group["particle_rows"][particle_start : particle_ends[end - 1]],
+                    multiplicities[start:end],
+                    group["weights"][start:end],
+                    weight_names,
+                    global_event_data,
+                )
+
+    def events_writer(self, key):
+        """
+        Returns an `EventsWriter` that stores particle-level columns of an LHE file chunk by chunk, or None if the
+        cache file cannot be written.
+        """
+
+        file = self._open("a")
+        if file is None:
+            return None
+
+        events = file.require_group("events")
+        if key in events:
+            del events[key]
+        return EventsWriter(file, events.create_group(key))
+
+
+class EventsWriter:
+    """Appends chunks of parsed LHE events to an `AnalysisCache`, see `AnalysisCache.load_events()`"""
+
+    def __init__(self, file, group):
+        self.file = file
+        self.group = group
+        self.group.attrs["complete"] = False
+
+    def append(self, particle_rows, multiplicities, weights, weight_names, global_event_data=None):
+        if "multiplicities" not in self.group:
+            self.group.attrs["weight_names"] = json.dumps(weight_names)
+            self.group.create_dataset("particle_rows", shape=(0, 6), maxshape=(None, 6), dtype=np.float64)
+            self.group.create_dataset("multiplicities", shape=(0,), maxshape=(None,), dtype=np.int64)
+            self.group.create_dataset(
+                "weights", shape=(0, len(weight_names)), maxshape=(None, len(weight_names)), dtype=np.float64
+            )
+            if global_event_data is not None:
+                global_group = self.group.create_group("global_event_data")
+                for name in global_event_data:
+                    global_group.create_dataset(name, shape=(0,), maxshape=(None,), dtype=np.float64)
+
+        _append(self.group["particle_rows"], np.asarray(particle_rows, dtype=np.float64).reshape((-1, 6)))
+        _append(self.group["multiplicities"], np.asarray(multiplicities, dtype=np.int64))
+        _append(self.group["weights"], np.asarray(weights, dtype=np.float64))
+        if global_event_data is not None:
+            for name, values in global_event_data.items():
+                _append(self.group["global_event_data"][name], np.asarray(values, dtype=np.float64))
+
+    def close(self, complete=True):
+        """Closes the cache file. Only complete columns are used by `AnalysisCache.load_events()`."""
+
+        if complete:
+            self.group.attrs["complete"] = True
+        self.file.close()
+
+
+def _append(dataset, values):
+    n = dataset.shape[0]
+    dataset.resize(n + len(values), axis=0)
+    dataset[n:] = values
+
+
+def _save_columns(group, columns):
+    group.attrs["names"] = json.dumps(list(columns.keys()))
+    for i, values in enumerate(columns.values()):
+        group.create_dataset(str(i), data=np.asarray(values))
+
+
+def _load_columns(group):
+    names = json.loads(group.attrs["names"])
+    return OrderedDict((name, group[str(i)][()]) for i, name in enumerate(names))
@@ -3,7 +3,8 @@ import logging
 from pathlib import Path
 
 from madminer.utils.various import call_command
-from madminer.utils.various import unzip_file
+from madminer.utils.various import open_file
+from madminer.utils.various import COMPRESSED_EXTENSIONS
 
 logger = logging.getLogger(__name__)
 
@@ -20,19 +21,14 @@ def run_delphes(
 ):
     """Runs Delphes on a HepMC sample"""
 
-    # Unzip event file
-    filename = Path(hepmc_sample_filename).with_suffix("")
-    extension = Path(hepmc_sample_filename).suffix
-    to_delete = None
-
-    if extension == ".gz":
-        logger.debug("Unzipping %s", hepmc_sample_filename)
-        if not filename.exists():
-            unzip_file(hepmc_sample_filename, filename)
-        if delete_unzipped_file:
-            to_delete = filename
+    if not delete_unzipped_file:
+        logger.warning(
+            "delete_unzipped_file is deprecated and has no effect, compressed HepMC files are no longer unzipped"
+        )
 
-        hepmc_sample_filename = str(filename)
+    # Compressed event files are decompressed on the fly and piped into Delphes, so no unzipped copy is written to disk
+    filename = Path(hepmc_sample_filename).with_suffix("")
+    is_compressed = Path(hepmc_sample_filename).suffix in COMPRESSED_EXTENSIONS
 
     # Where to put Delphes sample
     if delphes_sample_filename is None:
@@ -61,18 +57,24 @@ def run_delphes(
     else:
         initial_command = initial_command + "; "
 
-    # Call Delphes
-    _ = call_command(
-        f"{initial_command}{delphes_directory}/DelphesHepMC "
-        f"{delphes_card_filename} "
-        f"{delphes_sample_filename} "
-        f"{hepmc_sample_filename}",
-        log_file=log_file,
-    )
-
-    # Delete unzipped file
-    if to_delete is not None:
-        logger.debug("Deleting %s", to_delete)
-        Path(to_delete).unlink()
+    # Call Delphes (without input file, DelphesHepMC reads from standard input)
+    if is_compressed:
+        logger.debug("Streaming %s into Delphes", hepmc_sample_filename)
+        with open_file(hepmc_sample_filename, "rb") as hepmc_file:
+            _ = call_command(
+                f"{initial_command}{delphes_directory}/DelphesHepMC "
+                f"{delphes_card_filename} "
+                f"{delphes_sample_filename}",
+                log_file=log_file,
+                input_file=hepmc_file,
+            )
+    else:
+        _ = call_command(
+            f"{initial_command}{delphes_directory}/DelphesHepMC "
+            f"{delphes_card_filename} "
+            f"{delphes_sample_filename} "
+            f"{hepmc_sample_filename}",
+            log_file=log_file,
+        )
 
     return delphes_sample_filename
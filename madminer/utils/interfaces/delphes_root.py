@@ -1,3 +1,4 @@
+import ast
 import logging
 import os
 
@@ -6,20 +7,68 @@ from typing import Callable
 from typing import Dict
 from typing import List
 
+import awkward as ak
 import numpy as np
 import uproot
 
-from particle import Particle
 from madminer.models import Cut
 from madminer.models import Observable
+from madminer.utils.columnar import ObjectCollection
+from madminer.utils.columnar import ParticleArray
+from madminer.utils.columnar import evaluate_definition
+from madminer.utils.columnar import vectorized_math_commands
+from madminer.utils.expressions import compile_expression
+from madminer.utils.expressions import log_expression_timings
 from madminer.utils.particle import MadMinerParticle
+from madminer.utils.particle import get_pdg_table
 from madminer.utils.various import math_commands
 
 logger = logging.getLogger(__name__)
 
-# Sets uproot methods return types to be Numpy based
-# Ref: https://uproot.readthedocs.io/en/latest/uproot3-to-4.html#reading-arrays
-uproot.default_library = "np"
+# Electron and muon masses assigned to the reconstructed leptons
+_ELECTRON_MASS = 0.000511
+_MUON_MASS = 0.105
+
+# Fields read from the Delphes branches, the jet tags are optional
+_BRANCH_FIELDS = {
+    "Photon": ["PT", "Eta", "Phi", "E"],
+    "Electron": ["PT", "Eta", "Phi", "Charge"],
+    "Muon": ["PT", "Eta", "Phi", "Charge"],
+    "Jet": ["PT", "Eta", "Phi", "Mass", "TauTag", "BTag"],
+    "MissingET": ["MET", "Phi"],
+    "Particle": ["PT", "Eta", "Phi", "E", "PID"],
+    "GenJet": ["PT", "Eta", "Phi", "Mass", "TauTag", "BTag"],
+    "GenMissingET": ["MET", "Phi"],
+}
+_OPTIONAL_FIELDS = ["TauTag", "BTag"]
+
+# Delphes branches that the object collections are built from
+_COLLECTION_BRANCHES = {
+    "e": ["Electron"],
+    "j": ["Jet"],
+    "a": ["Photon"],
+    "mu": ["Muon"],
+    "l": ["Electron", "Muon"],
+    "met": ["MissingET"],
+}
+_TRUTH_COLLECTION_BRANCHES = {
+    "e": ["Particle"],
+    "j": ["GenJet"],
+    "a": ["Particle"],
+    "mu": ["Particle"],
+    "l": ["Particle"],
+    "met": ["GenMissingET"],
+}
+
+# Collections that the derived objects are built from
+_DERIVED_OBJECTS = {
+    "visible": ["e", "j", "mu", "a"],
+    "all": ["e", "j", "mu", "a", "met"],
+    "boost_to_com": ["e", "j", "mu", "a", "met"],
+}
+
+# Objects passed to observables defined through functions
+FUNCTION_OBJECTS = ["l", "a", "j", "met"]
 
 
 def parse_delphes_root_file(
@@ -37,11 +86,28 @@ def parse_delphes_root_file(
     acceptance_eta_max_a=None,
     acceptance_eta_max_j=None,
     delete_delphes_sample_file=False,
+    engine="columnar",
+    chunk_size=100000,
 ):
-    """Extracts observables and weights from a Delphes ROOT file"""
+    """
+    Extracts observables and weights from a Delphes ROOT file.
+
+    The file is processed in chunks of chunk_size events. The objects of each chunk are read from the ROOT file into
+    flat arrays, and the acceptance cuts are applied as array masks. Only the observations and weights of the events
+    that pass all cuts are kept, so the memory needed does not grow with the number of events in the file beyond
+    these outputs. With the columnar engine, observables and cuts are then evaluated on all events at once; definitions
+    that cannot be vectorized (for instance functions, or expressions with `if` or `and`) are evaluated event by event.
+    With the events engine, all definitions are evaluated event by event. In both cases, the objects of each event are
+    built at most once.
+
+    Only the branches of the objects that the observables and cuts use are read, see `get_used_collections()`.
+    """
 
     logger.debug("Parsing Delphes file %s", delphes_sample_file)
 
+    if engine not in ["events", "columnar"]:
+        raise ValueError(f"Unknown Delphes analysis engine {engine}")
+
     if weight_labels is None:
         logger.debug("Not extracting weights")
     else:
@@ -50,504 +116,719 @@ def parse_delphes_root_file(
     # Delphes ROOT file
     with uproot.open(delphes_sample_file) as root_file:
         tree = root_file["Delphes"]
+        n_events = tree.num_entries
+        logger.debug("Found %s events", n_events)
 
-    # Weights
-    weights = None
-    if weight_labels is not None:
-        try:
-            weights = tree.array("Weight.Weight")
+        collections_used = get_used_collections(observables, cuts)
+        logger.debug("Objects used by the observables and cuts: %s", ", ".join(collections_used))
+        branch_names = _get_branch_names(tree, use_generator_truth, collections_used)
+        if weight_labels is not None:
+            if "Weight.Weight" not in tree:
+                raise RuntimeError(
+                    "Extracting weights from Delphes ROOT file failed. Please install inofficial patches"
+                    " for the MG-Pythia interface and Delphes, available upong request, or parse weights"
+                    " from the LHE file!"
+                )
+            branch_names.append("Weight.Weight")
+        _log_skipped_branches(tree, branch_names)
+
+        # Loop over chunks of events
+        def chunks():
+            for entry_start in range(0, n_events, chunk_size):
+                entry_stop = min(entry_start + chunk_size, n_events)
+                n_events_chunk = entry_stop - entry_start
+                logger.debug("  Analysing events %s to %s", entry_start, entry_stop)
+
+                arrays = {
+                    name: tree[name].array(library="ak", entry_start=entry_start, entry_stop=entry_stop)
+                    for name in branch_names
+                }
+
+                # Get all particle properties
+                collections = _get_collections(
+                    arrays,
+                    use_generator_truth,
+                    collections_used,
+                    acceptance_pt_min_e,
+                    acceptance_pt_min_mu,
+                    acceptance_pt_min_a,
+                    acceptance_pt_min_j,
+                    acceptance_eta_max_e,
+                    acceptance_eta_max_mu,
+                    acceptance_eta_max_a,
+                    acceptance_eta_max_j,
+                )
+
+                chunk_weights = None
+                if weight_labels is not None:
+                    chunk_weights = ak.to_numpy(ak.flatten(arrays["Weight.Weight"]))
+                    chunk_weights = chunk_weights.reshape((n_events_chunk, -1)).T
+
+                yield collections, n_events_chunk, chunk_weights
+
+        observable_values, weights_dict, combined_filter = analyse_chunks(
+            chunks(), observables, cuts, weight_labels, engine
+        )
 
-            n_weights = len(weights[0])
-            n_events = len(weights)
+    # Delete Delphes file
+    if delete_delphes_sample_file:
+        logger.debug("  Deleting %s", delphes_sample_file)
+        os.remove(delphes_sample_file)
 
-            logger.debug("Found %s events, %s weights", n_events, n_weights)
+    return observable_values, weights_dict, combined_filter
 
-            weights = np.array(weights).reshape((n_events, n_weights)).T
-        except KeyError:
-            raise RuntimeError(
-                "Extracting weights from Delphes ROOT file failed. Please install inofficial patches"
-                " for the MG-Pythia interface and Delphes, available upong request, or parse weights"
-                " from the LHE file!"
-            )
-    else:
-        n_events = _get_n_events(tree)
-        logger.debug("Found %s events", n_events)
 
-    # Get all particle properties
-    if use_generator_truth:
-        photons_all_events = _get_particles_truth(tree, acceptance_pt_min_a, acceptance_eta_max_a, [22])
-        electrons_all_events = _get_particles_truth(tree, acceptance_pt_min_a, acceptance_eta_max_a, [11, -11])
-        muons_all_events = _get_particles_truth(tree, acceptance_pt_min_a, acceptance_eta_max_a, [13, -13])
-        leptons_all_events = _get_particles_truth_leptons(
-            tree, acceptance_pt_min_e, acceptance_eta_max_e, acceptance_pt_min_mu, acceptance_eta_max_mu
-        )
-        jets_all_events = _get_particles_truth_jets(tree, acceptance_pt_min_j, acceptance_eta_max_j)
-        met_all_events = _get_particles_truth_met(tree)
+def analyse_chunks(chunks, observables: Dict[str, Observable], cuts: List[Cut], weight_labels=None, engine="columnar"):
+    """
+    Evaluates observables and cuts on chunks of events and keeps the observations and weights of the events that pass
+    all required observables and cuts.
 
-    else:
-        photons_all_events = _get_particles_photons(tree, acceptance_pt_min_a, acceptance_eta_max_a)
-        electrons_all_events = _get_particles_charged(
-            tree, "Electron", 0.000511, -11, acceptance_pt_min_e, acceptance_eta_max_e
-        )
-        muons_all_events = _get_particles_charged(tree, "Muon", 0.105, -13, acceptance_pt_min_mu, acceptance_eta_max_mu)
-        leptons_all_events = _get_particles_leptons(
-            tree, acceptance_pt_min_e, acceptance_eta_max_e, acceptance_pt_min_mu, acceptance_eta_max_mu
-        )
-        jets_all_events = _get_particles_jets(tree, acceptance_pt_min_j, acceptance_eta_max_j)
-        met_all_events = _get_particles_met(tree)
-
-    # Prepare variables
-    def get_objects(ievent):
-        visible_momentum = MadMinerParticle.from_xyzt(0.0, 0.0, 0.0, 0.0)
-        for p in (
-            electrons_all_events[ievent]
-            + jets_all_events[ievent]
-            + muons_all_events[ievent]
-            + photons_all_events[ievent]
-        ):
-            visible_momentum += p
-        all_momentum = visible_momentum + met_all_events[ievent][0]
-
-        objects = math_commands()
-        objects.update(
-            {
-                "e": electrons_all_events[ievent],
-                "j": jets_all_events[ievent],
-                "a": photons_all_events[ievent],
-                "mu": muons_all_events[ievent],
-                "l": leptons_all_events[ievent],
-                "met": met_all_events[ievent][0],
-                "visible": visible_momentum,
-                "all": all_momentum,
-                "boost_to_com": lambda momentum: momentum.boost(all_momentum.to_Vector3D()),
-            }
-        )
+    Parameters
+    ----------
+    chunks : iterable of tuple
+        Tuples `(collections, n_events, weights)` for each chunk of events. The collections are an OrderedDict with
+        the object collections "e", "j", "a", "mu", "l", and, if it is used, "met", each given as a tuple
+        `(event_index, columns)` (see `make_collection()`). The weights are an ndarray with shape
+        `(n_weights, n_events)`, or None if weight_labels is None.
 
-        return objects
+    observables : dict
+        Observables.
 
-    # Observations
-    observable_values = OrderedDict()
+    cuts : list of Cut
+        Cuts.
 
-    for name, observable in observables.items():
-        values_this_observable = []
-        definition = observable.val_expression
-        default = observable.val_default
+    weight_labels : list of str or None, optional
+        Labels of the weights. If None, no weights are extracted. Default value: None.
 
-        # Loop over events
-        for event in range(n_events):
-            variables = get_objects(event)
+    engine : {"columnar", "events"}, optional
+        Evaluates the definitions on all events of a chunk at once (with an event-by-event fallback), or event by
+        event. Default value: "columnar".
 
-            try:
-                if isinstance(definition, str):
-                    value = eval(definition, variables)
-                elif isinstance(definition, Callable):
-                    value = definition(
-                        leptons_all_events[event],
-                        photons_all_events[event],
-                        jets_all_events[event],
-                        met_all_events[event][0],
-                    )
-                else:
-                    raise TypeError("Not a valid observable")
-            except (IndexError, NameError, RuntimeError, SyntaxError, TypeError, ZeroDivisionError):
-                value = default if default is not None else np.nan
-            finally:
-                values_this_observable.append(value)
+    Returns
+    -------
+    observable_values : OrderedDict or None
+        Observations of the events that pass everything, or None if no event does.
 
-        values_this_observable = np.array(values_this_observable, dtype=np.float64)
-        observable_values[name] = values_this_observable
+    weights : OrderedDict or None
+        Weights of these events for each weight label, or None if weight_labels is None or no event passes.
 
-        logger.debug("  First 10 values for observable %s:\n%s", name, values_this_observable[:10])
+    combined_filter : ndarray or None
+        Whether each event passes everything, or None if there are no required observables and cuts.
+    """
 
-    # Cuts
-    cut_values = []
+    if engine not in ["events", "columnar"]:
+        raise ValueError(f"Unknown analysis engine {engine}")
 
-    for cut in cuts:
-        values_this_cut = []
+    # Observations and weights of the events that pass everything in each chunk
+    observable_values = OrderedDict((name, []) for name in observables)
+    weights = []
+    filters = []
+    n_pass_required = OrderedDict((name, 0) for name, observable in observables.items() if observable.is_required)
+    n_pass_cuts = [0 for _ in cuts]
 
-        # Loop over events
-        for event in range(n_events):
-            variables = get_objects(event)
+    # Definitions that cannot be vectorized are evaluated event by event in all chunks
+    unsupported = set()
 
-            for obs_name in observable_values:
-                variables[obs_name] = observable_values[obs_name][event]
+    for collections, n_events_chunk, chunk_weights in chunks:
+        # Observations and cuts
+        if engine == "columnar":
+            chunk_values, cut_values = _analyse_columnar(collections, n_events_chunk, observables, cuts, unsupported)
+        else:
+            chunk_values, cut_values = _analyse_events(collections, n_events_chunk, observables, cuts)
 
-            try:
-                value = eval(cut.val_expression, variables)
-            except (SyntaxError, NameError, TypeError, ZeroDivisionError, IndexError):
-                value = cut.is_required
-            finally:
-                values_this_cut.append(value)
+        if len(filters) == 0:
+            for name, values_this_observable in chunk_values.items():
+                logger.debug("  First 10 values for observable %s:\n%s", name, values_this_observable[:10])
 
-        values_this_cut = np.array(values_this_cut, dtype=bool)
-        cut_values.append(values_this_cut)
+        # Check for existence of required observables and cuts
+        chunk_filter = np.ones(n_events_chunk, dtype=bool)
 
-    # Check for existence of required observables
-    combined_filter = None
+        for name in n_pass_required:
+            this_filter = np.isfinite(chunk_values[name])
+            n_pass_required[name] += int(np.sum(this_filter))
+            chunk_filter &= this_filter
 
-    for name, observable in observables.items():
-        if not observable.is_required:
-            continue
+        for i_cut, values_this_cut in enumerate(cut_values):
+            n_pass_cuts[i_cut] += int(np.sum(values_this_cut))
+            chunk_filter &= values_this_cut
 
-        this_filter = np.isfinite(observable_values[name])
-        n_pass = np.sum(this_filter)
-        n_fail = np.sum(np.invert(this_filter))
+        filters.append(chunk_filter)
 
-        logger.debug("  %s / %s events pass required observable %s", n_pass, n_pass + n_fail, name)
+        # Keep the events that pass everything
+        for name, values_this_observable in chunk_values.items():
+            observable_values[name].append(values_this_observable[chunk_filter])
 
-        if combined_filter is None:
-            combined_filter = this_filter
-        else:
-            combined_filter = np.logical_and(combined_filter, this_filter)
+        if weight_labels is not None:
+            if len(weights) == 0:
+                logger.debug("Found %s weights", len(chunk_weights))
+            weights.append(chunk_weights[:, chunk_filter])
 
-    # Check cuts
-    for cut, values_this_cut in zip(cuts, cut_values):
-        n_pass = np.sum(values_this_cut)
-        n_fail = np.sum(np.invert(values_this_cut))
+    log_expression_timings()
 
-        logger.debug("  %s / %s events pass cut %s", n_pass, n_pass + n_fail, cut)
+    combined_filter = np.concatenate(filters) if filters else np.ones(0, dtype=bool)
+    n_events = len(combined_filter)
+    n_pass = int(np.sum(combined_filter))
 
-        if combined_filter is None:
-            combined_filter = values_this_cut
-        else:
-            combined_filter = np.logical_and(combined_filter, values_this_cut)
+    for name, n_pass_this_observable in n_pass_required.items():
+        logger.debug("  %s / %s events pass required observable %s", n_pass_this_observable, n_events, name)
+    for cut, n_pass_this_cut in zip(cuts, n_pass_cuts):
+        logger.debug("  %s / %s events pass cut %s", n_pass_this_cut, n_events, cut)
 
     # Apply filter
-    if combined_filter is not None:
-        n_pass = np.sum(combined_filter)
-        n_fail = np.sum(np.invert(combined_filter))
-
+    if len(n_pass_required) + len(cuts) == 0:
+        combined_filter = None
+    else:
         if n_pass == 0:
             logger.warning("  No observations remaining!")
 
             return None, None, combined_filter
 
-        logger.info("  %s / %s events pass everything", n_pass, n_pass + n_fail)
+        logger.info("  %s / %s events pass everything", n_pass, n_events)
 
-        for obs_name in observable_values:
-            observable_values[obs_name] = observable_values[obs_name][combined_filter]
-
-        if weights is not None:
-            weights = weights[:, combined_filter]
+    for name, values_this_observable in observable_values.items():
+        observable_values[name] = np.concatenate(values_this_observable) if values_this_observable else np.empty(0)
 
     # Wrap weights
-    if weights is None:
+    if weight_labels is None or len(weights) == 0:
         weights_dict = None
     else:
         weights_dict = OrderedDict()
-        for weight_label, this_weights in zip(weight_labels, weights):
+        for weight_label, this_weights in zip(weight_labels, np.concatenate(weights, axis=1)):
             weights_dict[weight_label] = this_weights
 
-    # Delete Delphes file
-    if delete_delphes_sample_file:
-        logger.debug("  Deleting %s", delphes_sample_file)
-        os.remove(delphes_sample_file)
-
     return observable_values, weights_dict, combined_filter
 
 
-def _get_n_events(tree):
-    es = tree.array("Event")
-    n_events = len(es)
-    return n_events
+def _analyse_events(collections, n_events, observables, cuts):
+    """Evaluates observables and cuts event by event, building the objects of each event once"""
 
+    bounds = _get_event_bounds(collections, n_events)
 
-def _get_particles_truth(tree, pt_min, eta_max, included_pdgids=None):
-    es = tree.array("Particle.E")
-    pts = tree.array("Particle.PT")
-    etas = tree.array("Particle.Eta")
-    phis = tree.array("Particle.Phi")
-    charges = tree.array("Particle.Charge")
-    pdgids = tree.array("Particle.PID")
+    observable_values = OrderedDict((name, np.empty(n_events)) for name in observables)
+    cut_values = [np.empty(n_events, dtype=bool) for _ in cuts]
 
-    all_particles = []
+    # Loop over events
+    for event in range(n_events):
+        variables = _get_objects(collections, bounds, event)
 
-    for ievent in range(len(pts)):
-        event_particles = []
+        for name, observable in observables.items():
+            definition = observable.val_expression
 
-        for e, pt, eta, phi, pdgid in zip(es[ievent], pts[ievent], etas[ievent], phis[ievent], pdgids[ievent]):
-            if pt_min is not None and pt < pt_min:
-                continue
-            if eta_max is not None and abs(eta) > eta_max:
-                continue
-            if (included_pdgids is not None) and (pdgid not in included_pdgids):
-                continue
-
-            particle = MadMinerParticle.from_rhophietat(pt, phi, eta, e)
-            particle.set_pdgid(pdgid)
-            event_particles.append(particle)
-
-        all_particles.append(event_particles)
+            try:
+                if isinstance(definition, str):
+                    value = compile_expression(definition)(variables)
+                elif isinstance(definition, Callable):
+                    value = definition(variables["l"], variables["a"], variables["j"], variables["met"])
+                else:
+                    raise TypeError("Not a valid observable")
+            except (IndexError, NameError, RuntimeError, SyntaxError, TypeError, ZeroDivisionError):
+                value = observable.val_default if observable.val_default is not None else np.nan
 
-    return all_particles
+            observable_values[name][event] = value
 
+        for obs_name in observable_values:
+            variables[obs_name] = observable_values[obs_name][event]
 
-def _get_particles_charged(tree, name, mass, pdgid_positive_charge, pt_min, eta_max):
-    pts = tree.array(f"{name}.PT")
-    etas = tree.array(f"{name}.Eta")
-    phis = tree.array(f"{name}.Phi")
-    charges = tree.array(f"{name}.Charge")
+        for cut, values_this_cut in zip(cuts, cut_values):
+            try:
+                value = compile_expression(cut.val_expression)(variables)
+            except (SyntaxError, NameError, TypeError, ZeroDivisionError, IndexError):
+                value = cut.is_required
 
-    all_particles = []
+            values_this_cut[event] = value
 
-    for ievent in range(len(pts)):
-        event_particles = []
+    return observable_values, cut_values
 
-        for pt, eta, phi, charge in zip(pts[ievent], etas[ievent], phis[ievent], charges[ievent]):
-            if pt_min is not None and pt < pt_min:
-                continue
-            if eta_max is not None and abs(eta) > eta_max:
-                continue
 
-            pdgid = pdgid_positive_charge if charge >= 0.0 else -pdgid_positive_charge
+def _analyse_columnar(collections, n_events, observables, cuts, unsupported=None):
+    """Evaluates observables and cuts on all events at once, with an event-by-event fallback"""
 
-            particle = MadMinerParticle.from_rhophietatau(pt, phi, eta, mass)
-            particle.set_pdgid(pdgid)
-            event_particles.append(particle)
+    variables, object_collections = _get_objects_columnar(collections, n_events)
 
-        all_particles.append(event_particles)
+    # Event-by-event objects, only built for definitions that cannot be evaluated on arrays
+    bounds = _get_event_bounds(collections, n_events)
+    event_variables_cache = {}
 
-    return all_particles
+    def event_variables(i_event):
+        if i_event not in event_variables_cache:
+            event_variables_cache[i_event] = _get_objects(collections, bounds, i_event)
+        return event_variables_cache[i_event]
 
+    # Observables
+    observable_values = OrderedDict()
 
-def _get_particles_leptons(tree, pt_min_e, eta_max_e, pt_min_mu, eta_max_mu):
-    ids_mu = {int(p.pdgid) for p in Particle.findall(pdg_name="mu")}
-    pt_mu = tree.array("Muon.PT")
-    eta_mu = tree.array("Muon.Eta")
-    phi_mu = tree.array("Muon.Phi")
-    charge_mu = tree.array("Muon.Charge")
+    for name, observable in observables.items():
+        values, failed = evaluate_definition(
+            observable.val_expression,
+            variables,
+            object_collections,
+            n_events,
+            event_variables,
+            (IndexError, NameError, RuntimeError, SyntaxError, TypeError, ZeroDivisionError),
+            function_arguments=("l", "a", "j", "met"),
+            unsupported=unsupported,
+        )
+        default = observable.val_default if observable.val_default is not None else np.nan
+        observable_values[name] = np.where(failed, default, values).astype(np.float64)
 
-    ids_e = {int(p.pdgid) for p in Particle.findall(pdg_name="e")}
-    pt_e = tree.array("Electron.PT")
-    eta_e = tree.array("Electron.Eta")
-    phi_e = tree.array("Electron.Phi")
-    charge_e = tree.array("Electron.Charge")
+    # Cuts
+    variables.update(observable_values)
 
-    all_particles = []
+    def event_variables_with_observations(i_event):
+        this_variables = event_variables(i_event)
+        this_variables.update({key: values[i_event] for key, values in observable_values.items()})
+        return this_variables
 
-    for ievent in range(len(pt_mu)):
-        event_particles = []
+    cut_values = []
 
-        # Combined muons and electrons
-        event_pts = np.concatenate((pt_mu[ievent], pt_e[ievent]))
-        event_etas = np.concatenate((eta_mu[ievent], eta_e[ievent]))
-        event_phis = np.concatenate((phi_mu[ievent], phi_e[ievent]))
-        event_masses = np.concatenate((0.105 * np.ones_like(pt_mu[ievent]), 0.000511 * np.ones_like(pt_e[ievent])))
-        event_charges = np.concatenate((charge_mu[ievent], charge_e[ievent]))
-        event_pdgid_positive_charges = np.concatenate(
-            (-13 * np.ones_like(pt_mu[ievent], dtype=int), -11 * np.ones_like(pt_e[ievent], dtype=int))
+    for cut in cuts:
+        values, failed = evaluate_definition(
+            cut.val_expression,
+            variables,
+            object_collections,
+            n_events,
+            event_variables_with_observations,
+            (SyntaxError, NameError, TypeError, ZeroDivisionError, IndexError),
+            unsupported=unsupported,
+        )
+        cut_values.append(np.where(failed, bool(cut.is_required), values.astype(bool)))
+
+    return observable_values, cut_values
+
+
+def _get_objects(collections, bounds, event):
+    """Builds the objects of one event, as `MadMinerParticle` instances"""
+
+    particles = {
+        name: _build_particles(columns, bounds[name][event], bounds[name][event + 1])
+        for name, (_, columns) in collections.items()
+    }
+
+    visible_momentum = MadMinerParticle.from_xyzt(0.0, 0.0, 0.0, 0.0)
+    for p in particles["e"] + particles["j"] + particles["mu"] + particles["a"]:
+        visible_momentum += p
+
+    objects = math_commands()
+    objects.update(
+        {
+            "e": particles["e"],
+            "j": particles["j"],
+            "a": particles["a"],
+            "mu": particles["mu"],
+            "l": particles["l"],
+            "met": None,
+            "visible": visible_momentum,
+        }
+    )
+
+    # MET is only read if it is used
+    if "met" in particles:
+        all_momentum = visible_momentum + particles["met"][0]
+        objects.update(
+            {
+                "met": particles["met"][0],
+                "all": all_momentum,
+                "boost_to_com": lambda momentum: momentum.boost(all_momentum.to_Vector3D()),
+            }
         )
 
-        # Sort by descending pT
-        order = np.argsort(-1.0 * event_pts, axis=None)
-        event_pts = event_pts[order]
-        event_etas = event_etas[order]
-        event_phis = event_phis[order]
-
-        # Create particles
-        for pt, eta, phi, mass, charge, pdgid_positive_charge in zip(
-            event_pts, event_etas, event_phis, event_masses, event_charges, event_pdgid_positive_charges
-        ):
-            pdgid = pdgid_positive_charge if charge >= 0.0 else -pdgid_positive_charge
-
-            if int(pdgid) in ids_e:
-                if pt_min_e is not None and pt < pt_min_e:
-                    continue
-                if eta_max_e is not None and abs(eta) > eta_max_e:
-                    continue
-
-            elif int(pdgid) in ids_mu:
-                if pt_min_mu is not None and pt < pt_min_mu:
-                    continue
-                if eta_max_mu is not None and abs(eta) > eta_max_mu:
-                    continue
-
-            else:
-                logger.warning("Delphes ROOT file has lepton with PDG ID %s, ignoring it", pdgid)
-                continue
+    return objects
+
+
+def _get_objects_columnar(collections, n_events):
+    """Columnar counterpart of `_get_objects()`, building the objects of all events at once"""
+
+    object_collections = OrderedDict(
+        (name, ObjectCollection.from_flat(event_index, n_events, columns))
+        for name, (event_index, columns) in collections.items()
+        if name != "met"
+    )
+    # Sum over all visible objects, in the same order as in _get_objects()
+    visible_names = ["e", "j", "mu", "a"]
+    event_index = np.concatenate([collections[name][0] for name in visible_names])
+    momenta = [_momenta(collections[name][1]) for name in visible_names]
+
+    def visible_sum(values):
+        return np.bincount(event_index, weights=np.concatenate(values).astype(np.float64), minlength=n_events)
+
+    visible_momentum = ParticleArray.from_xyzt(
+        visible_sum([momentum.px for momentum in momenta]),
+        visible_sum([momentum.py for momentum in momenta]),
+        visible_sum([momentum.pz for momentum in momenta]),
+        visible_sum([momentum.E for momentum in momenta]),
+        **{
+            tag: visible_sum([collections[name][1][tag] for name in visible_names]) > 0.0
+            for tag in ["tau_tag", "b_tag", "t_tag"]
+        },
+    )
+
+    objects = vectorized_math_commands()
+    objects.update(object_collections)
+    objects["visible"] = visible_momentum
+
+    # MET is only read if it is used
+    if "met" in collections:
+        met = ObjectCollection.from_flat(collections["met"][0], n_events, collections["met"][1])[0]
+        all_momentum = visible_momentum + met
+        objects.update(
+            {
+                "met": met,
+                "all": all_momentum,
+                "boost_to_com": lambda momentum: momentum.boost(all_momentum.to_Vector3D()),
+            }
+        )
 
-            particle = MadMinerParticle.from_rhophietatau(pt, phi, eta, mass)
-            particle.set_pdgid(pdgid)
-            event_particles.append(particle)
+    return objects, list(object_collections.values())
 
-        all_particles.append(event_particles)
 
-    return all_particles
+def _get_event_bounds(collections, n_events):
+    """Returns, for each collection, the positions of the first object of each event (and the total count)"""
+    return {
+        name: np.searchsorted(event_index, np.arange(n_events + 1)).tolist()
+        for name, (event_index, _) in collections.items()
+    }
 
 
-def _get_particles_truth_leptons(tree, pt_min_e, eta_max_e, pt_min_mu, eta_max_mu):
-    ids_e = {int(p.pdgid) for p in Particle.findall(pdg_name="e")}
-    ids_mu = {int(p.pdgid) for p in Particle.findall(pdg_name="mu")}
-    es = tree.array("Particle.E")
-    pts = tree.array("Particle.PT")
-    etas = tree.array("Particle.Eta")
-    phis = tree.array("Particle.Phi")
-    charges = tree.array("Particle.Charge")
-    pdgids = tree.array("Particle.PID")
+def _build_particles(columns, start, end):
+    particles = []
 
-    all_particles = []
+    for i in range(start, end):
+        if "mass" in columns:
+            particle = MadMinerParticle.from_rhophietatau(
+                columns["pt"][i], columns["phi"][i], columns["eta"][i], columns["mass"][i]
+            )
+        else:
+            particle = MadMinerParticle.from_rhophietat(
+                columns["pt"][i], columns["phi"][i], columns["eta"][i], columns["e"][i]
+            )
+        particle.set_pdgid(columns["pdgid"][i])
+        particle.set_tags(bool(columns["tau_tag"][i]), bool(columns["b_tag"][i]), bool(columns["t_tag"][i]))
+        particles.append(particle)
 
-    for ievent in range(len(pts)):
-        event_particles = []
+    return particles
 
-        for e, pt, eta, phi, pdgid in zip(es[ievent], pts[ievent], etas[ievent], phis[ievent], pdgids[ievent]):
-            if pdgid not in {*ids_e, *ids_mu}:
-                continue
-            if pdgid in ids_e and (pt_min_e is not None and pt < pt_min_e):
-                continue
-            if pdgid in ids_e and (eta_max_e is not None and abs(eta) > eta_max_e):
-                continue
-            if pdgid in ids_mu and (pt_min_mu is not None and pt < pt_min_mu):
-                continue
-            if pdgid in ids_mu and (eta_max_mu is not None and abs(eta) > eta_max_mu):
-                continue
 
-            particle = MadMinerParticle.from_rhophietat(pt, phi, eta, e)
-            particle.set_pdgid(pdgid)
-            event_particles.append(particle)
+def _momenta(columns):
+    if "mass" in columns:
+        return ParticleArray.from_rhophietatau(columns["pt"], columns["phi"], columns["eta"], columns["mass"]).momentum
+    return ParticleArray.from_rhophietat(columns["pt"], columns["phi"], columns["eta"], columns["e"]).momentum
 
-        all_particles.append(event_particles)
 
-    return all_particles
+def get_used_collections(observables: Dict[str, Observable], cuts: List[Cut]):
+    """
+    Finds the object collections that observables and cuts use.
 
+    Parameters
+    ----------
+    observables : dict
+        Observables. Expressions are searched for the names of objects, for functions the objects declared in
+        `Observable.objects` are used (all of `FUNCTION_OBJECTS` if they are not declared).
 
-def _get_particles_photons(tree, pt_min, eta_max):
-    pts = tree.array("Photon.PT")
-    etas = tree.array("Photon.Eta")
-    phis = tree.array("Photon.Phi")
-    es = tree.array("Photon.E")
+    cuts : list of Cut
+        Cuts. Names of observables in their expressions are not counted as objects.
 
-    all_particles = []
+    Returns
+    -------
+    collections : list of str
+        The used collections among "e", "j", "a", "mu", "l", and "met". Derived objects like `visible` count as
+        using all collections that they are built from.
+    """
 
-    for ievent in range(len(pts)):
-        event_particles = []
+    names = set()
+    for observable in observables.values():
+        if isinstance(observable.val_expression, str):
+            names |= _get_names(observable.val_expression)
+        elif observable.objects is not None:
+            names |= set(observable.objects)
+        else:
+            names |= set(FUNCTION_OBJECTS)
 
-        for pt, eta, phi, e in zip(pts[ievent], etas[ievent], phis[ievent], es[ievent]):
-            if pt_min is not None and pt < pt_min:
-                continue
-            if eta_max is not None and abs(eta) > eta_max:
-                continue
+    for cut in cuts:
+        names |= _get_names(cut.val_expression) - set(observables)
 
-            particle = MadMinerParticle.from_rhophietat(pt, phi, eta, e)
-            particle.set_pdgid(22)
-            event_particles.append(particle)
+    collections = set()
+    for name in names:
+        collections |= set(_DERIVED_OBJECTS.get(name, [name]))
 
-        all_particles.append(event_particles)
+    return [name for name in _COLLECTION_BRANCHES if name in collections]
 
-    return all_particles
 
+def _get_names(definition):
+    """Returns all names that an expression refers to"""
 
-def _get_particles_jets(tree, pt_min, eta_max):
-    pts = tree.array("Jet.PT")
-    etas = tree.array("Jet.Eta")
-    phis = tree.array("Jet.Phi")
-    masses = tree.array("Jet.Mass")
     try:
-        tau_tags = tree.array("Jet.TauTag")
-    except:
-        logger.warning("Did not find tau-tag information in Delphes ROOT file.")
-        tau_tags = [0] * len(pts)
-    try:
-        b_tags = tree.array("Jet.BTag")
-    except:
-        logger.warning("Did not find b-tag information in Delphes ROOT file.")
-        b_tags = [0] * len(pts)
+        tree = ast.parse(definition, mode="eval")
+    except SyntaxError:
+        return set()
 
-    all_particles = []
+    return {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
 
-    for ievent in range(len(pts)):
-        event_particles = []
 
-        for pt, eta, phi, mass, tau_tag, b_tag in zip(
-            pts[ievent], etas[ievent], phis[ievent], masses[ievent], tau_tags[ievent], b_tags[ievent]
-        ):
-            if pt_min is not None and pt < pt_min:
-                continue
-            if eta_max is not None and abs(eta) > eta_max:
+def _get_branch_names(tree, use_generator_truth, collections_used):
+    """Returns the names of the branches that are read from the Delphes tree, leaving out missing jet tags"""
+
+    collection_branches = _TRUTH_COLLECTION_BRANCHES if use_generator_truth else _COLLECTION_BRANCHES
+
+    names = []
+    for collection in collections_used:
+        names += [name for name in collection_branches[collection] if name not in names]
+
+    branch_names = []
+    for name in names:
+        for field in _BRANCH_FIELDS[name]:
+            branch_name = f"{name}.{field}"
+            if field in _OPTIONAL_FIELDS and branch_name not in tree:
+                logger.warning("Did not find %s information in Delphes ROOT file.", branch_name)
                 continue
+            branch_names.append(branch_name)
+
+    return branch_names
+
+
+def _log_skipped_branches(tree, branch_names):
+    branches = [branch for branch in tree.itervalues(recursive=True) if len(branch.branches) == 0]
+    skipped_bytes = sum(branch.compressed_bytes for branch in branches if branch.name not in branch_names)
+    total_bytes = sum(branch.compressed_bytes for branch in branches)
+
+    logger.info(
+        "  Reading %s of %s branches, skipping %.1f of %.1f MB",
+        len(branch_names),
+        len(branches),
+        skipped_bytes / 1.0e6,
+        total_bytes / 1.0e6,
+    )
+
+
+def _get_collections(
+    arrays,
+    use_generator_truth,
+    collections_used,
+    pt_min_e,
+    pt_min_mu,
+    pt_min_a,
+    pt_min_j,
+    eta_max_e,
+    eta_max_mu,
+    eta_max_a,
+    eta_max_j,
+):
+    """
+    Builds the objects of a chunk of events from the arrays read from the Delphes tree and applies the acceptance
+    cuts.
 
-            particle = MadMinerParticle.from_rhophietatau(pt, phi, eta, mass)
-            particle.set_pdgid(9)
-            particle.set_tags(tau_tag >= 1, b_tag >= 1, False)
-            event_particles.append(particle)
+    Returns an OrderedDict with the collections "e", "j", "a", "mu", "l", and, if it is used, "met". Collections whose
+    branches were not read are empty. Each one is a tuple
+    `(event_index, columns)`, where event_index is the (ascending) event index of each object and columns is a dict
+    with the flat arrays "pt", "phi", "eta", "e" or "mass", "charge", "pdgid", "tau_tag", "b_tag", and "t_tag".
+    """
 
-        all_particles.append(event_particles)
+    if use_generator_truth:
+        event_index, branches = _read_branches(arrays, "Particle")
+        pdgids = branches["PID"].astype(np.int64)
+        electrons, photons, muons, leptons = get_particle_collections(
+            event_index, branches, pdgids, pt_min_e, pt_min_mu, pt_min_a, eta_max_e, eta_max_mu, eta_max_a
+        )
+        jets = _get_jets(arrays, "GenJet", pt_min_j, eta_max_j)
+        met_name = "GenMissingET"
 
-    return all_particles
+    else:
+        photons = _get_photons(arrays, pt_min_a, eta_max_a)
+        electrons = _get_charged(arrays, "Electron", _ELECTRON_MASS, -11, pt_min_e, eta_max_e)
+        muons = _get_charged(arrays, "Muon", _MUON_MASS, -13, pt_min_mu, eta_max_mu)
+        leptons = _merge_sorted_by_pt(muons, electrons)
+        jets = _get_jets(arrays, "Jet", pt_min_j, eta_max_j)
+        met_name = "MissingET"
 
+    collections = OrderedDict([("e", electrons), ("j", jets), ("a", photons), ("mu", muons), ("l", leptons)])
+    if "met" in collections_used:
+        collections["met"] = _get_met(arrays, met_name)
 
-def _get_particles_truth_jets(tree, pt_min, eta_max):
-    pts = tree.array("GenJet.PT")
-    etas = tree.array("GenJet.Eta")
-    phis = tree.array("GenJet.Phi")
-    masses = tree.array("GenJet.Mass")
-    try:
-        tau_tags = tree.array("GenJet.TauTag")
-    except:
-        logger.warning("Did not find tau-tag information for GenJets in Delphes ROOT file.")
-        tau_tags = [0] * len(pts)
-    try:
-        b_tags = tree.array("GenJet.BTag")
-    except:
-        logger.warning("Did not find b-tag information for GenJets in Delphes ROOT file.")
-        b_tags = [0] * len(pts)
+    return collections
 
-    all_particles = []
 
-    for ievent in range(len(pts)):
-        event_particles = []
+def _read_branches(arrays, name):
+    """
+    Converts the fields of a Delphes branch (like "Jet.PT") into flat float64 arrays. Returns the event index of each
+    object and a dict of the arrays. Fields that were not read are left out, and if the branch was not read at all,
+    there are no objects.
+    """
 
-        for pt, eta, phi, mass, tau_tag, b_tag in zip(
-            pts[ievent], etas[ievent], phis[ievent], masses[ievent], tau_tags[ievent], b_tags[ievent]
-        ):
-            if pt_min is not None and pt < pt_min:
-                continue
-            if eta_max is not None and abs(eta) > eta_max:
-                continue
+    event_index = np.zeros(0, dtype=np.int64)
+    branches = {}
+
+    for field in _BRANCH_FIELDS[name]:
+        values = arrays.get(f"{name}.{field}")
+        if values is None:
+            continue
+
+        if not branches:
+            counts = ak.to_numpy(ak.num(values))
+            event_index = np.repeat(np.arange(len(counts)), counts)
+        branches[field] = ak.to_numpy(ak.flatten(values)).astype(np.float64)
+
+    if not branches:
+        branches = {field: np.zeros(0) for field in _BRANCH_FIELDS[name] if field not in _OPTIONAL_FIELDS}
+
+    return event_index, branches
+
+
+def acceptance_mask(branches, pt_min, eta_max):
+    """Returns whether the objects with the transverse momenta "PT" and pseudorapidities "Eta" pass the acceptance"""
+
+    mask = np.ones(len(branches["PT"]), dtype=bool)
+    if pt_min is not None:
+        mask &= ~(branches["PT"] < pt_min)
+    if eta_max is not None:
+        mask &= ~(np.abs(branches["Eta"]) > eta_max)
+    return mask
+
+
+def make_collection(event_index, branches, pdgids, e=None, mass=None, mask=None, tags=None):
+    """
+    Builds an object collection from flat arrays.
+
+    Parameters
+    ----------
+    event_index : ndarray
+        Event index of each object, in ascending order.
+
+    branches : dict
+        Arrays "PT", "Phi", and "Eta" of the objects.
+
+    pdgids : ndarray
+        PDG ids of the objects, which also give their charges and, unless tags are given, their tags.
+
+    e : ndarray or None, optional
+        Energies of the objects. Either e or mass has to be given. Default value: None.
+
+    mass : ndarray or float or None, optional
+        Masses of the objects. Default value: None.
+
+    mask : ndarray or None, optional
+        Which objects are kept. If None, all are. Default value: None.
+
+    tags : dict or None, optional
+        Arrays "tau_tag", "b_tag", and "t_tag" that replace the tags given by the PDG ids. Default value: None.
+
+    Returns
+    -------
+    collection : tuple
+        `(event_index, columns)`, where columns is a dict with the flat arrays "pt", "phi", "eta", "e" or "mass",
+        "charge", "pdgid", "tau_tag", "b_tag", and "t_tag".
+    """
+
+    if mask is None:
+        mask = np.ones(len(event_index), dtype=bool)
+
+    properties = get_pdg_table().properties(pdgids)
+    if tags is not None:
+        properties.update(tags)
+
+    columns = {
+        "pt": branches["PT"],
+        "phi": branches["Phi"],
+        "eta": branches["Eta"],
+    }
+    if mass is None:
+        columns["e"] = e
+    else:
+        columns["mass"] = np.broadcast_to(mass, pdgids.shape).astype(np.float64)
+    columns.update(
+        {
+            "charge": properties["charge"],
+            "pdgid": pdgids,
+            "tau_tag": properties["tau_tag"],
+            "b_tag": properties["b_tag"],
+            "t_tag": properties["t_tag"],
+        }
+    )
+
+    return event_index[mask], {key: values[mask] for key, values in columns.items()}
+
+
+def get_particle_collections(
+    event_index, branches, pdgids, pt_min_e, pt_min_mu, pt_min_a, eta_max_e, eta_max_mu, eta_max_a
+):
+    """
+    Builds the collections "e", "a", "mu", and "l" from generator-level particles and applies the acceptance cuts.
+
+    Parameters
+    ----------
+    event_index : ndarray
+        Event index of each particle, in ascending order.
+
+    branches : dict
+        Arrays "PT", "Phi", "Eta", and "E" of the particles.
+
+    pdgids : ndarray
+        PDG ids of the particles.
+
+    pt_min_e, pt_min_mu, pt_min_a, eta_max_e, eta_max_mu, eta_max_a : float or None
+        Acceptance cuts for electrons, muons, and photons.
+
+    Returns
+    -------
+    electrons, photons, muons, leptons : tuple
+        Collections as returned by `make_collection()`, keeping the order of the particles.
+    """
 
-            particle = MadMinerParticle.from_rhophietatau(pt, phi, eta, mass)
-            particle.set_pdgid(9)
-            particle.set_tags(tau_tag >= 1, b_tag >= 1, False)
-            event_particles.append(particle)
+    is_electron = np.isin(pdgids, list(get_pdg_table().electron_pdgids))
+    is_muon = np.isin(pdgids, list(get_pdg_table().muon_pdgids))
 
-        all_particles.append(event_particles)
+    def particles(mask):
+        return make_collection(event_index, branches, pdgids, e=branches["E"], mask=mask)
 
-    return all_particles
+    electrons_accepted = is_electron & acceptance_mask(branches, pt_min_e, eta_max_e)
+    muons_accepted = is_muon & acceptance_mask(branches, pt_min_mu, eta_max_mu)
 
+    photons = particles((pdgids == 22) & acceptance_mask(branches, pt_min_a, eta_max_a))
+    electrons = particles(electrons_accepted)
+    muons = particles(muons_accepted)
+    leptons = particles(electrons_accepted | muons_accepted)
 
-def _get_particles_truth_met(tree):
-    mets = tree.array("GenMissingET.MET")
-    phis = tree.array("GenMissingET.Phi")
+    return electrons, photons, muons, leptons
 
-    all_particles = []
 
-    for ievent in range(len(mets)):
-        event_particles = []
+def _get_photons(arrays, pt_min, eta_max):
+    event_index, branches = _read_branches(arrays, "Photon")
+    pdgids = np.full(len(event_index), 22, dtype=np.int64)
+    mask = acceptance_mask(branches, pt_min, eta_max)
+    return make_collection(event_index, branches, pdgids, e=branches["E"], mask=mask)
 
-        for met, phi in zip(mets[ievent], phis[ievent]):
-            particle = MadMinerParticle.from_rhophietatau(met, phi, 0.0, 0.0)
-            particle.set_pdgid(0)
-            event_particles.append(particle)
 
-        all_particles.append(event_particles)
+def _get_charged(arrays, name, mass, pdgid_positive_charge, pt_min, eta_max):
+    event_index, branches = _read_branches(arrays, name)
+    pdgids = np.where(branches["Charge"] >= 0.0, pdgid_positive_charge, -pdgid_positive_charge).astype(np.int64)
+    mask = acceptance_mask(branches, pt_min, eta_max)
+    return make_collection(event_index, branches, pdgids, mass=mass, mask=mask)
 
-    return all_particles
 
+def _get_jets(arrays, name, pt_min, eta_max):
+    event_index, branches = _read_branches(arrays, name)
+    n_jets = len(event_index)
+    pdgids = np.full(n_jets, 9, dtype=np.int64)
+    tags = {
+        "tau_tag": branches.get("TauTag", np.zeros(n_jets)) >= 1,
+        "b_tag": branches.get("BTag", np.zeros(n_jets)) >= 1,
+        "t_tag": np.zeros(n_jets, dtype=bool),
+    }
+    mask = acceptance_mask(branches, pt_min, eta_max)
+    return make_collection(event_index, branches, pdgids, mass=branches["Mass"], mask=mask, tags=tags)
 
-def _get_particles_met(tree):
-    mets = tree.array("MissingET.MET")
-    phis = tree.array("MissingET.Phi")
 
-    all_particles = []
+def _get_met(arrays, name):
+    event_index, branches = _read_branches(arrays, name)
+    n_objects = len(event_index)
+    branches = {"PT": branches["MET"], "Phi": branches["Phi"], "Eta": np.zeros(n_objects)}
+    pdgids = np.zeros(n_objects, dtype=np.int64)
+    return make_collection(event_index, branches, pdgids, mass=0.0)
 
-    for ievent in range(len(mets)):
-        event_particles = []
 
-        for met, phi in zip(mets[ievent], phis[ievent]):
-            particle = MadMinerParticle.from_rhophietatau(met, phi, 0.0, 0.0)
-            particle.set_pdgid(0)
-            event_particles.append(particle)
+def _merge_sorted_by_pt(*collections):
+    """Merges collections and sorts the objects of each event by descending pT, ties keep the original order"""
 
-        all_particles.append(event_particles)
+    event_index = np.concatenate([collection[0] for collection in collections])
+    columns = {key: np.concatenate([collection[1][key] for collection in collections]) for key in collections[0][1]}
 
-    return all_particles
+    order = np.lexsort((-columns["pt"], event_index))
+    return event_index[order], {key: values[order] for key, values in columns.items()}
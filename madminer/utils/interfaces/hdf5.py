@@ -287,6 +287,58 @@ def save_nuisance_setup(
         )
 
 
+def save_morphing_error_surface(file_name: str, axes: List[np.ndarray], values: np.ndarray) -> None:
+    """
+    Saves a tabulated morphing error surface into a HDF5 data file
+
+    Parameters
+    ----------
+    file_name: str
+    axes: list of numpy.ndarray
+    values: numpy.ndarray
+
+    Returns
+    -------
+        None
+    """
+
+    with h5py.File(file_name, "a") as file:
+        with suppress(KeyError):
+            del file["morphing/error_surface"]
+
+        for i, axis in enumerate(axes):
+            file.create_dataset(f"morphing/error_surface/axis_{i}", data=np.asarray(axis, dtype=float))
+
+        file.create_dataset("morphing/error_surface/values", data=np.asarray(values, dtype=float))
+
+
+def load_morphing_error_surface(file_name: str) -> Tuple[List[np.ndarray], np.ndarray]:
+    """
+    Loads a tabulated morphing error surface from a HDF5 data file
+
+    Parameters
+    ----------
+    file_name: str
+
+    Returns
+    -------
+    axes: list of numpy.ndarray
+    values: numpy.ndarray
+    """
+
+    with h5py.File(file_name, "r") as file:
+        try:
+            group = file["morphing/error_surface"]
+        except KeyError:
+            logger.debug("HDF5 file does not contain a morphing error surface")
+            return None, None
+
+        values = group["values"][()]
+        axes = [group[f"axis_{i}"][()] for i in range(values.ndim)]
+
+    return axes, values
+
+
 def load_events(
     file_name: str,
     start_index: int = 0,
@@ -297,10 +349,14 @@ def load_events(
     sampling_factors: np.ndarray = None,
     include_nuisance_params: bool = True,
     include_sampling_ids: bool = False,
-) -> Iterator[Union[Tuple[np.ndarray, np.ndarray], Tuple[np.ndarray, np.ndarray, np.ndarray]]]:
+    include_nuisance_coefficients: bool = False,
+) -> Iterator[tuple]:
     """
     Loads generated events information from a HDF5 data file
 
+    If the file stores nuisance coefficients instead of nuisance benchmark weights (see `save_events`),
+    the yielded weights only contain the non-nuisance benchmarks.
+
     Parameters
     ----------
     file_name: str
@@ -312,6 +368,9 @@ def load_events(
     sampling_factors: numpy.ndarray
     include_nuisance_params: bool
     include_sampling_ids: bool
+    include_nuisance_coefficients: bool
+        Whether to also yield the stored nuisance coefficients (a, b), each with shape (n_batch, n_nuisance_params),
+        or None if the file does not contain them
 
     Returns
     -------
@@ -333,6 +392,12 @@ def load_events(
         sampling_ids,
     ) = _load_samples(file_name)
 
+    nuisance_coefficients = _load_nuisance_coefficients(file_name)
+
+    # Nuisance benchmark weights are not stored in the first place
+    if nuisance_coefficients is not None:
+        include_nuisance_params = True
+
     num_samples = len(observations)
 
     if start_index is None:
@@ -351,6 +416,10 @@ def load_events(
         batch_observations = observations[actual_index:batch_final_index]
         batch_weights = weights[actual_index:batch_final_index]
         batch_sampling_ids = None
+        batch_coefficients = None
+
+        if nuisance_coefficients is not None:
+            batch_coefficients = tuple(c[actual_index:batch_final_index] for c in nuisance_coefficients)
 
         if include_nuisance_params is False:
             batch_weights = batch_weights[:, benchmark_filter]
@@ -369,15 +438,21 @@ def load_events(
                 batch_weights = batch_weights[cut]
                 batch_sampling_ids = batch_sampling_ids[cut]
 
+                if batch_coefficients is not None:
+                    batch_coefficients = tuple(c[cut] for c in batch_coefficients)
+
             # Rescale weights based on sampling
             elif sampling_factors is not None:
                 k_factors = sampling_factors[batch_sampling_ids]
                 batch_weights = batch_weights * k_factors[:, np.newaxis]
 
+        batch_data = (batch_observations, batch_weights)
         if include_sampling_ids:
-            yield batch_observations, batch_weights, batch_sampling_ids
-        else:
-            yield batch_observations, batch_weights
+            batch_data += (batch_sampling_ids,)
+        if include_nuisance_coefficients:
+            batch_data += (batch_coefficients,)
+
+        yield batch_data
 
         actual_index += batch_size
 
@@ -391,6 +466,8 @@ def save_events(
     sampling_benchmarks: List[int],
     num_signal_events: List[int],
     num_background_events: int,
+    nuisance_coefficients: Tuple[np.ndarray, np.ndarray] = None,
+    shuffle: bool = False,
 ) -> None:
     """
     Saves generated events information into a HDF5 data file
@@ -405,6 +482,11 @@ def save_events(
     sampling_benchmarks: list
     num_signal_events: list
     num_background_events: int
+    nuisance_coefficients: tuple
+        Nuisance coefficients (a, b), each with shape (n_nuisance_params, n_events). If given, they are stored
+        instead of the nuisance benchmark weights, and only the weights of the non-nuisance benchmarks are saved
+    shuffle: bool
+        Whether to shuffle the events with a random permutation before they are written
 
     Returns
     -------
@@ -421,7 +503,76 @@ def save_events(
     if weights is None or observations is None:
         return
 
-    benchmark_names, _, _, _ = _load_benchmarks(file_name)
+    samples = _get_samples(file_name, observations, weights, sampling_benchmarks, nuisance_coefficients)
+    if shuffle:
+        samples = _shuffle_samples(*samples)
+    _save_samples(file_name, file_override, *samples)
+    _save_samples_summary(file_name, file_override, num_signal_events, num_background_events)
+
+
+def append_events(
+    file_name: str,
+    observations: dict,
+    weights: dict,
+    sampling_benchmarks: np.ndarray,
+    nuisance_coefficients: Tuple[np.ndarray, np.ndarray] = None,
+) -> None:
+    """
+    Appends a chunk of events to the samples in a HDF5 data file, which are created as resizable datasets with the
+    first chunk. The observables have to be saved before, for instance with `save_events()` without observations and
+    weights, and the number of signal and background events after the last chunk.
+
+    Parameters
+    ----------
+    file_name: str
+    observations: dict
+    weights: dict
+    sampling_benchmarks: numpy.ndarray
+    nuisance_coefficients: tuple
+        Nuisance coefficients (a, b), each with shape (n_nuisance_params, n_events). If given, they are stored
+        instead of the nuisance benchmark weights, and only the weights of the non-nuisance benchmarks are saved
+
+    Returns
+    -------
+        None
+    """
+
+    observations = [val for val in observations.values()]
+
+    samples = _get_samples(file_name, observations, weights, sampling_benchmarks, nuisance_coefficients)
+    _append_samples(file_name, *samples)
+
+
+def _get_samples(
+    file_name: str,
+    observations: list,
+    weights: dict,
+    sampling_benchmarks: List[int],
+    nuisance_coefficients: Tuple[np.ndarray, np.ndarray] = None,
+) -> tuple:
+    """
+    Arranges observations and weights as sample arrays, with the weights sorted by the benchmarks in a HDF5 data file
+
+    Parameters
+    ----------
+    file_name: str
+    observations: list
+    weights: dict
+    sampling_benchmarks: list
+    nuisance_coefficients: tuple
+
+    Returns
+    -------
+    samples: tuple
+        Observations, weights, sampling ids, and nuisance coefficients (or None) as accepted by `_save_samples()`
+    """
+
+    benchmark_names, _, benchmark_nuisance_flags, _ = _load_benchmarks(file_name)
+
+    if nuisance_coefficients is not None:
+        benchmark_names = [name for name, flag in zip(benchmark_names, benchmark_nuisance_flags) if not flag]
+        weights = {name: weights[name] for name in benchmark_names}
+        nuisance_coefficients = tuple(np.asarray(c, dtype=np.float32).T for c in nuisance_coefficients)
 
     logger.debug("Weight names to save in event file: %s", weights.keys())
     logger.debug("Benchmark names to save in event file: %s", benchmark_names)
@@ -431,8 +582,32 @@ def save_events(
     sample_weights = np.array(sorted_weights).T
     sampling_ids = np.array(sampling_benchmarks, dtype=int)
 
-    _save_samples(file_name, file_override, sample_observations, sample_weights, sampling_ids)
-    _save_samples_summary(file_name, file_override, num_signal_events, num_background_events)
+    return sample_observations, sample_weights, sampling_ids, nuisance_coefficients
+
+
+def shuffle_events(file_name: str) -> None:
+    """
+    Shuffles the events in a HDF5 data file in place with a random permutation, loading one dataset at a time
+
+    Parameters
+    ----------
+    file_name: str
+
+    Returns
+    -------
+        None
+    """
+
+    permutation = None
+
+    with h5py.File(file_name, "a") as file:
+        for name in ["observations", "weights", "sampling_benchmarks", "nuisance_a", "nuisance_b"]:
+            dataset = file.get(f"samples/{name}")
+            if dataset is None:
+                continue
+            if permutation is None:
+                permutation = np.random.permutation(dataset.shape[0])
+            dataset[...] = dataset[()][permutation]
 
 
 def _add_benchmarks_custom(
@@ -1064,6 +1239,7 @@ def _save_samples(
     sample_observations: np.ndarray,
     sample_weights: np.ndarray,
     sampling_ids: np.ndarray,
+    nuisance_coefficients: Tuple[np.ndarray, np.ndarray] = None,
 ) -> None:
     """
     Load sample properties into a HDF5 data file.
@@ -1077,6 +1253,8 @@ def _save_samples(
     sample_observations: numpy.ndarray
     sample_weights: numpy.ndarray
     sampling_ids: numpy.ndarray
+    nuisance_coefficients: tuple
+        Nuisance coefficients (a, b), each with shape (n_samples, n_nuisance_params)
 
     Returns
     -------
@@ -1097,6 +1275,124 @@ def _save_samples(
         file.create_dataset("samples/weights", data=sample_weights)
         file.create_dataset("samples/sampling_benchmarks", data=sampling_ids)
 
+        if nuisance_coefficients is not None:
+            nuisance_a, nuisance_b = nuisance_coefficients
+            file.create_dataset("samples/nuisance_a", data=nuisance_a, dtype=np.float32)
+            file.create_dataset("samples/nuisance_b", data=nuisance_b, dtype=np.float32)
+
+
+def _shuffle_samples(
+    sample_observations: np.ndarray,
+    sample_weights: np.ndarray,
+    sampling_ids: np.ndarray,
+    nuisance_coefficients: Tuple[np.ndarray, np.ndarray] = None,
+) -> tuple:
+    """
+    Shuffles sample properties with one random permutation of the events.
+
+    Parameters
+    ----------
+    sample_observations: numpy.ndarray
+    sample_weights: numpy.ndarray
+    sampling_ids: numpy.ndarray
+    nuisance_coefficients: tuple
+        Nuisance coefficients (a, b), each with shape (n_samples, n_nuisance_params)
+
+    Returns
+    -------
+    samples: tuple
+        Shuffled observations, weights, sampling ids, and nuisance coefficients (or None)
+    """
+
+    permutation = np.random.permutation(len(sampling_ids))
+
+    if nuisance_coefficients is not None:
+        nuisance_coefficients = tuple(c[permutation] for c in nuisance_coefficients)
+
+    return (
+        sample_observations[permutation],
+        sample_weights[permutation],
+        sampling_ids[permutation],
+        nuisance_coefficients,
+    )
+
+
+def _append_samples(
+    file_name: str,
+    sample_observations: np.ndarray,
+    sample_weights: np.ndarray,
+    sampling_ids: np.ndarray,
+    nuisance_coefficients: Tuple[np.ndarray, np.ndarray] = None,
+) -> None:
+    """
+    Append sample properties to resizable datasets in a HDF5 data file, creating them if necessary.
+
+    Parameters
+    ----------
+    file_name: str
+        HDF5 file name to save sample properties into
+    sample_observations: numpy.ndarray
+    sample_weights: numpy.ndarray
+    sampling_ids: numpy.ndarray
+    nuisance_coefficients: tuple
+        Nuisance coefficients (a, b), each with shape (n_samples, n_nuisance_params)
+
+    Returns
+    -------
+        None
+    """
+
+    samples = {
+        "observations": sample_observations,
+        "weights": sample_weights,
+        "sampling_benchmarks": sampling_ids,
+    }
+    if nuisance_coefficients is not None:
+        samples["nuisance_a"], samples["nuisance_b"] = nuisance_coefficients
+
+    with h5py.File(file_name, "a") as file:
+        for name, values in samples.items():
+            path = f"samples/{name}"
+            if path not in file:
+                file.create_dataset(
+                    path,
+                    shape=(0,) + values.shape[1:],
+                    maxshape=(None,) + values.shape[1:],
+                    dtype=values.dtype,
+                    chunks=True,
+                )
+
+            dataset = file[path]
+            n_samples = dataset.shape[0]
+            dataset.resize(n_samples + len(values), axis=0)
+            dataset[n_samples:] = values
+
+
+def _load_nuisance_coefficients(file_name: str) -> Union[Tuple[np.ndarray, np.ndarray], None]:
+    """
+    Load the per-event nuisance coefficients from a HDF5 data file
+
+    Parameters
+    ----------
+    file_name: str
+        HDF5 file name to load the nuisance coefficients from
+
+    Returns
+    -------
+    nuisance_coefficients: tuple or None
+        Nuisance coefficients (a, b), each with shape (n_samples, n_nuisance_params),
+        or None if the file stores nuisance benchmark weights instead
+    """
+
+    with h5py.File(file_name, "r") as file:
+        try:
+            nuisance_a = file["samples/nuisance_a"][()]
+            nuisance_b = file["samples/nuisance_b"][()]
+        except KeyError:
+            return None
+
+    return nuisance_a, nuisance_b
+
 
 def _load_samples_summary(file_name: str) -> Tuple[np.ndarray, int]:
     """
@@ -1,27 +1,58 @@
+import array
 import logging
 
-from pathlib import Path
+from collections import OrderedDict
+from typing import Dict
+from typing import List
 
-from madminer.utils.various import unzip_file
+import numpy as np
+
+from madminer.models import Cut
+from madminer.models import Observable
+from madminer.utils.interfaces.delphes_root import acceptance_mask
+from madminer.utils.interfaces.delphes_root import analyse_chunks
+from madminer.utils.interfaces.delphes_root import get_particle_collections
+from madminer.utils.interfaces.delphes_root import get_used_collections
+from madminer.utils.interfaces.delphes_root import make_collection
+from madminer.utils.jets import combine_constituents
+from madminer.utils.particle import get_pdg_table
+from madminer.utils.various import open_file
 
 logger = logging.getLogger(__name__)
 
+# Positions of the PDG id, the first momentum component (followed by py, pz, and E), and the status in the particle
+# lines of HepMC2 and HepMC3 files
+_PARTICLE_COLUMNS = {2: (2, 3, 8), 3: (3, 4, 9)}
 
-def extract_weight_order(filename, default_weight_label=None):
-    # Unzip event file
-    new_filename = Path(filename).with_suffix("")
-    extension = Path(filename).suffix
+# Momentum units, converted to GeV
+_MOMENTUM_UNITS = {"GEV": 1.0, "MEV": 0.001}
 
-    if extension == ".gz":
-        if not new_filename.exists():
-            unzip_file(filename, new_filename)
-        filename = new_filename
 
-    with open(filename, encoding="latin-1") as file:
+def extract_weight_order(filename, default_weight_label=None):
+    # Compressed event files are decompressed while reading
+    with open_file(filename, encoding="latin-1") as file:
+        n_events = 0
+
         for line in file:
             terms = line.replace('"', "").split()
 
-            if len(terms) == 0 or terms[0] != "N":
+            if len(terms) == 0:
+                continue
+
+            # Weight names are given in the first event (HepMC2) or before it (HepMC3)
+            if terms[0] == "E":
+                n_events += 1
+                if n_events > 1:
+                    break
+                continue
+
+            if terms[0] == "W" and n_events == 0:
+                logger.debug("Parsing HepMC line: %s", line)
+                weight_labels = _weight_labels(terms[1:], default_weight_label)
+                logger.debug("Found weight labels in HepMC file: %s", weight_labels)
+                return weight_labels
+
+            if terms[0] != "N":
                 continue
 
             logger.debug("Parsing HepMC line: %s", line)
@@ -36,15 +67,7 @@ def extract_weight_order(filename, default_weight_label=None):
 
                 return None
 
-            weight_labels = []
-            for term in terms[2:]:
-                if term.startswith("id="):
-                    term = term[3:]
-                    term = term.partition("_MERGING=")[0]
-                    weight_labels.append(term)
-                else:
-                    weight_labels.append(default_weight_label)
-
+            weight_labels = _weight_labels(terms[2:], default_weight_label)
             logger.debug("Found weight labels in HepMC file: %s", weight_labels)
 
             return weight_labels
@@ -53,3 +76,322 @@ def extract_weight_order(filename, default_weight_label=None):
     logger.debug("Did not find weight labels in HepMC file")
 
     return [default_weight_label]
+
+
+def _weight_labels(terms, default_weight_label):
+    weight_labels = []
+    for term in terms:
+        if term.startswith("id="):
+            term = term[3:]
+            term = term.partition("_MERGING=")[0]
+            weight_labels.append(term)
+        else:
+            weight_labels.append(default_weight_label)
+    return weight_labels
+
+
+def parse_hepmc_file(
+    hepmc_sample_file,
+    observables: Dict[str, Observable],
+    cuts: List[Cut],
+    weight_labels=None,
+    acceptance_pt_min_e=None,
+    acceptance_pt_min_mu=None,
+    acceptance_pt_min_a=None,
+    acceptance_pt_min_j=None,
+    acceptance_eta_max_e=None,
+    acceptance_eta_max_mu=None,
+    acceptance_eta_max_a=None,
+    acceptance_eta_max_j=None,
+    engine="columnar",
+    chunk_size=10000,
+    jet_clustering=None,
+):
+    """
+    Extracts observables and weights from the final-state particles of a HepMC file, without running Delphes.
+
+    The file is streamed (compressed files are decompressed while reading) in chunks of chunk_size events. The
+    final-state (status 1) particles of each chunk are collected into flat arrays, from which the same object
+    collections as from a Delphes file are built: "e", "mu", and "a" are the electrons, muons, and photons, "l" are
+    the electrons and muons, and "met" is the negative transverse momentum sum of all particles except neutrinos.
+    Jets are built by jet_clustering from all final-state particles except neutrinos. Observables and cuts are then
+    evaluated as in `parse_delphes_root_file()`.
+
+    Parameters
+    ----------
+    hepmc_sample_file : str
+        Path to the HepMC2 or HepMC3 (ASCII) file.
+
+    observables : dict
+        Observables.
+
+    cuts : list of Cut
+        Cuts.
+
+    weight_labels : list of str or None, optional
+        Labels of the event weights, see `extract_weight_order()`. If None, no weights are extracted. Default value:
+        None.
+
+    acceptance_pt_min_e, acceptance_pt_min_mu, acceptance_pt_min_a, acceptance_pt_min_j : float or None, optional
+        Minimal transverse momenta of electrons, muons, photons, and jets. Default value: None.
+
+    acceptance_eta_max_e, acceptance_eta_max_mu, acceptance_eta_max_a, acceptance_eta_max_j : float or None, optional
+        Maximal absolute pseudorapidities of electrons, muons, photons, and jets. Default value: None.
+
+    engine : {"columnar", "events"}, optional
+        Evaluates observables and cuts on all events of a chunk at once or event by event, see
+        `parse_delphes_root_file()`. Default value: "columnar".
+
+    chunk_size : int, optional
+        Number of events that are analysed at once. Default value: 10000.
+
+    jet_clustering : callable or None, optional
+        Function `jet_clustering(event_index, momenta)` that clusters the particles of a chunk of events into jets,
+        for instance a `madminer.utils.jets.JetClustering`. It is called with the event index of each particle in
+        ascending order and an ndarray of their momenta (px, py, pz, E) with shape `(n_particles, 4)`, and returns
+        the index of the jet of each particle (-1 for particles not in any jet), see
+        `madminer.utils.jets.cluster_jets()`. If None, there are no jets. Default value: None.
+
+    Returns
+    -------
+    observable_values : OrderedDict or None
+        Observations of the events that pass everything, or None if no event does.
+
+    weights : OrderedDict or None
+        Weights of these events for each weight label, or None.
+
+    combined_filter : ndarray or None
+        Whether each event passes everything, or None if there are no required observables and cuts.
+    """
+
+    logger.debug("Parsing HepMC file %s", hepmc_sample_file)
+
+    if engine not in ["events", "columnar"]:
+        raise ValueError(f"Unknown HepMC analysis engine {engine}")
+    if chunk_size < 1:
+        raise ValueError(f"Invalid chunk size: {chunk_size}")
+
+    collections_used = get_used_collections(observables, cuts)
+    logger.debug("Objects used by the observables and cuts: %s", ", ".join(collections_used))
+    if "j" in collections_used and jet_clustering is None:
+        logger.warning(
+            "No jet clustering given, there are no jets in the HepMC analysis. Jets can be clustered with "
+            "jet_clustering=madminer.utils.jets.JetClustering()."
+        )
+
+    def chunks():
+        n_events = 0
+
+        for particles, weights in read_hepmc_chunks(hepmc_sample_file, chunk_size):
+            n_events_chunk = weights.shape[1]
+            logger.debug("  Analysing events %s to %s", n_events, n_events + n_events_chunk)
+            n_events += n_events_chunk
+
+            collections = _get_collections(
+                particles,
+                n_events_chunk,
+                collections_used,
+                jet_clustering,
+                acceptance_pt_min_e,
+                acceptance_pt_min_mu,
+                acceptance_pt_min_a,
+                acceptance_pt_min_j,
+                acceptance_eta_max_e,
+                acceptance_eta_max_mu,
+                acceptance_eta_max_a,
+                acceptance_eta_max_j,
+            )
+
+            if weight_labels is None:
+                weights = None
+            elif len(weights) != len(weight_labels):
+                raise RuntimeError(
+                    f"Found {len(weights)} weights in HepMC file {hepmc_sample_file}, expected {len(weight_labels)}"
+                )
+
+            yield collections, n_events_chunk, weights
+
+    return analyse_chunks(chunks(), observables, cuts, weight_labels, engine)
+
+
+def read_hepmc_chunks(filename, chunk_size=10000):
+    """
+    Streams the final-state particles and the weights of a HepMC file in chunks of events.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the HepMC2 or HepMC3 (ASCII) file, which may be compressed (see `open_file()`).
+
+    chunk_size : int, optional
+        Number of events per chunk. Default value: 10000.
+
+    Yields
+    ------
+    particles : dict
+        Flat arrays "event_index" (within the chunk, ascending), "pdgid", and "momenta" (px, py, pz, E in GeV, with
+        shape `(n_particles, 4)`) of the particles with status 1.
+
+    weights : ndarray
+        Event weights with shape `(n_weights, n_events)`, from the "E" lines of HepMC2 files or the "W" lines of
+        HepMC3 files.
+    """
+
+    version = 2
+    chunk = _HepMCChunk()
+
+    with open_file(filename, encoding="latin-1") as file:
+        for line in file:
+            if line.startswith("P "):
+                terms = line.split()
+                pdgid_column, momentum_column, status_column = _PARTICLE_COLUMNS[version]
+                if terms[status_column] == "1":
+                    chunk.add_particle(terms[pdgid_column], terms[momentum_column : momentum_column + 4])
+
+            elif line.startswith("E "):
+                if chunk.n_events == chunk_size:
+                    yield chunk.arrays()
+                    chunk = _HepMCChunk()
+
+                weights = []
+                if version == 2:
+                    terms = line.split()
+                    n_random_states = int(terms[11])
+                    n_weights = int(terms[12 + n_random_states])
+                    weights = terms[13 + n_random_states : 13 + n_random_states + n_weights]
+                chunk.add_event(weights)
+
+            # Weight values in HepMC3 events (the weight names before the first event are skipped)
+            elif line.startswith("W ") and version == 3 and chunk.n_events > 0:
+                chunk.weights[-1] = line.split()[1:]
+
+            elif line.startswith("U ") and chunk.n_events > 0:
+                chunk.unit_factors[-1] = _MOMENTUM_UNITS[line.split()[1].upper()]
+
+            elif line.startswith("HepMC::Asciiv3"):
+                version = 3
+
+    if chunk.n_events > 0:
+        yield chunk.arrays()
+
+
+class _HepMCChunk:
+    """Final-state particles and weights of a chunk of HepMC events, collected into compact arrays"""
+
+    def __init__(self):
+        self.n_events = 0
+        self.event_index = array.array("q")
+        self.pdgids = array.array("q")
+        self.momenta = array.array("d")
+        self.unit_factors = array.array("d")
+        self.weights = []
+
+    def add_event(self, weights):
+        self.n_events += 1
+        self.unit_factors.append(1.0)
+        self.weights.append(weights)
+
+    def add_particle(self, pdgid, momentum):
+        self.event_index.append(self.n_events - 1)
+        self.pdgids.append(int(pdgid))
+        self.momenta.extend(float(value) for value in momentum)
+
+    def arrays(self):
+        event_index = np.frombuffer(self.event_index, dtype=np.int64)
+        momenta = np.frombuffer(self.momenta, dtype=np.float64).reshape((-1, 4))
+        momenta = momenta * np.frombuffer(self.unit_factors, dtype=np.float64)[event_index, np.newaxis]
+
+        try:
+            weights = np.array(self.weights, dtype=np.float64).reshape((self.n_events, -1)).T
+        except ValueError:
+            raise RuntimeError("Inconsistent number of weights in the events of the HepMC file")
+
+        particles = {
+            "event_index": event_index,
+            "pdgid": np.frombuffer(self.pdgids, dtype=np.int64),
+            "momenta": momenta,
+        }
+        return particles, weights
+
+
+def _get_collections(
+    particles,
+    n_events,
+    collections_used,
+    jet_clustering,
+    pt_min_e,
+    pt_min_mu,
+    pt_min_a,
+    pt_min_j,
+    eta_max_e,
+    eta_max_mu,
+    eta_max_a,
+    eta_max_j,
+):
+    """
+    Builds the object collections of a chunk of events from its final-state particles, see `make_collection()`. The
+    objects of each event are sorted by descending pT.
+    """
+
+    event_index, pdgids, momenta = particles["event_index"], particles["pdgid"], particles["momenta"]
+    branches = _branches(momenta)
+
+    order = np.lexsort((-branches["PT"], event_index))
+    event_index, pdgids, momenta = event_index[order], pdgids[order], momenta[order]
+    branches = {key: values[order] for key, values in branches.items()}
+
+    electrons, photons, muons, leptons = get_particle_collections(
+        event_index, branches, pdgids, pt_min_e, pt_min_mu, pt_min_a, eta_max_e, eta_max_mu, eta_max_a
+    )
+
+    # Jets and MET are only built if they are used
+    is_visible = ~np.isin(pdgids, list(get_pdg_table().neutrino_pdgids))
+
+    if jet_clustering is not None and "j" in collections_used:
+        jet_index = jet_clustering(event_index[is_visible], momenta[is_visible])
+        jet_event_index, jet_momenta = combine_constituents(event_index[is_visible], jet_index, momenta[is_visible])
+    else:
+        jet_event_index, jet_momenta = np.zeros(0, dtype=np.int64), np.zeros((0, 4))
+    jets = _get_jets(jet_event_index, jet_momenta, pt_min_j, eta_max_j)
+
+    collections = OrderedDict([("e", electrons), ("j", jets), ("a", photons), ("mu", muons), ("l", leptons)])
+    if "met" in collections_used:
+        collections["met"] = _get_met(event_index[is_visible], momenta[is_visible], n_events)
+
+    return collections
+
+
+def _branches(momenta):
+    """Transverse momenta, pseudorapidities, azimuthal angles, and energies of momenta (px, py, pz, E)"""
+
+    px, py, pz, e = momenta.T
+    pt = np.hypot(px, py)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        eta = np.arcsinh(pz / pt)
+
+    return {"PT": pt, "Eta": eta, "Phi": np.arctan2(py, px), "E": e}
+
+
+def _get_jets(event_index, momenta, pt_min, eta_max):
+    event_index = np.asarray(event_index, dtype=np.int64)
+    momenta = np.asarray(momenta, dtype=np.float64).reshape((-1, 4))
+    branches = _branches(momenta)
+
+    order = np.lexsort((-branches["PT"], event_index))
+    event_index = event_index[order]
+    branches = {key: values[order] for key, values in branches.items()}
+    mass = np.sqrt(np.maximum(branches["E"] ** 2 - np.sum(momenta[order, :3] ** 2, axis=1), 0.0))
+
+    n_jets = len(event_index)
+    pdgids = np.full(n_jets, 9, dtype=np.int64)
+    tags = {tag: np.zeros(n_jets, dtype=bool) for tag in ["tau_tag", "b_tag", "t_tag"]}
+    mask = acceptance_mask(branches, pt_min, eta_max)
+    return make_collection(event_index, branches, pdgids, mass=mass, mask=mask, tags=tags)
+
+
+def _get_met(event_index, momenta, n_events):
+    px = -np.bincount(event_index, weights=momenta[:, 0], minlength=n_events)
+    py = -np.bincount(event_index, weights=momenta[:, 1], minlength=n_events)
+    branches = {"PT": np.hypot(px, py), "Phi": np.arctan2(py, px), "Eta": np.zeros(n_events)}
+    pdgids = np.zeros(n_events, dtype=np.int64)
+    return make_collection(np.arange(n_events), branches, pdgids, mass=0.0)
@@ -1,6 +1,10 @@
+import gzip
+import io
 import logging
+import os
+import re
+import shutil
 import xml.etree.ElementTree as ET
-
 from collections import OrderedDict
 from pathlib import Path
 from typing import Callable
@@ -8,21 +12,52 @@ from typing import Dict
 from typing import List
 
 import numpy as np
+import vector
 
-from particle import Particle
 from madminer.models import Cut
 from madminer.models import Efficiency
 from madminer.models import Observable
 from madminer.models import Systematic
 from madminer.models import SystematicScale
 from madminer.models import SystematicType
+from madminer.utils.columnar import ObjectCollection
+from madminer.utils.columnar import ParticleArray
+from madminer.utils.columnar import evaluate_definition
+from madminer.utils.columnar import vectorized_math_commands
+from madminer.utils.expressions import compile_expression
+from madminer.utils.expressions import log_expression_timings
+from madminer.utils.interfaces.cache import AnalysisCache
+from madminer.utils.interfaces.cache import definition_hash
+from madminer.utils.jets import combine_constituents
 from madminer.utils.particle import MadMinerParticle
-from madminer.utils.various import unzip_file
+from madminer.utils.particle import get_pdg_table
+from madminer.utils.various import open_file
+from madminer.utils.various import COMPRESSED_EXTENSIONS
+from madminer.utils.various import DEFAULT_BUFFER_SIZE
 from madminer.utils.various import approx_equal
 from madminer.utils.various import math_commands
 
 logger = logging.getLogger(__name__)
 
+# Beginning of an event block (at the start of a line) in LHE files
+_EVENT_TAG = re.compile(rb"\n[ \t]*<event[\s>]")
+_EVENT_TAG_MAX_LENGTH = 256
+
+# Keep the position of every n-th event when scanning compressed LHE files
+_EVENT_OFFSET_STRIDE = 10
+
+# Beginning of an event block and end of the file, for lines of LHE files
+_EVENT_LINE = re.compile(rb"[ \t]*<event[\s>]")
+_END_LINE = re.compile(rb"[ \t]*</LesHouchesEvents>")
+
+# Compression level of written LHE files
+_GZIP_COMPRESSION_LEVEL = 6
+
+# Event blocks, the event weight (third entry of the line after the event tag), and reweighting weights
+_EVENT_BLOCK = re.compile(rb"<event(?:\s[^>]*)?>(.*?)</event>", re.S)
+_EVENT_WEIGHT = re.compile(rb"\A\s*\S+\s+\S+\s+(\S+)")
+_RWGT_WEIGHT = re.compile(rb"<wgt\s+id\s*=\s*['\"]([^'\"]*)['\"][^>]*>\s*([^<\s]+)\s*</wgt>")
+
 
 def parse_lhe_file(
     filename,
@@ -39,11 +74,42 @@ def parse_lhe_file(
     k_factor=1.0,
     parse_events_as_xml=True,
     systematics_dict=None,
+    engine="columnar",
+    chunk_size=100000,
+    byte_range=None,
+    random_state=None,
+    cache=False,
+    event_sink=None,
+    jet_clustering=None,
 ):
-    """Extracts observables and weights from a LHE file"""
+    """
+    Extracts observables and weights from a LHE file. If byte_range is given (one of the ranges returned by
+    `split_lhe_file()`), only the events in this range are analysed.
+
+    The engine ("columnar" or "events") decides how observables, cuts, and efficiencies are evaluated, see
+    `LHEReader.analyse_samples()`, which uses the same default.
+
+    If event_sink is given, the observations and weights of the events that pass all cuts are not returned, but passed
+    to event_sink as two OrderedDicts in chunks of at most chunk_size events, so that they never have to be kept in
+    memory all at once. The function then returns the number of events that pass all cuts.
+
+    If cache is True, the columnar engine stores the parsed events in a sidecar file next to the LHE file (see
+    `AnalysisCache`) and reuses them in later calls instead of parsing the LHE file again.
+
+    The columnar engine draws the smearing and MET noise from a `np.random.Generator` created from random_state (an
+    int, a SeedSequence, or a Generator); if random_state is None, its seed is drawn from NumPy's global random state.
+    The events engine always uses NumPy's global random state.
+
+    By default, every quark and gluon is a jet. If jet_clustering is given (for instance a
+    `madminer.utils.jets.JetClustering`), the (smeared) quarks and gluons of each chunk of events are clustered into
+    jets instead, see `madminer.utils.jets.cluster_jets()`. The jets are tagged if any of their constituents is.
+    """
 
     logger.debug("Parsing LHE file %s", filename)
 
+    if engine not in ["events", "columnar"]:
+        raise ValueError(f"Unknown LHE analysis engine {engine}")
+
     if parse_events_as_xml:
         logger.debug("Parsing header and events as XML with ElementTree")
     else:
@@ -59,63 +125,7 @@ def parse_lhe_file(
     if is_background and benchmark_names is None:
         raise RuntimeError("Parsing background LHE files required benchmark names to be provided.")
 
-    # Unzip and open LHE file
-    run_card = None
-    for elem in _untar_and_parse_lhe_file(filename):
-        if elem.tag == "MGRunCard":
-            run_card = elem.text
-            break
-        else:
-            continue
-
-    # Figure out event weighting
-    weight_norm_is_average = None
-    n_events_runcard = None
-    for line in run_card.splitlines():
-        # Remove run card comments
-        try:
-            line, _ = line.split("!")
-        except:
-            pass
-
-        # Separate in keys and values
-        try:
-            value, key = line.split("=")
-        except:
-            continue
-
-        # Remove spaces
-        value = value.strip()
-        key = key.strip()
-
-        # Parse entries
-        if key == "nevents":
-            n_events_runcard = float(value)
-        if key == "event_norm":
-            weight_norm_is_average = value == "average"
-
-            logger.debug(
-                "Found entry event_norm = %s in LHE header. Interpreting this as weight_norm_is_average = %s.",
-                value,
-                weight_norm_is_average,
-            )
-
-    if weight_norm_is_average is None:
-        logger.warning(
-            "Cannot read weight normalization mode (entry 'event_norm') from LHE file header. "
-            "MadMiner will continue assuming that events are properly normalized. "
-            "Please check this!"
-        )
-
-    # If necessary, rescale by number of events
-    if weight_norm_is_average:
-        if n_events_runcard is None:
-            raise RuntimeError(
-                "LHE weights have to be normalized, "
-                "but MadMiner cannot read number of events (entry 'nevents') from LHE file header."
-            )
-
-        k_factor = k_factor / n_events_runcard
+    k_factor, n_events_runcard = _get_event_normalization(filename, k_factor)
 
     # Loop over events
     n_events_with_negative_weights = 0
@@ -128,10 +138,59 @@ def parse_lhe_file(
     observations_all_events = []
     weights_all_events = []
     weight_names_all_events = None
+    n_events_flushed = 0
+
+    def flush(observations, weights, weight_names):
+        nonlocal n_events_flushed
+        if len(observations) == 0:
+            return
+        n_events_flushed += len(observations)
+        event_sink(
+            *_organize_results(
+                observables,
+                observations,
+                weights,
+                weight_names,
+                k_factor,
+                sampling_benchmark,
+                benchmark_names,
+                is_background,
+                systematics_dict,
+            )
+        )
 
-    # Option one: XML parsing
-    if parse_events_as_xml:
-        events = _untar_and_parse_lhe_file(filename, ["event"])
+    # Option one: columnar analysis of chunks of events
+    if engine == "columnar":
+        (
+            n_events_with_negative_weights,
+            observations_all_events,
+            weights_all_events,
+            weight_names_all_events,
+        ) = _parse_events_columnar(
+            filename,
+            sampling_benchmark,
+            observables,
+            cuts,
+            efficiencies,
+            (energy_resolutions, pt_resolutions, eta_resolutions, phi_resolutions),
+            _get_generator(random_state),
+            avg_efficiencies,
+            fail_cuts,
+            fail_efficiencies,
+            pass_cuts,
+            pass_efficiencies,
+            parse_events_as_xml=parse_events_as_xml,
+            chunk_size=chunk_size,
+            n_events_runcard=n_events_runcard,
+            byte_range=byte_range,
+            cache=AnalysisCache(filename) if cache else None,
+            chunk_sink=flush if event_sink is not None else None,
+            jet_clustering=jet_clustering,
+        )
+
+    # Option two: XML parsing
+    elif parse_events_as_xml:
+        events = _untar_and_parse_lhe_file(filename, ["event"], byte_range=byte_range)
         for i_event, event in enumerate(events, start=1):
             if i_event % 100000 == 0:
                 logger.info("  Processing event %d/%d", i_event, n_events_runcard)
@@ -157,6 +216,7 @@ def parse_lhe_file(
                 weights,
                 global_event_data=global_event_data,
                 print_event=i_event if i_event <= 20 else 0,
+                jet_clustering=jet_clustering,
             )
 
             # Skip events that fail anything
@@ -167,10 +227,15 @@ def parse_lhe_file(
             observations_all_events.append(observations)
             weights_all_events.append(weights)
 
-    # Option two: text parsing
+            if event_sink is not None and len(observations_all_events) >= chunk_size:
+                flush(observations_all_events, weights_all_events, weight_names_all_events)
+                observations_all_events, weights_all_events = [], []
+
+    # Option three: text parsing
     else:
         # Iterate over events in LHE file
-        for i_event, (particles, weights) in enumerate(_parse_txt_events(filename, sampling_benchmark), start=1):
+        txt_events = _parse_txt_events(filename, sampling_benchmark, byte_range=byte_range)
+        for i_event, (particles, weights) in enumerate(txt_events, start=1):
             if i_event % 100000 == 0:
                 logger.info("  Processing event %d/%d", i_event, n_events_runcard)
 
@@ -192,6 +257,7 @@ def parse_lhe_file(
                 weight_names_all_events,
                 weights,
                 print_event=i_event if i_event <= 20 else 0,
+                jet_clustering=jet_clustering,
             )
 
             # Skip events that fail anything
@@ -202,6 +268,15 @@ def parse_lhe_file(
             observations_all_events.append(observations)
             weights_all_events.append(weights)
 
+            if event_sink is not None and len(observations_all_events) >= chunk_size:
+                flush(observations_all_events, weights_all_events, weight_names_all_events)
+                observations_all_events, weights_all_events = [], []
+
+    # Remaining events
+    if event_sink is not None:
+        flush(observations_all_events, weights_all_events, weight_names_all_events)
+        observations_all_events, weights_all_events = [], []
+
     # Check results
     n_events_pass = _report_parse_results(
         avg_efficiencies,
@@ -210,25 +285,112 @@ def parse_lhe_file(
         fail_cuts,
         fail_efficiencies,
         n_events_with_negative_weights,
-        observations_all_events,
+        n_events_flushed + len(observations_all_events),
         pass_cuts,
         pass_efficiencies,
     )
+    log_expression_timings()
+
+    if event_sink is not None:
+        return n_events_pass
 
     if n_events_pass == 0:
         logger.warning("  No observations remaining!")
         return None, None
 
+    return _organize_results(
+        observables,
+        observations_all_events,
+        weights_all_events,
+        weight_names_all_events,
+        k_factor,
+        sampling_benchmark,
+        benchmark_names,
+        is_background,
+        systematics_dict,
+    )
+
+
+def parse_lhe_weights(
+    filename,
+    sampling_benchmark,
+    benchmark_names,
+    is_background=False,
+    k_factor=1.0,
+    systematics_dict=None,
+):
+    """
+    Extracts only the weights of all events from a LHE file, for instance to combine them with observables calculated
+    from a Delphes file. The events are scanned for their weights without parsing the particles, which is much faster
+    than `parse_lhe_file()` without observables. No cuts, efficiencies, or smearing are applied.
+
+    Returns an OrderedDict of weights with shape (n_events,) for each benchmark (organized like the weights returned by
+    `parse_lhe_file()`), or None if the file contains no events.
+    """
+
+    logger.debug("Scanning LHE file %s for weights", filename)
+
+    if k_factor is None:
+        k_factor = 1.0
+    if systematics_dict is None:
+        systematics_dict = OrderedDict()
+    if is_background and benchmark_names is None:
+        raise RuntimeError("Parsing background LHE files required benchmark names to be provided.")
+
+    k_factor, n_events_runcard = _get_event_normalization(filename, k_factor)
+    weights, weight_names = _scan_lhe_weights(filename, sampling_benchmark, n_events_runcard)
+
+    n_events_with_negative_weights = np.sum(np.any(weights < 0.0, axis=1))
+    if n_events_with_negative_weights > 0:
+        logger.warning("  %s events contain negative weights", n_events_with_negative_weights)
+
+    if len(weights) == 0:
+        logger.warning("  No events found!")
+        return None
+
+    _, output_weights = _organize_results(
+        OrderedDict(),
+        np.zeros((len(weights), 0)),
+        weights,
+        weight_names,
+        k_factor,
+        sampling_benchmark,
+        benchmark_names,
+        is_background,
+        systematics_dict,
+    )
+    return output_weights
+
+
+def _organize_results(
+    observables,
+    observations,
+    weights,
+    weight_names,
+    k_factor,
+    sampling_benchmark,
+    benchmark_names,
+    is_background,
+    systematics_dict,
+):
+    """
+    Reformats the observations and weights of the events that pass all cuts, given as arrays or lists with shapes
+    (n_events, n_observables) and (n_events, n_weights), into OrderedDicts for each observable and benchmark
+    """
+
     # Reformat observations to OrderedDicts with entries {observable_name : (n_events,)}
-    observations_all_events = list(map(list, zip(*observations_all_events)))  # transposes to (n_observables, n_events)
+    if isinstance(observations, np.ndarray):
+        observations = observations.T
+    else:
+        observations = list(map(list, zip(*observations)))  # transposes to (n_observables, n_events)
     observations_dict = OrderedDict()
-    for key, values in zip(observables.keys(), observations_all_events):
+    for key, values in zip(observables.keys(), observations):
         observations_dict[key] = np.asarray(values)
 
     # Reformat weights and add k-factors to weights
-    weights_all_events = np.array(weights_all_events)  # (n_events, n_weights)
+    weights_all_events = np.array(weights)  # (n_events, n_weights)
     weights_all_events = k_factor * weights_all_events
-    weights_all_events = OrderedDict(zip(weight_names_all_events, weights_all_events.T))
+    weights_all_events = OrderedDict(zip(weight_names, weights_all_events.T))
 
     # Background events
     if is_background:
@@ -271,6 +433,456 @@ def parse_lhe_file(
     return observations_dict, output_weights
 
 
+def _get_event_normalization(filename, k_factor):
+    """
+    Reads the weight normalization from the run card in the LHE header. Returns the k factor, divided by the number
+    of events if the weights are averages, and the number of events in the run card (or None).
+    """
+
+    # Unzip and open LHE file
+    run_card = None
+    for elem in _untar_and_parse_lhe_file(filename):
+        if elem.tag == "MGRunCard":
+            run_card = elem.text
+            break
+        else:
+            continue
+
+    # Figure out event weighting
+    weight_norm_is_average = None
+    n_events_runcard = None
+    for line in run_card.splitlines():
+        # Remove run card comments
+        try:
+            line, _ = line.split("!")
+        except:
+            pass
+
+        # Separate in keys and values
+        try:
+            value, key = line.split("=")
+        except:
+            continue
+
+        # Remove spaces
+        value = value.strip()
+        key = key.strip()
+
+        # Parse entries
+        if key == "nevents":
+            n_events_runcard = float(value)
+        if key == "event_norm":
+            weight_norm_is_average = value == "average"
+
+            logger.debug(
+                "Found entry event_norm = %s in LHE header. Interpreting this as weight_norm_is_average = %s.",
+                value,
+                weight_norm_is_average,
+            )
+
+    if weight_norm_is_average is None:
+        logger.warning(
+            "Cannot read weight normalization mode (entry 'event_norm') from LHE file header. "
+            "MadMiner will continue assuming that events are properly normalized. "
+            "Please check this!"
+        )
+
+    # If necessary, rescale by number of events
+    if weight_norm_is_average:
+        if n_events_runcard is None:
+            raise RuntimeError(
+                "LHE weights have to be normalized, "
+                "but MadMiner cannot read number of events (entry 'nevents') from LHE file header."
+            )
+
+        k_factor = k_factor / n_events_runcard
+
+    return k_factor, n_events_runcard
+
+
+def _get_generator(random_state=None):
+    """Returns a `np.random.Generator`, seeded from NumPy's global random state if random_state is None"""
+
+    if random_state is None:
+        random_state = np.random.randint(0, 2**31 - 1)
+    return np.random.default_rng(random_state)
+
+
+def _parse_events_columnar(
+    filename,
+    sampling_benchmark,
+    observables: Dict[str, Observable],
+    cuts: List[Cut],
+    efficiencies: List[Efficiency],
+    resolutions,
+    rng,
+    avg_efficiencies,
+    fail_cuts,
+    fail_efficiencies,
+    pass_cuts,
+    pass_efficiencies,
+    parse_events_as_xml=True,
+    chunk_size=100000,
+    n_events_runcard=None,
+    byte_range=None,
+    cache=None,
+    chunk_sink=None,
+    jet_clustering=None,
+):
+    """
+    Parses events into flat arrays and analyses them in chunks, evaluating expressions on whole chunks. If cache is an
+    `AnalysisCache`, the parsed events are read from it or written to it. If chunk_sink is given, it is called with the
+    observations, weights, and weight names of each chunk, which are then not returned.
+    """
+
+    logger.debug("Analysing events in chunks of %s events", chunk_size)
+
+    chunks = None
+    writer = None
+    if cache is not None:
+        events_key = definition_hash(sampling_benchmark, parse_events_as_xml, byte_range)
+        chunks = cache.load_events(events_key, chunk_size)
+        if chunks is None:
+            writer = cache.events_writer(events_key)
+    if chunks is None:
+        chunks = _parse_event_chunks(filename, sampling_benchmark, parse_events_as_xml, chunk_size, byte_range)
+
+    n_events_with_negative_weights = 0
+    observations_chunks = []
+    weights_chunks = []
+    weight_names = None
+    n_events = 0
+
+    # Definitions that cannot be vectorized are evaluated event by event in all chunks
+    unsupported = set()
+
+    try:
+        for particle_rows, multiplicities, weights, weight_names, global_event_data in chunks:
+            if writer is not None:
+                writer.append(particle_rows, multiplicities, weights, weight_names, global_event_data)
+
+            chunk_observations, chunk_weights, chunk_n_negative = _analyse_chunk_columnar(
+                particle_rows,
+                multiplicities,
+                weights,
+                global_event_data,
+                observables,
+                cuts,
+                efficiencies,
+                resolutions,
+                rng,
+                avg_efficiencies,
+                fail_cuts,
+                fail_efficiencies,
+                pass_cuts,
+                pass_efficiencies,
+                jet_clustering,
+                unsupported,
+            )
+            if chunk_sink is not None:
+                chunk_sink(chunk_observations, chunk_weights, weight_names)
+            else:
+                observations_chunks.append(chunk_observations)
+                weights_chunks.append(chunk_weights)
+            n_events_with_negative_weights += chunk_n_negative
+            n_events += len(multiplicities)
+            logger.info("  Processed event %d/%s", n_events, n_events_runcard)
+
+    except BaseException:
+        if writer is not None:
+            writer.close(complete=False)
+        raise
+
+    if writer is not None:
+        writer.close()
+
+    if len(observations_chunks) == 0:
+        return n_events_with_negative_weights, np.zeros((0, len(observables))), np.zeros((0, 0)), weight_names
+
+    return (
+        n_events_with_negative_weights,
+        np.concatenate(observations_chunks, axis=0),
+        np.concatenate(weights_chunks, axis=0),
+        weight_names,
+    )
+
+
+def _parse_event_chunks(filename, sampling_benchmark, parse_events_as_xml=True, chunk_size=100000, byte_range=None):
+    """
+    Parses events into flat arrays, yielding chunks `(particle_rows, multiplicities, weights, weight_names,
+    global_event_data)` like `AnalysisCache.load_events()`
+    """
+
+    if parse_events_as_xml:
+        raw_events = (
+            _parse_xml_event_raw(event, sampling_benchmark)
+            for event in _untar_and_parse_lhe_file(filename, ["event"], byte_range=byte_range)
+        )
+    else:
+        raw_events = (
+            (particle_rows, weights, None)
+            for particle_rows, weights in _parse_txt_events_raw(filename, sampling_benchmark, byte_range=byte_range)
+        )
+
+    weight_names = None
+    particle_rows, multiplicities, weights, global_event_data = [], [], [], []
+
+    def chunk():
+        return (
+            np.asarray(particle_rows, dtype=np.float64).reshape((-1, 6)),
+            np.asarray(multiplicities, dtype=np.int64),
+            np.asarray(weights, dtype=np.float64),
+            weight_names,
+            # Global event data as arrays
+            (
+                {key: np.array([data[key] for data in global_event_data]) for key in global_event_data[0]}
+                if parse_events_as_xml
+                else None
+            ),
+        )
+
+    for event_particle_rows, event_weights, event_global_data in raw_events:
+        if weight_names is None:
+            weight_names = list(event_weights.keys())
+
+        particle_rows += event_particle_rows
+        multiplicities.append(len(event_particle_rows))
+        weights.append(list(event_weights.values()))
+        global_event_data.append(event_global_data)
+
+        if len(multiplicities) >= chunk_size:
+            yield chunk()
+            particle_rows, multiplicities, weights, global_event_data = [], [], [], []
+
+    if len(multiplicities) > 0:
+        yield chunk()
+
+
+def _analyse_chunk_columnar(
+    particle_rows,
+    multiplicities,
+    weights,
+    global_event_data,
+    observables: Dict[str, Observable],
+    cuts: List[Cut],
+    efficiencies: List[Efficiency],
+    resolutions,
+    rng,
+    avg_efficiencies,
+    fail_cuts,
+    fail_efficiencies,
+    pass_cuts,
+    pass_efficiencies,
+    jet_clustering=None,
+    unsupported=None,
+):
+    n_events = len(multiplicities)
+    pdgids = particle_rows[:, 0].astype(int)
+    event_index = np.repeat(np.arange(n_events), multiplicities)
+
+    # Negative weights
+    n_events_with_negative_weights = int(np.sum(np.any(weights < 0.0, axis=1)))
+
+    # Smearing
+    momenta = particle_rows[:, 1:5]
+    is_smeared, smeared_momenta = _smear_particles_columnar(pdgids, momenta, *resolutions, rng)
+
+    # MET noise, no noise if it is not defined (like in _parse_event())
+    pt_resolutions = resolutions[1]
+    met_resolution = None
+    if pt_resolutions is not None and pt_resolutions.get("met") not in [None, (0.0, 0.0)]:
+        if None not in pt_resolutions["met"]:
+            met_resolution = pt_resolutions["met"]
+
+    # Objects
+    variables, collections = _get_objects_columnar(
+        pdgids,
+        momenta,
+        particle_rows[:, 5],
+        event_index,
+        n_events,
+        is_smeared,
+        smeared_momenta,
+        met_resolution,
+        rng,
+        global_event_data,
+        jet_clustering,
+    )
+    met = variables["met"]
+
+    # Event-by-event objects, only built for expressions that cannot be evaluated on arrays
+    event_starts = np.cumsum(multiplicities) - multiplicities
+    event_variables_cache = {}
+
+    def event_variables(i_event):
+        if i_event not in event_variables_cache:
+            start, end = event_starts[i_event], event_starts[i_event] + multiplicities[i_event]
+            particles = [_build_particle(int(row[0]), *row[1:]) for row in particle_rows[start:end]]
+            if is_smeared is None:
+                particles_smeared = particles
+            else:
+                # Like the particles rebuilt by _smear_particles(), without spin
+                particles_smeared = [
+                    _build_smeared_particle(int(pdgids[i]), *smeared_momenta[i])
+                    for i in range(start, end)
+                    if is_smeared[i]
+                ]
+            this_global_data = None
+            if global_event_data is not None:
+                this_global_data = {key: float(values[i_event]) for key, values in global_event_data.items()}
+            this_variables = _get_objects(
+                particles_smeared,
+                particles,
+                met_resolution=None,
+                global_event_data=this_global_data,
+                jet_clustering=jet_clustering,
+            )
+            # Same MET noise as in the columnar objects
+            this_variables["met"] = MadMinerParticle.from_xyzt(
+                float(met.px[i_event]), float(met.py[i_event]), 0.0, float(met.e[i_event])
+            )
+            event_variables_cache[i_event] = this_variables
+        return event_variables_cache[i_event]
+
+    # Observables
+    observations, pass_all_observation = _parse_observations_columnar(
+        observables, variables, collections, n_events, event_variables, unsupported
+    )
+
+    # Objects for cuts and efficiencies
+    observations_by_name = dict(zip(observables.keys(), observations.T))
+    variables.update(observations_by_name)
+
+    def event_variables_with_observations(i_event):
+        this_variables = event_variables(i_event)
+        this_variables.update({key: values[i_event] for key, values in observations_by_name.items()})
+        return this_variables
+
+    # Cuts
+    pass_all_cuts = _parse_cuts_columnar(
+        cuts,
+        fail_cuts,
+        pass_cuts,
+        variables,
+        collections,
+        n_events,
+        event_variables_with_observations,
+        pass_all_observation,
+        unsupported,
+    )
+
+    # Efficiencies
+    pass_all_efficiencies, total_efficiency = _parse_efficiencies_columnar(
+        avg_efficiencies,
+        efficiencies,
+        fail_efficiencies,
+        pass_efficiencies,
+        variables,
+        collections,
+        n_events,
+        event_variables_with_observations,
+        pass_all_observation & pass_all_cuts,
+        unsupported,
+    )
+
+    pass_all = pass_all_observation & pass_all_cuts & pass_all_efficiencies
+    weights = weights[pass_all] * total_efficiency[pass_all, np.newaxis]
+
+    return observations[pass_all], weights, n_events_with_negative_weights
+
+
+def _parse_observations_columnar(
+    observables: Dict[str, Observable], variables, collections, n_events, event_variables, unsupported=None
+):
+    observations = np.empty((n_events, len(observables)))
+    passed_all = np.ones(n_events, dtype=bool)
+
+    for i_observable, observable in enumerate(observables.values()):
+        values, failed = evaluate_definition(
+            observable.val_expression,
+            variables,
+            collections,
+            n_events,
+            event_variables,
+            (IndexError, NameError, RuntimeError, SyntaxError, TypeError, ZeroDivisionError),
+            function_arguments=("p_truth", "l", "a", "j", "met"),
+            unsupported=unsupported,
+        )
+
+        default = observable.val_default if observable.val_default is not None else np.nan
+        observations[:, i_observable] = np.where(failed, default, values)
+
+        if observable.is_required:
+            passed_all &= ~failed
+
+    return observations, passed_all
+
+
+def _parse_cuts_columnar(
+    cuts, fail_cuts, pass_cuts, variables, collections, n_events, event_variables, evaluated, unsupported=None
+):
+    pass_all_cuts = np.ones(n_events, dtype=bool)
+
+    for i_cut, cut in enumerate(cuts):
+        values, failed = evaluate_definition(
+            cut.val_expression,
+            variables,
+            collections,
+            n_events,
+            event_variables,
+            (SyntaxError, NameError, TypeError, ZeroDivisionError, IndexError),
+            evaluated=evaluated,
+            unsupported=unsupported,
+        )
+
+        cut_result = np.where(failed, bool(cut.is_required), values.astype(bool))
+        pass_cuts[i_cut] += int(np.sum(cut_result & evaluated))
+        fail_cuts[i_cut] += int(np.sum(~cut_result & evaluated))
+        pass_all_cuts &= cut_result
+
+    return pass_all_cuts
+
+
+def _parse_efficiencies_columnar(
+    avg_efficiencies,
+    efficiencies,
+    fail_efficiencies,
+    pass_efficiencies,
+    variables,
+    collections,
+    n_events,
+    event_variables,
+    evaluated,
+    unsupported=None,
+):
+    total_efficiency = np.ones(n_events)
+    pass_all_efficiencies = np.ones(n_events, dtype=bool)
+
+    for i_efficiency, efficiency in enumerate(efficiencies):
+        values, failed = evaluate_definition(
+            efficiency.val_expression,
+            variables,
+            collections,
+            n_events,
+            event_variables,
+            (SyntaxError, NameError, TypeError, ZeroDivisionError, IndexError),
+            evaluated=evaluated,
+            unsupported=unsupported,
+        )
+
+        values = np.where(failed, efficiency.val_default, values)
+        passed = values > 0.0
+
+        pass_efficiencies[i_efficiency] += int(np.sum(passed & evaluated))
+        fail_efficiencies[i_efficiency] += int(np.sum(~passed & evaluated))
+        avg_efficiencies[i_efficiency] += float(np.sum(values[passed & evaluated]))
+
+        total_efficiency = np.where(passed, total_efficiency * values, total_efficiency)
+        pass_all_efficiencies &= passed
+
+    return pass_all_efficiencies, total_efficiency
+
+
 def _report_parse_results(
     avg_efficiencies,
     cuts,
@@ -278,7 +890,7 @@ def _report_parse_results(
     fail_cuts,
     fail_efficiencies,
     n_events_with_negative_weights,
-    observations_all_events,
+    n_events_pass,
     pass_cuts,
     pass_efficiencies,
 ):
@@ -289,8 +901,6 @@ def _report_parse_results(
     for n_eff, efficiency, n_pass, n_fail in zip(avg_efficiencies, efficiencies, pass_efficiencies, fail_efficiencies):
         logger.info("  average efficiency for %s is %s", efficiency, n_eff / (n_pass + n_fail))
 
-    n_events_pass = len(observations_all_events)
-
     if len(cuts) > 0:
         logger.info("  %s events pass all cuts/efficiencies", n_events_pass)
     if n_events_with_negative_weights > 0:
@@ -318,6 +928,7 @@ def _parse_event(
     weights,
     global_event_data=None,
     print_event=0,
+    jet_clustering=None,
 ):
     # Negative weights?
     n_events_with_negative_weights = _report_negative_weights(n_events_with_negative_weights, weights)
@@ -333,10 +944,20 @@ def _parse_event(
     # Objects in event
     try:
         variables = _get_objects(
-            particles_smeared, particles, pt_resolutions["met"], global_event_data=global_event_data
+            particles_smeared,
+            particles,
+            pt_resolutions["met"],
+            global_event_data=global_event_data,
+            jet_clustering=jet_clustering,
         )
     except (TypeError, IndexError):
-        variables = _get_objects(particles_smeared, particles, met_resolution=None, global_event_data=global_event_data)
+        variables = _get_objects(
+            particles_smeared,
+            particles,
+            met_resolution=None,
+            global_event_data=global_event_data,
+            jet_clustering=jet_clustering,
+        )
 
     # Observables
     observations, pass_all_observation = _parse_observations(observables, variables)
@@ -407,7 +1028,7 @@ def _parse_observations(observables: Dict[str, Observable], variables: Dict[str,
 
         try:
             if isinstance(definition, str):
-                value = eval(definition, variables)
+                value = compile_expression(definition)(variables)
             elif isinstance(definition, Callable):
                 value = definition(
                     variables["p_truth"],
@@ -443,7 +1064,7 @@ def _parse_efficiencies(
         default = efficiency.val_default
 
         try:
-            efficiency_result = eval(definition, variables)
+            efficiency_result = compile_expression(definition)(variables)
             if efficiency_result > 0.0:
                 pass_efficiencies[i_efficiency] += 1
                 total_efficiency *= efficiency_result
@@ -475,7 +1096,7 @@ def _parse_cuts(cuts, fail_cuts, observables, observations, pass_all_cuts, pass_
         required = cut.is_required
 
         try:
-            cut_result = eval(definition, variables)
+            cut_result = compile_expression(definition)(variables)
             if cut_result:
                 pass_cuts[i_cut] += 1
             else:
@@ -690,9 +1311,15 @@ def _extract_nuisance_param_dict(weight_groups: list, systematics_name: str, sys
 
 
 def _parse_xml_event(event, sampling_benchmark):
+    particle_rows, weights, global_event_data = _parse_xml_event_raw(event, sampling_benchmark)
+    particles = [_build_particle(*row) for row in particle_rows]
+    return particles, weights, global_event_data
+
+
+def _parse_xml_event_raw(event, sampling_benchmark):
     # Initialize weights and momenta
     weights = OrderedDict()
-    particles = []
+    particle_rows = []
     global_event_data = {}
 
     # Split kinematics part in tag line and momenta
@@ -724,16 +1351,7 @@ def _parse_xml_event(event, sampling_benchmark):
         if elements[0] == "#aMCatNLO":
             elements = elements[1:]
         if status == 1:
-            pdgid = int(elements[0])
-            px = float(elements[6])
-            py = float(elements[7])
-            pz = float(elements[8])
-            e = float(elements[9])
-            spin = float(elements[12])
-            particle = MadMinerParticle.from_xyzt(px, py, pz, e)
-            particle.set_pdgid(pdgid)
-            particle.set_spin(spin)
-            particles.append(particle)
+            particle_rows.append(_parse_particle_row(elements))
 
     # Weights
     if event.find("rwgt") is not None:
@@ -741,13 +1359,38 @@ def _parse_xml_event(event, sampling_benchmark):
             weight_id, weight_value = weight.attrib["id"], float(weight.text)
             weights[weight_id] = weight_value
 
-    return particles, weights, global_event_data
+    return particle_rows, weights, global_event_data
+
+
+def _parse_particle_row(elements):
+    """Returns (pdgid, px, py, pz, e, spin) from the elements of a particle line"""
+    return (
+        int(elements[0]),
+        float(elements[6]),
+        float(elements[7]),
+        float(elements[8]),
+        float(elements[9]),
+        float(elements[12]),
+    )
+
+
+def _build_particle(pdgid, px, py, pz, e, spin):
+    particle = MadMinerParticle.from_xyzt(px, py, pz, e)
+    particle.set_pdgid(pdgid)
+    particle.set_spin(spin)
+    return particle
+
 
+def _parse_txt_events(filename, sampling_benchmark, byte_range=None):
+    for particle_rows, weights in _parse_txt_events_raw(filename, sampling_benchmark, byte_range=byte_range):
+        particles = [_build_particle(*row) for row in particle_rows]
+        yield particles, weights
 
-def _parse_txt_events(filename, sampling_benchmark):
+
+def _parse_txt_events_raw(filename, sampling_benchmark, byte_range=None):
     # Initialize weights and momenta
     weights = OrderedDict()
-    particles = []
+    particle_rows = []
 
     # Some tags so that we know where in the event we are
     do_tag = False
@@ -760,8 +1403,8 @@ def _parse_txt_events(filename, sampling_benchmark):
     reset_event = False
 
     # Loop through lines in Event
-    with open(filename, "r") as file:
-        for line in file.readlines():
+    with _open_lhe_file(filename, "r", byte_range) as file:
+        for line in file:
             # Clean up line
             try:
                 line = line.split("#")[0]
@@ -782,7 +1425,7 @@ def _parse_txt_events(filename, sampling_benchmark):
             elif line == "<event>":
                 # Initialize weights and momenta
                 weights = OrderedDict()
-                particles = []
+                particle_rows = []
 
                 # Some tags so that we know where in the event we are
                 do_tag = True
@@ -792,11 +1435,11 @@ def _parse_txt_events(filename, sampling_benchmark):
             # End of event
             elif line == "</event>":
                 n_events += 1
-                yield particles, weights
+                yield particle_rows, weights
 
                 # Reset weights and momenta
                 weights = OrderedDict()
-                particles = []
+                particle_rows = []
 
                 # Some tags so that we know where in the event we are
                 do_tag = False
@@ -833,16 +1476,7 @@ def _parse_txt_events(filename, sampling_benchmark):
             elif do_momenta:
                 status = int(elements[1])
                 if status == 1:
-                    pdgid = int(elements[0])
-                    px = float(elements[6])
-                    py = float(elements[7])
-                    pz = float(elements[8])
-                    e = float(elements[9])
-                    spin = float(elements[12])
-                    particle = MadMinerParticle.from_xyzt(px, py, pz, e)
-                    particle.set_pdgid(pdgid)
-                    particle.set_spin(spin)
-                    particles.append(particle)
+                    particle_rows.append(_parse_particle_row(elements))
 
             # Read reweighted weights
             elif do_reweight:
@@ -851,9 +1485,61 @@ def _parse_txt_events(filename, sampling_benchmark):
                 weights[rwgtid] = rwgtval
 
 
+def _scan_lhe_weights(filename, sampling_benchmark, n_events_hint=None):
+    """
+    Scans the events of a LHE file for the event weight and the reweighting weights, without parsing the particles.
+    Returns a (n_events, n_weights) array and the weight names, with the event weight named after sampling_benchmark.
+    """
+
+    capacity = max(int(n_events_hint or 0), 1024)
+    weights = None
+    weight_ids = None
+    weight_names = None
+    n_events = 0
+
+    buffer = b""
+    with open_file(filename, "rb") as file:
+        while True:
+            block = file.read(DEFAULT_BUFFER_SIZE)
+            buffer += block
+
+            # Only complete events, the rest is kept for the next block
+            end = len(buffer) if not block else buffer.rfind(b"</event>") + len(b"</event>")
+            if end < len(b"</event>"):
+                continue
+
+            for event in _EVENT_BLOCK.finditer(buffer, 0, end):
+                event_text = event.group(1)
+                ids, values = [], []
+                for weight_id, value in _RWGT_WEIGHT.findall(event_text):
+                    ids.append(weight_id)
+                    values.append(value)
+
+                if weights is None:
+                    weight_ids = ids
+                    weight_names = [sampling_benchmark] + [weight_id.decode() for weight_id in ids]
+                    weights = np.empty((capacity, len(weight_names)))
+                elif ids != weight_ids:
+                    raise RuntimeError(f"Inconsistent weights in LHE file {filename}: {ids} vs {weight_ids}")
+                if n_events == len(weights):
+                    weights = np.concatenate((weights, np.empty_like(weights)))
+
+                weights[n_events, 0] = float(_EVENT_WEIGHT.match(event_text).group(1))
+                weights[n_events, 1:] = [float(value) for value in values]
+                n_events += 1
+
+            buffer = buffer[end:]
+            if not block:
+                break
+
+    if weights is None:
+        return np.zeros((0, 1)), [sampling_benchmark]
+    return weights[:n_events], weight_names
+
+
 def _parse_lhe_file_with_bad_chars(filename):
     # In some cases, the LHE comments can contain bad characters
-    with open(filename, "r") as file:
+    with open_file(filename) as file:
         for line in file:
             comment_pos = line.find("#")
             if comment_pos >= 0:
@@ -862,26 +1548,282 @@ def _parse_lhe_file_with_bad_chars(filename):
                 yield line
 
 
-def _untar_and_parse_lhe_file(filename, tags=None):
-    # Unzip event file
-    new_filename = Path(filename).with_suffix("")
+def _untar_and_parse_lhe_file(filename, tags=None, byte_range=None):
+    # Compressed event files are decompressed while parsing
+    with _open_lhe_file(filename, "rb", byte_range) as file:
+        for event, elem in ET.iterparse(file):
+            if tags and elem.tag not in tags:
+                continue
+            else:
+                yield elem
+
+            elem.clear()
+
+
+def split_lhe_file(filename, n_ranges):
+    """
+    Splits the events in a LHE file into byte ranges that start at event boundaries, so that they can be analysed
+    in parallel with `parse_lhe_file(..., byte_range=...)`.
+
+    Uncompressed files are split by seeking to n_ranges equidistant positions, compressed files are scanned once for
+    the positions of the events in the decompressed stream.
+
+    Parameters
+    ----------
+    filename : str or Path
+        Path to the LHE file.
+
+    n_ranges : int
+        Maximal number of ranges.
+
+    Returns
+    -------
+    byte_ranges : list
+        Byte ranges in the order of the events in the file. Each range is a tuple `(header_end, start, end)` with
+        positions in the (decompressed) file, where `end` is None for the last range. If the file cannot be split,
+        the list is `[None]`.
+
+    """
+
+    if n_ranges <= 1:
+        return [None]
+
+    if Path(filename).suffix in COMPRESSED_EXTENSIONS:
+        offsets = _scan_event_offsets(filename)
+        if len(offsets) == 0:
+            return [None]
+        header_end = offsets[0]
+        boundaries = [offsets[(i * len(offsets)) // n_ranges] for i in range(n_ranges)]
+
+    else:
+        size = os.path.getsize(filename)
+        with open(filename, "rb") as file:
+            header_end = _find_next_event(file, 0)
+            if header_end is None:
+                return [None]
+            boundaries = [header_end] + [
+                _find_next_event(file, header_end + (i * (size - header_end)) // n_ranges) for i in range(1, n_ranges)
+            ]
+
+    boundaries = sorted(set(boundary for boundary in boundaries if boundary is not None))
+    ends = boundaries[1:] + [None]
+    byte_ranges = [(header_end, start, end) for start, end in zip(boundaries, ends)]
+
+    logger.debug("Split LHE file %s into %s byte ranges", filename, len(byte_ranges))
+
+    return byte_ranges
+
+
+def write_lhe_file_range(filename, byte_range, new_filename):
+    """
+    Writes the header and one range of events of a LHE file (as returned by `split_lhe_file()`) to a new, complete
+    LHE file.
+
+    Parameters
+    ----------
+    filename : str or Path
+        Path to the LHE file.
+
+    byte_range : tuple or None
+        Byte range of the events. If None, all events are written.
+
+    new_filename : str or Path
+        Path to the new LHE file. Files with extension ".gz" are compressed.
+
+    Returns
+    -------
+        None
+
+    """
+
+    with _open_lhe_file(filename, "rb", byte_range) as source, _create_lhe_file(new_filename) as target:
+        shutil.copyfileobj(source, target, DEFAULT_BUFFER_SIZE)
+
+
+def merge_lhe_files(filenames, new_filename):
+    """
+    Concatenates the events of LHE files (for instance ranges of one file that were processed separately) into a new
+    LHE file, with the header of the first file.
+
+    Parameters
+    ----------
+    filenames : list of str or Path
+        Paths to the LHE files, in the order of the events in the merged file.
+
+    new_filename : str or Path
+        Path to the merged LHE file. Files with extension ".gz" are compressed.
+
+    Returns
+    -------
+        None
+
+    """
+
+    logger.debug("Merging %s LHE files into %s", len(filenames), new_filename)
+
+    with _create_lhe_file(new_filename) as target:
+        for i, filename in enumerate(filenames):
+            with open_file(filename, "rb") as source:
+                in_events = i == 0
+                for line in source:
+                    if _END_LINE.match(line):
+                        break
+                    if not in_events and _EVENT_LINE.match(line):
+                        in_events = True
+                    if in_events:
+                        target.write(line)
+        target.write(b"</LesHouchesEvents>\n")
+
+
+def can_write_lhe_file(filename):
+    """
+    Checks whether `merge_lhe_files()` and `write_lhe_file_range()` can write a LHE file with this name: uncompressed
+    and gzip-compressed files can be written, files compressed with zstd or LZ4 can only be read.
+
+    Parameters
+    ----------
+    filename : str or Path
+        Path to the LHE file.
+
+    Returns
+    -------
+    writable : bool
+        Whether the file can be written.
+
+    """
+
     extension = Path(filename).suffix
+    return extension == ".gz" or extension not in COMPRESSED_EXTENSIONS
 
-    if extension == ".gz":
-        if not new_filename.exists():
-            unzip_file(filename, new_filename)
-        filename = new_filename
 
-    for event, elem in ET.iterparse(filename):
-        if tags and elem.tag not in tags:
-            continue
+def _create_lhe_file(filename):
+    """Opens a new (possibly gzip-compressed) LHE file for writing in binary mode"""
+
+    if not can_write_lhe_file(filename):
+        raise ValueError(f"Cannot write LHE files with extension {Path(filename).suffix}")
+    if Path(filename).suffix == ".gz":
+        return gzip.open(filename, "wb", compresslevel=_GZIP_COMPRESSION_LEVEL)
+    return open(filename, "wb", buffering=DEFAULT_BUFFER_SIZE)
+
+
+def _find_next_event(file, position):
+    """Returns the position of the first event tag at or after position in an uncompressed file, or None"""
+
+    # Include the preceding line break
+    start = max(position - 1, 0)
+    file.seek(start)
+    buffer = b""
+
+    while True:
+        chunk = file.read(DEFAULT_BUFFER_SIZE)
+        if not chunk:
+            return None
+
+        buffer += chunk
+        match = _EVENT_TAG.search(buffer)
+        if match is not None:
+            return start + match.start() + match.group().index(b"<")
+
+        # Keep the end of the buffer, which might contain the beginning of a tag
+        start += max(len(buffer) - _EVENT_TAG_MAX_LENGTH, 0)
+        buffer = buffer[-_EVENT_TAG_MAX_LENGTH:]
+
+
+def _scan_event_offsets(filename):
+    """Returns the positions of every _EVENT_OFFSET_STRIDE-th event in the decompressed stream of a LHE file"""
+
+    offsets = []
+    n_events = 0
+    start = 0
+    buffer = b""
+    last_offset = -1
+
+    with open_file(filename, "rb") as file:
+        while True:
+            chunk = file.read(DEFAULT_BUFFER_SIZE)
+            if not chunk:
+                break
+
+            buffer += chunk
+            for match in _EVENT_TAG.finditer(buffer):
+                offset = start + match.start() + match.group().index(b"<")
+                if offset <= last_offset:
+                    continue
+                if n_events % _EVENT_OFFSET_STRIDE == 0:
+                    offsets.append(offset)
+                n_events += 1
+                last_offset = offset
+
+            start += max(len(buffer) - _EVENT_TAG_MAX_LENGTH, 0)
+            buffer = buffer[-_EVENT_TAG_MAX_LENGTH:]
+
+    logger.debug("Found %s events in %s", n_events, filename)
+
+    return offsets
+
+
+def _open_lhe_file(filename, mode="r", byte_range=None):
+    if byte_range is None:
+        return open_file(filename, mode)
+
+    stream = io.BufferedReader(_LHEByteRange(filename, *byte_range), DEFAULT_BUFFER_SIZE)
+    if mode == "rb":
+        return stream
+    return io.TextIOWrapper(stream)
+
+
+class _LHEByteRange(io.RawIOBase):
+    """Stream with the header and one range of events of a LHE file, followed by the closing LHE tag"""
+
+    def __init__(self, filename, header_end, start, end):
+        super().__init__()
+        self._file = open_file(filename, "rb")
+        self._chunks = self._iterate_chunks(header_end, start, end)
+        self._buffer = memoryview(b"")
+
+    def _iterate_chunks(self, header_end, start, end):
+        yield from self._read(header_end)
+
+        # Compressed files are decompressed up to the start of the range
+        self._file.seek(start)
+
+        if end is None:
+            yield from self._read(None)
         else:
-            yield elem
+            yield from self._read(end - start)
+            yield b"</LesHouchesEvents>\n"
+
+    def _read(self, n_bytes):
+        while n_bytes is None or n_bytes > 0:
+            size = DEFAULT_BUFFER_SIZE if n_bytes is None else min(n_bytes, DEFAULT_BUFFER_SIZE)
+            chunk = self._file.read(size)
+            if not chunk:
+                return
+            if n_bytes is not None:
+                n_bytes -= len(chunk)
+            yield chunk
+
+    def readable(self):
+        return True
 
-        elem.clear()
+    def readinto(self, buffer):
+        while len(self._buffer) == 0:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._buffer = memoryview(chunk)
 
+        n_bytes = min(len(buffer), len(self._buffer))
+        buffer[:n_bytes] = self._buffer[:n_bytes]
+        self._buffer = self._buffer[n_bytes:]
+        return n_bytes
 
-def _get_objects(particles, particles_truth, met_resolution=None, global_event_data=None):
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def _get_objects(particles, particles_truth, met_resolution=None, global_event_data=None, jet_clustering=None):
     # Find visible particles
     electrons = []
     muons = []
@@ -917,7 +1859,7 @@ def _get_objects(particles, particles_truth, met_resolution=None, global_event_d
         elif pdgid in [23, 24, 25]:
             unstables.append(particle)
         else:
-            logger.warning("Unknown particle with PDG id %s, treating as invisible!")
+            logger.warning("Unknown particle with PDG id %s, treating as invisible!", particle.pdgid)
             invisibles.append(particle)
 
     # Sort by pT
@@ -927,17 +1869,18 @@ def _get_objects(particles, particles_truth, met_resolution=None, global_event_d
     photons = sorted(photons, reverse=True, key=lambda x: x.pt)
     leptons = sorted(leptons, reverse=True, key=lambda x: x.pt)
     neutrinos = sorted(neutrinos, reverse=True, key=lambda x: x.pt)
+    if jet_clustering is not None:
+        jets = _cluster_particles(jets, jet_clustering)
     jets = sorted(jets, reverse=True, key=lambda x: x.pt)
 
     # Sum over all particles
     ht = 0.0
     visible_sum = MadMinerParticle.from_xyzt(0.0, 0.0, 0.0, 0.0)
 
-    standard_ids = set(get_elementary_pdg_ids())
-    neutrino_ids = set(int(p.pdgid) for p in Particle.findall(lambda p: p.pdgid.is_sm_lepton and p.charge == 0))
+    visible_pdgids = get_pdg_table().visible_pdgids
 
     for particle in particles:
-        if particle.pdgid in standard_ids and particle.pdgid not in neutrino_ids:
+        if particle.pdgid in visible_pdgids:
             visible_sum += particle
             ht += particle.pt
 
@@ -984,6 +1927,159 @@ def _get_objects(particles, particles_truth, met_resolution=None, global_event_d
     return objects
 
 
+def _cluster_particles(particles, jet_clustering):
+    """Clusters the particles of one event into jets, which are tagged if any of their constituents is"""
+
+    momenta = np.array([[p.px, p.py, p.pz, p.e] for p in particles]).reshape((-1, 4))
+    tags = np.array([[p.tau_tag, p.b_tag, p.t_tag] for p in particles], dtype=np.float64).reshape((-1, 3))
+    event_index = np.zeros(len(particles), dtype=np.int64)
+
+    jet_index = jet_clustering(event_index, momenta)
+    _, jet_values = combine_constituents(event_index, jet_index, np.hstack([momenta, tags]))
+
+    jets = []
+    for px, py, pz, e, tau_tag, b_tag, t_tag in jet_values:
+        jet = MadMinerParticle.from_xyzt(px, py, pz, e)
+        jet.set_pdgid(9)
+        jet.set_tags(bool(tau_tag > 0.0), bool(b_tag > 0.0), bool(t_tag > 0.0))
+        jets.append(jet)
+
+    return jets
+
+
+def _get_objects_columnar(
+    pdgids,
+    momenta,
+    spins,
+    event_index,
+    n_events,
+    is_smeared=None,
+    smeared_momenta=None,
+    met_resolution=None,
+    rng=None,
+    global_event_data=None,
+    jet_clustering=None,
+):
+    """
+    Columnar counterpart of `_get_objects()`, building all object collections for a chunk of events at once. The
+    particles kept by `_smear_particles_columnar()` are marked by is_smeared (None meaning all particles, unchanged).
+    """
+
+    # Charges, tags, and flags
+    properties = get_pdg_table().properties(pdgids)
+
+    columns = {
+        "charge": properties["charge"],
+        "pdgid": pdgids,
+        "spin": spins,
+        "tau_tag": properties["tau_tag"],
+        "b_tag": properties["b_tag"],
+        "t_tag": properties["t_tag"],
+    }
+    truth_columns = dict(zip(["px", "py", "pz", "e"], momenta.T), **columns)
+
+    # Particles rebuilt by _smear_particles() are given in (pt, phi, eta, e) and do not carry the spin
+    if is_smeared is None:
+        is_smeared = np.ones(len(pdgids), dtype=bool)
+        smeared_columns = dict(truth_columns)
+        px, py, pz = smeared_columns["px"], smeared_columns["py"], smeared_columns["pz"]
+        pt = np.hypot(px, py)
+    else:
+        smeared_columns = dict(zip(["pt", "phi", "eta", "e"], smeared_momenta.T), **columns)
+        smeared_columns["spin"] = np.full(len(pdgids), np.nan)
+        pt, phi = smeared_columns["pt"], smeared_columns["phi"]
+        px, py, pz = pt * np.cos(phi), pt * np.sin(phi), pt * np.sinh(smeared_columns["eta"])
+
+    def collection(mask, sort=True, truth=False):
+        return ObjectCollection.from_flat(
+            event_index[mask],
+            n_events,
+            {key: values[mask] for key, values in (truth_columns if truth else smeared_columns).items()},
+            sort_key=pt[mask] if sort else None,
+        )
+
+    # Find visible particles
+    abs_pdgids = np.abs(pdgids)
+
+    is_jet = is_smeared & np.isin(abs_pdgids, [1, 2, 3, 4, 5, 6, 9, 21])
+    is_electron = is_smeared & (abs_pdgids == 11)
+    is_muon = is_smeared & (abs_pdgids == 13)
+    is_tau = is_smeared & (abs_pdgids == 15)
+    is_photon = is_smeared & (abs_pdgids == 22)
+    is_neutrino = is_smeared & np.isin(abs_pdgids, [12, 14, 16])
+    is_unstable = is_smeared & np.isin(abs_pdgids, [23, 24, 25])
+
+    is_unknown = is_smeared & ~(is_jet | is_electron | is_muon | is_tau | is_photon | is_neutrino | is_unstable)
+    if np.any(is_unknown):
+        logger.warning("Unknown particles with PDG ids %s, treating as invisible!", sorted(set(pdgids[is_unknown])))
+
+    # MET from the sum over all visible particles
+    is_visible = is_smeared & properties["is_visible"]
+    met_x = -np.bincount(event_index[is_visible], weights=px[is_visible], minlength=n_events)
+    met_y = -np.bincount(event_index[is_visible], weights=py[is_visible], minlength=n_events)
+
+    # Soft noise, drawn for all events at once
+    if met_resolution is not None:
+        ht = np.bincount(event_index[is_visible], weights=pt[is_visible], minlength=n_events)
+        noise_std = met_resolution[0] + met_resolution[1] * ht
+        noise = rng.normal(0.0, noise_std[:, np.newaxis], size=(n_events, 2))
+        met_x = met_x + noise[:, 0]
+        met_y = met_y + noise[:, 1]
+
+    met = ParticleArray.from_xyzt(met_x, met_y, np.zeros(n_events), (met_x**2 + met_y**2) ** 0.5)
+
+    # Jets from the quarks and gluons, tagged if any constituent is
+    if jet_clustering is None:
+        jets = collection(is_jet)
+    else:
+        momenta_jet = np.stack([px, py, pz, smeared_columns["e"]], axis=1)[is_jet]
+        tags_jet = np.stack([columns[tag][is_jet] for tag in ["tau_tag", "b_tag", "t_tag"]], axis=1)
+        jet_index = jet_clustering(event_index[is_jet], momenta_jet)
+        jet_event_index, jet_values = combine_constituents(
+            event_index[is_jet], jet_index, np.hstack([momenta_jet, tags_jet])
+        )
+        n_jets = len(jet_event_index)
+        jet_columns = dict(zip(["px", "py", "pz", "e"], jet_values[:, :4].T))
+        jet_columns.update(
+            {
+                "charge": np.zeros(n_jets),
+                "pdgid": np.full(n_jets, 9),
+                "spin": np.full(n_jets, np.nan),
+                "tau_tag": jet_values[:, 4] > 0.0,
+                "b_tag": jet_values[:, 5] > 0.0,
+                "t_tag": jet_values[:, 6] > 0.0,
+            }
+        )
+        jets = ObjectCollection.from_flat(
+            jet_event_index, n_events, jet_columns, sort_key=np.hypot(jet_values[:, 0], jet_values[:, 1])
+        )
+
+    # Build objects
+    collections = OrderedDict(
+        [
+            ("p", collection(is_smeared, sort=False)),
+            ("p_truth", collection(np.ones(len(pdgids), dtype=bool), sort=False, truth=True)),
+            ("e", collection(is_electron)),
+            ("j", jets),
+            ("a", collection(is_photon)),
+            ("mu", collection(is_muon)),
+            ("tau", collection(is_tau)),
+            ("l", collection(is_electron | is_muon)),
+            ("v", collection(is_neutrino)),
+        ]
+    )
+
+    objects = vectorized_math_commands()
+    objects.update(collections)
+    objects["met"] = met
+
+    # Global event_data
+    if global_event_data is not None:
+        objects.update(global_event_data)
+
+    return objects, list(collections.values())
+
+
 def _smear_variable(true_value, resolutions, id):
     """Adds Gaussian nose to a variable"""
 
@@ -1070,10 +2166,87 @@ def _smear_particles(particles, energy_resolutions, pt_resolutions, eta_resoluti
     return smeared_particles
 
 
+def _build_smeared_particle(pdgid, pt, phi, eta, e):
+    particle = MadMinerParticle.from_rhophietat(pt, phi, eta, e)
+    particle.set_pdgid(pdgid)
+    return particle
+
+
+def _smear_particles_columnar(
+    pdgids, momenta, energy_resolutions, pt_resolutions, eta_resolutions, phi_resolutions, rng
+):
+    """
+    Columnar counterpart of `_smear_particles()`, smearing all particles of a chunk of events at once. The noise for
+    all particles is drawn with one call to rng; only energies and pTs that end up below their minimum are redrawn.
+
+    Returns a mask of the particles that are kept and their smeared momenta as (pt, phi, eta, e), with phi between
+    0 and 2 pi like in `_smear_particles()`, or None and the unchanged momenta (px, py, pz, e) if no smearing is
+    defined.
+    """
+
+    # No smearing if any argument is None
+    resolutions = [energy_resolutions, pt_resolutions, eta_resolutions, phi_resolutions]
+    if any(resolution is None for resolution in resolutions):
+        return None, momenta
+
+    # Resolution parameters (abs, rel) of E, pT, eta, and phi for each PDG id, NaN meaning no smearing
+    unique_pdgids, inverse = np.unique(pdgids, return_inverse=True)
+    is_kept_id = np.zeros(len(unique_pdgids), dtype=bool)
+    parameters = np.full((len(unique_pdgids), 4, 2), np.nan)
+    for i, pdgid in enumerate(unique_pdgids.tolist()):
+        if any(pdgid not in resolution.keys() for resolution in resolutions):
+            continue
+        if None in energy_resolutions[pdgid] and None in pt_resolutions[pdgid]:
+            raise RuntimeError("Cannot derive both pT and energy from on-shell conditions!")
+
+        is_kept_id[i] = True
+        for j, resolution in enumerate(resolutions):
+            if None not in resolution[pdgid]:
+                parameters[i, j] = resolution[pdgid]
+
+    is_kept = is_kept_id[inverse]
+    parameters = parameters[inverse][is_kept]
+
+    # True values
+    px, py, pz, e = momenta[is_kept].T
+    particles = vector.array({"px": px, "py": py, "pz": pz, "E": e})
+    m = particles.m
+    true_values = np.stack([e, particles.pt, particles.eta, particles.phi], axis=1)
+
+    # Energy and pT calculated from on-shell conditions
+    on_shell_e = np.isnan(parameters[:, 0, 0])
+    on_shell_pt = np.isnan(parameters[:, 1, 0])
+
+    # Gaussian noise, which is only added if the resolution is positive
+    widths = parameters[:, :, 0] + parameters[:, :, 1] * true_values
+    is_smeared = widths > 0.0
+    widths = np.where(is_smeared, widths, 0.0)
+    values = true_values + widths * rng.standard_normal(true_values.shape)
+
+    # Redraw energies and pTs below their minimum
+    minima = np.stack([np.where(on_shell_pt, m, 0.0), np.zeros(len(m))], axis=1)
+    for j in [0, 1]:
+        redraw = is_smeared[:, j] & (values[:, j] <= minima[:, j])
+        while np.any(redraw):
+            values[redraw, j] = true_values[redraw, j] + widths[redraw, j] * rng.standard_normal(np.sum(redraw))
+            redraw = is_smeared[:, j] & (values[:, j] <= minima[:, j])
+
+    e, pt, eta, phi = values.T
+    phi = np.mod(phi, 2.0 * np.pi)
+
+    # Calculate pT from on-shell conditions
+    with np.errstate(invalid="ignore"):
+        pt = np.where(on_shell_pt, np.where(e > m, (e**2 - m**2) ** 0.5 / np.cosh(eta), 0.0), pt)
+
+    # Calculate E from on-shell conditions
+    e = np.where(on_shell_e, vector.array({"pt": pt, "phi": phi, "eta": eta, "mass": m}).e, e)
+
+    smeared_momenta = np.full(momenta.shape, np.nan)
+    smeared_momenta[is_kept] = np.stack([pt, phi, eta, e], axis=1)
+
+    return is_kept, smeared_momenta
+
+
 def get_elementary_pdg_ids():
     """Get Standard Model elementary particle IDs"""
-    pdg_ids = Particle.findall(
-        lambda p: (p.pdgid.is_sm_quark or p.pdgid.is_sm_lepton or p.pdgid.is_sm_gauge_boson_or_higgs)
-    )
-
-    return [int(p.pdgid) for p in pdg_ids]
+    return list(get_pdg_table().elementary_pdgids)
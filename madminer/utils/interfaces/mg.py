@@ -1,7 +1,13 @@
+import json
 import logging
 import shutil
+import tempfile
 
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
 from pathlib import Path
+from queue import Queue
+from threading import Lock
 
 from madminer.utils.various import call_command
 from madminer.utils.various import make_file_executable
@@ -595,6 +601,176 @@ def run_mg_reweighting(mg_process_directory, run_name, reweight_card_file=None,
     )
 
 
+def clone_mg_process_directory(mg_process_directory, clone_directory):
+    """
+    Copies a MG process directory without the event runs in it, so that MadGraph can run in both at the same time.
+
+    Parameters
+    ----------
+    mg_process_directory : str
+        Path to the MG process directory.
+
+    clone_directory : str
+        Path to the copy. Has to not exist yet.
+
+    Returns
+    -------
+        None
+
+    """
+
+    events_directory = Path(mg_process_directory, "Events").resolve()
+
+    def ignore_runs(directory, names):
+        return names if Path(directory).resolve() == events_directory else []
+
+    logger.debug("Copying MadGraph process directory %s to %s", mg_process_directory, clone_directory)
+    shutil.copytree(mg_process_directory, clone_directory, symlinks=True, ignore=ignore_runs)
+
+
+def run_in_mg_process_clones(mg_process_directory, jobs, n_workers, n_retries=0, collect=None, temp_directory=None):
+    """
+    Runs jobs in parallel, each in one of n_workers copies of a MG process directory. Failed jobs are retried, the
+    other jobs continue when a job fails for good.
+
+    Parameters
+    ----------
+    mg_process_directory : str
+        Path to the MG process directory.
+
+    jobs : list of callable
+        Each job is called as `job(clone_directory, attempt)` with the path to a copy of the process directory that
+        no other job uses at the same time and the number of the attempt (starting at 0). Jobs fail by raising a
+        RuntimeError (as `call_command()` does).
+
+    n_workers : int
+        Maximal number of jobs that run at the same time.
+
+    n_retries : int, optional
+        Number of times a failed job is started again. Default value: 0.
+
+    collect : callable or None, optional
+        If not None, called as `collect(i, result)` with the index and the return value of each job as soon as it
+        has finished, before its copy of the process directory is used for the next job. Only one call runs at a
+        time. Default value: None.
+
+    temp_directory : str or None, optional
+        Directory in which the copies of the process directory are created (and deleted afterwards). If None, a system
+        default is used. Default value: None.
+
+    Returns
+    -------
+        None
+
+    """
+
+    if n_workers < 1:
+        raise ValueError(f"Invalid number of workers: {n_workers}")
+    if n_retries < 0:
+        raise ValueError(f"Invalid number of retries: {n_retries}")
+
+    if temp_directory is not None:
+        Path(temp_directory).mkdir(parents=True, exist_ok=True)
+
+    n_clones = min(n_workers, len(jobs))
+    collect_lock = Lock()
+    clone_parent = tempfile.mkdtemp(prefix="madminer_", dir=temp_directory)
+
+    def run_job(i):
+        clone_directory = clones.get()
+        try:
+            for attempt in range(n_retries + 1):
+                try:
+                    result = jobs[i](clone_directory, attempt)
+                    break
+                except RuntimeError as e:
+                    if attempt == n_retries:
+                        raise
+                    logger.warning("Job %s failed, starting it again: %s", i, e)
+            if collect is not None:
+                with collect_lock:
+                    collect(i, result)
+        finally:
+            clones.put(clone_directory)
+
+    failed = []
+    try:
+        clones = Queue()
+        for k in range(n_clones):
+            clone_directory = str(Path(clone_parent, f"{Path(mg_process_directory).name}_{k}"))
+            clone_mg_process_directory(mg_process_directory, clone_directory)
+            clones.put(clone_directory)
+
+        logger.info("Running %s jobs in %s copies of %s", len(jobs), n_clones, mg_process_directory)
+        with ThreadPoolExecutor(max_workers=n_clones) as executor:
+            futures = {executor.submit(run_job, i): i for i in range(len(jobs))}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    future.result()
+                except RuntimeError as e:
+                    logger.error("Job %s failed: %s", i, e)
+                    failed.append(i)
+    finally:
+        shutil.rmtree(clone_parent, ignore_errors=True)
+
+    if len(failed) > 0:
+        raise RuntimeError(f"Jobs {sorted(failed)} failed, please check the log files")
+
+
+def run_mg_in_clone(clone_directory, attempt, log_file=None, **kwargs):
+    """
+    Runs `run_mg()` in a copy of the MG process directory and returns the paths to the new runs in its Events
+    folder. Each attempt after the first one writes to its own log file, with "_retry_<attempt>" appended to the stem
+    of log_file.
+    """
+
+    events_directory = Path(clone_directory, "Events")
+    previous_runs = set(events_directory.iterdir()) if events_directory.is_dir() else set()
+
+    run_mg(mg_process_directory=clone_directory, log_file=_retry_log_file(log_file, attempt), **kwargs)
+
+    return sorted(path for path in events_directory.iterdir() if path not in previous_runs)
+
+
+def run_mg_reweighting_in_clone(clone_directory, attempt, lhe_file, log_file=None, **kwargs):
+    """
+    Runs `run_mg_reweighting()` on a copy of the LHE file lhe_file in a copy of the MG process directory and returns
+    the path to the reweighted LHE file in it. Each attempt after the first one writes to its own log file, with
+    "_retry_<attempt>" appended to the stem of log_file.
+    """
+
+    run_name = "madminer_reweighting"
+    run_directory = Path(clone_directory, "Events", run_name)
+    shutil.rmtree(run_directory, ignore_errors=True)
+    run_directory.mkdir(parents=True)
+
+    extension = ".lhe.gz" if Path(lhe_file).suffix == ".gz" else ".lhe"
+    shutil.copyfile(lhe_file, run_directory / f"unweighted_events{extension}")
+
+    run_mg_reweighting(clone_directory, run_name, log_file=_retry_log_file(log_file, attempt), **kwargs)
+
+    reweighted_file = find_lhe_events(run_directory)
+    if reweighted_file is None:
+        raise RuntimeError(f"Could not find reweighted events in {run_directory}")
+
+    return reweighted_file
+
+
+def find_lhe_events(events_directory):
+    """Returns the path to the LHE events in a run folder of a MG process directory, or None"""
+
+    lhe_files = sorted(Path(events_directory).glob("*events.lhe*"))
+    return str(lhe_files[0]) if len(lhe_files) > 0 else None
+
+
+def _retry_log_file(log_file, attempt):
+    if log_file is None or attempt == 0:
+        return log_file
+    log_path = Path(log_file)
+    return str(log_path.with_name(f"{log_path.stem}_retry_{attempt}{log_path.suffix}"))
+
+
 def copy_ufo_model(ufo_directory, mg_directory):
     model_name = Path(ufo_directory).name
     destination = Path(mg_directory, "models", model_name)
@@ -619,3 +795,146 @@ def create_master_script(log_directory, master_script_filename, mg_directory, mg
     with open(master_script_filename, "w") as file:
         file.write(script)
     make_file_executable(master_script_filename)
+
+
+def create_job_array(log_directory, mg_directory, mg_process_directory, jobs, resources=None):
+    """
+    Writes a manifest and a launcher script to run the scripts of `setup_mg_with_scripts()` as a job array of a batch
+    system.
+
+    The manifest `<mg_process_directory>/madminer/job_array.json` lists one entry per job with its array index, the
+    script (relative from mg_process_directory), the directory in which its events end up, and the resource hints.
+    The launcher `<mg_process_directory>/madminer/run_array.sh` takes the array index as first argument (or from
+    SLURM_ARRAY_TASK_ID or PBS_ARRAYID), runs the corresponding script in a copy of the process directory in
+    MADMINER_SCRATCH (or TMPDIR or /tmp), and moves the new event folder to `Events/job_<index>`. That way jobs on
+    different nodes do not share the cards in the process directory.
+
+    Parameters
+    ----------
+    log_directory : str
+        Default log directory of the launcher script.
+
+    mg_directory : str
+        Default MadGraph directory of the launcher script.
+
+    mg_process_directory : str
+        Path to the MG process directory.
+
+    jobs : list of dict
+        One dict per job with the keys "script" (relative from mg_process_directory) and "log_file" (relative from
+        the log directory), and further information that is copied to the manifest.
+
+    resources : dict or None, optional
+        Resource hints for the batch system (for instance number of cores, memory, or wall time), copied to each job
+        of the manifest. Default value: None.
+
+    Returns
+    -------
+    launcher_filename : str
+        Path to the launcher script.
+
+    """
+
+    manifest_filename = f"{mg_process_directory}/madminer/job_array.json"
+    launcher_filename = f"{mg_process_directory}/madminer/run_array.sh"
+
+    manifest = {
+        "launcher": "madminer/run_array.sh",
+        "jobs": [
+            dict(index=i, events_directory=f"Events/job_{i}", resources=dict(resources or {}), **job)
+            for i, job in enumerate(jobs)
+        ],
+    }
+    with open(manifest_filename, "w") as file:
+        json.dump(manifest, file, indent=2)
+
+    cases = "\n".join(f"{i}) script={job['script']} ;;" for i, job in enumerate(jobs))
+    script = f"""#!/bin/bash
+
+# Job array launcher for MadMiner
+
+# Usage: run_array.sh [index] [MG_directory] [MG_process_directory] [log_directory]
+
+index=${{1:-${{SLURM_ARRAY_TASK_ID:-$PBS_ARRAYID}}}}
+mgdir=${{2:-{mg_directory}}}
+mgprocdir=${{3:-{mg_process_directory}}}
+mmlogdir=${{4:-{log_directory}}}
+
+case $index in
+{cases}
+*) echo "Invalid job index: $index" >&2; exit 1 ;;
+esac
+
+# Run in a copy of the process directory
+workdir=$(mktemp -d "${{MADMINER_SCRATCH:-${{TMPDIR:-/tmp}}}}/madminer_job_${{index}}_XXXXXX") || exit 1
+trap 'rm -rf "$workdir"' EXIT
+for path in "$mgprocdir"/*; do
+  [ "$(basename "$path")" = Events ] || cp -r "$path" "$workdir/" || exit 1
+done
+mkdir -p "$workdir/Events" "$mmlogdir"
+
+"$workdir/$script" "$mgdir" "$workdir" "$mmlogdir" || exit $?
+
+# Collect events
+run=$(ls -d "$workdir"/Events/*/ 2>/dev/null | tail -n 1)
+if [ -z "$run" ]; then
+  echo "No events found for job $index" >&2
+  exit 1
+fi
+rm -rf "$mgprocdir/Events/job_$index"
+mkdir -p "$mgprocdir/Events"
+mv "$run" "$mgprocdir/Events/job_$index"
+"""
+
+    with open(launcher_filename, "w") as file:
+        file.write(script)
+    make_file_executable(launcher_filename)
+
+    return launcher_filename
+
+
+def collect_job_array_events(mg_process_directory):
+    """
+    Finds the event files of the finished jobs of a job array created with `MadMiner.run_multiple(...,
+    job_array=True)`.
+
+    Parameters
+    ----------
+    mg_process_directory : str
+        Path to the MG process directory.
+
+    Returns
+    -------
+    samples : list of dict
+        One dict per finished job with the keys "index", "sampled_from_benchmark", "is_background", "lhe_filename",
+        and "hepmc_filename" (None if the events were not showered), which can be passed on to
+        `LHEReader.add_sample()` or `DelphesReader.add_sample()`. Jobs without events are skipped with a warning.
+
+    """
+
+    with open(f"{mg_process_directory}/madminer/job_array.json") as file:
+        manifest = json.load(file)
+
+    samples = []
+    for job in manifest["jobs"]:
+        events_directory = Path(mg_process_directory, job["events_directory"])
+        lhe_file = find_lhe_events(events_directory)
+        hepmc_files = sorted(events_directory.glob("*.hepmc*"))
+
+        if lhe_file is None:
+            logger.warning("Did not find events of job %s in %s", job["index"], events_directory)
+            continue
+
+        samples.append(
+            dict(
+                index=job["index"],
+                sampled_from_benchmark=job["sample_benchmark"],
+                is_background=job["is_background"],
+                lhe_filename=lhe_file,
+                hepmc_filename=str(hepmc_files[0]) if len(hepmc_files) > 0 else None,
+            )
+        )
+
+    logger.info("Found events of %s of %s jobs", len(samples), len(manifest["jobs"]))
+
+    return samples
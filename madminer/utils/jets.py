@@ -0,0 +1,357 @@
+import logging
+
+from dataclasses import dataclass
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Exponents of the transverse momenta in the distance measures of the generalized kT algorithms
+_ALGORITHM_EXPONENTS = {"antikt": -1, "kt": 1, "cambridge": 0}
+
+# Maximal number of pair distances held in memory at once by the NumPy clustering
+_MAX_DISTANCES = 2**22
+
+
+@dataclass
+class JetClustering:
+    """
+    Jet definition for the clustering of the particles of a chunk of events, which can be passed as jet_clustering
+    to the LHE and HepMC readers.
+
+    Parameters
+    ----------
+    algorithm : {"antikt", "kt", "cambridge"}, optional
+        Sequential recombination algorithm (with E-scheme recombination). Default value: "antikt".
+
+    radius : float, optional
+        Jet radius R. Default value: 0.4.
+
+    pt_min : float, optional
+        Minimal transverse momentum of the jets in GeV. Default value: 0.
+
+    backend : {"auto", "numpy", "fastjet"}, optional
+        With "fastjet", the particles are clustered with the fastjet package. With "numpy", the events of a chunk are
+        clustered together with NumPy, which is fast for the small multiplicities of parton-level events, but scales
+        with the cube of the number of particles per event. With "auto", fastjet is used if it is installed. Default
+        value: "auto".
+    """
+
+    algorithm: str = "antikt"
+    radius: float = 0.4
+    pt_min: float = 0.0
+    backend: str = "auto"
+
+    def __post_init__(self):
+        """Perform certain attribute quality assertions"""
+
+        if self.algorithm not in _ALGORITHM_EXPONENTS:
+            raise ValueError(f"Invalid jet algorithm: {self.algorithm}")
+        if not self.radius > 0.0:
+            raise ValueError(f"Invalid jet radius: {self.radius}")
+        if self.backend not in ["auto", "numpy", "fastjet"]:
+            raise ValueError(f"Invalid jet clustering backend: {self.backend}")
+
+    def __call__(self, event_index, momenta):
+        return cluster_jets(event_index, momenta, self.algorithm, self.radius, self.pt_min, self.backend)
+
+
+def cluster_jets(event_index, momenta, algorithm="antikt", radius=0.4, pt_min=0.0, backend="auto"):
+    """
+    Clusters the particles of a chunk of events into jets.
+
+    Parameters
+    ----------
+    event_index : ndarray
+        Event index of each particle, with shape `(n_particles,)` and in ascending order.
+
+    momenta : ndarray
+        Momenta (px, py, pz, E) of the particles, with shape `(n_particles, 4)`.
+
+    algorithm, radius, pt_min, backend
+        Jet definition, see `JetClustering`.
+
+    Returns
+    -------
+    jet_index : ndarray
+        Index of the jet that each particle belongs to, or -1 for particles that are not part of a jet with at least
+        pt_min (including particles without transverse momentum, which are not clustered). The jets are numbered in
+        the order of the events, and within each event by descending transverse momentum.
+    """
+
+    event_index = np.asarray(event_index, dtype=np.int64)
+    momenta = np.asarray(momenta, dtype=np.float64).reshape((-1, 4))
+
+    if backend == "auto":
+        backend = "fastjet" if _has_fastjet() else "numpy"
+
+    # Particles without transverse momentum have no rapidity
+    clustered = np.hypot(momenta[:, 0], momenta[:, 1]) > 0.0
+    if backend == "fastjet":
+        jets, constituents = _cluster_fastjet(event_index[clustered], momenta[clustered], algorithm, radius)
+    else:
+        jets, constituents = _cluster_numpy(event_index[clustered], momenta[clustered], algorithm, radius)
+
+    # Jets above pt_min, numbered by event and descending pT
+    jet_events, jet_momenta = jets
+    jet_pt = np.hypot(jet_momenta[:, 0], jet_momenta[:, 1])
+    order = np.lexsort((-jet_pt, jet_events))
+    order = order[~(jet_pt[order] < pt_min)]
+    jet_numbers = np.full(len(jet_events), -1, dtype=np.int64)
+    jet_numbers[order] = np.arange(len(order))
+
+    jet_index = np.full(len(event_index), -1, dtype=np.int64)
+    jet_index[np.flatnonzero(clustered)] = jet_numbers[constituents]
+    return jet_index
+
+
+def combine_constituents(event_index, jet_index, values):
+    """
+    Sums the properties of the particles in each jet.
+
+    Parameters
+    ----------
+    event_index : ndarray
+        Event index of each particle, with shape `(n_particles,)`.
+
+    jet_index : ndarray
+        Jet of each particle as returned by `cluster_jets()`, with shape `(n_particles,)`.
+
+    values : ndarray
+        Properties of the particles (for instance their momenta), with shape `(n_particles, n_values)`.
+
+    Returns
+    -------
+    jet_event_index : ndarray
+        Event index of each jet, with shape `(n_jets,)`.
+
+    jet_values : ndarray
+        Sums of the properties over the particles in each jet, with shape `(n_jets, n_values)`.
+    """
+
+    event_index = np.asarray(event_index, dtype=np.int64)
+    jet_index = np.asarray(jet_index, dtype=np.int64)
+    in_jet = jet_index >= 0
+    n_jets = int(np.max(jet_index, initial=-1)) + 1
+
+    jet_event_index = np.zeros(n_jets, dtype=np.int64)
+    jet_event_index[jet_index[in_jet]] = event_index[in_jet]
+
+    values = np.asarray(values, dtype=np.float64)
+    jet_values = np.stack(
+        [np.bincount(jet_index[in_jet], weights=column[in_jet], minlength=n_jets) for column in values.T], axis=1
+    ).reshape((n_jets, values.shape[1]))
+
+    return jet_event_index, jet_values
+
+
+def _has_fastjet():
+    try:
+        import fastjet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _cluster_fastjet(event_index, momenta, algorithm, radius):
+    """Clusters with the fastjet package, returns the jets `(event_index, momenta)` and the jet of each particle"""
+
+    try:
+        import awkward as ak
+        import fastjet
+    except ImportError as e:
+        raise RuntimeError("Jet clustering with the fastjet backend requires the fastjet package") from e
+
+    n_events = int(event_index[-1]) + 1 if len(event_index) > 0 else 0
+    counts = np.bincount(event_index, minlength=n_events)
+    particles = ak.unflatten(
+        ak.zip(
+            {"px": momenta[:, 0], "py": momenta[:, 1], "pz": momenta[:, 2], "E": momenta[:, 3]}, with_name="Momentum4D"
+        ),
+        counts,
+    )
+
+    algorithms = {
+        "antikt": fastjet.antikt_algorithm,
+        "kt": fastjet.kt_algorithm,
+        "cambridge": fastjet.cambridge_algorithm,
+    }
+    sequence = fastjet.ClusterSequence(particles, fastjet.JetDefinition(algorithms[algorithm], radius))
+    jets = sequence.inclusive_jets()
+    jet_constituents = sequence.constituent_index()
+
+    jet_counts = ak.to_numpy(ak.num(jets))
+    jet_events = np.repeat(np.arange(n_events), jet_counts)
+    jet_momenta = np.stack([ak.to_numpy(ak.flatten(jets[key])) for key in ["px", "py", "pz", "E"]], axis=1)
+
+    # Constituent indices are given within each event
+    starts = np.cumsum(counts) - counts
+    constituent_counts = ak.to_numpy(ak.flatten(ak.num(jet_constituents, axis=2)))
+    constituent_jets = np.repeat(np.arange(len(jet_events)), constituent_counts)
+    positions = ak.to_numpy(ak.flatten(jet_constituents, axis=None)) + starts[jet_events[constituent_jets]]
+    constituents = np.empty(len(event_index), dtype=np.int64)
+    constituents[positions] = constituent_jets
+
+    return (jet_events, jet_momenta.reshape((-1, 4))), constituents
+
+
+def _cluster_numpy(event_index, momenta, algorithm, radius):
+    """
+    Clusters with NumPy, returns the jets `(event_index, momenta)` and the jet of each particle. Events with similar
+    multiplicities are clustered together in batches, one recombination per event and step.
+    """
+
+    exponent = _ALGORITHM_EXPONENTS[algorithm]
+
+    n_events = int(event_index[-1]) + 1 if len(event_index) > 0 else 0
+    counts = np.bincount(event_index, minlength=n_events)
+    starts = np.cumsum(counts) - counts
+
+    jet_events, jet_momenta = [], []
+    constituents = np.empty(len(event_index), dtype=np.int64)
+    n_jets = 0
+
+    # Events by descending multiplicity
+    events = np.argsort(-counts, kind="stable")
+    events = events[counts[events] > 0]
+    while len(events) > 0:
+        n_max = int(counts[events[0]])
+        batch, events = np.split(events, [max(1, _MAX_DISTANCES // n_max**2)])
+
+        slots = np.arange(n_max)
+        active = slots < counts[batch, np.newaxis]
+        positions = np.where(active, starts[batch, np.newaxis] + slots, 0)
+        batch_momenta = np.where(active[..., np.newaxis], momenta[positions], 0.0)
+
+        jet_batch, jet_slot, labels = _cluster_batch(batch_momenta, active, exponent, radius**2)
+
+        # Jets of the batch, and the jet of each particle through the pseudojet it ended up in
+        jet_numbers = np.full((len(batch), n_max), -1, dtype=np.int64)
+        jet_numbers[jet_batch, jet_slot] = n_jets + np.arange(len(jet_batch))
+        n_jets += len(jet_batch)
+
+        jet_events.append(batch[jet_batch])
+        jet_momenta.append(batch_momenta[jet_batch, jet_slot])
+        constituents[positions[active]] = np.take_along_axis(jet_numbers, labels, axis=1)[active]
+
+    if n_jets == 0:
+        return (np.zeros(0, dtype=np.int64), np.zeros((0, 4))), constituents
+    return (np.concatenate(jet_events), np.concatenate(jet_momenta)), constituents
+
+
+def _cluster_batch(momenta, active, exponent, radius2):
+    """
+    Clusters the pseudojets of a batch of events, given as momenta with shape `(n_events, n_max, 4)` and a mask of
+    the active ones. Returns the event and slot of each jet and the slot of the jet that each particle ends up in;
+    the momenta of the jets are left in their slots.
+    """
+
+    n_events, n_max, _ = momenta.shape
+    events = np.arange(n_events)
+    active = active.copy()
+    labels = np.broadcast_to(np.arange(n_max), (n_events, n_max)).copy()
+
+    kt2, rapidity, phi = _kinematics(momenta)
+    beam_distances = _beam_distances(kt2, exponent)
+
+    # Pair distances, the closest partner of each pseudojet
+    distances = _pair_distances(
+        beam_distances, rapidity, phi, active, np.repeat(events, n_max), np.tile(np.arange(n_max), n_events), radius2
+    ).reshape((n_events, n_max, n_max))
+    distances[~active] = np.inf
+    closest = np.argmin(distances, axis=2)
+    closest_distances = np.take_along_axis(distances, closest[..., np.newaxis], axis=2)[..., 0]
+
+    jet_events, jet_slots = [], []
+
+    while True:
+        alive = np.any(active, axis=1)
+        if not np.any(alive):
+            break
+
+        beam = np.where(active, beam_distances, np.inf)
+        i_beam = np.argmin(beam, axis=1)
+        i_pair = np.argmin(closest_distances, axis=1)
+        merge = alive & (closest_distances[events, i_pair] < beam[events, i_beam])
+        final = alive & ~merge
+
+        # Pseudojets closest to the beam become jets
+        b_final, i_final = events[final], i_beam[final]
+        jet_events.append(b_final)
+        jet_slots.append(i_final)
+
+        # Closest pairs are merged into the first one
+        b_merge, i_merge = events[merge], i_pair[merge]
+        j_merge = closest[b_merge, i_merge]
+        momenta[b_merge, i_merge] += momenta[b_merge, j_merge]
+        labels[b_merge] = np.where(labels[b_merge] == j_merge[:, np.newaxis], i_merge[:, np.newaxis], labels[b_merge])
+
+        kt2[b_merge, i_merge], rapidity[b_merge, i_merge], phi[b_merge, i_merge] = _kinematics(
+            momenta[b_merge, i_merge]
+        )
+        beam_distances[b_merge, i_merge] = _beam_distances(kt2[b_merge, i_merge], exponent)
+
+        # Remove the jets and merged pseudojets
+        b_removed = np.concatenate([b_final, b_merge])
+        i_removed = np.concatenate([i_final, j_merge])
+        active[b_removed, i_removed] = False
+        distances[b_removed, i_removed, :] = np.inf
+        distances[b_removed, :, i_removed] = np.inf
+        closest_distances[b_removed, i_removed] = np.inf
+
+        # Update the distances to the merged pseudojets
+        new_distances = _pair_distances(beam_distances, rapidity, phi, active, b_merge, i_merge, radius2)
+        distances[b_merge, i_merge, :] = new_distances
+        distances[b_merge, :, i_merge] = new_distances
+
+        closer = new_distances < closest_distances[b_merge]
+        closest_distances[b_merge] = np.where(closer, new_distances, closest_distances[b_merge])
+        closest[b_merge] = np.where(closer, i_merge[:, np.newaxis], closest[b_merge])
+
+        # Pseudojets whose closest partner was removed or changed have to look for it again
+        stale = np.zeros((n_events, n_max), dtype=bool)
+        stale[b_removed] = closest[b_removed] == i_removed[:, np.newaxis]
+        stale[b_merge] |= (closest[b_merge] == i_merge[:, np.newaxis]) & ~closer
+        stale[b_merge, i_merge] = True
+        stale &= active
+
+        b_stale, i_stale = np.nonzero(stale)
+        closest[b_stale, i_stale] = np.argmin(distances[b_stale, i_stale], axis=1)
+        closest_distances[b_stale, i_stale] = distances[b_stale, i_stale, closest[b_stale, i_stale]]
+
+    return np.concatenate(jet_events), np.concatenate(jet_slots), labels
+
+
+def _kinematics(momenta):
+    """Squared transverse momenta, rapidities, and azimuthal angles of momenta (px, py, pz, E)"""
+
+    px, py, pz, e = np.moveaxis(momenta, -1, 0)
+    kt2 = px**2 + py**2
+    m2 = np.maximum(e**2 - kt2 - pz**2, 0.0)
+
+    # Like fastjet, numerically stable for massless particles
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rapidity = 0.5 * np.log((kt2 + m2) / (e + np.abs(pz)) ** 2)
+    rapidity = np.where(pz > 0.0, -rapidity, rapidity)
+
+    return kt2, rapidity, np.arctan2(py, px)
+
+
+def _beam_distances(kt2, exponent):
+    with np.errstate(divide="ignore"):
+        return kt2**exponent
+
+
+def _pair_distances(beam_distances, rapidity, phi, active, events, slots, radius2):
+    """Distances between the pseudojets in the given events and slots and all pseudojets in the same events"""
+
+    delta_rapidity = rapidity[events] - rapidity[events, slots][:, np.newaxis]
+    delta_phi = np.abs(phi[events] - phi[events, slots][:, np.newaxis])
+    delta_phi = np.minimum(delta_phi, 2.0 * np.pi - delta_phi)
+
+    distances = np.minimum(beam_distances[events], beam_distances[events, slots][:, np.newaxis])
+    distances = distances * (delta_rapidity**2 + delta_phi**2) / radius2
+    distances[~active[events]] = np.inf
+    distances[np.arange(len(events)), slots] = np.inf
+
+    return distances
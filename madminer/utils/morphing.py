@@ -8,6 +8,8 @@ from typing import Iterable
 import numpy as np
 import sympy as sp
 
+from scipy.interpolate import RegularGridInterpolator
+
 from madminer.models import Benchmark
 from madminer.models import AnalysisParameter
 from madminer.models import NuisanceParameter
@@ -98,6 +100,7 @@ class PhysicsMorpher:
         self.gd = None
         self.gs = None
         self.condition_number = None
+        self.morphing_error_surface = None
 
     def set_components(self, components):
         """
@@ -269,6 +272,9 @@ class PhysicsMorpher:
         -------
             None
         """
+        # A previously tabulated morphing error does not describe the new basis
+        self.morphing_error_surface = None
+
         # Set gp, gd, gs separately if not using the new method.
         if basis_p is not None or basis_d is not None or basis_s is not None:
             # Set the values of basis, basis_p, basis_d, basis_s
@@ -714,6 +720,111 @@ class PhysicsMorpher:
 
             return np.dot(self.morphing_matrix, component_weights)
 
+    def calculate_morphing_weights_batch(self, thetas, basis=None, morphing_matrix=None):
+        """
+        Calculates the morphing weights `w_b(theta)` for many parameter points at once.
+
+        Parameters
+        ----------
+        thetas : ndarray
+            Parameter points with shape `(n_thetas, n_parameters)`.
+
+        basis : ndarray or None, optional
+             Manually specified morphing basis for which the weights are calculated. This array has shape
+             `(n_basis_benchmarks, n_parameters)`. If None, the basis from the last call of `set_basis()` or
+             `find_basis()` is used. Default value: None.
+
+        morphing_matrix : ndarray or None, optional
+             Manually specified morphing matrix for the given morphing basis. This array has shape
+             `(n_components, n_basis_benchmarks)`. If None, the morphing matrix is calculated automatically. Default
+             value: None.
+
+        Returns
+        -------
+        morphing_weights : ndarray
+            Morphing weights as an array with shape `(n_thetas, n_basis_benchmarks)`.
+        """
+
+        # Check all data is there
+        if self.components is None or self.n_components is None or self.n_components <= 0:
+            raise RuntimeError(
+                "No components defined. Use morpher.set_components() or morpher.find_components() first!"
+            )
+
+        thetas = np.asarray(thetas, dtype=np.float64).reshape((-1, self.n_parameters))
+        component_weights = np.prod(thetas[:, np.newaxis, :] ** self.components[np.newaxis, :, :], axis=2)
+
+        if self.gd is None and self.gp is None and self.gs is None:
+            if basis is None:
+                basis = self.basis
+                morphing_matrix = self.morphing_matrix
+
+            if basis is None:
+                raise RuntimeError(
+                    "No basis defined or given. Use PhysicsMorpher.set_basis(), PhysicsMorpher.optimize_basis(), or the "
+                    "basis keyword."
+                )
+
+            if morphing_matrix is None:
+                morphing_matrix = self.calculate_morphing_matrix(basis)
+
+            # Shape (n_thetas, n_basis_benchmarks)
+            return component_weights.dot(morphing_matrix)
+
+        if morphing_matrix is None:
+            morphing_matrix = self.calculate_morphing_matrix()
+
+        # Shape (n_thetas, n_basis_benchmarks)
+        return component_weights.dot(morphing_matrix)
+
+    def calculate_morphing_error_surface(self, axes=None, resolution=11, batch_size=100000):
+        """
+        Tabulates the morphing error `sqrt(sum_b w_b(theta)^2)` on a regular grid in the full parameter space.
+
+        The result is stored in `PhysicsMorpher.morphing_error_surface`, is saved into the MadMiner file by
+        `MadMiner.save()`, and can later be queried by interpolation without evaluating the morphing weights again.
+
+        Parameters
+        ----------
+        axes : list of ndarray or None, optional
+            Grid coordinates for each parameter. If None, `resolution` equally spaced points spanning the parameter
+            range are used for each parameter. Default value: None.
+
+        resolution : int, optional
+            Number of grid points per parameter, only used if `axes` is None. Default value: 11.
+
+        batch_size : int, optional
+            Number of grid points for which the morphing weights are evaluated at once. Default value: 100000.
+
+        Returns
+        -------
+        morphing_error_surface : MorphingErrorSurface
+            Tabulated morphing error.
+        """
+
+        if axes is None:
+            if self.parameter_range is None or self.parameter_range.ndim != 2:
+                raise RuntimeError("No parameter ranges defined. Specify the grid with the axes keyword.")
+            axes = [np.linspace(range_[0], range_[1], resolution) for range_ in self.parameter_range]
+
+        axes = [np.asarray(axis, dtype=np.float64) for axis in axes]
+        if len(axes) != self.n_parameters:
+            raise ValueError(f"Expected {self.n_parameters} grid axes, got {len(axes)}")
+
+        grid_shape = tuple(len(axis) for axis in axes)
+        grid = np.meshgrid(*axes, indexing="ij")
+        thetas = np.stack([coordinates.flatten() for coordinates in grid], axis=1)
+
+        logger.debug("Evaluating morphing error on a grid with %s points", len(thetas))
+
+        values = np.empty(len(thetas))
+        for i_start in range(0, len(thetas), batch_size):
+            weights = self.calculate_morphing_weights_batch(thetas[i_start : i_start + batch_size])
+            values[i_start : i_start + batch_size] = np.sum(weights * weights, axis=1) ** 0.5
+
+        self.morphing_error_surface = MorphingErrorSurface(axes, values.reshape(grid_shape))
+        return self.morphing_error_surface
+
     def calculate_morphing_weight_gradient(self, theta, basis=None, morphing_matrix=None, gp=None, gd=None, gs=None):
         """
         Calculates the gradient of the morphing weights, `grad_i w_b(theta)`.
@@ -1123,7 +1234,31 @@ class NuisanceMorpher:
         b = sanitize_array(b, min_value=-10.0, max_value=10.0)
         return b
 
-    def calculate_nuisance_factors(self, nuisance_parameters, benchmark_weights):
+    def calculate_coefficients(self, benchmark_weights):
+        """
+        Calculates the coefficients a_i(x) and b_i(x) in
+        `dsigma(x |  theta, nu) / dsigma(x | theta, 0) = exp[ sum_i (a_i(x) nu_i + b_i(x) nu_i^2 )]`.
+
+        The result only depends on the events, not on the nuisance parameters, and can be passed as `coefficients` to
+        the other methods of this class to avoid recalculating it for every value of `nu`.
+
+        Parameters
+        ----------
+        benchmark_weights : ndarray
+            Event weights `dsigma(x | theta_i, nu_i)` with shape `(n_events, n_benchmarks)`. The benchmarks are expected
+            to be sorted in the same order as the keyword benchmark_names used during initialization, and the
+            nuisance benchmarks are expected to be rescaled to have the same physics parameters theta as the
+            reference_benchmark given during initialization.
+
+        Returns
+        -------
+        coefficients : tuple of ndarray
+            Coefficients (a, b), each with shape `(n_nuisance_parameters, n_events)`.
+        """
+
+        return self.calculate_a(benchmark_weights), self.calculate_b(benchmark_weights)
+
+    def calculate_nuisance_factors(self, nuisance_parameters, benchmark_weights=None, coefficients=None):
         """
         Calculates the rescaling of the event weights from non-central values of nuisance parameters.
 
@@ -1132,11 +1267,14 @@ class NuisanceMorpher:
         nuisance_parameters : ndarray
             Values of the nuisance parameters `nu`, with shape `(n_nuisance_parameters,)`.
 
-        benchmark_weights : ndarray
+        benchmark_weights : ndarray or None, optional
             Event weights `dsigma(x | theta_i, nu_i)` with shape `(n_events, n_benchmarks)`. The benchmarks are expected
             to be sorted in the same order as the keyword benchmark_names used during initialization, and the
             nuisance benchmarks are expected to be rescaled to have the same physics parameters theta as the
-            reference_benchmark given during initialization.
+            reference_benchmark given during initialization. Only used if coefficients is None.
+
+        coefficients : tuple of ndarray or None, optional
+            Output of `calculate_coefficients()` for these events. Default value: None.
 
         Returns
         -------
@@ -1144,21 +1282,40 @@ class NuisanceMorpher:
             Nuisance factor `dsigma(x |  theta, nu) / dsigma(x | theta, 0)` with shape `(n_events,)`.
         """
 
-        if nuisance_parameters is None:
-            nuisance_parameters = np.zeros(self.n_nuisance_parameters)
+        return self.calculate_nuisance_factors_batch([nuisance_parameters], benchmark_weights, coefficients)[0]
 
-        a = self.calculate_a(benchmark_weights)  # Shape (n_nuisance_parameters, n_events)
-        b = self.calculate_b(benchmark_weights)  # Shape (n_nuisance_parameters, n_events)
+    def calculate_nuisance_factors_batch(self, nuisance_parameters, benchmark_weights=None, coefficients=None):
+        """
+        Calculates the rescaling of the event weights for several values of the nuisance parameters at once.
 
-        exponent = np.sum(
-            a * nuisance_parameters[:, np.newaxis] + b * nuisance_parameters[:, np.newaxis] ** 2,
-            axis=0,
-        )
+        Parameters
+        ----------
+        nuisance_parameters : ndarray or list of (None or ndarray)
+            Values of the nuisance parameters `nu`, with shape `(n_nus, n_nuisance_parameters)`. None entries are
+            interpreted as the nominal values.
+
+        benchmark_weights : ndarray or None, optional
+            Event weights `dsigma(x | theta_i, nu_i)` with shape `(n_events, n_benchmarks)`. Only used if
+            coefficients is None.
+
+        coefficients : tuple of ndarray or None, optional
+            Output of `calculate_coefficients()` for these events. Default value: None.
+
+        Returns
+        -------
+        nuisance_factors : ndarray
+            Nuisance factors `dsigma(x |  theta, nu) / dsigma(x | theta, 0)` with shape `(n_nus, n_events)`.
+        """
+
+        a, b = self._get_coefficients(benchmark_weights, coefficients)
+        nus = self._get_nus(nuisance_parameters)  # Shape (n_nus, n_nuisance_parameters)
+
+        exponent = nus.dot(a) + (nus**2).dot(b)
         nuisance_factors = np.exp(exponent)
 
         return nuisance_factors
 
-    def calculate_log_nuisance_factor_gradients(self, nuisance_parameters, benchmark_weights):
+    def calculate_log_nuisance_factor_gradients(self, nuisance_parameters, benchmark_weights=None, coefficients=None):
         """
         Calculates the gradient of the log of the nuisance factors with respect to the nuisance parameters.
 
@@ -1167,11 +1324,14 @@ class NuisanceMorpher:
         nuisance_parameters : ndarray
             Values of the nuisance parameters `nu`, with shape `(n_nuisance_parameters,)`.
 
-        benchmark_weights : ndarray
+        benchmark_weights : ndarray or None, optional
             Event weights `dsigma(x | theta_i, nu_i)` with shape `(n_events, n_benchmarks)`. The benchmarks are expected
             to be sorted in the same order as the keyword benchmark_names used during initialization, and the
             nuisance benchmarks are expected to be rescaled to have the same physics parameters theta as the
-            reference_benchmark given during initialization.
+            reference_benchmark given during initialization. Only used if coefficients is None.
+
+        coefficients : tuple of ndarray or None, optional
+            Output of `calculate_coefficients()` for these events. Default value: None.
 
         Returns
         -------
@@ -1180,17 +1340,14 @@ class NuisanceMorpher:
             `(n_parameters, n_events)`.
         """
 
-        if nuisance_parameters is None:
-            nuisance_parameters = np.zeros(self.n_nuisance_parameters)
+        a, b = self._get_coefficients(benchmark_weights, coefficients)
+        nus = self._get_nus([nuisance_parameters])[0]
 
-        a = self.calculate_a(benchmark_weights)  # Shape (n_nuisance_parameters, n_events)
-        b = self.calculate_b(benchmark_weights)  # Shape (n_nuisance_parameters, n_events)
-
-        log_gradients = a + 2.0 * b * nuisance_parameters[:, np.newaxis]
+        log_gradients = a + 2.0 * b * nus[:, np.newaxis]
 
         return log_gradients
 
-    def calculate_nuisance_factor_gradients(self, nuisance_parameters, benchmark_weights):
+    def calculate_nuisance_factor_gradients(self, nuisance_parameters, benchmark_weights=None, coefficients=None):
         """
         Calculates the gradient of the nuisance factors with respect to the nuisance parameters.
 
@@ -1199,11 +1356,14 @@ class NuisanceMorpher:
         nuisance_parameters : ndarray
             Values of the nuisance parameters `nu`, with shape `(n_nuisance_parameters,)`.
 
-        benchmark_weights : ndarray
+        benchmark_weights : ndarray or None, optional
             Event weights `dsigma(x | theta_i, nu_i)` with shape `(n_events, n_benchmarks)`. The benchmarks are expected
             to be sorted in the same order as the keyword benchmark_names used during initialization, and the
             nuisance benchmarks are expected to be rescaled to have the same physics parameters theta as the
-            reference_benchmark given during initialization.
+            reference_benchmark given during initialization. Only used if coefficients is None.
+
+        coefficients : tuple of ndarray or None, optional
+            Output of `calculate_coefficients()` for these events. Default value: None.
 
         Returns
         -------
@@ -1212,18 +1372,348 @@ class NuisanceMorpher:
             `(n_parameters, n_events)`.
         """
 
-        if nuisance_parameters is None:
-            nuisance_parameters = np.zeros(self.n_nuisance_parameters)
+        return self.calculate_nuisance_factor_gradients_batch([nuisance_parameters], benchmark_weights, coefficients)[0]
+
+    def calculate_nuisance_factor_gradients_batch(self, nuisance_parameters, benchmark_weights=None, coefficients=None):
+        """
+        Calculates the gradient of the nuisance factors for several values of the nuisance parameters at once.
+
+        Parameters
+        ----------
+        nuisance_parameters : ndarray or list of (None or ndarray)
+            Values of the nuisance parameters `nu`, with shape `(n_nus, n_nuisance_parameters)`. None entries are
+            interpreted as the nominal values.
 
-        a = self.calculate_a(benchmark_weights)  # Shape (n_nuisance_parameters, n_events)
-        b = self.calculate_b(benchmark_weights)  # Shape (n_nuisance_parameters, n_events)
+        benchmark_weights : ndarray or None, optional
+            Event weights `dsigma(x | theta_i, nu_i)` with shape `(n_events, n_benchmarks)`. Only used if
+            coefficients is None.
 
-        exponent = np.sum(
-            a * nuisance_parameters[:, np.newaxis] + b * nuisance_parameters[:, np.newaxis] ** 2,
-            axis=0,
-        )
-        nuisance_factors = np.exp(exponent)
-        log_gradients = a + 2.0 * b * nuisance_parameters[:, np.newaxis]
-        gradients = log_gradients * nuisance_factors[np.newaxis, :]
+        coefficients : tuple of ndarray or None, optional
+            Output of `calculate_coefficients()` for these events. Default value: None.
+
+        Returns
+        -------
+        nuisance_factor_gradients : ndarray
+            Nuisance factor gradients `grad_nu (dsigma(x | theta, nu) / dsigma(x | theta, 0))` with shape
+            `(n_nus, n_parameters, n_events)`.
+        """
+
+        a, b = self._get_coefficients(benchmark_weights, coefficients)
+        nus = self._get_nus(nuisance_parameters)  # Shape (n_nus, n_nuisance_parameters)
+
+        nuisance_factors = np.exp(nus.dot(a) + (nus**2).dot(b))  # Shape (n_nus, n_events)
+        log_gradients = a[np.newaxis, :, :] + 2.0 * b[np.newaxis, :, :] * nus[:, :, np.newaxis]
+        gradients = log_gradients * nuisance_factors[:, np.newaxis, :]
 
         return gradients
+
+    def expand_benchmark_weights(self, benchmark_weights, coefficients):
+        """
+        Reconstructs the weights of the nuisance benchmarks from the weights of the other benchmarks and the
+        coefficients a_i(x) and b_i(x). This is the inverse of storing `calculate_coefficients()` instead of the
+        nuisance benchmark weights.
+
+        Parameters
+        ----------
+        benchmark_weights : ndarray
+            Event weights with shape `(n_events, n_benchmarks - n_nuisance_benchmarks)`, containing all benchmarks
+            except the nuisance benchmarks, in the order of the keyword benchmark_names used during initialization.
+
+        coefficients : tuple of ndarray
+            Coefficients (a, b), each with shape `(n_nuisance_parameters, n_events)`.
+
+        Returns
+        -------
+        benchmark_weights : ndarray
+            Event weights `dsigma(x | theta_i, nu_i)` for all benchmarks with shape `(n_events, n_benchmarks)`.
+        """
+
+        a, b = coefficients
+        n_events = benchmark_weights.shape[0]
+
+        nuisance_indices = {i for i in self.i_benchmarks_pos + self.i_benchmarks_neg if i is not None}
+        other_indices = [i for i in range(len(self.benchmark_names)) if i not in nuisance_indices]
+
+        if len(other_indices) != benchmark_weights.shape[1]:
+            raise ValueError(
+                f"Expected weights for {len(other_indices)} benchmarks, but got {benchmark_weights.shape[1]}"
+            )
+
+        weights = np.empty((n_events, len(self.benchmark_names)), dtype=benchmark_weights.dtype)
+        weights[:, other_indices] = benchmark_weights
+        reference_weights = weights[:, self.i_benchmark_ref]
+
+        # nu = +1: exp(a + b), nu = -1: exp(b - a)
+        for i, (i_pos, i_neg) in enumerate(zip(self.i_benchmarks_pos, self.i_benchmarks_neg)):
+            if i_pos is not None:
+                weights[:, i_pos] = reference_weights * np.exp(a[i] + b[i])
+            if i_neg is not None:
+                weights[:, i_neg] = reference_weights * np.exp(b[i] - a[i])
+
+        return weights
+
+    def _get_coefficients(self, benchmark_weights, coefficients):
+        if coefficients is not None:
+            return coefficients
+        if benchmark_weights is None:
+            raise ValueError("Either benchmark_weights or coefficients have to be given")
+        return self.calculate_coefficients(benchmark_weights)
+
+    def _get_nus(self, nuisance_parameters):
+        nus = np.zeros((len(nuisance_parameters), self.n_nuisance_parameters))
+        for i, nu in enumerate(nuisance_parameters):
+            if nu is not None:
+                nus[i] = nu
+        return nus
+
+
+class MorphingKernel:
+    """
+    Precompiled translation of parameter points into benchmark weights.
+
+    The kernel is built once from a fixed morphing (or finite-difference) setup and afterwards evaluates the vectors
+    `A(theta)` with `dsigma(theta) = A(theta) . dsigma_benchmarks` and their gradients for whole batches of parameter
+    points at once. All quantities that do not depend on theta (component exponents, the morphing matrix zero-padded
+    to the full benchmark layout, and the finite-difference matrices) are computed in the constructor.
+
+    For a typical MadMiner application, it is not necessary to use this class directly: `DataAnalyzer` and all
+    classes derived from it build a kernel when they load a MadMiner file.
+
+    Parameters
+    ----------
+    benchmark_names : list of str
+        Names of all benchmarks (including nuisance benchmarks) in the order in which their weights are stored.
+
+    benchmark_values : ndarray
+        Parameter values of all benchmarks with shape `(n_benchmarks, n_parameters)`.
+
+    components : ndarray or None, optional
+        Morphing components with shape `(n_components, n_parameters)`. If None, morphing is not available. Default
+        value: None.
+
+    morphing_matrix : ndarray or None, optional
+        Morphing matrix with shape `(n_components, n_morphing_benchmarks)`, as calculated by
+        `PhysicsMorpher.calculate_morphing_matrix()`. If None, morphing is not available. Default value: None.
+
+    finite_difference_matrices : ndarray or None, optional
+        Matrices that translate the benchmark weights into the gradients of the weights at each benchmark, with shape
+        `(n_benchmarks, n_parameters, n_benchmarks)`. If None, finite differences are not available. Default value:
+        None.
+    """
+
+    def __init__(
+        self,
+        benchmark_names,
+        benchmark_values,
+        components=None,
+        morphing_matrix=None,
+        finite_difference_matrices=None,
+    ):
+        self.benchmark_names = list(benchmark_names)
+        self.benchmark_indices = {name: i for i, name in enumerate(self.benchmark_names)}
+        self.benchmark_values = np.asarray(benchmark_values, dtype=np.float64)
+        self.n_benchmarks = len(self.benchmark_names)
+        self.n_parameters = self.benchmark_values.shape[1] if self.benchmark_values.ndim == 2 else 0
+
+        # Benchmark weights are just rows of the identity
+        self.benchmark_matrix = np.identity(self.n_benchmarks)
+
+        # Morphing
+        self.components = None
+        self.morphing_matrix = None
+        self.n_morphing_benchmarks = None
+        self.gradient_exponents = None
+        self.gradient_prefactors = None
+        self.benchmark_gradient_matrices = None
+
+        if components is not None and morphing_matrix is not None:
+            self.components = np.asarray(components, dtype=int)  # (n_components, n_parameters)
+            morphing_matrix = np.asarray(morphing_matrix, dtype=np.float64)  # (n_components, n_morphing_benchmarks)
+            n_components, self.n_morphing_benchmarks = morphing_matrix.shape
+
+            # Zero-pad to the full benchmark layout once, so that no padding is needed later
+            self.morphing_matrix = np.zeros((n_components, self.n_benchmarks))
+            self.morphing_matrix[:, : self.n_morphing_benchmarks] = morphing_matrix
+
+            # d/dtheta_i prod_p theta_p^c_p = c_i theta_i^(c_i - 1) prod_(p != i) theta_p^c_p
+            # Shape (n_parameters, n_components, n_parameters) and (n_parameters, n_components)
+            identity = np.identity(self.n_parameters, dtype=int)
+            self.gradient_exponents = np.maximum(self.components[np.newaxis, :, :] - identity[:, np.newaxis, :], 0)
+            self.gradient_prefactors = self.components.T.astype(np.float64)
+
+            # Gradients at the benchmarks themselves. Shape (n_benchmarks, n_parameters, n_benchmarks)
+            self.benchmark_gradient_matrices = self._morphing_gradients(self.benchmark_values)
+
+        # Finite differences
+        self.finite_difference_matrices = None
+        if finite_difference_matrices is not None:
+            self.finite_difference_matrices = np.asarray(finite_difference_matrices, dtype=np.float64)
+
+    @property
+    def mode(self):
+        """Derivative mode: "morphing", "fd", or None if no gradients can be calculated"""
+
+        if self.morphing_matrix is not None:
+            return "morphing"
+        elif self.finite_difference_matrices is not None:
+            return "fd"
+        return None
+
+    def weights(self, thetas):
+        """
+        Calculates the vectors `A(theta)` such that `dsigma(theta) = A(theta) . dsigma_benchmarks`.
+
+        Parameters
+        ----------
+        thetas : ndarray or list of (ndarray or str or int)
+            Parameter points, given either as a ndarray with shape `(n_thetas, n_parameters)` or as a list in which
+            each entry is a benchmark name (str), a benchmark index (int), or a parameter point (ndarray).
+
+        Returns
+        -------
+        theta_matrices : ndarray
+            Benchmark weights with shape `(n_thetas, n_benchmarks)`.
+        """
+
+        indices, points, point_positions = self._split(thetas)
+
+        theta_matrices = np.empty((len(indices), self.n_benchmarks))
+        benchmark_positions = [i for i, index in enumerate(indices) if index is not None]
+        if benchmark_positions:
+            theta_matrices[benchmark_positions] = self.benchmark_matrix[[indices[i] for i in benchmark_positions]]
+        if point_positions:
+            theta_matrices[point_positions] = self._morphing_weights(points)
+
+        return theta_matrices
+
+    def gradients(self, thetas):
+        """
+        Calculates the matrices `A_ij(theta)` such that `d dsigma(theta) / d theta_i = A_ij(theta) dsigma_j`, where
+        `j` runs over the benchmarks.
+
+        Parameters
+        ----------
+        thetas : ndarray or list of (ndarray or str or int)
+            Parameter points, given either as a ndarray with shape `(n_thetas, n_parameters)` or as a list in which
+            each entry is a benchmark name (str), a benchmark index (int), or a parameter point (ndarray).
+
+        Returns
+        -------
+        theta_gradient_matrices : ndarray
+            Benchmark weight gradients with shape `(n_thetas, n_parameters, n_benchmarks)`.
+        """
+
+        mode = self.mode
+        if mode is None:
+            raise RuntimeError(
+                "Cannot compute xsec gradients when neither morphing nor finite differences are correctly set up!"
+            )
+
+        indices, points, point_positions = self._split(thetas)
+
+        if mode == "fd" and point_positions:
+            raise RuntimeError("Cannot calculate score for arbitrary parameter points without morphing setup")
+
+        benchmark_gradient_matrices = (
+            self.benchmark_gradient_matrices if mode == "morphing" else self.finite_difference_matrices
+        )
+
+        theta_gradient_matrices = np.empty((len(indices), self.n_parameters, self.n_benchmarks))
+        benchmark_positions = [i for i, index in enumerate(indices) if index is not None]
+        if benchmark_positions:
+            theta_gradient_matrices[benchmark_positions] = benchmark_gradient_matrices[
+                [indices[i] for i in benchmark_positions]
+            ]
+        if point_positions:
+            theta_gradient_matrices[point_positions] = self._morphing_gradients(points)
+
+        return theta_gradient_matrices
+
+    def _split(self, thetas):
+        """Separates benchmark references from parameter points that need morphing"""
+
+        if isinstance(thetas, np.ndarray) and thetas.dtype.kind in "iuf":
+            points = thetas.reshape((-1, self.n_parameters)).astype(np.float64)
+            return [None] * len(points), points, list(range(len(points)))
+
+        indices, points, point_positions = [], [], []
+        for i, theta in enumerate(thetas):
+            if isinstance(theta, str):
+                indices.append(self.benchmark_indices[theta])
+            elif isinstance(theta, (int, np.integer)):
+                indices.append(int(theta))
+            else:
+                indices.append(None)
+                points.append(np.asarray(theta, dtype=np.float64).flatten())
+                point_positions.append(i)
+
+        points = np.asarray(points).reshape((-1, self.n_parameters))
+        return indices, points, point_positions
+
+    def _component_weights(self, points):
+        """Component weights with shape (n_thetas, n_components)"""
+
+        return np.prod(points[:, np.newaxis, :] ** self.components[np.newaxis, :, :], axis=2)
+
+    def _morphing_weights(self, points):
+        """Zero-padded morphing weights with shape (n_thetas, n_benchmarks)"""
+
+        if self.morphing_matrix is None:
+            raise RuntimeError("Cannot calculate weights for arbitrary parameter points without morphing setup")
+
+        return self._component_weights(points).dot(self.morphing_matrix)
+
+    def _morphing_gradients(self, points):
+        """Zero-padded morphing weight gradients with shape (n_thetas, n_parameters, n_benchmarks)"""
+
+        # Shape (n_thetas, n_parameters, n_components)
+        component_weight_gradients = self.gradient_prefactors[np.newaxis, :, :] * np.prod(
+            points[:, np.newaxis, np.newaxis, :] ** self.gradient_exponents[np.newaxis, :, :, :],
+            axis=3,
+        )
+        return component_weight_gradients.dot(self.morphing_matrix)
+
+
+class MorphingErrorSurface:
+    """
+    Morphing error `sqrt(sum_b w_b(theta)^2)` tabulated on a regular parameter grid, with interpolated lookup.
+
+    Large values indicate parameter points where the morphing amplifies the statistical fluctuations of the basis
+    samples. Surfaces are typically created with `PhysicsMorpher.calculate_morphing_error_surface()`.
+
+    Parameters
+    ----------
+    axes : list of ndarray
+        Grid coordinates for each parameter, each strictly ascending.
+
+    values : ndarray
+        Morphing error at the grid points with shape `(len(axes[0]), len(axes[1]), ...)`.
+    """
+
+    def __init__(self, axes, values):
+        self.axes = [np.asarray(axis, dtype=np.float64) for axis in axes]
+        self.values = np.asarray(values, dtype=np.float64)
+        self.n_parameters = len(self.axes)
+
+        if self.values.shape != tuple(len(axis) for axis in self.axes):
+            raise ValueError(f"Grid values with shape {self.values.shape} do not match the grid axes")
+
+        self._interpolator = RegularGridInterpolator(self.axes, self.values, bounds_error=False, fill_value=np.nan)
+
+    def __call__(self, thetas):
+        """
+        Interpolates the morphing error at the given parameter points.
+
+        Parameters
+        ----------
+        thetas : ndarray
+            Parameter points with shape `(n_thetas, n_parameters)` or `(n_parameters,)`.
+
+        Returns
+        -------
+        morphing_errors : ndarray
+            Interpolated morphing errors with shape `(n_thetas,)`. Points outside the grid are assigned NaN.
+        """
+
+        thetas = np.asarray(thetas, dtype=np.float64).reshape((-1, self.n_parameters))
+        return self._interpolator(thetas)
@@ -1,4 +1,5 @@
 import logging
+import numpy as np
 import vector
 
 from particle import Particle
@@ -10,6 +11,100 @@ B_PDG_IDS = {int(p.pdgid) for p in Particle.findall(pdg_name="b")}
 T_PDG_IDS = {int(p.pdgid) for p in Particle.findall(pdg_name="t")}
 TAU_PDG_IDS = {int(p.pdgid) for p in Particle.findall(pdg_name="tau")}
 
+# Built on first use by get_pdg_table()
+_PDG_TABLE = None
+
+
+class PDGTable:
+    """
+    Charges, tags, and flags of all particles known to the `particle` package. The package is queried once, the
+    properties are stored in arrays sorted by PDG id for vectorized lookups, and in a dict for single particles.
+
+    PDG ids that the `particle` package does not know have charge 0, no tags, and are neither elementary nor
+    neutrinos, like in `MadMinerParticle.set_pdgid()`.
+    """
+
+    def __init__(self):
+        particles = Particle.findall()
+
+        # Standard Model elementary particles (in the order of the particle package) and neutrinos
+        self.elementary_pdgids = [
+            int(p.pdgid)
+            for p in particles
+            if p.pdgid.is_sm_quark or p.pdgid.is_sm_lepton or p.pdgid.is_sm_gauge_boson_or_higgs
+        ]
+        self.neutrino_pdgids = {int(p.pdgid) for p in particles if p.pdgid.is_sm_lepton and p.charge == 0}
+        self.visible_pdgids = set(self.elementary_pdgids) - self.neutrino_pdgids
+        self.electron_pdgids = {int(p.pdgid) for p in particles if p.pdg_name == "e"}
+        self.muon_pdgids = {int(p.pdgid) for p in particles if p.pdg_name == "mu"}
+
+        charges = {int(p.pdgid): float(p.charge) for p in particles}
+        self.pdgids = np.array(sorted(charges), dtype=np.int64)
+        self.charges = np.array([charges[pdgid] for pdgid in self.pdgids.tolist()], dtype=np.float64)
+
+        # Tags as set by MadMinerParticle.set_pdgid()
+        self.b_tags = np.isin(self.pdgids, list(B_PDG_IDS))
+        self.t_tags = ~self.b_tags & np.isin(self.pdgids, list(T_PDG_IDS))
+        self.tau_tags = ~self.b_tags & ~self.t_tags & np.isin(self.pdgids, list(TAU_PDG_IDS))
+
+        self.is_elementary = np.isin(self.pdgids, self.elementary_pdgids)
+        self.is_neutrino = np.isin(self.pdgids, list(self.neutrino_pdgids))
+        self.is_visible = self.is_elementary & ~self.is_neutrino
+
+        self._properties = {
+            pdgid: (charge, tau_tag, b_tag, t_tag)
+            for pdgid, charge, tau_tag, b_tag, t_tag in zip(
+                self.pdgids.tolist(),
+                self.charges.tolist(),
+                self.tau_tags.tolist(),
+                self.b_tags.tolist(),
+                self.t_tags.tolist(),
+            )
+        }
+
+    def particle_properties(self, pdgid):
+        """Returns charge, tau tag, b tag, and t tag for a single PDG id"""
+        return self._properties.get(pdgid, (0.0, False, False, False))
+
+    def properties(self, pdgids):
+        """
+        Looks up the properties of an array of PDG ids.
+
+        Parameters
+        ----------
+        pdgids : array_like
+            PDG ids.
+
+        Returns
+        -------
+        properties : dict
+            Arrays "charge", "tau_tag", "b_tag", "t_tag", "is_neutrino", and "is_visible" with the shape of pdgids.
+
+        """
+
+        pdgids = np.asarray(pdgids, dtype=np.int64)
+        positions = np.clip(np.searchsorted(self.pdgids, pdgids), 0, len(self.pdgids) - 1)
+        known = self.pdgids[positions] == pdgids
+
+        return {
+            "charge": np.where(known, self.charges[positions], 0.0),
+            "tau_tag": known & self.tau_tags[positions],
+            "b_tag": known & self.b_tags[positions],
+            "t_tag": known & self.t_tags[positions],
+            "is_neutrino": known & self.is_neutrino[positions],
+            "is_visible": known & self.is_visible[positions],
+        }
+
+
+def get_pdg_table():
+    """Returns the PDGTable, which is built when it is first needed"""
+
+    global _PDG_TABLE
+    if _PDG_TABLE is None:
+        logger.debug("Building PDG property table")
+        _PDG_TABLE = PDGTable()
+    return _PDG_TABLE
+
 
 class MadMinerParticle(vector.MomentumObject4D):
     """ """
@@ -31,17 +126,13 @@ class MadMinerParticle(vector.MomentumObject4D):
 
     def set_pdgid(self, pdgid):
         self.pdgid = int(pdgid)
+        self.charge, tau_tag, b_tag, t_tag = get_pdg_table().particle_properties(self.pdgid)
 
-        try:
-            self.charge = Particle.from_pdgid(self.pdgid).charge
-        except RuntimeError:
-            self.charge = 0.0
-
-        if self.pdgid in B_PDG_IDS:
+        if b_tag:
             self.b_tag = True
-        elif self.pdgid in T_PDG_IDS:
+        elif t_tag:
             self.t_tag = True
-        elif self.pdgid in TAU_PDG_IDS:
+        elif tau_tag:
             self.tau_tag = True
 
     def set_spin(self, spin):
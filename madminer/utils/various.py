@@ -1,31 +1,43 @@
 import logging
 import gzip
+import io
 import math
 import os
 import shutil
 import stat
 
 from contextlib import contextmanager
+from pathlib import Path
 from subprocess import Popen
 from subprocess import PIPE
+from threading import Thread
 
 import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# Buffer size for reading (compressed) event files
+DEFAULT_BUFFER_SIZE = 4 * 1024 * 1024
 
-def call_command(cmd, log_file=None, return_std=False):
+COMPRESSED_EXTENSIONS = (".gz", ".zst", ".lz4")
+
+
+def call_command(cmd, log_file=None, return_std=False, input_file=None):
     if log_file is not None:
         with open(log_file, "wb") as log:
-            proc = Popen(cmd, stdout=log, stderr=log, shell=True)
+            proc = Popen(cmd, stdout=log, stderr=log, stdin=_stdin(input_file), shell=True)
+            writer = _stream_to_stdin(proc, input_file)
             _ = proc.communicate()
+            _join(writer)
             exitcode = proc.returncode
 
         if exitcode != 0:
             raise RuntimeError(f"Calling command {cmd} returned exit code {exitcode}. Output in file {log_file}.")
     else:
-        proc = Popen(cmd, stdout=PIPE, stderr=PIPE, shell=True)
+        proc = Popen(cmd, stdout=PIPE, stderr=PIPE, stdin=_stdin(input_file), shell=True)
+        writer = _stream_to_stdin(proc, input_file)
         out, err = proc.communicate()
+        _join(writer)
         exitcode = proc.returncode
 
         if exitcode != 0:
@@ -44,6 +56,97 @@ def call_command(cmd, log_file=None, return_std=False):
     return exitcode
 
 
+def _stdin(input_file):
+    return None if input_file is None else PIPE
+
+
+def _stream_to_stdin(proc, input_file):
+    """Feeds a file object to the standard input of a process in a background thread"""
+
+    if input_file is None:
+        return None
+
+    # Bypass communicate(), which would write the whole file at once
+    stdin = proc.stdin
+    proc.stdin = None
+
+    def write():
+        try:
+            shutil.copyfileobj(input_file, stdin, DEFAULT_BUFFER_SIZE)
+        except BrokenPipeError:
+            logger.debug("Process closed its standard input before reading all of it")
+        finally:
+            try:
+                stdin.close()
+            except BrokenPipeError:
+                pass
+
+    writer = Thread(target=write, daemon=True)
+    writer.start()
+    return writer
+
+
+def _join(writer):
+    if writer is not None:
+        writer.join()
+
+
+def open_file(filename, mode="r", encoding=None, buffer_size=DEFAULT_BUFFER_SIZE):
+    """
+    Opens a (possibly compressed) file for reading. Compressed files are decompressed on the fly while reading, so
+    no decompressed copy is written to disk.
+
+    Parameters
+    ----------
+    filename : str or Path
+        Path to the file. Files with extension ".gz" are read as gzip stream, ".zst" as zstd stream (requires the
+        zstandard package), and ".lz4" as lz4 frame stream (requires the lz4 package).
+
+    mode : {"r", "rb"}, optional
+        Text ("r") or binary ("rb") mode. Default value: "r".
+
+    encoding : str or None, optional
+        Encoding in text mode. Default value: None.
+
+    buffer_size : int, optional
+        Size of the read buffer in bytes. Default value: 4 MiB.
+
+    Returns
+    -------
+    file : file object
+        Buffered file object.
+
+    """
+
+    if mode not in ["r", "rb"]:
+        raise ValueError(f"Invalid mode {mode}, files can only be opened for reading")
+
+    extension = Path(filename).suffix
+
+    if extension not in COMPRESSED_EXTENSIONS:
+        return open(filename, mode, buffering=buffer_size, encoding=encoding)
+
+    if extension == ".gz":
+        stream = gzip.open(filename, "rb")
+    elif extension == ".zst":
+        try:
+            import zstandard
+        except ImportError as e:
+            raise RuntimeError("Reading zstd-compressed files requires the zstandard package") from e
+        stream = zstandard.ZstdDecompressor().stream_reader(open(filename, "rb"), closefd=True)
+    else:
+        try:
+            import lz4.frame
+        except ImportError as e:
+            raise RuntimeError("Reading lz4-compressed files requires the lz4 package") from e
+        stream = lz4.frame.open(filename, "rb")
+
+    stream = io.BufferedReader(stream, buffer_size)
+    if mode == "rb":
+        return stream
+    return io.TextIOWrapper(stream, encoding=encoding)
+
+
 def unzip_file(filename, new_filename, block_size=65536):
     # call_command("gunzip -c {} > {}".format(filename, new_filename))  # Doesn't work under windows
     with gzip.open(filename, "rb") as s_file, open(new_filename, "wb") as d_file:
@@ -0,0 +1,72 @@
+import os
+
+from collections import OrderedDict
+
+import numpy as np
+
+from madminer.models import Observable
+from madminer.utils.interfaces.cache import AnalysisCache
+from madminer.utils.interfaces.cache import definition_hash
+
+
+def test_analysis_cache(tmp_path):
+    filename = tmp_path / "events.lhe"
+    filename.write_text("events")
+    cache = AnalysisCache(filename)
+
+    observables = OrderedDict([("ptj", Observable("ptj", "j[0].pt"))])
+    key = definition_hash(observables, [1.0, None])
+    assert key == definition_hash(OrderedDict([("ptj", Observable("ptj", "j[0].pt"))]), [1.0, None])
+    assert key != definition_hash(OrderedDict([("ptj", Observable("ptj", "j[0].e"))]), [1.0, None])
+
+    # Results
+    assert cache.load_results(key) is None
+    cache.save_results(key, OrderedDict([("ptj", np.arange(3.0))]), OrderedDict([("b0", np.ones(3))]), 3)
+    observations, weights, n_events = cache.load_results(key)
+    assert n_events == 3 and list(observations) == ["ptj"] and np.array_equal(weights["b0"], np.ones(3))
+
+    # Parsed events, read in other chunks than they were written
+    writer = cache.events_writer("events")
+    for n_events in [2, 3]:
+        writer.append(np.ones((2 * n_events, 6)), np.full(n_events, 2), np.zeros((n_events, 1)), ["b0"])
+    writer.close()
+    chunks = list(cache.load_events("events", chunk_size=4))
+    assert [len(chunk[1]) for chunk in chunks] == [4, 1]
+    assert [chunk[0].shape for chunk in chunks] == [(8, 6), (2, 6)]
+
+    # Changing the input file invalidates the cache
+    stat = os.stat(filename)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert cache.load_results(key) is None
+    assert cache.load_events("events", chunk_size=4) is None
+
+
+def test_definition_hash_of_functions():
+    def make_cut(threshold):
+        return lambda observations: observations[0] > threshold
+
+    def make_scaled(scale=1.0, *, offset=0.0):
+        return lambda observations, scale=scale, *, offset=offset: scale * observations[0] + offset
+
+    # Values captured in closures and default arguments are part of the definition
+    assert definition_hash(make_cut(1.0)) == definition_hash(make_cut(1.0))
+    assert definition_hash(make_cut(1.0)) != definition_hash(make_cut(100.0))
+    assert definition_hash(make_scaled(2.0)) != definition_hash(make_scaled(3.0))
+    assert definition_hash(make_scaled(offset=1.0)) != definition_hash(make_scaled(offset=2.0))
+
+    def factorial(n):
+        return 1 if n <= 1 else n * factorial(n - 1)
+
+    assert definition_hash(factorial) == definition_hash(factorial)
+
+    # Module-level helpers and constants that a function refers to are part of the definition
+    namespace = {}
+    exec("THRESHOLD = 1.0\ndef passes(value):\n    return value > THRESHOLD\n", namespace)
+    exec("def cut(observations):\n    return all(passes(value) for value in observations)\n", namespace)
+    key = definition_hash(namespace["cut"])
+    namespace["THRESHOLD"] = 2.0
+    assert definition_hash(namespace["cut"]) != key
+    namespace["THRESHOLD"] = 1.0
+    assert definition_hash(namespace["cut"]) == key
+    exec("def passes(value):\n    return value >= THRESHOLD\n", namespace)
+    assert definition_hash(namespace["cut"]) != key
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from madminer.utils.columnar import ObjectCollection
+from madminer.utils.columnar import UnsupportedExpression
+from madminer.utils.columnar import evaluate_expression
+from madminer.utils.columnar import vectorized_math_commands
+from madminer.utils.expressions import compile_expression
+from madminer.utils.interfaces.lhe import _smear_particles_columnar
+
+
+def _jets():
+    # Three events with 2, 0, and 1 jets, given in unsorted order
+    event_index = np.array([0, 0, 2])
+    px = np.array([10.0, 30.0, 5.0])
+    columns = {
+        "px": px,
+        "py": np.zeros(3),
+        "pz": np.array([1.0, 2.0, 3.0]),
+        "e": np.array([20.0, 40.0, 10.0]),
+        "charge": np.zeros(3),
+    }
+    return ObjectCollection.from_flat(event_index, 3, columns, sort_key=np.abs(px))
+
+
+def test_object_collection():
+    jets = _jets()
+    variables = vectorized_math_commands()
+    variables["j"] = jets
+
+    values, failed = evaluate_expression("j[0].pt", variables, [jets], 3)
+    assert np.allclose(values[[0, 2]], [30.0, 5.0])
+    assert np.all(failed == [False, True, False])
+
+    values, failed = evaluate_expression("(j[0] + j[-1]).e", variables, [jets], 3)
+    assert np.allclose(values[[0, 2]], [60.0, 20.0])
+    assert np.all(failed == [False, True, False])
+
+    values, failed = evaluate_expression("len(j) >= 1", variables, [jets], 3)
+    assert np.all(values == [True, False, True])
+    assert not np.any(failed)
+
+    # Undefined names fail in every event
+    values, failed = evaluate_expression("visible.e", variables, [jets], 3)
+    assert np.all(failed)
+
+    # Conditional expressions have to be evaluated event by event
+    with pytest.raises(UnsupportedExpression):
+        evaluate_expression("j[0].pt if len(j) > 0 else 0.0", variables, [jets], 3)
+
+
+def test_compiled_expressions():
+    jets = _jets()
+    variables = vectorized_math_commands()
+    variables["j"] = jets
+
+    expression = compile_expression("j[0].pt if len(j) > 0 else 0.0")
+    assert compile_expression("j[0].pt if len(j) > 0 else 0.0") is expression
+
+    # Unsupported expressions are not tried on arrays again in the same analysis, but in other ones
+    unsupported = set()
+    with pytest.raises(UnsupportedExpression):
+        evaluate_expression(expression, variables, [jets], 3, unsupported=unsupported)
+    assert unsupported == {"j[0].pt if len(j) > 0 else 0.0"}
+    with pytest.raises(UnsupportedExpression, match="not vectorizable before"):
+        evaluate_expression("j[0].pt if len(j) > 0 else 0.0", variables, [jets], 3, unsupported=unsupported)
+    values, _ = evaluate_expression("j[0].pt", variables, [jets], 3, unsupported=unsupported)
+    assert values is not None
+
+    # Floating-point errors only affect the current chunk
+    variables["x"] = np.array([1.0, 0.0, 2.0])
+    with pytest.raises(UnsupportedExpression):
+        evaluate_expression("1.0 / x", variables, [], 3, unsupported=unsupported)
+    assert "1.0 / x" not in unsupported
+
+    with pytest.raises(SyntaxError):
+        compile_expression("j[0].pt >")
+
+
+def test_smearing():
+    # Two b quarks and a photon, which has no smearing function
+    pdgids = np.array([5, -5, 22])
+    momenta = np.array([[30.0, 0.0, 10.0, 40.0], [-20.0, -5.0, 0.0, 25.0], [3.0, 4.0, 0.0, 5.0]])
+    resolutions = [{5: (None, None), -5: (None, None)}] + [{5: (1.0, 0.1), -5: (1.0, 0.1)} for _ in range(3)]
+
+    is_kept, smeared = _smear_particles_columnar(pdgids, momenta, *resolutions, np.random.default_rng(1))
+    _, smeared_again = _smear_particles_columnar(pdgids, momenta, *resolutions, np.random.default_rng(1))
+
+    assert np.all(is_kept == [True, True, False])
+    assert np.array_equal(smeared, smeared_again, equal_nan=True)
+
+    # Energy from on-shell condition with the true mass
+    pt, phi, eta, e = smeared[:2].T
+    assert np.all(pt > 0.0) and np.all((phi >= 0.0) & (phi < 2.0 * np.pi))
+    masses = (momenta[:2, 3] ** 2 - np.sum(momenta[:2, :3] ** 2, axis=1)) ** 0.5
+    assert np.allclose(e**2 - (pt * np.cosh(eta)) ** 2, masses**2)
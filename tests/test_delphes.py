@@ -0,0 +1,190 @@
+import gzip
+import logging
+
+from collections import OrderedDict
+
+import awkward as ak
+import numpy as np
+import uproot
+
+from madminer import MadMiner
+from madminer.delphes import DelphesReader
+from madminer.models import Cut
+from madminer.models import Observable
+from madminer.utils.interfaces.delphes import run_delphes
+from madminer.utils.interfaces.delphes_root import get_used_collections
+from madminer.utils.interfaces.delphes_root import parse_delphes_root_file
+
+
+def _write_delphes_file(filename):
+    # Three events with 2, 0, and 1 jets, one electron and muon in the first event, and one MET object each
+    branches = {
+        "Jet": ak.zip(
+            {
+                "PT": ak.Array([[50.0, 30.0], [], [40.0]]),
+                "Eta": ak.Array([[0.5, -1.0], [], [4.0]]),
+                "Phi": ak.Array([[0.1, 2.0], [], [-1.0]]),
+                "Mass": ak.Array([[5.0, 3.0], [], [4.0]]),
+                "BTag": ak.Array([[1, 0], [], [0]]),
+            }
+        ),
+        "Electron": ak.zip(
+            {
+                "PT": ak.Array([[20.0], [], []]),
+                "Eta": ak.Array([[0.2], [], []]),
+                "Phi": ak.Array([[1.0], [], []]),
+                "Charge": ak.Array([[-1], [], []]),
+            }
+        ),
+        "Muon": ak.zip(
+            {
+                "PT": ak.Array([[25.0], [], []]),
+                "Eta": ak.Array([[-0.3], [], []]),
+                "Phi": ak.Array([[-2.0], [], []]),
+                "Charge": ak.Array([[1], [], []]),
+            }
+        ),
+        "Photon": ak.zip(
+            {
+                "PT": ak.Array([[], [15.0], []]),
+                "Eta": ak.Array([[], [0.0], []]),
+                "Phi": ak.Array([[], [0.5], []]),
+                "E": ak.Array([[], [15.0], []]),
+            }
+        ),
+        "MissingET": ak.zip({"MET": ak.Array([[10.0], [20.0], [30.0]]), "Phi": ak.Array([[0.0], [1.0], [2.0]])}),
+        "Weight": ak.zip({"Weight": ak.Array([[1.0], [2.0], [3.0]])}),
+    }
+
+    with uproot.recreate(filename) as file:
+        file.mktree(
+            "Delphes",
+            {name: values.type.content for name, values in branches.items()},
+            counter_name=lambda name: f"{name}_size",
+            field_name=lambda name, field: f"{name}.{field}",
+        )
+        file["Delphes"].extend(branches)
+
+
+def test_parse_delphes_root_file(tmp_path):
+    filename = str(tmp_path / "delphes.root")
+    _write_delphes_file(filename)
+
+    observables = OrderedDict(
+        [
+            ("ptj", Observable("ptj", "j[0].pt", val_default=0.0)),
+            ("btag", Observable("btag", "j[0].b_tag", val_default=0.0)),
+            ("pdgidl", Observable("pdgidl", "l[0].pdgid", val_default=0.0)),
+            ("mvis", Observable("mvis", "visible.m")),
+            ("met", Observable("met", "met.pt if len(a) == 0 else 0.0", is_required=True)),
+            ("nj", Observable("nj", lambda leptons, photons, jets, met: len(jets))),
+        ]
+    )
+    cuts = [Cut("met", "met < 25.0")]
+
+    # The columnar engine in chunks of two events, the events engine all at once
+    results = {}
+    for engine, chunk_size in [("columnar", 2), ("events", 100000)]:
+        results[engine] = parse_delphes_root_file(
+            filename, observables, cuts, acceptance_eta_max_j=2.5, engine=engine, chunk_size=chunk_size
+        )
+
+    observations, weights, combined_filter = results["columnar"]
+    assert weights is None
+    assert list(combined_filter) == [True, True, False]
+    assert np.allclose(observations["ptj"], [50.0, 0.0])
+    assert list(observations["btag"]) == [1.0, 0.0]
+    assert list(observations["pdgidl"]) == [-13.0, 0.0]
+    assert list(observations["nj"]) == [2.0, 0.0]
+
+    events_observations, _, events_filter = results["events"]
+    assert np.array_equal(combined_filter, events_filter)
+    for name in observables:
+        assert np.allclose(observations[name], events_observations[name])
+
+
+def test_used_collections():
+    observables = OrderedDict(
+        [
+            ("ej", Observable("ej", "j[0].e")),
+            ("met", Observable("met", lambda leptons, photons, jets, met: met.pt, objects=["met"])),
+        ]
+    )
+    assert get_used_collections(observables, [Cut("cut", "ej > 20.0 and len(a) == 0")]) == ["j", "a", "met"]
+    assert get_used_collections(observables, [Cut("cut", "visible.m > 10.0")]) == ["e", "j", "a", "mu", "met"]
+    assert get_used_collections({"f": Observable("f", lambda *args: 1.0)}, []) == ["j", "a", "l", "met"]
+
+
+def test_run_and_analyse_delphes_in_parallel(tmp_path, caplog):
+    miner = MadMiner()
+    miner.add_parameter(lha_block="a", lha_id=1, parameter_name="theta", parameter_range=(-1.0, 1.0))
+    miner.add_benchmark({"theta": 0.0}, "b0")
+    miner.add_benchmark({"theta": 1.0}, "b1")
+    miner.save(str(tmp_path / "setup.h5"))
+
+    # Stub for the Delphes executable, which copies a prepared ROOT file to the output path
+    _write_delphes_file(str(tmp_path / "template.root"))
+    delphes = tmp_path / "DelphesHepMC"
+    delphes.write_text(f'#!/bin/sh\necho "Processing $3"\ncp {tmp_path / "template.root"} "$2"\n')
+    delphes.chmod(0o755)
+
+    reader = DelphesReader(str(tmp_path / "setup.h5"))
+    for i in range(3):
+        hepmc_file = tmp_path / f"events_{i}.hepmc"
+        hepmc_file.write_text("")
+        reader.add_sample(str(hepmc_file), "b0", is_background=i == 1, weights="delphes")
+    reader.run_delphes(str(tmp_path), "card.tcl", log_file=str(tmp_path / "delphes.log"), n_workers=2)
+
+    assert reader.delphes_sample_filenames == [str(tmp_path / f"events_{i}_delphes.root") for i in range(3)]
+    assert "events_1.hepmc" in (tmp_path / "delphes_1.log").read_text()
+
+    reader.add_observable("ptj", "j[0].pt", required=False, default=0.0)
+    reader.add_cut("met.pt < 25.0")
+
+    results = []
+    for n_workers in [1, 2]:
+        reader.analyse_delphes_samples(n_workers=n_workers)
+        results.append((reader.observations, reader.weights, reader.events_sampling_benchmark_ids))
+
+    # Merged in the order of the samples
+    observations, weights, sampling_ids = results[1]
+    assert list(sampling_ids) == [0, 0, -1, -1, 0, 0]
+    assert np.allclose(observations["ptj"], [50.0, 0.0] * 3)
+    assert np.allclose(weights["b1"][2:4], [1.0, 2.0])
+    for expected, values in zip(results[0][:2], results[1][:2]):
+        assert list(expected) == list(values)
+        for key in expected:
+            assert np.array_equal(expected[key], values[key])
+
+    # The text parser for LHE weights is gone
+    with caplog.at_level(logging.WARNING, logger="madminer.delphes.delphes_reader"):
+        reader.analyse_delphes_samples(parse_lhe_events_as_xml=False)
+    assert "parse_lhe_events_as_xml is deprecated" in caplog.text
+
+
+def test_run_delphes_on_compressed_file(tmp_path, caplog):
+    # Stub for the Delphes executable, which writes its standard input and arguments to the output path
+    delphes = tmp_path / "DelphesHepMC"
+    delphes.write_text('#!/bin/sh\ncat > "$2"\necho "arguments: $#" >> "$2"\n')
+    delphes.chmod(0o755)
+
+    events = "".join(f"E {i} -1 -1.0 -1.0 -1.0 0 -1 2 10001 10002 0 1 1.0\n" for i in range(10000))
+    with gzip.open(tmp_path / "events.hepmc.gz", "wt") as file:
+        file.write(events)
+
+    delphes_filename = run_delphes(str(tmp_path), "card.tcl", str(tmp_path / "events.hepmc.gz"))
+
+    # The events are streamed to Delphes, without decompressed copy of the HepMC file
+    assert delphes_filename == str(tmp_path / "events_delphes.root")
+    assert (tmp_path / "events_delphes.root").read_text() == events + "arguments: 2\n"
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "DelphesHepMC",
+        "events.hepmc.gz",
+        "events_delphes.root",
+    ]
+
+    # Unzipped copies are never kept
+    with caplog.at_level(logging.WARNING, logger="madminer.utils.interfaces.delphes"):
+        run_delphes(str(tmp_path), "card.tcl", str(tmp_path / "events.hepmc.gz"), delete_unzipped_file=False)
+    assert "delete_unzipped_file is deprecated" in caplog.text
+    assert not (tmp_path / "events.hepmc").exists()
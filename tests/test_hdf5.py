@@ -0,0 +1,72 @@
+from collections import OrderedDict
+
+import h5py
+import numpy as np
+
+from madminer import MadMiner
+from madminer.models import Observable
+from madminer.utils.interfaces.hdf5 import append_events
+from madminer.utils.interfaces.hdf5 import save_events
+from madminer.utils.interfaces.hdf5 import shuffle_events
+
+
+def test_append_events(tmp_path):
+    miner = MadMiner()
+    miner.add_parameter(lha_block="a", lha_id=1, parameter_name="theta", parameter_range=(-1.0, 1.0))
+    miner.add_benchmark({"theta": 0.0}, "b0")
+    miner.add_benchmark({"theta": 1.0}, "b1")
+    miner.save(str(tmp_path / "setup.h5"))
+
+    observables = OrderedDict([("x", Observable("x", "j[0].pt")), ("y", Observable("y", "met.pt"))])
+    observations = OrderedDict([("x", np.arange(5.0)), ("y", -np.arange(5.0))])
+    weights = OrderedDict([("b1", np.full(5, 2.0)), ("b0", np.ones(5))])
+    sampling_ids = np.array([0, 0, 0, 1, 1])
+
+    # All events at once
+    filename = str(tmp_path / "events.h5")
+    miner.save(filename)
+    save_events(filename, True, observables, observations, weights, sampling_ids, [3, 2], 0)
+
+    # In chunks
+    filename_chunks = str(tmp_path / "events_chunks.h5")
+    miner.save(filename_chunks)
+    save_events(filename_chunks, True, observables, OrderedDict(), None, None, None, None)
+    for chunk in [slice(0, 2), slice(2, 5)]:
+        append_events(
+            filename_chunks,
+            OrderedDict((key, values[chunk]) for key, values in observations.items()),
+            OrderedDict((key, values[chunk]) for key, values in weights.items()),
+            sampling_ids[chunk],
+        )
+
+    with h5py.File(filename, "r") as file, h5py.File(filename_chunks, "r") as file_chunks:
+        for name in ["observations", "weights", "sampling_benchmarks"]:
+            assert np.array_equal(file[f"samples/{name}"][()], file_chunks[f"samples/{name}"][()])
+        assert file_chunks["samples/weights"].maxshape == (None, 2)
+
+
+def test_shuffle_events(tmp_path):
+    miner = MadMiner()
+    miner.add_parameter(lha_block="a", lha_id=1, parameter_name="theta", parameter_range=(-1.0, 1.0))
+    miner.add_benchmark({"theta": 0.0}, "b0")
+
+    observables = OrderedDict([("x", Observable("x", "j[0].pt"))])
+    observations = OrderedDict([("x", np.arange(100.0))])
+    weights = OrderedDict([("b0", np.arange(100.0) + 1000.0)])
+    sampling_ids = np.zeros(100, dtype=int)
+
+    # Shuffled before writing, and in place after writing
+    for i, shuffle in enumerate([True, False]):
+        filename = str(tmp_path / f"events_{i}.h5")
+        miner.save(filename)
+        save_events(filename, True, observables, observations, weights, sampling_ids, [100], 0, shuffle=shuffle)
+        if not shuffle:
+            shuffle_events(filename)
+
+        with h5py.File(filename, "r") as file:
+            x = file["samples/observations"][()][:, 0]
+            w = file["samples/weights"][()][:, 0]
+            assert not np.array_equal(x, np.arange(100.0))
+            assert np.array_equal(np.sort(x), np.arange(100.0))
+            assert np.array_equal(w, x + 1000.0)
+            assert list(file["sample_summary/signal_events"][()]) == [100]
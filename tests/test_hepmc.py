@@ -0,0 +1,130 @@
+import gzip
+from collections import OrderedDict
+
+import numpy as np
+
+from madminer import MadMiner
+from madminer.delphes import DelphesReader
+from madminer.models import Cut
+from madminer.models import Observable
+from madminer.utils.interfaces.hepmc import extract_weight_order
+from madminer.utils.interfaces.hepmc import parse_hepmc_file
+
+# Three events as (weights, particles), each particle as (pdgid, status, px, py, pz, E): an electron, a muon, and a
+# neutrino; a photon and a pion; only a neutrino. Beam protons and intermediate Z bosons are not in the final state.
+EVENTS = [
+    ([1.0, 2.0], [(11, 1, 30.0, 0.0, 0.0, 30.0), (-13, 1, 0.0, 40.0, 30.0, 50.0), (12, 1, -10.0, -20.0, 0.0, 22.4)]),
+    ([0.5, 0.25], [(22, 1, 0.0, -15.0, 0.0, 15.0), (211, 1, 5.0, 0.0, 0.0, 5.0), (23, 2, 5.0, -15.0, 0.0, 91.0)]),
+    ([3.0, 1.0], [(14, 1, 20.0, 0.0, 0.0, 20.0)]),
+]
+BEAMS = [(2212, 4, 0.0, 0.0, 6500.0, 6500.0), (2212, 4, 0.0, 0.0, -6500.0, 6500.0)]
+
+
+def _write_hepmc2(filename):
+    lines = ["HepMC::Version 2.06.09", "HepMC::IO_GenEvent-START_EVENT_LISTING"]
+    for i, (weights, particles) in enumerate(EVENTS):
+        weights = " ".join(str(weight) for weight in weights)
+        lines += [f"E {i} -1 -1.0 -1.0 -1.0 0 -1 2 10001 10002 0 2 {weights}", 'N 2 "id=b0" "id=b1"', "U GEV MM"]
+        for barcode, (pdgid, status, px, py, pz, e) in enumerate(BEAMS + particles):
+            lines.append(f"P {10001 + barcode} {pdgid} {px} {py} {pz} {e} 0.0 {status} 0 0 0 0")
+    lines.append("HepMC::IO_GenEvent-END_EVENT_LISTING")
+
+    with open(filename, "w") as file:
+        file.write("\n".join(lines) + "\n")
+
+
+def _write_hepmc3(filename):
+    # Momenta in MeV
+    lines = ["HepMC::Version 3.02.05", "HepMC::Asciiv3-START_EVENT_LISTING", "W id=b0 id=b1"]
+    for i, (weights, particles) in enumerate(EVENTS):
+        lines += [f"E {i} 1 {len(BEAMS + particles)}", "U MEV MM", "W " + " ".join(str(weight) for weight in weights)]
+        for j, (pdgid, status, px, py, pz, e) in enumerate(BEAMS + particles):
+            momentum = " ".join(str(1000.0 * value) for value in [px, py, pz, e])
+            lines.append(f"P {j + 1} {0 if j < 2 else -1} {pdgid} {momentum} 0.0 {status}")
+            if j == 1:
+                lines.append("V -1 0 [1,2]")
+    lines.append("HepMC::Asciiv3-END_EVENT_LISTING")
+
+    with gzip.open(filename, "wt") as file:
+        file.write("\n".join(lines) + "\n")
+
+
+def _one_jet(event_index, momenta):
+    # All particles of an event in one jet
+    return np.unique(event_index, return_inverse=True)[1]
+
+
+def test_parse_hepmc_file(tmp_path):
+    filenames = [str(tmp_path / "events.hepmc"), str(tmp_path / "events.hepmc3.gz")]
+    _write_hepmc2(filenames[0])
+    _write_hepmc3(filenames[1])
+
+    observables = OrderedDict(
+        [
+            ("met", Observable("met", "met.pt")),
+            ("pdgidl", Observable("pdgidl", "l[0].pdgid", val_default=0.0)),
+            ("ptl", Observable("ptl", "l[1].pt", val_default=0.0)),
+            ("ea", Observable("ea", "a[0].e", is_required=True)),
+            ("ptj", Observable("ptj", "j[0].pt", val_default=0.0)),
+        ]
+    )
+    cuts = [Cut("met", "met < 25.0")]
+
+    results = []
+    for filename in filenames:
+        assert extract_weight_order(filename, "b0") == ["b0", "b1"]
+        results.append(
+            parse_hepmc_file(filename, observables, [], ["b0", "b1"], engine="events", jet_clustering=_one_jet)
+        )
+        results.append(parse_hepmc_file(filename, observables, cuts, ["b0", "b1"], chunk_size=2))
+
+    # Leptons sorted by pT, MET from everything but the neutrinos, the photon requires the second event
+    observations, weights, combined_filter = results[0]
+    assert list(combined_filter) == [False, True, False]
+    assert np.allclose(observations["met"], [np.hypot(5.0, -15.0)])
+    assert np.allclose(observations["ptj"], [np.hypot(5.0, -15.0)])
+    assert np.allclose(weights["b1"], [0.25])
+
+    # Without jet clustering, there are no jets
+    observations, weights, combined_filter = results[1]
+    assert list(combined_filter) == [False, True, False]
+    assert list(observations["ptj"]) == [0.0]
+
+    observations, weights, combined_filter = parse_hepmc_file(
+        filenames[1], OrderedDict(list(observables.items())[:3]), cuts
+    )
+    assert list(combined_filter) == [False, True, True]
+    assert weights is None
+    assert list(observations["pdgidl"]) == [0.0, 0.0]
+
+    observations, _, _ = parse_hepmc_file(filenames[0], OrderedDict(list(observables.items())[1:3]), [])
+    assert list(observations["pdgidl"]) == [-13.0, 0.0, 0.0]
+    assert np.allclose(observations["ptl"], [30.0, 0.0, 0.0])
+
+    # Both formats give the same results
+    for expected, values in zip(results[:2], results[2:]):
+        assert np.array_equal(expected[2], values[2])
+        for expected_values, values_values in zip(expected[:2], values[:2]):
+            if expected_values is not None:
+                for key in expected_values:
+                    assert np.allclose(expected_values[key], values_values[key])
+
+
+def test_analyse_hepmc_samples(tmp_path):
+    miner = MadMiner()
+    miner.add_parameter(lha_block="a", lha_id=1, parameter_name="theta", parameter_range=(-1.0, 1.0))
+    miner.add_benchmark({"theta": 0.0}, "b0")
+    miner.add_benchmark({"theta": 1.0}, "b1")
+    miner.save(str(tmp_path / "setup.h5"))
+
+    reader = DelphesReader(str(tmp_path / "setup.h5"))
+    _write_hepmc2(str(tmp_path / "events.hepmc"))
+    reader.add_sample(str(tmp_path / "events.hepmc"), "b0", weights="delphes")
+    reader.add_observable("ptj", "j[0].pt", required=False, default=0.0)
+    reader.add_cut("met.pt > 15.0")
+
+    reader.analyse_hepmc_samples(jet_clustering=_one_jet, chunk_size=2, n_workers=2)
+
+    assert np.allclose(reader.observations["ptj"], [50.0, np.hypot(5.0, -15.0)])
+    assert np.allclose(reader.weights["b0"], [1.0, 0.5])
+    assert np.allclose(reader.weights["b1"], [2.0, 0.25])
@@ -0,0 +1,87 @@
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+from test_lhe import LHE_HEADER
+
+from madminer.models import Observable
+from madminer.utils.interfaces.lhe import parse_lhe_file
+from madminer.utils.jets import JetClustering
+from madminer.utils.jets import cluster_jets
+from madminer.utils.jets import combine_constituents
+
+# Two gluons at a distance of 0.2 in (y, phi), a b quark recoiling against them, and an electron
+LHE_EVENT = """<event>
+ 6      0 {weight:+.7e} 9.118800e+01 7.546771e-03 1.180000e-01
+       21 -1    0    0  501  502 +0.0000000000e+00 +0.0000000000e+00 +5.0e+02 5.0e+02 0.0e+00 0.0e+00 -1.0e+00
+       21 -1    0    0  502  503 +0.0000000000e+00 +0.0000000000e+00 -5.0e+02 5.0e+02 0.0e+00 0.0e+00 1.0e+00
+       21  1    1    2  501  504 +8.0000000000e+01 +0.0000000000e+00 +0.0e+00 8.0e+01 0.0e+00 0.0e+00 1.0e+00
+       21  1    1    2  504  505 {px:+.10e} {py:+.10e} +0.0e+00 4.0e+01 0.0e+00 0.0e+00 1.0e+00
+        5  1    1    2  505  503 -1.0000000000e+02 +0.0000000000e+00 +0.0e+00 1.0e+02 0.0e+00 0.0e+00 1.0e+00
+       11  1    1    2    0    0 +0.0000000000e+00 +5.0000000000e+01 +0.0e+00 5.0e+01 0.0e+00 0.0e+00 1.0e+00
+</event>
+"""
+
+
+def test_cluster_jets():
+    # Event 0: two close particles and one far away, event 1: a single particle and one without pT
+    event_index = np.array([0, 0, 0, 1, 1])
+    momenta = np.array(
+        [
+            [50.0, 0.0, 0.0, 50.0],
+            [10.0 * np.cos(0.3), 10.0 * np.sin(0.3), 0.0, 10.0],
+            [-30.0, 0.0, 0.0, 30.0],
+            [0.0, 20.0, 0.0, 20.0],
+            [0.0, 0.0, 5.0, 5.0],
+        ]
+    )
+
+    for algorithm in ["antikt", "kt", "cambridge"]:
+        jet_index = cluster_jets(event_index, momenta, algorithm=algorithm, radius=0.4, backend="numpy")
+        assert list(jet_index) == [0, 0, 1, 2, -1]
+
+    # Jets below pt_min are dropped, a smaller radius resolves the close particles
+    assert list(cluster_jets(event_index, momenta, radius=0.4, pt_min=25.0, backend="numpy")) == [0, 0, 1, -1, -1]
+    assert list(cluster_jets(event_index, momenta, radius=0.2, backend="numpy")) == [0, 2, 1, 3, -1]
+
+    jet_event_index, jet_momenta = combine_constituents(event_index, [0, 0, 1, 2, -1], momenta)
+    assert list(jet_event_index) == [0, 0, 1]
+    assert np.allclose(jet_momenta[0], momenta[0] + momenta[1])
+
+    with pytest.raises(ValueError):
+        JetClustering(algorithm="siscone")
+
+
+def test_parse_lhe_file_with_jet_clustering(tmp_path):
+    filename = tmp_path / "events.lhe"
+    events = [
+        LHE_EVENT.format(weight=1.0e-3, px=40.0 * np.cos(delta_phi), py=40.0 * np.sin(delta_phi))
+        for delta_phi in [0.2, 1.0]
+    ]
+    filename.write_text(LHE_HEADER + "".join(events) + "</LesHouchesEvents>\n")
+
+    observables = OrderedDict(
+        [
+            ("ptj1", Observable("ptj1", "j[0].pt")),
+            ("bj1", Observable("bj1", "1.0 * j[0].b_tag")),
+            ("ptj3", Observable("ptj3", "j[2].pt", val_default=0.0)),
+            ("pte", Observable("pte", "e[0].pt")),
+        ]
+    )
+
+    for engine in ["events", "columnar"]:
+        observations, _ = parse_lhe_file(
+            filename,
+            "b0",
+            observables,
+            benchmark_names=["b0"],
+            systematics_dict={},
+            engine=engine,
+            jet_clustering=JetClustering(radius=0.4, backend="numpy"),
+        )
+
+        # The two gluons are merged in the first event only, the b tag is kept
+        assert np.allclose(observations["ptj1"], [np.hypot(80.0 + 40.0 * np.cos(0.2), 40.0 * np.sin(0.2)), 100.0])
+        assert np.allclose(observations["bj1"], [0.0, 1.0])
+        assert np.allclose(observations["ptj3"], [0.0, 40.0])
+        assert np.allclose(observations["pte"], [50.0, 50.0])
@@ -0,0 +1,222 @@
+import gzip
+
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+from madminer import LHEReader
+from madminer import MadMiner
+from madminer.models import Cut
+from madminer.models import Efficiency
+from madminer.models import Observable
+from madminer.utils.interfaces.lhe import can_write_lhe_file
+from madminer.utils.interfaces.lhe import parse_lhe_file
+from madminer.utils.interfaces.lhe import parse_lhe_weights
+from madminer.utils.interfaces.lhe import split_lhe_file
+from madminer.utils.interfaces.lhe import write_lhe_file_range
+
+LHE_HEADER = """<LesHouchesEvents version="3.0">
+<header>
+<MGRunCard>
+<![CDATA[
+  3 = nevents ! Number of unweighted events requested
+  sum = event_norm ! average or sum
+]]>
+</MGRunCard>
+</header>
+<init>
+2212 2212 6.5e+03 6.5e+03 0 0 247000 247000 -4 1
+1.0 0.1 1.0 1
+</init>
+"""
+
+LHE_EVENT = """<event>
+ 3      0 {weight:+.7e} 9.118800e+01 7.546771e-03 1.180000e-01
+       21 -1    0    0  503  502 +0.0000000000e+00 +0.0000000000e+00 +4.5e+01 4.5e+01 0.0e+00 0.0e+00 -1.0e+00
+       11  1    1    2    0    0 +1.0000000000e+01 +2.0000000000e+01 +3.0e+01 3.7416573868e+01 0.0e+00 0.0e+00 1.0e+00
+      -11  1    1    2    0    0 -1.0000000000e+01 -2.0000000000e+01 +1.5e+01 2.6925824036e+01 0.0e+00 0.0e+00 1.0e+00
+<rwgt>
+<wgt id='b1'> {weight_b1:+.7e} </wgt>
+</rwgt>
+</event>
+"""
+
+
+def test_parse_lhe_weights(tmp_path):
+    filename = tmp_path / "events.lhe"
+    events = [LHE_EVENT.format(weight=w, weight_b1=2.0 * w) for w in [1.0e-3, -2.0e-3, 3.0e-3]]
+    filename.write_text(LHE_HEADER + "".join(events) + "</LesHouchesEvents>\n")
+
+    for is_background in [False, True]:
+        weights = parse_lhe_weights(filename, "b0", ["b0", "b1"], is_background=is_background, systematics_dict={})
+        _, expected = parse_lhe_file(
+            filename,
+            "b0",
+            OrderedDict(),
+            benchmark_names=["b0", "b1"],
+            is_background=is_background,
+            systematics_dict={},
+        )
+
+        assert list(weights) == list(expected)
+        for key in expected:
+            assert np.array_equal(weights[key], expected[key])
+
+    assert np.allclose(weights["b1"], [1.0e-3, -2.0e-3, 3.0e-3])
+
+
+def test_columnar_and_events_engines(tmp_path):
+    # The electron of every other event is harder, so that cuts and efficiencies differ between events
+    electron = "+1.0000000000e+01 +2.0000000000e+01 +3.0e+01 3.7416573868e+01"
+    hard_electron = "+3.0000000000e+01 +4.0000000000e+01 +0.0e+00 5.0000000000e+01"
+    events = []
+    for i, weight in enumerate([1.0e-3, 2.0e-3, -1.0e-3, 4.0e-3, 5.0e-3, 6.0e-3]):
+        event = LHE_EVENT.format(weight=weight, weight_b1=2.0 * weight)
+        events.append(event.replace(electron, hard_electron) if i % 2 else event)
+    filename = tmp_path / "events.lhe"
+    filename.write_text(LHE_HEADER + "".join(events) + "</LesHouchesEvents>\n")
+
+    observables = OrderedDict(
+        [
+            ("pte", Observable("pte", "e[0].pt")),
+            ("ptll", Observable("ptll", lambda p_truth, l, a, j, met: (l[0] + l[1]).pt)),
+            ("ptj", Observable("ptj", "j[0].pt", val_default=-1.0)),
+            ("met", Observable("met", "met.pt")),
+        ]
+    )
+    cuts = [Cut("cut", "pte > 30.0 and ptj < 0.0"), Cut("cut", "ptll < 100.0")]
+    efficiencies = [Efficiency("eff", "0.5 if pte > 40.0 else 0.9")]
+
+    results = [
+        parse_lhe_file(
+            filename,
+            "b0",
+            observables,
+            cuts,
+            efficiencies,
+            benchmark_names=["b0", "b1"],
+            systematics_dict={},
+            engine=engine,
+            chunk_size=4,
+        )
+        for engine in ["events", "columnar"]
+    ]
+
+    (expected_observations, expected_weights), (observations, weights) = results
+    assert list(observations) == list(expected_observations) == list(observables)
+    for key in observables:
+        assert np.allclose(observations[key], expected_observations[key])
+    assert list(weights) == list(expected_weights)
+    for key in expected_weights:
+        assert np.allclose(weights[key], expected_weights[key])
+
+    # The soft electrons fail the first cut, the efficiency depends on the electron pT
+    assert np.allclose(observations["pte"], 50.0)
+    assert np.allclose(observations["ptj"], -1.0)
+    assert np.allclose(weights["b0"], 0.5 * np.array([2.0e-3, 4.0e-3, 6.0e-3]))
+
+
+def _write_events(filename, weights):
+    events = [LHE_EVENT.format(weight=weight, weight_b1=2.0 * weight) for weight in weights]
+    filename.write_text(LHE_HEADER + "".join(events) + "</LesHouchesEvents>\n")
+
+
+def _reader(tmp_path):
+    miner = MadMiner()
+    miner.add_parameter(lha_block="a", lha_id=1, parameter_name="theta", parameter_range=(-1.0, 1.0))
+    miner.add_benchmark({"theta": 0.0}, "b0")
+    miner.add_benchmark({"theta": 1.0}, "b1")
+    miner.save(str(tmp_path / "setup.h5"))
+
+    _write_events(tmp_path / "signal.lhe", [1.0e-3, 2.0e-3, 3.0e-3])
+    _write_events(tmp_path / "background.lhe", [4.0e-3, 5.0e-3])
+
+    reader = LHEReader(str(tmp_path / "setup.h5"))
+    reader.add_sample(str(tmp_path / "signal.lhe"), "b0")
+    reader.add_sample(str(tmp_path / "background.lhe"), "b0", is_background=True)
+    reader.add_observable("pte", "e[0].pt")
+    return reader
+
+
+def test_analyse_samples_in_parallel(tmp_path):
+    reader = _reader(tmp_path)
+    reader.set_smearing(pt_resolution_rel=0.1)
+
+    results = []
+    for engine, n_workers in [("columnar", 1), ("columnar", 2), ("events", 1), ("events", 2)]:
+        # The analysis in this process does not reseed the global random state of the caller
+        np.random.seed(1)
+        reader.analyse_samples(engine=engine, n_workers=n_workers, random_state=5)
+        assert np.random.rand() == np.random.RandomState(1).rand()
+
+        results.append((reader.observations, reader.weights, reader.events_sampling_benchmark_ids))
+
+    # Every file is smeared with the same seed, independently of the number of workers
+    for expected, result in [(results[0], results[1]), (results[2], results[3])]:
+        for expected_values, values in zip(expected[:2], result[:2]):
+            assert list(values) == list(expected_values)
+            for key in expected_values:
+                assert np.array_equal(values[key], expected_values[key])
+        assert list(result[2]) == list(expected[2]) == [0, 0, 0, -1, -1]
+
+    assert np.allclose(results[0][1]["b1"], [2.0e-3, 4.0e-3, 6.0e-3, 4.0e-3, 5.0e-3])
+    assert not np.allclose(results[0][0]["pte"], np.hypot(10.0, 20.0))
+
+
+def test_split_lhe_file(tmp_path):
+    # Compressed files can be split at every tenth event
+    weights = 1.0e-3 * np.arange(1.0, 26.0)
+    events = [LHE_EVENT.format(weight=weight, weight_b1=2.0 * weight) for weight in weights]
+    text = LHE_HEADER + "".join(events) + "</LesHouchesEvents>\n"
+    (tmp_path / "events.lhe").write_text(text)
+    with gzip.open(tmp_path / "events.lhe.gz", "wt") as file:
+        file.write(text)
+
+    # The ranges contain every event exactly once, for plain and compressed files
+    for filename in [tmp_path / "events.lhe", tmp_path / "events.lhe.gz"]:
+        assert len(split_lhe_file(filename, 3)) == 3
+
+        for n_ranges in [1, 2, 3, 7, 30]:
+            byte_ranges = split_lhe_file(filename, n_ranges)
+            assert 1 <= len(byte_ranges) <= min(n_ranges, len(weights))
+
+            range_weights, written_weights = [], []
+            for i, byte_range in enumerate(byte_ranges):
+                _, this_weights = parse_lhe_file(
+                    filename,
+                    "b0",
+                    OrderedDict(),
+                    benchmark_names=["b0", "b1"],
+                    systematics_dict={},
+                    byte_range=byte_range,
+                )
+                range_weights.append(this_weights["b1"])
+
+                range_filename = tmp_path / f"range_{i}.lhe"
+                write_lhe_file_range(filename, byte_range, range_filename)
+                written_weights.append(parse_lhe_weights(range_filename, "b0", ["b0", "b1"], systematics_dict={})["b0"])
+
+            assert np.allclose(np.concatenate(range_weights), 2.0 * weights)
+            assert np.allclose(np.concatenate(written_weights), weights)
+
+    # Files compressed with zstd or LZ4 can be read, but not written
+    assert can_write_lhe_file("events.lhe") and can_write_lhe_file("events.lhe.gz")
+    assert not can_write_lhe_file("events.lhe.zst") and not can_write_lhe_file("events.lhe.lz4")
+    with pytest.raises(ValueError):
+        write_lhe_file_range(tmp_path / "events.lhe", None, tmp_path / "events.lhe.zst")
+
+
+def test_analyse_split_samples(tmp_path):
+    reader = _reader(tmp_path)
+
+    results = []
+    for split_files in [False, True]:
+        reader.analyse_samples(n_workers=2, split_files=split_files)
+        results.append((reader.observations, reader.weights, reader.events_sampling_benchmark_ids))
+
+    for expected_values, values in zip(results[0][:2], results[1][:2]):
+        assert list(values) == list(expected_values)
+        for key in expected_values:
+            assert np.array_equal(values[key], expected_values[key])
+    assert list(results[1][2]) == list(results[0][2]) == [0, 0, 0, -1, -1]
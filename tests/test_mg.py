@@ -0,0 +1,243 @@
+import gzip
+import json
+import os
+import re
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+from test_lhe import LHE_EVENT
+from test_lhe import LHE_HEADER
+
+from madminer import MadMiner
+from madminer.utils.interfaces.lhe import parse_lhe_weights
+from madminer.utils.interfaces.mg import collect_job_array_events
+
+# Stand-in for MadGraph: "output" creates a process directory, "launch" writes the param card as events into the next
+# run folder. The first attempt to generate events with theta = 1 fails.
+FAKE_MG5_AMC = """#!{python}
+import gzip
+import sys
+from pathlib import Path
+
+commands = [line.split() for line in open(sys.argv[1]) if line.strip()]
+for command in commands:
+    if command[0] == "output":
+        for folder in ["Cards", "Events", "bin"]:
+            Path(command[1], folder).mkdir(parents=True, exist_ok=True)
+    elif command[0] == "launch":
+        param_card = Path(command[1], "Cards", "param_card.dat").read_text()
+        marker = Path(sys.argv[0]).parent / "failed_once"
+        if " 1.0 " in param_card and not marker.exists():
+            marker.touch()
+            print("Something went wrong")
+            sys.exit(1)
+        n_runs = len(list(Path(command[1], "Events").iterdir()))
+        run_directory = Path(command[1], "Events", f"run_{{n_runs + 1:02d}}")
+        run_directory.mkdir()
+        with gzip.open(run_directory / "unweighted_events.lhe.gz", "wt") as file:
+            file.write(param_card)
+"""
+
+
+def _setup(tmp_path):
+    mg_directory = tmp_path / "MG5"
+    (mg_directory / "bin").mkdir(parents=True)
+    mg5_amc = mg_directory / "bin" / "mg5_aMC"
+    mg5_amc.write_text(FAKE_MG5_AMC.format(python=sys.executable))
+    mg5_amc.chmod(0o755)
+
+    (tmp_path / "proc_card.dat").write_text("generate p p > e+ e-\n")
+    (tmp_path / "param_card.dat").write_text("Block a\n    1 0.000000e+00 # theta\n")
+    (tmp_path / "run_card.dat").write_text("  100 = nevents ! Number of unweighted events requested\n")
+
+    miner = MadMiner()
+    miner.add_parameter(
+        lha_block="a", lha_id=1, parameter_name="theta", param_card_transform="theta", parameter_range=(-1.0, 1.0)
+    )
+    for theta in [0.0, 1.0, -1.0]:
+        miner.add_benchmark({"theta": theta}, f"b{theta:+.0f}")
+
+    return miner
+
+
+def test_run_multiple_in_parallel(tmp_path):
+    miner = _setup(tmp_path)
+    mg_directory = tmp_path / "MG5"
+    mg_process_directory = tmp_path / "MG_process"
+    miner.run_multiple(
+        mg_directory=str(mg_directory),
+        proc_card_file=str(tmp_path / "proc_card.dat"),
+        param_card_template_file=str(tmp_path / "param_card.dat"),
+        run_card_files=[str(tmp_path / "run_card.dat")],
+        mg_process_directory=str(mg_process_directory),
+        log_directory=str(tmp_path / "logs"),
+        temp_directory=str(tmp_path / "tmp"),
+        n_workers=2,
+        n_retries=1,
+    )
+
+    # Events of run i in run_0<i+1>, the failed attempt of run 1 in its own log file
+    for i, theta in enumerate(["0.0", "1.0", "-1.0"]):
+        with gzip.open(mg_process_directory / "Events" / f"run_{i + 1:02d}" / "unweighted_events.lhe.gz", "rt") as file:
+            assert f" {theta} " in file.read()
+    assert "Something went wrong" in (tmp_path / "logs" / "run_1.log").read_text()
+    assert list((tmp_path / "tmp").iterdir()) == [tmp_path / "tmp" / "generate.mg5"]
+
+
+def test_job_array(tmp_path):
+    miner = _setup(tmp_path)
+    mg_process_directory = tmp_path / "MG_process"
+    miner.run_multiple(
+        mg_directory=str(tmp_path / "MG5"),
+        proc_card_file=str(tmp_path / "proc_card.dat"),
+        param_card_template_file=str(tmp_path / "param_card.dat"),
+        run_card_files=[str(tmp_path / "run_card.dat")],
+        mg_process_directory=str(mg_process_directory),
+        log_directory=str(tmp_path / "logs"),
+        temp_directory=str(tmp_path / "tmp"),
+        only_prepare_script=True,
+        job_array=True,
+        job_resources={"cores": 2},
+    )
+
+    with open(mg_process_directory / "madminer" / "job_array.json") as file:
+        jobs = json.load(file)["jobs"]
+    assert [job["sample_benchmark"] for job in jobs] == ["b+0", "b+1", "b-1"]
+    assert all(job["resources"] == {"cores": 2} for job in jobs)
+
+    # Job 1 fails at the first attempt, is missing until it is run again
+    def run_job(index):
+        env = dict(os.environ, MADMINER_SCRATCH=str(tmp_path / "tmp"))
+        launcher = mg_process_directory / "madminer" / "run_array.sh"
+        return subprocess.run([str(launcher), str(index)], env=env).returncode
+
+    assert [run_job(index) for index in range(3)] == [0, 1, 0]
+    assert [sample["index"] for sample in collect_job_array_events(str(mg_process_directory))] == [0, 2]
+
+    assert run_job(1) == 0
+    samples = collect_job_array_events(str(mg_process_directory))
+    assert [sample["sampled_from_benchmark"] for sample in samples] == ["b+0", "b+1", "b-1"]
+    for sample, theta in zip(samples, ["0.0", "1.0", "-1.0"]):
+        assert sample["hepmc_filename"] is None
+        with gzip.open(sample["lhe_filename"], "rt") as file:
+            assert f" {theta} " in file.read()
+    assert list((tmp_path / "tmp").iterdir()) == [tmp_path / "tmp" / "generate.mg5"]
+
+
+# Stand-in for "madevent reweight <run> -f": adds weights for benchmark b1 (three times the event weight)
+FAKE_MADEVENT = """#!{python}
+import gzip
+import re
+import sys
+from pathlib import Path
+
+process_directory = Path(sys.argv[0]).resolve().parent.parent
+assert sys.argv[1] == "reweight" and "launch" in (process_directory / "Cards" / "reweight_card.dat").read_text()
+print("Reweighting", sys.argv[2])
+
+filename = process_directory / "Events" / sys.argv[2] / "unweighted_events.lhe.gz"
+with gzip.open(filename, "rt") as file:
+    events = file.read()
+
+
+def reweight(match):
+    weight = float(match.group(1).split()[2])
+    return f"<event>{{match.group(1)}}<rwgt>\\\\n<wgt id='b1'> {{3.0 * weight:+.7e}} </wgt>\\\\n</rwgt>\\\\n</event>"
+
+
+events = re.sub(r"<event>(.*?)</event>", reweight, events, flags=re.S)
+with gzip.open(filename, "wt") as file:
+    file.write(events.replace("<header>", "<header>\\\\n<!-- reweighted -->", 1))
+"""
+
+
+def _setup_reweighting(tmp_path):
+    mg_process_directory = tmp_path / "MG_process"
+    (mg_process_directory / "bin").mkdir(parents=True)
+    (mg_process_directory / "Cards").mkdir()
+    madevent = mg_process_directory / "bin" / "madevent"
+    madevent.write_text(FAKE_MADEVENT.format(python=sys.executable))
+    madevent.chmod(0o755)
+
+    # One run with compressed events, one uncompressed LHE file elsewhere
+    event = re.sub(r"<rwgt>.*</rwgt>\n", "", LHE_EVENT, flags=re.S)
+    samples = [(mg_process_directory / "Events" / "run_01" / "unweighted_events.lhe.gz", 40), (tmp_path / "b.lhe", 5)]
+    for filename, n_events in samples:
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        text = LHE_HEADER + "".join(event.format(weight=1.0e-3 * (i + 1)) for i in range(n_events))
+        with gzip.open(filename, "wt") if filename.suffix == ".gz" else open(filename, "w") as file:
+            file.write(text + "</LesHouchesEvents>\n")
+
+    return mg_process_directory, samples
+
+
+def test_reweight_existing_samples_in_parallel(tmp_path):
+    miner = _setup(tmp_path)
+    mg_process_directory, samples = _setup_reweighting(tmp_path)
+
+    miner.reweight_existing_sample(
+        mg_process_directory=str(mg_process_directory),
+        run_name=["run_01", str(tmp_path / "b.lhe")],
+        param_card_template_file=str(tmp_path / "param_card.dat"),
+        sample_benchmark="b+0",
+        reweight_benchmarks=["b+1"],
+        log_directory=str(tmp_path / "logs"),
+        temp_directory=str(tmp_path / "tmp"),
+        n_workers=2,
+        n_chunks=2,
+    )
+
+    # Both files split and merged in order
+    for (filename, n_events), run in zip(samples, ["run_01", "b.lhe"]):
+        weights = parse_lhe_weights(filename, "b0", ["b0", "b1"], is_background=False, systematics_dict={})
+        assert np.allclose(weights["b0"], 1.0e-3 * np.arange(1, n_events + 1))
+        assert np.allclose(weights["b1"], 3.0 * weights["b0"])
+        with gzip.open(filename, "rt") if filename.suffix == ".gz" else open(filename) as file:
+            assert file.read().count("<!-- reweighted -->") == 1
+    assert sorted(path.name for path in (tmp_path / "logs").iterdir()) == [
+        "reweight_0_0.log",
+        "reweight_0_1.log",
+        "reweight_1_0.log",
+        "reweight_1_1.log",
+    ]
+    assert list((tmp_path / "tmp").iterdir()) == []
+    assert [path.name for path in samples[0][0].parent.iterdir()] == ["unweighted_events.lhe.gz"]
+
+
+def test_reweight_keeps_events_if_merge_fails(tmp_path, monkeypatch):
+    miner = _setup(tmp_path)
+    mg_process_directory, samples = _setup_reweighting(tmp_path)
+    original_events = [filename.read_bytes() for filename, _ in samples]
+
+    def merge_lhe_files(filenames, new_filename):
+        with open(new_filename, "wb") as file:
+            file.write(b"<LesHouchesEvents")
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr("madminer.core.madminer.merge_lhe_files", merge_lhe_files)
+
+    with pytest.raises(OSError):
+        miner.reweight_existing_sample(
+            mg_process_directory=str(mg_process_directory),
+            run_name=["run_01", str(tmp_path / "b.lhe")],
+            param_card_template_file=str(tmp_path / "param_card.dat"),
+            sample_benchmark="b+0",
+            reweight_benchmarks=["b+1"],
+            log_directory=str(tmp_path / "logs"),
+            temp_directory=str(tmp_path / "tmp"),
+            n_workers=2,
+            n_chunks=2,
+        )
+
+    # The original events are untouched, the reweighted ranges are kept
+    assert [filename.read_bytes() for filename, _ in samples] == original_events
+    assert [path.name for path in samples[0][0].parent.iterdir()] == ["unweighted_events.lhe.gz"]
+    (chunk_directory,) = (tmp_path / "tmp").iterdir()
+    assert sorted(path.name for path in chunk_directory.iterdir()) == [
+        "events_0_0.lhe.gz",
+        "events_0_1.lhe.gz",
+        "events_1_0.lhe.gz",
+        "events_1_1.lhe.gz",
+    ]
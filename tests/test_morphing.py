@@ -1,5 +1,14 @@
+import logging
+
+from collections import OrderedDict
+
 import numpy as np
+import pytest
 
+from madminer import LHEReader
+from madminer import MadMiner
+from madminer.sampling import SampleAugmenter
+from madminer.sampling import morphing_point
 from madminer.utils import morphing as m
 
 
@@ -345,6 +354,96 @@ def test_get_min_basis():
     ), "The generated minimum number of basis requires differs from expected"
 
 
+def test_morphing_kernel(
+    this_components=np.array([[4, 0], [3, 1], [2, 2], [1, 3], [0, 4]]),
+    this_basis=np.array([[1, -5], [1, -4], [1, -3], [1, -2], [1, -1]]),
+):
+    morpher = m.PhysicsMorpher(parameter_max_power=[2, 2])
+    morpher.set_components(this_components)
+    morpher.set_basis(basis_numpy=this_basis)
+
+    # One additional (nuisance) benchmark that is not part of the morphing basis
+    benchmark_names = [f"b{i}" for i in range(6)]
+    benchmark_values = np.vstack((this_basis, this_basis[:1]))
+    kernel = m.MorphingKernel(
+        benchmark_names,
+        benchmark_values,
+        components=morpher.components,
+        morphing_matrix=morpher.morphing_matrix,
+    )
+
+    thetas = np.array([[1.0, 1.0], [0.5, -2.0], [0.0, 0.3]])
+    weights = kernel.weights(thetas)
+    gradients = kernel.gradients(thetas)
+
+    assert weights.shape == (3, 6)
+    assert gradients.shape == (3, 2, 6)
+    assert np.allclose(weights[:, 5], 0.0)
+    assert np.allclose(gradients[:, :, 5], 0.0)
+
+    for theta, weight, gradient in zip(thetas, weights, gradients):
+        assert np.allclose(weight[:5], morpher.calculate_morphing_weights(theta))
+        assert np.allclose(gradient[:, :5], morpher.calculate_morphing_weight_gradient(theta))
+
+    # Benchmarks can be referenced by name or index
+    mixed = kernel.weights(["b2", 4, thetas[0]])
+    assert np.allclose(mixed[0], np.identity(6)[2])
+    assert np.allclose(mixed[1], np.identity(6)[4])
+    assert np.allclose(mixed[2], weights[0])
+    assert np.allclose(kernel.gradients(["b1"])[0], kernel.gradients(this_basis[1:2])[0])
+
+
+def test_morphing_weights_batch(
+    this_components=np.array([[4, 0], [3, 1], [2, 2], [1, 3], [0, 4]]),
+    this_basis=np.array([[1, -5], [1, -4], [1, -3], [1, -2], [1, -1]]),
+):
+    from madminer.plotting import compute_morphing_quality_grid
+
+    morpher = m.PhysicsMorpher(parameter_max_power=[2, 2], parameter_range=[(-1.0, 1.0), (-1.0, 1.0)])
+    morpher.set_components(this_components)
+    morpher.set_basis(basis_numpy=this_basis)
+
+    thetas = np.array([[1.0, 1.0], [0.5, -2.0], [0.0, 0.3]])
+    weights = morpher.calculate_morphing_weights_batch(thetas)
+    for theta, weight in zip(thetas, weights):
+        assert np.allclose(weight, morpher.calculate_morphing_weights(theta))
+
+    # Grid values match the point-by-point evaluation, with the first index running over the second parameter
+    (xi, yi), squared_weights = compute_morphing_quality_grid(morpher, (0, 1), resolution=4)
+    assert squared_weights.shape == (4, 4)
+    weight = morpher.calculate_morphing_weights(np.array([xi[3], yi[1]]))
+    assert np.isclose(squared_weights[1, 3], np.sum(weight * weight) ** 0.5)
+
+
+def test_morphing_error_surface(
+    tmp_path,
+    this_components=np.array([[4, 0], [3, 1], [2, 2], [1, 3], [0, 4]]),
+    this_basis=np.array([[1, -5], [1, -4], [1, -3], [1, -2], [1, -1]]),
+):
+    from madminer.utils.interfaces.hdf5 import load_morphing_error_surface
+    from madminer.utils.interfaces.hdf5 import save_morphing_error_surface
+
+    morpher = m.PhysicsMorpher(parameter_max_power=[2, 2], parameter_range=[(-1.0, 1.0), (-2.0, 2.0)])
+    morpher.set_components(this_components)
+    morpher.set_basis(basis_numpy=this_basis)
+    surface = morpher.calculate_morphing_error_surface(resolution=5, batch_size=7)
+
+    assert surface.values.shape == (5, 5)
+    assert morpher.morphing_error_surface is surface
+
+    # Exact at the grid points, NaN outside of the grid
+    thetas = np.array([[0.5, -1.0], [-1.0, 2.0], [1.5, 0.0]])
+    weights = morpher.calculate_morphing_weights_batch(thetas[:2])
+    assert np.allclose(surface(thetas[:2]), np.sum(weights * weights, axis=1) ** 0.5)
+    assert np.isnan(surface(thetas[2]))
+
+    # Round trip through the file
+    filename = str(tmp_path / "surface.h5")
+    save_morphing_error_surface(filename, surface.axes, surface.values)
+    axes, values = load_morphing_error_surface(filename)
+    assert np.allclose(m.MorphingErrorSurface(axes, values)(thetas[:2]), surface(thetas[:2]))
+
+
 # helper method that calculate W_i and Neff/xsec with W_i = w_i*sigma_i and Neff = sum(W_i)
 def _calculate_predict_xsec(xsec, morphing_weights):
     index = len(morphing_weights)
@@ -355,3 +454,51 @@ def _calculate_predict_xsec(xsec, morphing_weights):
     this_xsec = xsec[:index]
     W_i = np.multiply(this_xsec, morphing_weights, dtype=np.float32)
     return sum(W_i)
+
+
+def test_morphing_error_surface(tmp_path, caplog):
+    miner = MadMiner()
+    miner.add_parameter(lha_block="a", lha_id=1, parameter_name="theta", morphing_max_power=2, parameter_range=(-1, 1))
+    for theta in [-1.0, 0.0, 1.0]:
+        miner.add_benchmark({"theta": theta}, f"b{theta:+.0f}")
+    miner.set_morphing(include_existing_benchmarks=True, max_overall_power=2)
+    surface = miner.morpher.calculate_morphing_error_surface(resolution=5)
+    miner.save(str(tmp_path / "setup.h5"))
+
+    # The surface is saved with the setup
+    loaded = MadMiner()
+    loaded.load(str(tmp_path / "setup.h5"))
+    assert len(loaded.morpher.morphing_error_surface.axes) == 1
+    assert np.array_equal(loaded.morpher.morphing_error_surface.axes[0], surface.axes[0])
+    assert np.array_equal(loaded.morpher.morphing_error_surface.values, surface.values)
+
+    reader = LHEReader(str(tmp_path / "setup.h5"))
+    reader.add_observable("x", "_")
+    reader.observations = OrderedDict([("x", np.arange(4.0))])
+    reader.weights = OrderedDict((name, np.full(4, 1.0e-3)) for name in ["b-1", "b+0", "b+1"])
+    reader.save(str(tmp_path / "events.h5"), shuffle=False)
+
+    with pytest.raises(ValueError):
+        SampleAugmenter(str(tmp_path / "events.h5"), morphing_error_action="ignore")
+
+    # Points in the grid are looked up, points outside of it are calculated directly
+    sampler = SampleAugmenter(str(tmp_path / "events.h5"), max_morphing_error=3.0, morphing_error_action="raise")
+    thetas = np.array([[0.25], [3.0]])
+    weights = sampler.morphing_kernel.weights(thetas)
+    assert np.allclose(sampler._calculate_morphing_errors(thetas), np.sum(weights**2, axis=1) ** 0.5, rtol=0.2)
+    assert sampler._calculate_morphing_errors(thetas)[1] > 3.0
+
+    sampler.sample_train_plain(morphing_point([0.5]), n_samples=2, test_split=0.25, validation_split=0.25)
+    with pytest.raises(RuntimeError, match="morphing error"):
+        sampler.sample_train_plain(morphing_point([3.0]), n_samples=2, test_split=0.25, validation_split=0.25)
+
+    sampler = SampleAugmenter(str(tmp_path / "events.h5"), max_morphing_error=3.0)
+    with caplog.at_level(logging.WARNING, logger="madminer.sampling.sampleaugmenter"):
+        sampler.sample_train_plain(morphing_point([3.0]), n_samples=2, test_split=0.25, validation_split=0.25)
+    assert "1 of 1 parameter points have a morphing error" in caplog.text
+
+    # Benchmarks, also given as NumPy integers, are not checked
+    sampler = SampleAugmenter(str(tmp_path / "events.h5"), max_morphing_error=0.0, morphing_error_action="raise")
+    sampler._check_morphing_errors([[("b+1", None), (1, None), (np.int64(2), None)]])
+    with pytest.raises(RuntimeError, match="morphing error"):
+        sampler._check_morphing_errors([[(np.array([0.5]), None)]])
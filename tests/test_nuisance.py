@@ -5,13 +5,15 @@ from collections import OrderedDict
 import numpy as np
 
 from madminer.models import NuisanceParameter
+from madminer import DataAnalyzer
 from madminer import MadMiner
 from madminer import LHEReader
 from madminer import FisherInformation
 from madminer import profile_information
+from madminer.utils.morphing import NuisanceMorpher
 
 
-def theta_limit_madminer(xsec=0.001, lumi=1000000.0, effect_phys=0.1, effect_sys=0.1):
+def theta_limit_madminer(xsec=0.001, lumi=1000000.0, effect_phys=0.1, effect_sys=0.1, nuisance_storage="weights"):
     # Set up MadMiner file
     miner = MadMiner()
     miner.add_parameter(
@@ -38,7 +40,7 @@ def theta_limit_madminer(xsec=0.001, lumi=1000000.0, effect_phys=0.1, effect_sys
     proc.weights["benchmark_0"] = np.array([xsec])
     proc.weights["benchmark_1"] = np.array([xsec * (1.0 + effect_phys)])
     proc.weights["benchmark_nuisance"] = np.array([xsec * (1.0 + effect_sys)])
-    proc.save(".data2.h5", shuffle=False)
+    proc.save(".data2.h5", shuffle=False, nuisance_storage=nuisance_storage)
 
     # Calculate Fisher information
     fisher = FisherInformation(".data2.h5")
@@ -122,3 +124,78 @@ def test_nuisance():
 
     # Check that results make sense
     assert np.all(np.abs(relative_diffs) < tolerance)
+
+
+def test_nuisance_factors_batch():
+    nuisance_parameters = OrderedDict()
+    nuisance_parameters["nu0"] = NuisanceParameter("nu0", "syst0", "b_pos", "b_neg")
+    nuisance_parameters["nu1"] = NuisanceParameter("nu1", "syst1", "b_other")
+    morpher = NuisanceMorpher(nuisance_parameters, ["b_ref", "b_pos", "b_neg", "b_other"], "b_ref")
+
+    weights = np.random.uniform(0.5, 1.5, size=(100, 4))
+    nus = [None, np.array([0.5, -1.0]), np.array([-2.0, 0.3])]
+    coefficients = morpher.calculate_coefficients(weights)
+
+    factors = morpher.calculate_nuisance_factors_batch(nus, coefficients=coefficients)
+    gradients = morpher.calculate_nuisance_factor_gradients_batch(nus, weights)
+
+    assert factors.shape == (3, 100)
+    assert gradients.shape == (3, 2, 100)
+    assert np.allclose(factors[0], 1.0)
+
+    for nu, factor, gradient in zip(nus, factors, gradients):
+        a, b = coefficients
+        nu = np.zeros(2) if nu is None else nu
+        expected = np.exp(np.sum(a * nu[:, np.newaxis] + b * nu[:, np.newaxis] ** 2, axis=0))
+        assert np.allclose(factor, expected)
+        assert np.allclose(morpher.calculate_nuisance_factors(nu, weights), expected)
+        assert np.allclose(gradient, (a + 2.0 * b * nu[:, np.newaxis]) * expected)
+
+    # Nuisance benchmark weights can be reconstructed from the coefficients
+    expanded = morpher.expand_benchmark_weights(weights[:, :1], coefficients)
+    assert np.allclose(expanded, weights)
+
+
+def test_nuisance_coefficient_storage():
+    limit_weights = theta_limit_madminer(effect_sys=0.05, nuisance_storage="weights")
+    limit_coefficients = theta_limit_madminer(effect_sys=0.05, nuisance_storage="coefficients")
+
+    assert np.isclose(limit_weights, limit_coefficients, rtol=1.0e-4)
+
+
+def test_weights_with_stored_nuisance_coefficients(tmp_path):
+    miner = MadMiner()
+    miner.add_parameter(lha_block="a", lha_id=1, parameter_name="theta", morphing_max_power=1)
+    miner.add_benchmark({"theta": 0.0})
+    miner.add_benchmark({"theta": 1.0})
+    miner.set_morphing(include_existing_benchmarks=True, max_overall_power=1)
+    miner.save(str(tmp_path / "setup.h5"))
+
+    weights = np.array([1.0e-3, 2.0e-3, 3.0e-3])
+    reader = LHEReader(str(tmp_path / "setup.h5"))
+    reader.add_observable("x", "_")
+    reader.reference_benchmark = "benchmark_0"
+    reader.nuisance_parameters = OrderedDict([("nu", NuisanceParameter("nu", "syst", "benchmark_nuisance"))])
+    reader.observations = OrderedDict([("x", np.arange(3.0))])
+    reader.weights = OrderedDict(
+        [
+            ("benchmark_0", weights),
+            ("benchmark_1", 1.1 * weights),
+            ("benchmark_nuisance", np.array([1.05, 0.9, 1.2]) * weights),
+        ]
+    )
+    reader.save(str(tmp_path / "events.h5"), shuffle=False, nuisance_storage="coefficients")
+
+    analyzer = DataAnalyzer(str(tmp_path / "events.h5"))
+    _, benchmark_weights, coefficients = next(analyzer.event_loader(return_nuisance_coefficients=True))
+    assert coefficients is not None
+
+    thetas, nus = [np.array([0.5]), np.array([0.0])], [np.array([0.3]), np.array([1.0])]
+    expected = analyzer._weights(thetas, nus, benchmark_weights)
+    stored = analyzer._weights(thetas, nus, benchmark_weights, nuisance_coefficients=coefficients)
+    assert np.allclose(stored, expected, rtol=1.0e-5)
+    assert np.allclose(stored[1], np.array([1.05, 0.9, 1.2]) * weights, rtol=1.0e-5)
+
+    expected = analyzer._weight_gradients(thetas, nus, benchmark_weights)
+    stored = analyzer._weight_gradients(thetas, nus, benchmark_weights, nuisance_coefficients=coefficients)
+    assert np.allclose(stored, expected, rtol=1.0e-5)
@@ -0,0 +1,51 @@
+import numpy as np
+
+from particle import Particle
+
+from madminer.utils.particle import B_PDG_IDS
+from madminer.utils.particle import T_PDG_IDS
+from madminer.utils.particle import TAU_PDG_IDS
+from madminer.utils.particle import MadMinerParticle
+from madminer.utils.particle import get_pdg_table
+
+
+def _expected_properties(pdgid):
+    # Charge and tags as MadMinerParticle.set_pdgid() determined them before the PDG table
+    try:
+        charge = float(Particle.from_pdgid(pdgid).charge)
+    except RuntimeError:
+        charge = 0.0
+
+    b_tag = pdgid in B_PDG_IDS
+    t_tag = not b_tag and pdgid in T_PDG_IDS
+    tau_tag = not b_tag and not t_tag and pdgid in TAU_PDG_IDS
+    return charge, tau_tag, b_tag, t_tag
+
+
+def test_pdg_table():
+    table = get_pdg_table()
+
+    # All known particles, unknown ids (9 is used for jets), and invalid ones
+    pdgids = [int(p.pdgid) for p in Particle.findall()] + [0, 9, -9, 81, 99999999]
+    properties = table.properties(np.array(pdgids).reshape((-1, 1)))
+    assert properties["charge"].shape == (len(pdgids), 1)
+
+    for i, pdgid in enumerate(pdgids):
+        expected = _expected_properties(pdgid)
+        assert table.particle_properties(pdgid) == expected
+        assert (
+            properties["charge"][i, 0],
+            properties["tau_tag"][i, 0],
+            properties["b_tag"][i, 0],
+            properties["t_tag"][i, 0],
+        ) == expected
+
+    for pdgid in [0, 9, 81]:
+        assert not table.properties([pdgid])["is_visible"][0]
+        assert not table.properties([pdgid])["is_neutrino"][0]
+    assert list(table.properties([11, -12, 21, 5])["is_visible"]) == [True, False, True, True]
+    assert list(table.properties([11, -12, 21, 5])["is_neutrino"]) == [False, True, False, False]
+
+    particle = MadMinerParticle.from_xyzt(1.0, 0.0, 0.0, 1.0)
+    particle.set_pdgid(-5)
+    assert (particle.charge, particle.tau_tag, particle.b_tag, particle.t_tag) == _expected_properties(-5)
@@ -0,0 +1,38 @@
+import gzip
+
+import pytest
+
+from madminer.utils.various import open_file
+
+
+def _compress_gzip(data):
+    return gzip.compress(data)
+
+
+def _compress_zstd(data):
+    zstandard = pytest.importorskip("zstandard")
+    return zstandard.ZstdCompressor().compress(data)
+
+
+def _compress_lz4(data):
+    lz4_frame = pytest.importorskip("lz4.frame")
+    return lz4_frame.compress(data)
+
+
+@pytest.mark.parametrize(
+    "extension, compress",
+    [("", lambda data: data), (".gz", _compress_gzip), (".zst", _compress_zstd), (".lz4", _compress_lz4)],
+)
+def test_open_file(tmp_path, extension, compress):
+    text = "".join(f"<event>\n{i}\n</event>\n" for i in range(10000))
+    filename = tmp_path / f"events.lhe{extension}"
+    filename.write_bytes(compress(text.encode("utf-8")))
+
+    with open_file(filename) as file:
+        assert file.read() == text
+    with open_file(filename, "rb", buffer_size=1024) as file:
+        assert file.readline() == b"<event>\n"
+        assert file.read() == text.encode("utf-8")[8:]
+
+    with pytest.raises(ValueError):
+        open_file(filename, "w")